@@ -36,10 +36,13 @@ def register_blueprints(app):
 
 
 def configure_database(app):
+    from apps.models import anomalies as anomalies_model
+
     @app.before_first_request
     def initialize_database():
         app.logger.info("Initializing Database")
         db.create_all()
+        anomalies_model.create_missing_indexes()
         app.logger.info("Database initialization completed")
 
     @app.teardown_request
@@ -47,10 +50,40 @@ def configure_database(app):
         db.session.remove()
 
 
+def configure_cache(app):
+    from apps.cache.revalidating_cache import add_staleness_headers
+
+    # Responses built from stale cached values are marked as such
+    app.after_request(add_staleness_headers)
+
+
 def start_scheduler(app):
+    import apps.cache.refresh_coordinator as refresh_coordinator
+    from apps.cache.cache import ConfigCache
+    from apps.utils.job_scheduler import JobScheduler, DEFAULT_MAX_WORKERS
+
+    # Only one process (the leader) runs the cache loaders: the other processes serve reads from the shared cache
+    refresh_coordinator.check_shared_cache(int(os.getenv('GUNICORN_WORKERS', '1')))
+    coordinator = refresh_coordinator.CacheRefreshCoordinator(refresh_coordinator.create_leader_lock())
+
+    def run_in_app_context(job_function):
+        if not coordinator.is_leader():
+            app.logger.info("Process %d is not the cache refresh leader: skipping job", os.getpid())
+            return
+        with app.app_context():
+            job_function()
+            refresh_coordinator.publish_cache_generation()
+
+    # Jobs of the same group are limited in number, to bound the load on the shared resources
+    scheduler_config = ConfigCache.load_object("scheduler_config") or {}
+    group_limits = {'ingestion': 2, 'elastic': 3, 'acquisition-plans': 1}
+    group_limits.update(scheduler_config.get("group_limits", {}))
+    job_scheduler = JobScheduler(max_workers=int(scheduler_config.get("max_workers", DEFAULT_MAX_WORKERS)),
+                                 group_limits=group_limits,
+                                 job_wrapper=run_in_app_context)
+
     def schedule_process():
         import schedule
-        import apps.utils.html_utils as html_utils
         from apps.cache.modules import acquisitions, publication, archive, \
             timeliness, unavailability, events, datatakes, interface_monitoring, \
             acquisitionplans, acquisitionassets
@@ -58,201 +91,227 @@ def start_scheduler(app):
 
         ################################################################################################################
         ##                                                                                                            ##
-        ##  Wrapping functions, used to invoke the ingestion of new anomalies and the update of datatakes with the    ##
-        ##  "app_context()" imported. This is mandatory, to allow saving results on the local DB.                     ##
+        ##  Job functions: all jobs are executed by the job scheduler with the "app_context()" imported. This is      ##
+        ##  mandatory, to allow saving results on the local DB.                                                       ##
         ##                                                                                                            ##
         ################################################################################################################
 
         def news_updater():
-            with app.app_context():
-                news_ingestor.NewsIngestor().ingest_news()
+            news_ingestor.NewsIngestor().ingest_news()
 
         def anomalies_updater():
-            with app.app_context():
-                anomalies_ingestor.AnomaliesIngestor().ingest_anomalies()
-
-        def news_cache_loader():
-            with app.app_context():
-                events.load_news_cache_previous_quarter()
-
-        def anomalies_cache_loader():
-            with app.app_context():
-                events.load_anomalies_cache_previous_quarter()
-
-        def datatakes_cache_loader():
-            with app.app_context():
-                datatakes.load_datatakes_cache_last_quarter()
-
-        def datatakes_prev_quarter_cache_loader():
-            with app.app_context():
-                datatakes.load_datatakes_cache_previous_quarter()
-
-        def acquisition_plans_cache_loader():
-            with app.app_context():
-                acquisitionplans.load_all_acquisition_plans()
-
-        def acquisition_plans_cache_completeness_loader():
-            with app.app_context():
-                acquisitionplans.update_acquisition_completeness()
+            anomalies_ingestor.AnomaliesIngestor().ingest_anomalies()
 
         def acquisition_assets_cache_loader():
-            with app.app_context():
-                acquisitionassets.load_stations()
-                acquisitionassets.load_satellite_orbits()
+            acquisitionassets.load_stations()
+            acquisitionassets.load_satellite_orbits()
 
         def data_access_status_monitoring_cache_loader():
-            with app.app_context():
-                interface_monitoring.load_interface_monitoring_cache_last_quarter('DD_DAS')
-                #interface_monitoring.load_interface_monitoring_cache_last_quarter('DD_DHUS')
+            interface_monitoring.load_interface_monitoring_cache_last_quarter('DD_DAS')
+            #interface_monitoring.load_interface_monitoring_cache_last_quarter('DD_DHUS')
 
         def data_access_status_monitoring_cache_loader_prev_quarter():
-            with app.app_context():
-                interface_monitoring.load_interface_monitoring_cache_prev_quarter('DD_DAS')
-                #interface_monitoring.load_interface_monitoring_cache_prev_quarter('DD_DHUS')
+            interface_monitoring.load_interface_monitoring_cache_prev_quarter('DD_DAS')
+            #interface_monitoring.load_interface_monitoring_cache_prev_quarter('DD_DHUS')
 
         def data_archive_status_monitoring_cache_loader():
-            with app.app_context():
-                interface_monitoring.load_interface_monitoring_cache_last_quarter('LTA_Acri')
-                interface_monitoring.load_interface_monitoring_cache_last_quarter('LTA_CloudFerro')
-                interface_monitoring.load_interface_monitoring_cache_last_quarter('LTA_Exprivia')
-                interface_monitoring.load_interface_monitoring_cache_last_quarter('LTA_Werum')
+            interface_monitoring.load_interface_monitoring_cache_last_quarter('LTA_Acri')
+            interface_monitoring.load_interface_monitoring_cache_last_quarter('LTA_CloudFerro')
+            interface_monitoring.load_interface_monitoring_cache_last_quarter('LTA_Exprivia')
+            interface_monitoring.load_interface_monitoring_cache_last_quarter('LTA_Werum')
 
         def data_archive_status_monitoring_cache_loader_prev_quarter():
-            with app.app_context():
-                interface_monitoring.load_interface_monitoring_cache_prev_quarter('LTA_Acri')
-                interface_monitoring.load_interface_monitoring_cache_prev_quarter('LTA_CloudFerro')
-                interface_monitoring.load_interface_monitoring_cache_prev_quarter('LTA_Exprivia')
-                interface_monitoring.load_interface_monitoring_cache_prev_quarter('LTA_Werum')
+            interface_monitoring.load_interface_monitoring_cache_prev_quarter('LTA_Acri')
+            interface_monitoring.load_interface_monitoring_cache_prev_quarter('LTA_CloudFerro')
+            interface_monitoring.load_interface_monitoring_cache_prev_quarter('LTA_Exprivia')
+            interface_monitoring.load_interface_monitoring_cache_prev_quarter('LTA_Werum')
 
+        ################################################################################################################
+        ##                                                                                                            ##
+        ##  Job graph: the dependencies between jobs are declared, so that a job is started only when the data it    ##
+        ##  needs have been loaded. The priority defines the startup warm-up order: the cheapest and most viewed      ##
+        ##  caches are loaded first.                                                                                  ##
+        ##                                                                                                            ##
+        ################################################################################################################
+        # Ingestion of News and Anomalies
+        job_scheduler.add_job('news-ingestion', news_updater, priority=10, group='ingestion')
+        job_scheduler.add_job('anomalies-ingestion', anomalies_updater, priority=10, group='ingestion')
+
+        # Last quarter data
+        job_scheduler.add_job('news-cache', events.load_news_cache_previous_quarter,
+                              depends_on=['news-ingestion'], priority=20)
+        job_scheduler.add_job('anomalies-cache', events.load_anomalies_cache_previous_quarter,
+                              depends_on=['anomalies-ingestion'], priority=20)
+        # The impact of anomalies on datatakes completeness is refreshed with datatakes
+        job_scheduler.add_job('datatakes', datatakes.load_datatakes_cache_last_quarter,
+                              depends_on=['anomalies-ingestion'], priority=30, group='elastic')
+        job_scheduler.add_job('datatakes-reconciliation', datatakes.reconcile_datatakes_cache_last_quarter,
+                              depends_on=['anomalies-ingestion'], priority=30, group='elastic', warm_up=False)
+        job_scheduler.add_job('timeliness', timeliness.load_all_periods_timeliness_cache,
+                              priority=40, group='elastic')
+        job_scheduler.add_job('publication-stats', publication.load_all_periods_publication_stats_cache,
+                              priority=40, group='elastic')
+        job_scheduler.add_job('publication-trend', publication.load_all_periods_publication_trend_cache,
+                              priority=45, group='elastic')
+        job_scheduler.add_job('archive', archive.load_all_periods_archive_cache,
+                              priority=45, group='elastic')
+        job_scheduler.add_job('acquisitions', acquisitions.load_acquisitions_cache_last_quarter,
+                              priority=50, group='elastic')
+        job_scheduler.add_job('edrs-acquisitions', acquisitions.load_edrs_acquisitions_cache_last_quarter,
+                              priority=50, group='elastic')
+        job_scheduler.add_job('unavailability', unavailability.load_unavailability_cache_last_quarter,
+                              priority=50, group='elastic')
+        job_scheduler.add_job('data-access-status', data_access_status_monitoring_cache_loader,
+                              priority=55, group='elastic')
+        job_scheduler.add_job('data-archive-status', data_archive_status_monitoring_cache_loader,
+                              priority=55, group='elastic')
+        job_scheduler.add_job('acquisition-assets', acquisition_assets_cache_loader, priority=60)
+
+        # Acquisition plans: the completeness of acquisition plans fragments is computed on the datatakes day index
+        job_scheduler.add_job('acquisition-plans', acquisitionplans.load_all_acquisition_plans,
+                              priority=70, group='acquisition-plans')
+        job_scheduler.add_job('acquisition-plans-completeness', acquisitionplans.update_acquisition_completeness,
+                              depends_on=['datatakes', 'acquisition-plans'], priority=75)
+
+        # Previous quarter data
+        job_scheduler.add_job('datatakes-prev-quarter', datatakes.load_datatakes_cache_previous_quarter,
+                              priority=100, group='elastic')
+        job_scheduler.add_job('timeliness-prev-quarter', timeliness.load_timeliness_cache_previous_quarter,
+                              priority=100, group='elastic')
+        job_scheduler.add_job('timeliness-stats-prev-quarter', timeliness.timeliness_stats_load_cache_previous_quarter,
+                              priority=100, group='elastic')
+        job_scheduler.add_job('publication-prev-quarter', publication.load_all_previous_quarter_publication_cache,
+                              priority=100, group='elastic')
+        job_scheduler.add_job('archive-prev-quarter', archive.load_archive_cache_previous_quarter,
+                              priority=100, group='elastic')
+        job_scheduler.add_job('acquisitions-prev-quarter', acquisitions.load_acquisitions_cache_previous_quarter,
+                              priority=110, group='elastic')
+        job_scheduler.add_job('edrs-acquisitions-prev-quarter',
+                              acquisitions.load_edrs_acquisitions_cache_previous_quarter,
+                              priority=110, group='elastic')
+        job_scheduler.add_job('unavailability-prev-quarter', unavailability.load_unavailability_cache_previous_quarter,
+                              priority=110, group='elastic')
+        job_scheduler.add_job('data-access-status-prev-quarter',
+                              data_access_status_monitoring_cache_loader_prev_quarter,
+                              priority=120, group='elastic')
+        job_scheduler.add_job('data-archive-status-prev-quarter',
+                              data_archive_status_monitoring_cache_loader_prev_quarter,
+                              priority=120, group='elastic')
 
         ################################################################################################################
         ##                                                                                                            ##
-        ##  This is the main backend orchestrator: it is meant to schedule the execution of all listed jobs, so to    ##
+        ##  This is the main backend orchestrator: it is meant to trigger the execution of all listed jobs, so to     ##
         ##  populate the application cache, without need of executing runtime queries. This method is divided into    ##
         ##  three main sections:                                                                                      ##
         ##  1. The ingestion of anomalies, to be executed once per hour                                               ##
         ##  2. The update of data collected in the last quarter, to be executed once per hour                         ##
         ##  3. The reload of consolidated data from the previous quarter, to be executed once per day                 ##
+        ##  Triggers only queue the jobs: the execution order is driven by the job dependencies.                      ##
         ##                                                                                                            ##
         ################################################################################################################
-        '''
-        '''
+        time_triggers = schedule.Scheduler()
+        trigger = job_scheduler.trigger
+
         ################################################################################################################
         # 1. Ingest News and Anomalies
-        schedule.every().hour.at(":00").do(news_updater)
-        schedule.every().hour.at(":00").do(anomalies_updater)
+        time_triggers.every().hour.at(":00").do(trigger, 'news-ingestion')
+        time_triggers.every().hour.at(":00").do(trigger, 'anomalies-ingestion')
 
         ################################################################################################################
         # 2. Populate cache - load data in the last quarter
         # Load News and Anomalies
-        schedule.every().hour.at(":01").do(news_cache_loader)
-        schedule.every().hour.at(":01").do(anomalies_cache_loader)
+        time_triggers.every().hour.at(":01").do(trigger, 'news-cache')
+        time_triggers.every().hour.at(":01").do(trigger, 'anomalies-cache')
 
         # Load Datatakes for all missions
-        schedule.every().hour.at(":02").do(datatakes_cache_loader)
+        time_triggers.every().hour.at(":02").do(trigger, 'datatakes')
 
         # Load acquisition assets (orbits)
-        schedule.every(4).hours.at(":04").do(acquisition_assets_cache_loader)
+        time_triggers.every(4).hours.at(":04").do(trigger, 'acquisition-assets')
 
         # Load Product Timeliness for different Time Periods, for all the missions
-        schedule.every().hour.at(":05").do(timeliness.load_all_periods_timeliness_cache).tag("Timeliness")
+        time_triggers.every().hour.at(":05").do(trigger, 'timeliness').tag("Timeliness")
 
         # Load Publication statistics for different Time Periods, for all the missions
-        schedule.every().hour.at(":08").do(publication.load_all_periods_publication_stats_cache).tag("Publication")
+        time_triggers.every().hour.at(":08").do(trigger, 'publication-stats').tag("Publication")
 
         # Load Archive statistics for different Time Periods, for all the missions
-        schedule.every().hour.at(":09").do(publication.load_all_periods_publication_trend_cache).tag("Publication")
+        time_triggers.every().hour.at(":09").do(trigger, 'publication-trend').tag("Publication")
 
         # Load Publication statistics for different Time Periods, for all the missions
-        schedule.every().hour.at(":11").do(archive.load_all_periods_archive_cache).tag("Archive")
+        time_triggers.every().hour.at(":11").do(trigger, 'archive').tag("Archive")
 
         # Load Acquisition statistics for all ground station, including EDRS
-        schedule.every().hour.at(":14").do(acquisitions.load_acquisitions_cache_last_quarter).tag(
-            "Acquisitions")
-        schedule.every().hour.at(":14").do(acquisitions.load_edrs_acquisitions_cache_last_quarter).tag(
-            "Acquisitions")
+        time_triggers.every().hour.at(":14").do(trigger, 'acquisitions').tag("Acquisitions")
+        time_triggers.every().hour.at(":14").do(trigger, 'edrs-acquisitions').tag("Acquisitions")
 
         # Load Unavailability occurrences for all platforms
-        schedule.every().hour.at(":15").do(unavailability.load_unavailability_cache_last_quarter).tag(
-            "Unavailability")
+        time_triggers.every().hour.at(":15").do(trigger, 'unavailability').tag("Unavailability")
 
         # Load Status interface monitoring for "DD_DAS" and "DD_DHUS"
-        schedule.every().hour.at(":19").do(data_access_status_monitoring_cache_loader).tag("Data Access Status")
+        time_triggers.every().hour.at(":19").do(trigger, 'data-access-status').tag("Data Access Status")
 
         # Load Status interface monitoring for "LTA_Acri", "LTA_CloudFerro", "LTA_Exprivia", "LTA_Werum"
-        schedule.every().hour.at(":21").do(data_archive_status_monitoring_cache_loader).tag("Data Archive Status")
+        time_triggers.every().hour.at(":21").do(trigger, 'data-archive-status').tag("Data Archive Status")
+
+        # Update Acquisition plans completeness, after Datatakes are loaded
+        time_triggers.every().hour.at(":05").do(trigger, 'acquisition-plans-completeness')
 
         ################################################################################################################
         # 3. Populate cache - load data from the previously completed quarter
         # Load Datatakes for all missions
-        schedule.every().day.at("02:21").do(datatakes_prev_quarter_cache_loader)
+        time_triggers.every().day.at("02:21").do(trigger, 'datatakes-prev-quarter')
+
+        # Rebuild Datatakes in the last quarter: hourly loads only retrieve updated datatakes
+        time_triggers.every().day.at("02:22").do(trigger, 'datatakes-reconciliation')
 
         # Load Product Timeliness the previously completed quarter, for all the missions
-        schedule.every().day.at("02:24").do(timeliness.load_timeliness_cache_previous_quarter).tag("Timeliness")
-        schedule.every().day.at("02:26").do(timeliness.timeliness_stats_load_cache_previous_quarter).tag("Timeliness")
+        time_triggers.every().day.at("02:24").do(trigger, 'timeliness-prev-quarter').tag("Timeliness")
+        time_triggers.every().day.at("02:26").do(trigger, 'timeliness-stats-prev-quarter').tag("Timeliness")
 
         # Load Publication statistics the previously completed quarter, for all the missions
-        schedule.every().day.at("02:30").do(publication.load_all_previous_quarter_publication_cache).tag(
-            "Publication")
+        time_triggers.every().day.at("02:30").do(trigger, 'publication-prev-quarter').tag("Publication")
 
         # Load Archive statistics the previously completed quarter, for all the missions
-        schedule.every().day.at("02:32").do(archive.load_archive_cache_previous_quarter).tag(
-            "Archive")
+        time_triggers.every().day.at("02:32").do(trigger, 'archive-prev-quarter').tag("Archive")
 
         # Load Acquisition statistics for all ground station, including EDRS
-        schedule.every().day.at("02:34").do(acquisitions.load_acquisitions_cache_previous_quarter).tag(
-            "Acquisitions")
-        schedule.every().day.at("02:34").do(acquisitions.load_edrs_acquisitions_cache_previous_quarter).tag(
-            "Acquisitions")
+        time_triggers.every().day.at("02:34").do(trigger, 'acquisitions-prev-quarter').tag("Acquisitions")
+        time_triggers.every().day.at("02:34").do(trigger, 'edrs-acquisitions-prev-quarter').tag("Acquisitions")
 
         # Load Acquisition statistics for all ground station, including EDRS
-        schedule.every().day.at("02:35").do(unavailability.load_unavailability_cache_previous_quarter).tag(
-            "Unavailability")
+        time_triggers.every().day.at("02:35").do(trigger, 'unavailability-prev-quarter').tag("Unavailability")
 
         # Load Acquisition plans as daily KML
-        schedule.every().day.at("02:45").do(acquisition_plans_cache_loader).tag("AcquisitionPlans")
-        schedule.every().hour.at(":05").do(acquisition_plans_cache_completeness_loader)
+        time_triggers.every().day.at("02:45").do(trigger, 'acquisition-plans').tag("AcquisitionPlans")
+
         # Load Status interface monitoring for "DD_DAS" and "DD_DHUS"
-        schedule.every().day.at("02:49").do(data_access_status_monitoring_cache_loader_prev_quarter).tag(
+        time_triggers.every().day.at("02:49").do(trigger, 'data-access-status-prev-quarter').tag(
             "Data Access Status")
 
         # Load Status interface monitoring for "LTA_Acri", "LTA_CloudFerro", "LTA_Exprivia", "LTA_Werum"
-        schedule.every().day.at("02:51").do(data_archive_status_monitoring_cache_loader_prev_quarter).tag(
+        time_triggers.every().day.at("02:51").do(trigger, 'data-archive-status-prev-quarter').tag(
             "Data Archive Status")
+        return time_triggers
 
-        ################################################################################################################
-        # Print thread status
-        # print("Timeliness Scheduled jobs: ", schedule.get_jobs("Timeliness"))
-        # print("Publication Scheduled jobs: ", schedule.get_jobs("Publication"))
-
-    def check_schedule():
-        import time
-        import schedule
-        app.logger.info("[BEG] Scheduler - RUN ALL tasks")
-        try:
-            schedule.run_all(10)
-        except Exception as ex:
-            app.logger.error("[ERR] Scheduler - Error running schedule tasks: %s", ex)
-        app.logger.info("[END] Scheduler - RUN ALL tasks")
-
-        while True:
-            app.logger.debug("[BEG] Scheduler - RUN pending tasks")
-            try:
-                schedule.run_pending()
-                time.sleep(10)
-            except Exception as ex:
-                app.logger.error("[ERR] Loop Scheduler - Error running loop schedule tasks: %s", ex)
-                app.logger.error("[ERR] Loop Scheduler - Traceback of error ", exc_info = 1)
-            app.logger.debug("[END] Scheduler - RUN pending tasks")
-
-    import _thread
     # if not app.debug:
     with app.app_context():
         app.logger.info("Configuring and starting scheduler...")
-        schedule_process()
+        time_triggers = schedule_process()
         app.logger.info("Jobs scheduled")
-        _thread.start_new_thread(check_schedule, ())
-        app.logger.info("Scheduler thread started")
+        app.extensions['job_scheduler'] = job_scheduler
+        app.extensions['cache_refresh_coordinator'] = coordinator
+
+    def start_refresh_on_leader():
+        # Warm-up: all the jobs are queued, and executed in order of priority and dependencies.
+        # A new leader taking over does not reload data already on the shared cache
+        with app.app_context():
+            cold_cache = refresh_coordinator.get_cache_generation() == 0
+        job_scheduler.start(time_triggers=time_triggers, warm_up=cold_cache)
+        app.logger.info("Scheduler started on process %d", os.getpid())
+
+    coordinator.start(start_refresh_on_leader)
+    app.logger.info("Process %d competing for cache refresh leadership", os.getpid())
 
 
 flask_cache = None
@@ -281,6 +340,7 @@ def create_app(config):
     register_blueprints(app)
     print("Starting Cache ...")
     flask_cache.init_app(app)
+    configure_cache(app)
     print("Starting Database ...")
     configure_database(app)
     print("Starting Scheduler ...")
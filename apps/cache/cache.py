@@ -13,87 +13,159 @@ delivered to him.
 """
 
 import threading
-
-
-class ConfigCacheSingleton:
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping
+
+EMPTY_MAPPING = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class CacheSnapshot:
+    """
+    Immutable content of a configuration cache: readers get the snapshot
+    current at the moment of the call, while a reload publishes a new snapshot
+    with an increased version.
+    """
+    version: int
+    objects: Mapping = field(default_factory=lambda: EMPTY_MAPPING)
+    indexes: Mapping = field(default_factory=lambda: EMPTY_MAPPING)
+
+
+class VersionedCacheSingleton:
+    """
+    Configuration cache backed by a dictionary.
+    Writers build a new snapshot under lock and publish it with a single
+    assignment; readers never take the lock.
+    """
     _instance = None
     _lock = threading.Lock()
-    __magazine = []
+    _write_lock = threading.Lock()
+    _snapshot = CacheSnapshot(0)
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             with cls._lock:
                 if not cls._instance:
-                    cls._instance = super(ConfigCacheSingleton, cls).__new__(cls)
+                    cls._instance = super(VersionedCacheSingleton, cls).__new__(cls)
         return cls._instance
 
-    def store_object(self, key, value):
-        obj = {key: value}
-        return self.__magazine.append(obj)
+    def _build_indexes(self, objects):
+        """
+        Compute the lookup tables derived from the cached objects.
+        Overridden by caches providing nested lookups.
+        """
+        return {}
 
-    def load_object(self, key):
-        for item in self.__magazine:
-            value = item.get(key, None)
-            if value is not None:
-                return value
-        return None
+    def _publish(self, objects):
+        snapshot = CacheSnapshot(self._snapshot.version + 1,
+                                 MappingProxyType(objects),
+                                 MappingProxyType(self._build_indexes(objects)))
+        self._snapshot = snapshot
+        return snapshot
 
-    def load_all(self):
-        return self.__magazine
+    def store_object(self, key, value):
+        with self._write_lock:
+            objects = dict(self._snapshot.objects)
+            objects[key] = value
+            self._publish(objects)
 
+    def store_objects(self, objects):
+        """
+        Replace the whole content of the cache: used to (re)load configuration
+        Args:
+            objects (dict): the new cache content
 
-class PublicationProductTreeCacheSingleton:
-    _instance = None
-    _lock = threading.Lock()
-    __magazine = []
-
-    def __new__(cls, *args, **kwargs):
-        if not cls._instance:
-            with cls._lock:
-                if not cls._instance:
-                    cls._instance = super(PublicationProductTreeCacheSingleton, cls).__new__(cls)
-        return cls._instance
+        Returns: the version of the published snapshot
 
-    def store_object(self, key, value):
-        obj = {key: value}
-        return self.__magazine.append(obj)
+        """
+        with self._write_lock:
+            return self._publish(dict(objects)).version
 
-    def load_object(self, key):
-        for item in self.__magazine:
-            value = item.get(key, None)
-            if value is not None:
-                return value
-        return None
+    def load_object(self, key, default=None):
+        return self._snapshot.objects.get(key, default)
 
     def load_all(self):
-        return self.__magazine
+        return self._snapshot.objects
 
+    @property
+    def snapshot(self) -> CacheSnapshot:
+        return self._snapshot
 
-class MissionTimelinessCacheSingleton:
-    _instance = None
-    _lock = threading.Lock()
-    __magazine = []
+    @property
+    def version(self):
+        return self._snapshot.version
 
-    def __new__(cls, *args, **kwargs):
-        if not cls._instance:
-            with cls._lock:
-                if not cls._instance:
-                    cls._instance = super(MissionTimelinessCacheSingleton, cls).__new__(cls)
-        return cls._instance
 
-    def store_object(self, key, value):
-        obj = {key: value}
-        return self.__magazine.append(obj)
+class ConfigCacheSingleton(VersionedCacheSingleton):
+    _instance = None
+    _snapshot = CacheSnapshot(0)
 
-    def load_object(self, key):
-        for item in self.__magazine:
-            value = item.get(key, None)
-            if value is not None:
-                return value
-        return None
 
-    def load_all(self):
-        return self.__magazine
+class PublicationProductTreeCacheSingleton(VersionedCacheSingleton):
+    _instance = None
+    _snapshot = CacheSnapshot(0)
+
+    def _build_indexes(self, objects):
+        mission_levels = {}
+        mission_product_types = {}
+        mission_type_levels = {}
+        for key, value in objects.items():
+            if not isinstance(value, dict) or not isinstance(value.get('levels'), dict):
+                continue
+            levels = {level: tuple(product_types)
+                      for level, product_types in value['levels'].items()}
+            mission_levels[key] = MappingProxyType(levels)
+            mission_product_types[key] = tuple((level, product_type)
+                                               for level, product_types in levels.items()
+                                               for product_type in product_types)
+            mission_type_levels[key] = MappingProxyType({product_type: level
+                                                         for level, product_type in mission_product_types[key]})
+        return {
+            'levels': mission_levels,
+            'product_types': mission_product_types,
+            'type_levels': mission_type_levels
+        }
+
+    def product_levels(self, mission):
+        """
+        Returns: the mapping product level -> tuple of product types, for the mission
+        """
+        return self._snapshot.indexes.get('levels', {}).get(mission, EMPTY_MAPPING)
+
+    def product_types(self, mission):
+        """
+        Returns: the tuple of (product level, product type) pairs, for the mission
+        """
+        return self._snapshot.indexes.get('product_types', {}).get(mission, ())
+
+    def product_type_level(self, mission, product_type):
+        """
+        Returns: the product level of the product type for the mission, None if not configured
+        """
+        return self._snapshot.indexes.get('type_levels', {}).get(mission, EMPTY_MAPPING).get(product_type)
+
+
+class MissionTimelinessCacheSingleton(VersionedCacheSingleton):
+    _instance = None
+    _snapshot = CacheSnapshot(0)
+
+    def _build_indexes(self, objects):
+        timeliness_types = objects.get('timeliness_types') or []
+        mission_timeliness_types = {}
+        for key, value in objects.items():
+            if key == 'timeliness_types' or not isinstance(value, dict):
+                continue
+            mission_timeliness_types[key] = tuple(typ for typ in timeliness_types if typ in value)
+        return {
+            'mission_timeliness_types': mission_timeliness_types
+        }
+
+    def mission_timeliness_types(self, mission):
+        """
+        Returns: the timeliness types configured for the mission, in the order of 'timeliness_types'
+        """
+        return self._snapshot.indexes.get('mission_timeliness_types', {}).get(mission, ())
 
 
 class PublicationProductTreeCache(metaclass=PublicationProductTreeCacheSingleton):
@@ -12,14 +12,14 @@ behalf of ${ownerShort} to fulfill the purpose for which the document was
 delivered to him.
 """
 
-import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from time import perf_counter
 
-from flask import Response
-
-from apps import flask_cache
+import apps.cache.response_store as response_store
+import apps.cache.revalidating_cache as revalidating_cache
+from apps.cache.cache import ConfigCache
 from apps.utils import date_utils
 from apps.utils.date_utils import PeriodID
 
@@ -28,20 +28,27 @@ logger = logging.getLogger(__name__)
 # TODO Define ENUM for periods
 PREV_QUARTER = 'previous-quarter'
 
+# Maximum number of mission queries executed at the same time;
+# overridden by "max_parallel_queries" in "cache_loader_config" configuration
+DEFAULT_MAX_PARALLEL_QUERIES = 4
+
+
+def get_max_parallel_queries():
+    loader_config = ConfigCache.load_object("cache_loader_config") or {}
+    return max(1, int(loader_config.get("max_parallel_queries", DEFAULT_MAX_PARALLEL_QUERIES)))
+
 
 class RestCacheLoader:
 
     mission_list = ["S1", "S2", "S3", "S5"]
-    # table with the validity of the cache, depending on the
-    #   time period for the cached data
-    #   604800 seconds for data to be updated each hour [1 week]
-    #   604800 seconds for data to be updated each day [1 week]
-    cache_durations = {
-        PeriodID.DAY: 604800,
-        PeriodID.WEEK: 604800,
-        PeriodID.MONTH: 604800,
-        PeriodID.QUARTER: 604800,
-        PREV_QUARTER: 604800
+    # table with the cache policy, depending on the time period for the cached data:
+    #   last periods are reloaded each hour, previous quarter each day
+    cache_policies = {
+        PeriodID.DAY: revalidating_cache.HOURLY_REFRESH_POLICY,
+        PeriodID.WEEK: revalidating_cache.HOURLY_REFRESH_POLICY,
+        PeriodID.MONTH: revalidating_cache.HOURLY_REFRESH_POLICY,
+        PeriodID.QUARTER: revalidating_cache.HOURLY_REFRESH_POLICY,
+        PREV_QUARTER: revalidating_cache.DAILY_REFRESH_POLICY
     }
 
     def __init__(self, stat_id, api_key_format, elastic_function):
@@ -49,6 +56,27 @@ class RestCacheLoader:
         self._api_key_format = api_key_format
         self._mission_elastic_fun = elastic_function
 
+    def _fetch_missions_data(self, start_date, end_date, *extra_args):
+        """
+        Execute the elastic function for each mission, with a bounded number of
+        concurrent executions. The elastic function is called with
+        start date, end date, mission, followed by the extra arguments.
+        Results are returned in the order of mission_list, so that
+        the cached data does not depend on the completion order of the queries.
+
+        Returns: a list of (mission, elastic function result)
+
+        """
+        max_workers = min(get_max_parallel_queries(), len(self.mission_list))
+        logger.debug("Querying %s for missions %s with %d parallel queries",
+                     self._statistics_id, self.mission_list, max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers,
+                                thread_name_prefix=self._statistics_id.replace(' ', '_')) as executor:
+            mission_results = list(executor.map(lambda mission: self._mission_elastic_fun(start_date, end_date,
+                                                                                          mission, *extra_args),
+                                                 self.mission_list))
+        return list(zip(self.mission_list, mission_results))
+
     def load_cache(self, period_id):
         """
         Load Statistics Rest API Cache for last period_id (days/hour/month) data:
@@ -104,9 +132,8 @@ class RestCacheLoader:
         logger.debug("Setting %s Cache for period: %s, from %s, to %s",
                      self._statistics_id,
                      period_id, start_date, end_date)
-        # Validity is taken from configuration!
         # hour based, day based
-        seconds_validity = self.cache_durations.get(period_id, 4000)
+        cache_policy = self.cache_policies.get(period_id, revalidating_cache.HOURLY_REFRESH_POLICY)
         # TODO: Manage errors on requests!
         end_date_str = end_date.strftime('%d-%m-%YT%H:%M:%S')
         start_date_str = start_date.strftime('%d-%m-%YT%H:%M:%S')
@@ -118,20 +145,20 @@ class RestCacheLoader:
         else:
             rest_api_prefix = self._api_key_format.format('last', period_id)
         period_data = self._retrieve_statistics_data(period_id, start_date, end_date)
-        logger.debug("Saving on cache for last %s publication of type: %s, with cache key: %s, timeout: %d",
+        logger.debug("Saving on cache for last %s publication of type: %s, with cache key: %s, "
+                     "timeout: %d, stale after: %d",
                      period_id, self._statistics_id,
                      rest_api_prefix,
-                     seconds_validity)
-        flask_cache.set(rest_api_prefix,
-                        Response(json.dumps(period_data), mimetype="application/json", status=200),
-                        seconds_validity)
+                     cache_policy.hard_ttl, cache_policy.soft_ttl)
+        response_store.store_json_response(rest_api_prefix, period_data,
+                                           cache_policy.hard_ttl, stale_after=cache_policy.soft_ttl)
 
     def _retrieve_statistics_data(self, period_id, start_date, end_date):
         # Load Only cache mission, if specified in arguments
         period_data = []
-        for mission in self.mission_list:
-            logger.debug("Loading Publication Cache for period last %s - mission %s", period_id, mission)
-            period_data.extend(self._mission_elastic_fun(start_date, end_date, mission))
+        logger.debug("Loading Publication Cache for period last %s - missions %s", period_id, self.mission_list)
+        for mission, mission_data in self._fetch_missions_data(start_date, end_date):
+            period_data.extend(mission_data)
         # In case, return more information
         publication_period_data = {
             'period': period_id,
@@ -202,15 +229,15 @@ class RestCache_TrendLoader(RestCacheLoader):
         # TODO: split in two: a lis of period_data for each service id
 
         period_service_data = {}
-        for mission in self.mission_list:
-            logger.debug("Loading Publication Cache for period last %s - mission %s", period_id, mission)
-            logger.debug("Using %d subperiods from %s to %s", num_subperiods, trend_start_date.isoformat(),
-                         trend_end_date.isoformat())
-            #  Retrieve per Service statistics.
-            # Each mission returns a dictionary, specifiying mission statiscs per each service id
-            # add the rtrieved data to the corresponding service id section in period_data
-            mission_service_data = self._mission_elastic_fun(trend_start_date, trend_end_date, mission, num_subperiods)
-            logger.debug("Collecting results from Elastic Function %s", self._mission_elastic_fun.__name__)
+        logger.debug("Loading Publication Cache for period last %s - missions %s", period_id, self.mission_list)
+        logger.debug("Using %d subperiods from %s to %s", num_subperiods, trend_start_date.isoformat(),
+                     trend_end_date.isoformat())
+        #  Retrieve per Service statistics.
+        # Each mission returns a dictionary, specifiying mission statiscs per each service id
+        # add the rtrieved data to the corresponding service id section in period_data
+        missions_service_data = self._fetch_missions_data(trend_start_date, trend_end_date, num_subperiods)
+        logger.debug("Collecting results from Elastic Function %s", self._mission_elastic_fun.__name__)
+        for mission, mission_service_data in missions_service_data:
             for service, mission_data in mission_service_data['service_trend'].items():
                 logger.debug("Saving to cache for mission %s, service %s, data: %s",
                              mission, service, mission_data)
@@ -19,23 +19,59 @@ import logging
 from flask import Response, send_file
 
 import apps.cache.modules.datatakes as datatakes_cache
+import apps.cache.revalidating_cache as revalidating_cache
 from apps import flask_cache
-# 1 day and some more time
-from apps.ingestion.acquisition_plans.acq_plan_fragments import AcqPlanFragments, AcqPlanDayFragment
+from apps.ingestion.acquisition_plans.acq_plan_fragments import AcqPlanDayFragment
 from apps.ingestion.acq_plan_ingestor import AcqPlanIngestor, acq_plans_mission_satellites, \
     kml_acq_plans_missions, orbit_kml_acq_plans_missions, acq_plans_missions, kml_from_orbits
+from apps.ingestion.acquisition_plans.compact_fragments import CompactDayFragment
 from apps.ingestion.acquisition_plans.fragment_completeness import FragmentCompletenessHandler
 from apps.ingestion.kml_processor import AcqPlanKmlBuilder
 from apps.utils.date_utils import get_past_day_str
 
 logger = logging.getLogger(__name__)
 
-acq_plan_cache_duration = 604800
+# Plans are downloaded every day
+acq_plan_cache_policy = revalidating_cache.DAILY_REFRESH_POLICY
 acq_past_num_days = 15
 
 
 def get_acquisition_plan_key(mission):
-    return f"AcqPlans_{mission}"
+    # Key of the index of days on cache, for each mission satellite
+    return f"AcqPlanDays_{mission}"
+
+
+def get_acquisition_plan_day_key(mission, satellite, day_str):
+    return f"AcqPlans_{mission}_{satellite}_{day_str}"
+
+
+class CachedSatelliteFragments:
+    """
+    Acquisition Plan fragments of a satellite, as saved on cache: one CompactDayFragment for each day.
+    Only the fragments of the requested days are retrieved from cache, and converted to KML folders.
+    """
+
+    def __init__(self, mission, satellite, day_list):
+        self._mission = mission
+        self._satellite = satellite
+        self._day_list = day_list
+        self._fragments = {}
+
+    @property
+    def day_list(self):
+        return list(self._day_list)
+
+    def get_fragment(self, day_str):
+        if day_str not in self._fragments:
+            compact_fragment = None
+            if day_str in self._day_list:
+                compact_fragment = flask_cache.get(get_acquisition_plan_day_key(self._mission,
+                                                                                self._satellite,
+                                                                                day_str))
+            if compact_fragment is None:
+                raise Exception(f"No data for day {day_str}")
+            self._fragments[day_str] = compact_fragment.to_day_fragment()
+        return self._fragments[day_str]
 
 
 def get_acquisition_plan(mission, satellite, day_str):
@@ -130,13 +166,32 @@ def get_datatake_acquisitions_coverage(datatake_plans_coverage):
     logger.info("[END] Retrieve Acquisition Datatakes Coverage ")
 
 
-def save_acquisition_plans_to_cache(mission, kml_fragments: AcqPlanFragments):
-    acq_plan_key = get_acquisition_plan_key(mission)
-    # Acquisition Plans are saved on cache, indexing by Mission.
-    # Retrieving Cache, extract satellite data (in _get_fragments)
-    flask_cache.set(acq_plan_key, kml_fragments, acq_plan_cache_duration)
+def save_acquisition_plans_to_cache(mission, kml_fragments):
+    """
+    Save on cache the Acquisition Plans of a mission: the fragments of each satellite/day are
+    saved with a dedicated key, in compact form; the index of days of each satellite is saved
+    with the mission key, and is saved last, so that all the indexed days are found on cache.
+    Args:
+        mission (str): the mission
+        kml_fragments (dict): a table satellite -> fragments (AcqPlanFragments or CachedSatelliteFragments)
 
+    Returns: N/A
 
+    """
+    acq_plan_key = get_acquisition_plan_key(mission)
+    mission_days = {}
+    compact_fragments = {}
+    for satellite, satellite_fragments in kml_fragments.items():
+        day_list = satellite_fragments.day_list
+        for day_str in day_list:
+            day_key = get_acquisition_plan_day_key(mission, satellite, day_str)
+            compact_fragments[day_key] = CompactDayFragment.from_day_fragment(satellite_fragments.get_fragment(day_str))
+        mission_days[satellite] = day_list
+    flask_cache.set_many(compact_fragments, timeout=acq_plan_cache_policy.hard_ttl)
+    revalidating_cache.set_value(acq_plan_key, mission_days, acq_plan_cache_policy)
+
+
+@revalidating_cache.single_flight('acquisition-plans')
 def load_all_acquisition_plans():
     """
     Load on cache KML fragments received on AcqPlan Table
@@ -219,9 +274,10 @@ def _get_fragments(mission, satellite):
 def _get_mission_fragments(mission):
     acq_plan_key = get_acquisition_plan_key(mission)
     logger.debug("Retrieving KML fragments with key %s", acq_plan_key)
-    if not flask_cache.has(acq_plan_key):
-        logger.debug("Fragments not found, start acquisition of plans")
-        load_all_acquisition_plans()
-        logger.debug("After All Plans acquisition, Retrieving KML fragment with key %s", acq_plan_key)
-    mission_fragments = flask_cache.get(acq_plan_key)
-    return mission_fragments
+    # If fragments are not found, the acquisition of plans is started (or the one in progress is awaited)
+    mission_days = revalidating_cache.get_value(acq_plan_key, load_all_acquisition_plans,
+                                                acq_plan_cache_policy)
+    if mission_days is None:
+        return None
+    return {satellite: CachedSatelliteFragments(mission, satellite, day_list)
+            for satellite, day_list in mission_days.items()}
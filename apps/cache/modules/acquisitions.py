@@ -14,13 +14,13 @@ delivered to him.
 
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from time import perf_counter
 
-from flask import Response
-
+import apps.cache.response_store as response_store
+import apps.cache.revalidating_cache as revalidating_cache
 import apps.elastic.modules.acquisitions as elastic_acquisitions
-from apps import flask_cache
+from apps.cache.period_windows import PeriodWindows, elastic_time_field, last_period_thresholds
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +28,9 @@ acquisitions_cache_key = '/api/reporting/cds-acquisitions/{}-{}'
 
 edrs_acquisitions_cache_key = '/api/reporting/cds-edrs-acquisitions/{}-{}'
 
-acquisitions_cache_duration = 604800
+acquisitions_cache_policy = revalidating_cache.HOURLY_REFRESH_POLICY
+
+acquisitions_prev_quarter_cache_policy = revalidating_cache.DAILY_REFRESH_POLICY
 
 
 def load_acquisitions_cache_last_quarter():
@@ -45,23 +47,11 @@ def load_acquisitions_cache_last_quarter():
     # Retrieve acquisitions in the last quarter
     acq_last_quarter = elastic_acquisitions.fetch_acquisitions_last_quarter()
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
-    now = datetime.now()
-    acq_last_24h = []
-    acq_last_7d = []
-    acq_last_30d = []
-    for dt in acq_last_quarter:
-        acq_stop = datetime.strptime(dt['_source']['planned_data_start'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        if now - timedelta(hours=24) <= acq_stop:
-            acq_last_24h.append(dt)
-        if now - timedelta(days=7) <= acq_stop:
-            acq_last_7d.append(dt)
-        if now - timedelta(days=30) <= acq_stop:
-            acq_last_30d.append(dt)
-    _set_acquisitions_cache('24h', acq_last_24h)
-    _set_acquisitions_cache('7d', acq_last_7d)
-    _set_acquisitions_cache('30d', acq_last_30d)
-    _set_acquisitions_cache('quarter', acq_last_quarter)
+    # Populate cache: results for sub-periods are suffixes of results in the last quarter, sorted by time
+    windows = PeriodWindows(acq_last_quarter, elastic_time_field('planned_data_start'))
+    for period_id, period_start in last_period_thresholds(datetime.now()).items():
+        _set_acquisitions_cache(period_id, windows.json_since(period_start))
+    _set_acquisitions_cache('quarter', windows.json_since())
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -81,28 +71,30 @@ def load_acquisitions_cache_previous_quarter():
 
     # Retrieve acquisitions in the last quarter
     acq_prev_quarter = elastic_acquisitions.fetch_acquisitions_prev_quarter()
-    _set_acquisitions_cache('previous-quarter', acq_prev_quarter)
+    _set_acquisitions_cache('previous-quarter', json.dumps(acq_prev_quarter).encode('utf-8'))
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
     logger.info(f"[END] Loading Acquisitions Cache in the previous quarter - Execution Time : {cache_end_time - cache_start_time:0.6f}")
 
 
-def _set_acquisitions_cache(period_id, period_data):
+def _set_acquisitions_cache(period_id, period_body):
     """
-        Store in cache the provided results, and set the validity time of cache according to the data period.
+        Store in cache the provided results, already serialized as JSON bytes, and set the validity time of cache
+        according to the data period.
         """
 
     # Log an acknowledgement message
     logger.debug("Caching acquisitions in period: %s", period_id)
 
-    seconds_validity = acquisitions_cache_duration
+    cache_policy = acquisitions_cache_policy
     if period_id == 'previous-quarter':
+        cache_policy = acquisitions_prev_quarter_cache_policy
         api_prefix = acquisitions_cache_key.format('previous', 'quarter')
     else:
         api_prefix = acquisitions_cache_key.format('last', period_id)
-    flask_cache.set(api_prefix, Response(json.dumps(period_data), mimetype="application/json", status=200),
-                    seconds_validity)
+    response_store.store_json_body(api_prefix, period_body,
+                                   cache_policy.hard_ttl, cache_policy.soft_ttl)
 
 
 def load_edrs_acquisitions_cache_last_quarter():
@@ -119,23 +111,11 @@ def load_edrs_acquisitions_cache_last_quarter():
     # Retrieve EDRS acquisitions in the last quarter
     edrs_acq_last_quarter = elastic_acquisitions.fetch_edrs_acquisitions_last_quarter()
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
-    now = datetime.now()
-    edrs_acq_last_24h = []
-    edrs_acq_last_7d = []
-    edrs_acq_last_30d = []
-    for dt in edrs_acq_last_quarter:
-        edrs_acq_stop = datetime.strptime(dt['_source']['planned_link_session_start'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        if now - timedelta(hours=24) <= edrs_acq_stop:
-            edrs_acq_last_24h.append(dt)
-        if now - timedelta(days=7) <= edrs_acq_stop:
-            edrs_acq_last_7d.append(dt)
-        if now - timedelta(days=30) <= edrs_acq_stop:
-            edrs_acq_last_30d.append(dt)
-    _set_edrs_acquisitions_cache('24h', edrs_acq_last_24h)
-    _set_edrs_acquisitions_cache('7d', edrs_acq_last_7d)
-    _set_edrs_acquisitions_cache('30d', edrs_acq_last_30d)
-    _set_edrs_acquisitions_cache('quarter', edrs_acq_last_quarter)
+    # Populate cache: results for sub-periods are suffixes of results in the last quarter, sorted by time
+    windows = PeriodWindows(edrs_acq_last_quarter, elastic_time_field('planned_link_session_start'))
+    for period_id, period_start in last_period_thresholds(datetime.now()).items():
+        _set_edrs_acquisitions_cache(period_id, windows.json_since(period_start))
+    _set_edrs_acquisitions_cache('quarter', windows.json_since())
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -155,26 +135,28 @@ def load_edrs_acquisitions_cache_previous_quarter():
 
     # Retrieve EDRS acquisitions in the last quarter
     edrs_acq_prev_quarter = elastic_acquisitions.fetch_edrs_acquisitions_prev_quarter()
-    _set_edrs_acquisitions_cache('previous-quarter', edrs_acq_prev_quarter)
+    _set_edrs_acquisitions_cache('previous-quarter', json.dumps(edrs_acq_prev_quarter).encode('utf-8'))
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
     logger.info(f"[END] Loading EDRS Acquisitions Cache in the previous quarter - Execution Time : {cache_end_time - cache_start_time:0.6f}")
 
 
-def _set_edrs_acquisitions_cache(period_id, period_data):
+def _set_edrs_acquisitions_cache(period_id, period_body):
     """
-        Store in cache the provided results, and set the validity time of cache according to the data period.
+        Store in cache the provided results, already serialized as JSON bytes, and set the validity time of cache
+        according to the data period.
         """
 
     # Log an acknowledgement message
     logger.debug("Caching EDRS acquisitions in period: %s", period_id)
 
-    seconds_validity = acquisitions_cache_duration
+    cache_policy = acquisitions_cache_policy
     if period_id == 'previous-quarter':
+        cache_policy = acquisitions_prev_quarter_cache_policy
         api_prefix = edrs_acquisitions_cache_key.format('previous', 'quarter')
     else:
         api_prefix = edrs_acquisitions_cache_key.format('last', period_id)
-    flask_cache.set(api_prefix, Response(json.dumps(period_data), mimetype="application/json", status=200),
-                    seconds_validity)
+    response_store.store_json_body(api_prefix, period_body,
+                                   cache_policy.hard_ttl, cache_policy.soft_ttl)
 
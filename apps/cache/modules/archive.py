@@ -13,6 +13,7 @@ delivered to him.
 """
 import logging
 
+import apps.cache.response_store as response_store
 import apps.elastic.modules.archive_statistics as elastic_archive
 from apps import flask_cache
 from apps.cache.loader.cache_loader import RestCacheLoader
@@ -53,4 +54,4 @@ def get_archive_cached_data(period_type, period_id):
             archive_load_cache(period_id)
         else:
             load_archive_cache_previous_quarter()
-    return flask_cache.get(archive_api_uri)
+    return response_store.get_cached_response(archive_api_uri)
@@ -14,13 +14,14 @@ delivered to him.
 
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from time import perf_counter
 
-from flask import Response
-
+import apps.cache.response_store as response_store
+import apps.cache.revalidating_cache as revalidating_cache
 import apps.elastic.modules.datatakes as elastic_datatakes
-from apps import flask_cache
+from apps.cache.period_windows import PeriodWindows, elastic_time_field, last_period_thresholds
+from apps.utils.date_utils import PeriodID
 
 logger = logging.getLogger(__name__)
 
@@ -28,14 +29,18 @@ datatakes_cache_key = '/api/worker/cds-datatakes/{}-{}'
 
 datatakes_by_day_cache_key = '/datatake/day'
 
-datatakes_cache_duration = 604800
+datatakes_cache_policy = revalidating_cache.HOURLY_REFRESH_POLICY
+
+datatakes_prev_quarter_cache_policy = revalidating_cache.DAILY_REFRESH_POLICY
 
 
-def load_datatakes_cache_last_quarter():
+@revalidating_cache.single_flight('datatakes-last-quarter')
+def load_datatakes_cache_last_quarter(full_refresh=False):
     """
     Fetch the datatakes in the last 3 months from Elastic DB using the exposed REST APIs, and store results
     in cache for future reuse. The start time is set at 00:00 of the first day of the temporal interval; the
     stop time is set at 23:59.
+    Only the datatakes updated since the previous load are retrieved, unless full_refresh is set.
     """
 
     # Log an acknowledgement message
@@ -43,32 +48,22 @@ def load_datatakes_cache_last_quarter():
     cache_start_time = perf_counter()
 
     # Retrieve datatakes in the last quarter
-    dt_last_quarter = elastic_datatakes.fetch_anomalies_datatakes_last_quarter()
+    dt_last_quarter = elastic_datatakes.fetch_anomalies_datatakes_last_quarter(full_refresh)
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
-    now = datetime.now()
-    dt_last_24h = []
-    dt_last_7d = []
-    dt_last_30d = []
-    for dt in dt_last_quarter:
-        sensing_stop = datetime.strptime(dt['_source']['observation_time_stop'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        if now - timedelta(hours=24) <= sensing_stop:
-            dt_last_24h.append(dt)
-        if now - timedelta(days=7) <= sensing_stop:
-            dt_last_7d.append(dt)
-        if now - timedelta(days=30) <= sensing_stop:
-            dt_last_30d.append(dt)
-    _set_datatakes_cache('24h', dt_last_24h)
-    _set_datatakes_cache('7d', dt_last_7d)
-    _set_datatakes_cache('30d', dt_last_30d)
-    _set_datatakes_cache('quarter', dt_last_quarter)
+    # Populate cache: results for sub-periods are suffixes of results in the last quarter, sorted by time
+    period_starts = last_period_thresholds(datetime.now())
+    dt_windows = PeriodWindows(dt_last_quarter, elastic_time_field('observation_time_stop'))
+    for period_id, period_start in period_starts.items():
+        _set_datatakes_cache(period_id, dt_windows.json_since(period_start))
+    _set_datatakes_cache('quarter', dt_windows.json_since())
+    dt_last_30d = dt_windows.records_since(period_starts[PeriodID.MONTH])
 
     # Note: future datatakes are missing
     logger.info("Building the day-based index of Datatakes in the last 30 days")
     dt_day_table = _build_datatakes_daily_index(dt_last_30d)
     # Cache results
     logger.info("Saving on cache the day-based index of Datatakes")
-    flask_cache.set(datatakes_by_day_cache_key, dt_day_table, datatakes_cache_duration)
+    revalidating_cache.set_value(datatakes_by_day_cache_key, dt_day_table, datatakes_cache_policy)
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -76,6 +71,14 @@ def load_datatakes_cache_last_quarter():
         f"[END] Loading Datatakes Cache in the last quarter - Execution Time : {cache_end_time - cache_start_time:0.6f}")
 
 
+def reconcile_datatakes_cache_last_quarter():
+    """
+    Rebuild the datatakes of the last 3 months from scratch, so that documents removed from
+    Elastic DB, or missed by the incremental loads, are reconciled
+    """
+    load_datatakes_cache_last_quarter(full_refresh=True)
+
+
 def load_datatakes_cache_previous_quarter():
     """
         Fetch the datatakes in the last 3 months from Elastic DB using the exposed REST APIs, and store results
@@ -91,7 +94,7 @@ def load_datatakes_cache_previous_quarter():
     dt_prev_quarter = elastic_datatakes.fetch_anomalies_datatakes_prev_quarter()
 
     # Populate cache: results for sub-periods can be deduced from results in the last quarter
-    _set_datatakes_cache('previous-quarter', dt_prev_quarter)
+    _set_datatakes_cache('previous-quarter', json.dumps(dt_prev_quarter).encode('utf-8'))
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -103,21 +106,23 @@ def load_datatake_details(datatake_id):
     return elastic_datatakes.fetch_datatake_details(datatake_id)
 
 
-def _set_datatakes_cache(period_id, period_data):
+def _set_datatakes_cache(period_id, period_body):
     """
-        Store in cache the provided results, and set the validity time of cache according to the data period.
+        Store in cache the provided results, already serialized as JSON bytes, and set the validity time of cache
+        according to the data period.
         """
 
     # Log an acknowledgement message
     logger.debug("Caching datatakes in period: %s", period_id)
 
-    seconds_validity = datatakes_cache_duration
+    cache_policy = datatakes_cache_policy
     if period_id == 'previous-quarter':
+        cache_policy = datatakes_prev_quarter_cache_policy
         api_prefix = datatakes_cache_key.format('previous', 'quarter')
     else:
         api_prefix = datatakes_cache_key.format('last', period_id)
-    flask_cache.set(api_prefix, Response(json.dumps(period_data), mimetype="application/json", status=200),
-                    seconds_validity)
+    response_store.store_json_body(api_prefix, period_body,
+                                   cache_policy.hard_ttl, cache_policy.soft_ttl)
 
 
 def _build_datatakes_daily_index(dt_list, by_end_date=False):
@@ -158,11 +163,11 @@ def _build_datatakes_daily_index(dt_list, by_end_date=False):
 
 
 def get_daily_datatakes():
-    datatakes_api_uri = datatakes_cache_key.format('last', "quarter")
-    if not flask_cache.has(datatakes_api_uri):
-        logger.debug("Datatakes Cache (needed by acquisition plan) not yet loaded")
-        load_datatakes_cache_last_quarter()
-    daily_datatakes = flask_cache.get(datatakes_by_day_cache_key)
+    # If Datatakes Cache (needed by acquisition plan) is not yet loaded, the request waits for the load
+    # in progress; stale datatakes are returned while they are refreshed in background
+    daily_datatakes = revalidating_cache.get_value(datatakes_by_day_cache_key,
+                                                   load_datatakes_cache_last_quarter,
+                                                   datatakes_cache_policy)
     return daily_datatakes
 
 
@@ -12,18 +12,18 @@ behalf of  to fulfill the purpose for which the document was
 delivered to him.
 """
 
-import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from time import perf_counter
 
 from dateutil.relativedelta import relativedelta
-from flask import Response
 
+import apps.cache.response_store as response_store
+import apps.cache.revalidating_cache as revalidating_cache
 import apps.ingestion.news_ingestor as news_ingestor
 import apps.models.anomalies as anomalies_model
 import apps.models.news as news_model
-from apps import flask_cache
+from apps.cache.period_windows import PeriodWindows, last_period_thresholds
 from apps.utils import db_utils, date_utils
 
 logger = logging.getLogger(__name__)
@@ -32,7 +32,16 @@ anomalies_cache_key = '/api/events/cds-anomalies/{}-{}'
 
 news_cache_key = '/api/events/cds-news/{}-{}'
 
-events_cache_duration = 604800
+# All the periods, including the previous quarter, are refreshed every hour
+events_cache_policy = revalidating_cache.HOURLY_REFRESH_POLICY
+
+
+def _anomaly_start_time(anomaly):
+    return anomaly.start
+
+
+def _news_occurrence_time(news):
+    return news.occurrenceDate
 
 
 def load_anomalies_cache_last_quarter():
@@ -51,25 +60,11 @@ def load_anomalies_cache_last_quarter():
     end_date = end_date.replace(hour=23, minute=59, second=59)
     anomalies_last_quarter = anomalies_model.get_anomalies(start_date, end_date)
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
-    now = datetime.now()
-    anomalies_last_24h = []
-    anomalies_last_7d = []
-    anomalies_last_30d = []
-    for anomaly in anomalies_last_quarter:
-
-        # Populate cache
-        if now - timedelta(hours=24) <= anomaly.start:
-            anomalies_last_24h.append(anomaly)
-        if now - timedelta(days=7) <= anomaly.start:
-            anomalies_last_7d.append(anomaly)
-        if now - timedelta(days=30) <= anomaly.start:
-            anomalies_last_30d.append(anomaly)
-
-    _set_anomalies_cache('24h', anomalies_last_24h)
-    _set_anomalies_cache('7d', anomalies_last_7d)
-    _set_anomalies_cache('30d', anomalies_last_30d)
-    _set_anomalies_cache('quarter', anomalies_last_quarter)
+    # Populate cache: results for sub-periods are suffixes of results in the last quarter, sorted by time
+    windows = PeriodWindows(anomalies_last_quarter, _anomaly_start_time, cls=db_utils.AlchemyEncoder)
+    for period_id, period_start in last_period_thresholds(datetime.now()).items():
+        _set_anomalies_cache(period_id, windows.json_since(period_start))
+    _set_anomalies_cache('quarter', windows.json_since())
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -96,28 +91,13 @@ def load_anomalies_cache_previous_quarter():
     # Retrieve anomalies up to the previous completed quarter from CAMS
     anomalies_prev_quarter = anomalies_model.get_anomalies(start_date, end_date)
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
+    # Populate cache: results for sub-periods are suffixes of results since the previous quarter, sorted by time
     now = datetime.now()
-    anomalies_last_24h = []
-    anomalies_last_7d = []
-    anomalies_last_30d = []
-    anomalies_last_quarter = []
-    for anomaly in anomalies_prev_quarter:
-
-        # Populate cache
-        if now - timedelta(hours=24) <= anomaly.start:
-            anomalies_last_24h.append(anomaly)
-        if now - timedelta(days=7) <= anomaly.start:
-            anomalies_last_7d.append(anomaly)
-        if now - timedelta(days=30) <= anomaly.start:
-            anomalies_last_30d.append(anomaly)
-        if now - relativedelta(months=3) <= anomaly.start:
-            anomalies_last_quarter.append(anomaly)
-    _set_anomalies_cache('24h', anomalies_last_24h)
-    _set_anomalies_cache('7d', anomalies_last_7d)
-    _set_anomalies_cache('30d', anomalies_last_30d)
-    _set_anomalies_cache('quarter', anomalies_last_quarter)
-    _set_anomalies_cache('previous-quarter', anomalies_prev_quarter)
+    windows = PeriodWindows(anomalies_prev_quarter, _anomaly_start_time, cls=db_utils.AlchemyEncoder)
+    for period_id, period_start in last_period_thresholds(now).items():
+        _set_anomalies_cache(period_id, windows.json_since(period_start))
+    _set_anomalies_cache('quarter', windows.json_since(now - relativedelta(months=3)))
+    _set_anomalies_cache('previous-quarter', windows.json_since())
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -125,24 +105,23 @@ def load_anomalies_cache_previous_quarter():
         f"[END] Loading Anomalies Cache in the previous quarter - Execution Time : {cache_end_time - cache_start_time:0.6f}")
 
 
-def _set_anomalies_cache(period_id, period_data):
+def _set_anomalies_cache(period_id, period_body):
     """
-        Store in cache the provided results, and set the validity time of cache according to the data period.
+        Store in cache the provided results, already serialized as JSON bytes, and set the validity time of cache
+        according to the data period.
         """
 
     # Log an acknowledgement message
     logger.debug("Caching anomalies in period: %s", period_id)
 
-    seconds_validity = events_cache_duration
+    cache_policy = events_cache_policy
     if period_id == 'previous-quarter':
         api_prefix = anomalies_cache_key.format('previous', 'quarter')
     else:
         api_prefix = anomalies_cache_key.format('last', period_id)
 
-    flask_cache.set(api_prefix,
-                    Response(json.dumps(period_data, cls=db_utils.AlchemyEncoder), mimetype="application/json",
-                             status=200),
-                    seconds_validity)
+    response_store.store_json_body(api_prefix, period_body,
+                                   cache_policy.hard_ttl, cache_policy.soft_ttl)
 
 
 def load_news_cache_last_quarter():
@@ -162,25 +141,11 @@ def load_news_cache_last_quarter():
     end_date = end_date.replace(hour=23, minute=59, second=59)
     news_last_quarter = news_model.get_news(start_date, end_date)
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
-    now = datetime.now()
-    news_last_24h = []
-    news_last_7d = []
-    news_last_30d = []
-    for news in news_last_quarter:
-
-        # Populate cache
-        if now - timedelta(hours=24) <= news.occurrenceDate:
-            news_last_24h.append(news)
-        if now - timedelta(days=7) <= news.occurrenceDate:
-            news_last_7d.append(news)
-        if now - timedelta(days=30) <= news.occurrenceDate:
-            news_last_30d.append(news)
-
-    _set_news_cache('24h', news_last_24h)
-    _set_news_cache('7d', news_last_7d)
-    _set_news_cache('30d', news_last_30d)
-    _set_news_cache('quarter', news_last_quarter)
+    # Populate cache: results for sub-periods are suffixes of results in the last quarter, sorted by time
+    windows = PeriodWindows(news_last_quarter, _news_occurrence_time, cls=db_utils.AlchemyEncoder)
+    for period_id, period_start in last_period_thresholds(datetime.now()).items():
+        _set_news_cache(period_id, windows.json_since(period_start))
+    _set_news_cache('quarter', windows.json_since())
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -207,28 +172,13 @@ def load_news_cache_previous_quarter():
     # Retrieve anomalies up to the previous completed quarter from CAMS
     news_prev_quarter = news_model.get_news(start_date, end_date)
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
+    # Populate cache: results for sub-periods are suffixes of results since the previous quarter, sorted by time
     now = datetime.now()
-    news_last_24h = []
-    news_last_7d = []
-    news_last_30d = []
-    news_last_quarter = []
-    for news in news_prev_quarter:
-
-        # Populate cache
-        if now - timedelta(hours=24) <= news.occurrenceDate:
-            news_last_24h.append(news)
-        if now - timedelta(days=7) <= news.occurrenceDate:
-            news_last_7d.append(news)
-        if now - timedelta(days=30) <= news.occurrenceDate:
-            news_last_30d.append(news)
-        if now - relativedelta(months=3) <= news.occurrenceDate:
-            news_last_quarter.append(news)
-    _set_news_cache('24h', news_last_24h)
-    _set_news_cache('7d', news_last_7d)
-    _set_news_cache('30d', news_last_30d)
-    _set_news_cache('quarter', news_last_quarter)
-    _set_news_cache('previous-quarter', news_prev_quarter)
+    windows = PeriodWindows(news_prev_quarter, _news_occurrence_time, cls=db_utils.AlchemyEncoder)
+    for period_id, period_start in last_period_thresholds(now).items():
+        _set_news_cache(period_id, windows.json_since(period_start))
+    _set_news_cache('quarter', windows.json_since(now - relativedelta(months=3)))
+    _set_news_cache('previous-quarter', windows.json_since())
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -236,19 +186,19 @@ def load_news_cache_previous_quarter():
         f"[END] Loading News Cache in the previous quarter - Execution Time : {cache_end_time - cache_start_time:0.6f}")
 
 
-def _set_news_cache(period_id, period_data):
+def _set_news_cache(period_id, period_body):
     """
-        Store in cache the provided results, and set the validity time of cache according to the data period.
+        Store in cache the provided results, already serialized as JSON bytes, and set the validity time of cache
+        according to the data period.
         """
 
     # Log an acknowledgement message
     logger.debug("Caching news in period: %s", period_id)
 
-    seconds_validity = events_cache_duration
+    cache_policy = events_cache_policy
     if period_id == 'previous-quarter':
         api_prefix = news_cache_key.format('previous', 'quarter')
     else:
         api_prefix = news_cache_key.format('last', period_id)
-    flask_cache.set(api_prefix, Response(json.dumps(period_data, cls=db_utils.AlchemyEncoder), mimetype="application/json",
-                             status=200),
-                    seconds_validity)
+    response_store.store_json_body(api_prefix, period_body,
+                                   cache_policy.hard_ttl, cache_policy.soft_ttl)
@@ -13,19 +13,21 @@ delivered to him.
 """
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from time import perf_counter
 
-from flask import Response
-from apps import flask_cache
-
+import apps.cache.response_store as response_store
+import apps.cache.revalidating_cache as revalidating_cache
 import apps.elastic.modules.interface_monitoring as elastic_interface_monitoring
+from apps.cache.period_windows import PeriodWindows, elastic_time_field, last_period_thresholds
 
 logger = logging.getLogger(__name__)
 
 interface_monitoring_cache_key = '/api/reporting/cds-interface-status-monitoring/{}-{}/{}'
 
-interface_monitoring_cache_duration = 604800
+interface_monitoring_cache_policy = revalidating_cache.HOURLY_REFRESH_POLICY
+
+interface_monitoring_prev_quarter_cache_policy = revalidating_cache.DAILY_REFRESH_POLICY
 
 
 def load_interface_monitoring_cache_last_quarter(service_name):
@@ -41,23 +43,11 @@ def load_interface_monitoring_cache_last_quarter(service_name):
     # Retrieve failed status monitoring interfaces in the last quarter
     status_list_last_quarter = elastic_interface_monitoring.fetch_interface_monitoring_last_quarter(service_name)
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
-    now = datetime.now()
-    status_interface_last_24h = []
-    status_interface_last_7d = []
-    status_interface_last_30d = []
-    for dt in status_list_last_quarter:
-        status_start = datetime.strptime(dt['_source']['status_time_start'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        if now - timedelta(hours=24) <= status_start:
-            status_interface_last_24h.append(dt)
-        if now - timedelta(days=7) <= status_start:
-            status_interface_last_7d.append(dt)
-        if now - timedelta(days=30) <= status_start:
-            status_interface_last_30d.append(dt)
-    _set_interface_monitoring_cache('24h', service_name, status_interface_last_24h)
-    _set_interface_monitoring_cache('7d', service_name, status_interface_last_7d)
-    _set_interface_monitoring_cache('30d', service_name, status_interface_last_30d)
-    _set_interface_monitoring_cache('quarter', service_name, status_list_last_quarter)
+    # Populate cache: results for sub-periods are suffixes of results in the last quarter, sorted by time
+    windows = PeriodWindows(status_list_last_quarter, elastic_time_field('status_time_start'))
+    for period_id, period_start in last_period_thresholds(datetime.now()).items():
+        _set_interface_monitoring_cache(period_id, service_name, windows.json_since(period_start))
+    _set_interface_monitoring_cache('quarter', service_name, windows.json_since())
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -77,7 +67,8 @@ def load_interface_monitoring_cache_prev_quarter(service_name):
 
     # Retrieve failed status monitoring interfaces in the last quarter
     status_list_prev_quarter = elastic_interface_monitoring.fetch_interface_monitoring_prev_quarter(service_name)
-    _set_interface_monitoring_cache('previous-quarter', service_name, status_list_prev_quarter)
+    _set_interface_monitoring_cache('previous-quarter', service_name,
+                                    json.dumps(status_list_prev_quarter).encode('utf-8'))
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -85,18 +76,20 @@ def load_interface_monitoring_cache_prev_quarter(service_name):
         f"[END] Loading Interface Monitoring Status in the previous quarter - Execution Time : {cache_end_time - cache_start_time:0.6f}")
 
 
-def _set_interface_monitoring_cache(period_id, service_name, period_data):
+def _set_interface_monitoring_cache(period_id, service_name, period_body):
     """
-        Store in cache the provided results, and set the validity time of cache according to the data period.
+        Store in cache the provided results, already serialized as JSON bytes, and set the validity time of cache
+        according to the data period.
         """
 
     # Log an acknowledgement message
     logger.debug("Caching acquisitions in period: %s", period_id)
 
-    seconds_validity = interface_monitoring_cache_duration
+    cache_policy = interface_monitoring_cache_policy
     if period_id == 'previous-quarter':
+        cache_policy = interface_monitoring_prev_quarter_cache_policy
         api_prefix = interface_monitoring_cache_key.format('previous', 'quarter', service_name)
     else:
         api_prefix = interface_monitoring_cache_key.format('last', period_id, service_name)
-    flask_cache.set(api_prefix, Response(json.dumps(period_data), mimetype="application/json", status=200),
-                    seconds_validity)
+    response_store.store_json_body(api_prefix, period_body,
+                                   cache_policy.hard_ttl, cache_policy.soft_ttl)
@@ -14,19 +14,21 @@ delivered to him.
 
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from time import perf_counter
 
-from flask import Response
-
+import apps.cache.response_store as response_store
+import apps.cache.revalidating_cache as revalidating_cache
 import apps.elastic.modules.unavailability as elastic_unavailability
-from apps import flask_cache
+from apps.cache.period_windows import PeriodWindows, elastic_time_field, last_period_thresholds
 
 logger = logging.getLogger(__name__)
 
 unavailability_cache_key = '/api/reporting/cds-sat-unavailability/{}-{}'
 
-unavailability_cache_duration = 604800
+unavailability_cache_policy = revalidating_cache.HOURLY_REFRESH_POLICY
+
+unavailability_prev_quarter_cache_policy = revalidating_cache.DAILY_REFRESH_POLICY
 
 
 def load_unavailability_cache_last_quarter():
@@ -43,23 +45,11 @@ def load_unavailability_cache_last_quarter():
     # Retrieve unavailabilities in the last quarter
     sat_unav_last_quarter = elastic_unavailability.fetch_unavailability_last_quarter()
 
-    # Populate cache: results for sub-periods can be deduced from results in the last quarter
-    now = datetime.now()
-    sat_unav_last_24h = []
-    sat_unav_last_7d = []
-    sat_unav_last_30d = []
-    for dt in sat_unav_last_quarter:
-        unav_stop = datetime.strptime(dt['_source']['start_time'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        if now - timedelta(hours=24) <= unav_stop:
-            sat_unav_last_24h.append(dt)
-        if now - timedelta(days=7) <= unav_stop:
-            sat_unav_last_7d.append(dt)
-        if now - timedelta(days=30) <= unav_stop:
-            sat_unav_last_30d.append(dt)
-    _set_unavailability_cache('24h', sat_unav_last_24h)
-    _set_unavailability_cache('7d', sat_unav_last_7d)
-    _set_unavailability_cache('30d', sat_unav_last_30d)
-    _set_unavailability_cache('quarter', sat_unav_last_quarter)
+    # Populate cache: results for sub-periods are suffixes of results in the last quarter, sorted by time
+    windows = PeriodWindows(sat_unav_last_quarter, elastic_time_field('start_time'))
+    for period_id, period_start in last_period_thresholds(datetime.now()).items():
+        _set_unavailability_cache(period_id, windows.json_since(period_start))
+    _set_unavailability_cache('quarter', windows.json_since())
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
@@ -79,25 +69,27 @@ def load_unavailability_cache_previous_quarter():
 
     # Retrieve acquisitions in the last quarter
     acq_prev_quarter = elastic_unavailability.fetch_unavailability_prev_quarter()
-    _set_unavailability_cache('previous-quarter', acq_prev_quarter)
+    _set_unavailability_cache('previous-quarter', json.dumps(acq_prev_quarter).encode('utf-8'))
 
     # Log an acknowledgement message
     cache_end_time = perf_counter()
     logger.info(f"[END] Loading Sat Unavailability Cache in the previous quarter - Execution Time : {cache_end_time - cache_start_time:0.6f}")
 
 
-def _set_unavailability_cache(period_id, period_data):
+def _set_unavailability_cache(period_id, period_body):
     """
-        Store in cache the provided results, and set the validity time of cache according to the data period.
+        Store in cache the provided results, already serialized as JSON bytes, and set the validity time of cache
+        according to the data period.
         """
 
     # Log an acknowledgement message
     logger.debug("Caching acquisitions in period: %s", period_id)
 
-    seconds_validity = unavailability_cache_duration
+    cache_policy = unavailability_cache_policy
     if period_id == 'previous-quarter':
+        cache_policy = unavailability_prev_quarter_cache_policy
         api_prefix = unavailability_cache_key.format('previous', 'quarter')
     else:
         api_prefix = unavailability_cache_key.format('last', period_id)
-    flask_cache.set(api_prefix, Response(json.dumps(period_data), mimetype="application/json", status=200),
-                    seconds_validity)
+    response_store.store_json_body(api_prefix, period_body,
+                                   cache_policy.hard_ttl, cache_policy.soft_ttl)
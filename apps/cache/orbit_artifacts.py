@@ -0,0 +1,277 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) - ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sgp4.api import SatrecArray
+
+from apps.ingestion.acquisition_plans.tle_repository import TleRecord, get_tle_repository, satellite_propagators
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two orbit samples
+DEFAULT_ORBIT_STEP = 300
+
+DEFAULT_PAST_WINDOW = timedelta(days=20)
+
+DEFAULT_FUTURE_WINDOW = timedelta(days=20)
+
+# Samples after the window end, needed by the path interpolation
+EXTRA_SAMPLES = 4
+
+CLOCK_MULTIPLIER = 60
+
+UNIX_EPOCH_JD = 2440587.5
+
+SECONDS_PER_DAY = 86400
+
+
+@dataclass
+class SatelliteAsset:
+    """
+    Appearance of a satellite on the globe
+    """
+    color: List[int]
+    marker: str
+
+
+@dataclass
+class SatelliteOrbitSamples:
+    """
+    Positions of a satellite, in the inertial (TEME) frame:
+    times are UNIX seconds, positions are in meters
+    """
+    sat_id: str
+    tle: TleRecord
+    times: np.ndarray
+    positions: np.ndarray
+
+
+def _utc_isoformat(unix_time):
+    return datetime.fromtimestamp(unix_time, timezone.utc).isoformat()
+
+
+def propagate_positions(tle_records: List[TleRecord], times: np.ndarray) -> np.ndarray:
+    """
+    Propagate the orbits of a set of satellites on the same times,
+    with a single SGP4 call
+    Args:
+        tle_records (): the TLE of the satellites
+        times (np.ndarray): UNIX seconds
+
+    Returns: array of positions in meters, with shape (satellites, times, 3)
+
+    """
+    satellites = SatrecArray([satellite_propagators.get_satellite(tle.lines).model for tle in tle_records])
+    days, day_seconds = np.divmod(times, SECONDS_PER_DAY)
+    error_codes, positions, _ = satellites.sgp4(UNIX_EPOCH_JD + days.astype(float),
+                                               day_seconds / SECONDS_PER_DAY)
+    if error_codes.any():
+        logger.warning("Orbit propagation errors for satellites %s",
+                       [tle.sat_id for tle, errors in zip(tle_records, error_codes) if errors.any()])
+    return positions * 1000.0
+
+
+def build_lead_trail_times(tle: TleRecord, start_time: datetime, end_time: datetime):
+    """
+    Build the lead and trail times of the orbit path, one interval for each orbit
+    (as computed by satellite_czml)
+    Returns: a tuple with the lead times and trail times lists
+    """
+    orbital_minutes = 24.0 * 60.0 / float(tle.line2[52:63])
+    orbital_seconds = orbital_minutes * 60.0
+    minutes_in_window = int((end_time - start_time).total_seconds() / 60)
+    number_of_full_orbits = math.floor(minutes_in_window / orbital_minutes)
+    path_start = start_time
+    path_end = path_start + timedelta(minutes=minutes_in_window % orbital_minutes)
+    lead_times = []
+    trail_times = []
+    for _ in range(number_of_full_orbits + 1):
+        interval = path_start.isoformat() + '/' + path_end.isoformat()
+        lead_times.append({"interval": interval, "epoch": path_start.isoformat(),
+                           "number": [0, orbital_seconds, orbital_seconds, 0]})
+        trail_times.append({"interval": interval, "epoch": path_start.isoformat(),
+                            "number": [0, 0, orbital_seconds, orbital_seconds]})
+        path_start = path_end
+        path_end = path_start + timedelta(minutes=orbital_minutes)
+    return lead_times, trail_times
+
+
+class OrbitArtifactBuilder:
+    """
+    Build the CZML document of the satellite orbits, on a time window around the current time.
+    The orbit samples are kept between refreshes: at each refresh the samples before the new
+    window start are dropped, and only the samples after the previous window end are computed.
+    The samples of a satellite are computed again from the epoch of its TLE, when a new TLE is
+    available. The samples of all the satellites are computed together.
+    """
+
+    def __init__(self, sat_ids, step=DEFAULT_ORBIT_STEP,
+                 past_window=DEFAULT_PAST_WINDOW, future_window=DEFAULT_FUTURE_WINDOW,
+                 tle_provider: Callable[[str], TleRecord] = None):
+        self._sat_ids = list(sat_ids)
+        self._step = step
+        self._past_window = past_window
+        self._future_window = future_window
+        self._tle_provider = tle_provider or (lambda sat_id: get_tle_repository().get_latest(sat_id))
+        self._lock = threading.Lock()
+        self._samples: Dict[str, SatelliteOrbitSamples] = {}
+        self._window_start = None
+        self._window_end = None
+
+    @property
+    def samples(self):
+        return self._samples
+
+    def _window(self, now: datetime):
+        """
+        Returns: start and end of the window, as UNIX seconds, aligned to the orbit step
+        """
+        now_seconds = now.replace(tzinfo=timezone.utc).timestamp() if now.tzinfo is None else now.timestamp()
+        window_start = int(now_seconds - self._past_window.total_seconds()) // self._step * self._step
+        window_end = -(-int(now_seconds + self._future_window.total_seconds()) // self._step) * self._step
+        return window_start, window_end
+
+    def _first_needed_time(self, sat_samples: Optional[SatelliteOrbitSamples], tle: TleRecord, window_start):
+        if sat_samples is None or not len(sat_samples.times) or tle.epoch < sat_samples.tle.epoch:
+            return window_start
+        if tle.epoch != sat_samples.tle.epoch:
+            # Samples before the new TLE epoch are kept
+            epoch_seconds = tle.epoch.replace(tzinfo=timezone.utc).timestamp()
+            return max(window_start, -(-int(epoch_seconds) // self._step) * self._step)
+        return max(window_start, int(sat_samples.times[-1]) + self._step)
+
+    def refresh(self, now: datetime = None):
+        """
+        Update the orbit samples to the window around the specified time
+        Args:
+            now (datetime): the window reference time (naive UTC, or aware)
+
+        Returns: the number of computed samples
+
+        """
+        with self._lock:
+            window_start, window_end = self._window(now or datetime.utcnow())
+            last_sample_time = window_end + EXTRA_SAMPLES * self._step
+            pending = {}
+            for sat_id in self._sat_ids:
+                sat_samples = self._samples.get(sat_id)
+                try:
+                    tle = self._tle_provider(sat_id)
+                except Exception as ex:
+                    if sat_samples is None:
+                        logger.error("No TLE available for satellite %s: orbit not computed - %s", sat_id, ex)
+                        continue
+                    logger.warning("No TLE available for satellite %s: using TLE epoch %s - %s",
+                                   sat_id, sat_samples.tle.epoch, ex)
+                    tle = sat_samples.tle
+                first_needed_time = self._first_needed_time(sat_samples, tle, window_start)
+                if sat_samples is not None:
+                    kept = (sat_samples.times >= window_start) & (sat_samples.times < first_needed_time)
+                    sat_samples = SatelliteOrbitSamples(sat_id, tle, sat_samples.times[kept],
+                                                        sat_samples.positions[kept])
+                else:
+                    sat_samples = SatelliteOrbitSamples(sat_id, tle, np.empty(0, dtype=np.int64),
+                                                        np.empty((0, 3)))
+                self._samples[sat_id] = sat_samples
+                if first_needed_time <= last_sample_time:
+                    pending[sat_id] = first_needed_time
+            computed_samples = 0
+            if pending:
+                times = np.arange(min(pending.values()), last_sample_time + 1, self._step, dtype=np.int64)
+                positions = propagate_positions([self._samples[sat_id].tle for sat_id in pending], times)
+                for sat_id, sat_positions in zip(pending, positions):
+                    sat_samples = self._samples[sat_id]
+                    new_samples = times >= pending[sat_id]
+                    sat_samples.times = np.concatenate((sat_samples.times, times[new_samples]))
+                    sat_samples.positions = np.concatenate((sat_samples.positions, sat_positions[new_samples]))
+                    computed_samples += int(new_samples.sum())
+            self._window_start = window_start
+            self._window_end = window_end
+            logger.debug("Orbit samples refreshed: window %s - %s, computed %d samples",
+                         _utc_isoformat(window_start), _utc_isoformat(window_end), computed_samples)
+            return computed_samples
+
+    def build_czml(self, satellite_assets: Dict[str, SatelliteAsset]) -> List[dict]:
+        """
+        Build the CZML packets of the orbits, on the last refreshed window
+        Args:
+            satellite_assets (): color and marker of each satellite
+
+        Returns: the list of CZML packets
+
+        """
+        with self._lock:
+            start_time = datetime.fromtimestamp(self._window_start, timezone.utc)
+            end_time = datetime.fromtimestamp(self._window_end, timezone.utc)
+            interval = start_time.isoformat() + '/' + end_time.isoformat()
+            packets = [{"id": "document", "version": "1.0",
+                        "clock": {"currentTime": start_time.isoformat(),
+                                  "multiplier": CLOCK_MULTIPLIER,
+                                  "interval": interval,
+                                  "range": "LOOP_STOP",
+                                  "step": "SYSTEM_CLOCK_MULTIPLIER"}}]
+            for sat_id in self._sat_ids:
+                sat_samples = self._samples.get(sat_id)
+                if sat_samples is None:
+                    continue
+                asset = satellite_assets[sat_id]
+                tle = sat_samples.tle
+                lead_times, trail_times = build_lead_trail_times(tle, start_time, end_time)
+                # Times relative to the window start, positions rounded to meters
+                cartesian = np.column_stack((sat_samples.times - self._window_start,
+                                             np.rint(sat_samples.positions))).astype(np.int64)
+                packets.append({
+                    "id": int(tle.line1[2:7]),
+                    "description": "Satellite: " + tle.name,
+                    "availability": interval,
+                    "billboard": {"show": True, "image": asset.marker, "scale": 1},
+                    "position": {"epoch": start_time.isoformat(),
+                                 "cartesian": cartesian.ravel().tolist(),
+                                 "interpolationAlgorithm": "LAGRANGE",
+                                 "interpolationDegree": 5,
+                                 "referenceFrame": "INERTIAL"},
+                    "label": {"show": True,
+                              "text": tle.name,
+                              "horizontalOrigin": "LEFT",
+                              "pixelOffset": {"cartesian2": [12, 0]},
+                              "fillColor": {"rgba": asset.color},
+                              "font": "12pt Lato",
+                              "outlineColor": {"rgba": asset.color},
+                              "outlineWidth": 3},
+                    "path": {"show": [{"interval": interval, "boolean": True}],
+                             "width": 2,
+                             "leadTime": lead_times,
+                             "trailTime": trail_times,
+                             "resolution": 120,
+                             "material": {"solidColor": {"color": {"rgba": asset.color}}}}
+                })
+            return packets
+
+    def build_czml_body(self, satellite_assets: Dict[str, SatelliteAsset]) -> bytes:
+        """
+        Returns: the CZML document, serialized as compact JSON bytes
+        """
+        start_time = time.perf_counter()
+        body = json.dumps(self.build_czml(satellite_assets), separators=(',', ':')).encode('utf-8')
+        logger.debug("Orbits CZML serialized: %d bytes, %0.3f s", len(body), time.perf_counter() - start_time)
+        return body
@@ -0,0 +1,116 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) - ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import json
+import logging
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from apps.utils.date_utils import PeriodID
+
+logger = logging.getLogger(__name__)
+
+ELASTIC_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def last_period_thresholds(now: datetime):
+    """
+    Compute the beginning of the last periods contained in the last quarter
+    Args:
+        now (datetime): the reference time
+
+    Returns: a dictionary period id -> period start time
+
+    """
+    return {
+        PeriodID.DAY: now - timedelta(hours=24),
+        PeriodID.WEEK: now - timedelta(days=7),
+        PeriodID.MONTH: now - timedelta(days=30)
+    }
+
+
+def elastic_time_field(field_name):
+    """
+    Build a function extracting the datetime from a field of an Elastic record _source
+    Args:
+        field_name (str): name of the time field, in Elastic time format
+
+    Returns: a function record -> datetime
+
+    """
+    def _record_time(record):
+        return datetime.strptime(record['_source'][field_name], ELASTIC_TIME_FORMAT)
+    return _record_time
+
+
+def json_array_body(fragments):
+    """
+    Build a JSON array from records already serialized as JSON bytes
+    Args:
+        fragments (): sequence of JSON serialized records
+
+    Returns: the JSON array, as bytes
+
+    """
+    return b'[' + b', '.join(fragments) + b']'
+
+
+class PeriodWindows:
+    """
+    Records of a time interval, sorted by time, so that the records in the last
+    period of any length are a suffix of the list, located by bisection.
+    Each record is serialized to JSON only once: the JSON body of each period is
+    built by concatenating the serialized records.
+    """
+
+    def __init__(self, records, record_time_fun, cls=None):
+        """
+        Args:
+            records (): the records of the whole interval
+            record_time_fun (): function record -> datetime, the time used to assign records to periods
+            cls (): optional JSONEncoder class used to serialize the records
+        """
+        timed_records = [(record_time_fun(record), record) for record in records]
+        timed_records.sort(key=lambda timed_record: timed_record[0])
+        self._times = [timed_record[0] for timed_record in timed_records]
+        self._records = [timed_record[1] for timed_record in timed_records]
+        self._fragments = [json.dumps(record, cls=cls).encode('utf-8') for record in self._records]
+
+    def __len__(self):
+        return len(self._records)
+
+    def _start_index(self, start_time):
+        if start_time is None:
+            return 0
+        return bisect_left(self._times, start_time)
+
+    def records_since(self, start_time=None):
+        """
+        Args:
+            start_time (datetime): the start of the period (included); None for the whole interval
+
+        Returns: the list of records with time not before start_time
+
+        """
+        return self._records[self._start_index(start_time):]
+
+    def json_since(self, start_time=None):
+        """
+        Args:
+            start_time (datetime): the start of the period (included); None for the whole interval
+
+        Returns: the JSON array of records with time not before start_time, as bytes
+
+        """
+        return json_array_body(self._fragments[self._start_index(start_time):])
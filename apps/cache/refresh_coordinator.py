@@ -0,0 +1,208 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) - ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from apps import flask_cache
+from apps.cache.cache import ConfigCache
+
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK_NAME = 'cache-refresh-leader'
+
+# Validity of the leader lock on Redis: the leader renews it every DEFAULT_LOCK_RENEW_INTERVAL seconds;
+# if the leader process dies, another process takes over after the lock expires
+DEFAULT_LOCK_TTL = 60
+
+DEFAULT_LOCK_RENEW_INTERVAL = 20
+
+DEFAULT_LOCK_FILE = os.path.join(tempfile.gettempdir(), 'cops-dashboard-cache-refresh.lock')
+
+cache_generation_key = '/cache/generation'
+
+cache_generation_time_key = '/cache/generation/time'
+
+
+def get_cache_generation():
+    """
+    Returns: the generation of the data on the shared cache, increased each time a cache loader
+        completes; 0 if no loader completed yet
+    """
+    return flask_cache.get(cache_generation_key) or 0
+
+
+def get_cache_generation_info():
+    return {
+        'generation': get_cache_generation(),
+        'time': flask_cache.get(cache_generation_time_key)
+    }
+
+
+def publish_cache_generation():
+    """
+    Notify that fresh data are available on the shared cache
+    Returns: the new cache generation
+    """
+    generation = flask_cache.cache.inc(cache_generation_key)
+    if generation is None:
+        # Backends not supporting atomic increment: the only writer is the leader
+        generation = get_cache_generation() + 1
+        flask_cache.set(cache_generation_key, generation, timeout=0)
+    flask_cache.set(cache_generation_time_key, datetime.utcnow().isoformat(), timeout=0)
+    return generation
+
+
+class RedisLeaderLock:
+    """
+    Leader lock shared by all the processes using the Redis cache: the lock has a TTL, so that
+    it is released if the leader process dies
+    """
+
+    def __init__(self, redis_url, ttl=DEFAULT_LOCK_TTL):
+        import redis
+        self._client = redis.Redis.from_url(redis_url)
+        self._lock = self._client.lock(LEADER_LOCK_NAME, timeout=ttl, thread_local=False)
+
+    def acquire(self):
+        return self._lock.acquire(blocking=False)
+
+    def renew(self):
+        try:
+            return self._lock.reacquire()
+        except Exception as ex:
+            logger.warning("Leader lock lost: %s", ex)
+            return False
+
+    def release(self):
+        try:
+            self._lock.release()
+        except Exception as ex:
+            logger.debug("Leader lock already released: %s", ex)
+
+
+class FileLeaderLock:
+    """
+    Leader lock shared by all the processes on the same host: an exclusive lock on a file,
+    released by the operating system if the leader process dies
+    """
+
+    def __init__(self, lock_file=DEFAULT_LOCK_FILE):
+        self._lock_file = lock_file
+        self._lock_fd = None
+
+    def acquire(self):
+        import fcntl
+        lock_fd = os.open(self._lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(lock_fd)
+            return False
+        os.ftruncate(lock_fd, 0)
+        os.write(lock_fd, str(os.getpid()).encode('utf-8'))
+        self._lock_fd = lock_fd
+        return True
+
+    def renew(self):
+        return self._lock_fd is not None
+
+    def release(self):
+        if self._lock_fd is not None:
+            import fcntl
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+def check_shared_cache(num_workers):
+    """
+    Only the leader process loads the cache: with more worker processes,
+    the cache must be shared (Redis), otherwise the followers would serve an empty cache
+    Args:
+        num_workers (int): number of worker processes serving the application
+
+    """
+    if num_workers > 1 and flask_cache.config.get('CACHE_TYPE') != 'RedisCache':
+        raise RuntimeError(f"{num_workers} worker processes configured with a {flask_cache.config.get('CACHE_TYPE')} "
+                           f"cache, not shared among processes: use the Redis cache or a single worker")
+
+
+def create_leader_lock():
+    """
+    Build the leader lock matching the cache backend: a Redis lock when the cache is on Redis,
+    a file lock otherwise
+    """
+    coordinator_config = ConfigCache.load_object("cache_refresh_config") or {}
+    if flask_cache.config.get('CACHE_TYPE') == 'RedisCache':
+        return RedisLeaderLock(flask_cache.config.get('CACHE_REDIS_URL'),
+                               ttl=int(coordinator_config.get('lock_ttl', DEFAULT_LOCK_TTL)))
+    return FileLeaderLock(coordinator_config.get('lock_file', DEFAULT_LOCK_FILE))
+
+
+class CacheRefreshCoordinator:
+    """
+    Elect the process running the cache loaders: all processes compete for the leader lock;
+    the process holding it runs the loaders, the others only serve reads from the shared cache.
+    Followers keep trying to acquire the lock, so that a new leader is elected if the leader dies.
+    """
+
+    def __init__(self, leader_lock, renew_interval=DEFAULT_LOCK_RENEW_INTERVAL):
+        self._leader_lock = leader_lock
+        self._renew_interval = renew_interval
+        self._is_leader = False
+        self._on_elected = None
+
+    def is_leader(self):
+        return self._is_leader
+
+    def start(self, on_elected):
+        """
+        Start competing for leadership
+        Args:
+            on_elected (): function executed each time this process becomes leader
+        """
+        self._on_elected = on_elected
+        try:
+            self._check_leadership()
+        except Exception as ex:
+            # e.g. Redis not reachable: leadership is requested again by the loop
+            logger.error("Error checking cache refresh leadership: %s", ex)
+        threading.Thread(target=self._leadership_loop, name='cache-refresh-leader', daemon=True).start()
+
+    def _check_leadership(self):
+        if self._is_leader:
+            if not self._leader_lock.renew():
+                logger.warning("Process %d lost cache refresh leadership", os.getpid())
+                self._is_leader = False
+            return
+        if self._leader_lock.acquire():
+            logger.info("Process %d elected cache refresh leader", os.getpid())
+            self._is_leader = True
+            try:
+                self._on_elected()
+            except Exception as ex:
+                logger.error("Error starting cache refresh on leader: %s", ex)
+
+    def _leadership_loop(self):
+        while True:
+            time.sleep(self._renew_interval)
+            try:
+                self._check_leadership()
+            except Exception as ex:
+                logger.error("Error checking cache refresh leadership: %s", ex)
@@ -0,0 +1,203 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) - ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from flask import Response, request
+
+from apps import flask_cache
+from apps.cache.revalidating_cache import set_staleness_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+JSON_MIMETYPE = "application/json"
+
+# Bodies smaller than this are served as is: compression would not pay off
+MIN_COMPRESS_SIZE = 1024
+
+GZIP_COMPRESS_LEVEL = 6
+
+BROTLI_COMPRESS_QUALITY = 5
+
+
+@dataclass
+class CachedResponse:
+    """
+    REST API payload, as saved on flask_cache: the JSON document is serialized and
+    compressed once, when the cache is loaded, so that requests only need to
+    select the encoding and stream the stored bytes.
+    Responses served after stale_time are marked as stale.
+    """
+    body: bytes
+    etag: str
+    mimetype: str = JSON_MIMETYPE
+    gzip_body: Optional[bytes] = None
+    br_body: Optional[bytes] = None
+    stored_time: Optional[float] = None
+    stale_time: Optional[float] = None
+
+    @property
+    def content_length(self):
+        return len(self.body)
+
+    def encoded_body(self, accept_encoding):
+        """
+        Select the body representation matching the client Accept-Encoding header
+        Args:
+            accept_encoding (str): value of the Accept-Encoding request header
+
+        Returns: a tuple (content encoding or None, body bytes)
+
+        """
+        accepted = [enc.split(';')[0].strip().lower()
+                    for enc in (accept_encoding or '').split(',')]
+        if self.br_body is not None and 'br' in accepted:
+            return 'br', self.br_body
+        if self.gzip_body is not None and 'gzip' in accepted:
+            return 'gzip', self.gzip_body
+        return None, self.body
+
+
+def build_cached_response(body: bytes, mimetype=JSON_MIMETYPE) -> CachedResponse:
+    """
+    Compute ETag and compressed representations of an already serialized payload
+    Args:
+        body (bytes): the serialized payload
+        mimetype (str): the payload mime type
+
+    Returns: a CachedResponse instance
+
+    """
+    etag = hashlib.sha1(body).hexdigest()
+    gzip_body = None
+    br_body = None
+    if len(body) >= MIN_COMPRESS_SIZE:
+        gzip_body = gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL)
+        if brotli is not None:
+            br_body = brotli.compress(body, quality=BROTLI_COMPRESS_QUALITY)
+    return CachedResponse(body=body, etag=etag, mimetype=mimetype,
+                          gzip_body=gzip_body, br_body=br_body)
+
+
+def store_cached_response(cache_key, cached_response: CachedResponse, timeout, stale_after=None):
+    """
+    Save on flask_cache an already built response: the stored copy is timed now
+    Args:
+        cache_key (str): the cache key (the REST API URI)
+        cached_response (CachedResponse): the response, as returned by build_cached_response
+        timeout (int): cache validity, in seconds
+        stale_after (int): optional time after which the payload is served as stale, in seconds
+
+    Returns: N/A
+
+    """
+    stored_time = time.time()
+    cached_response = replace(cached_response, stored_time=stored_time,
+                              stale_time=stored_time + stale_after if stale_after is not None else None)
+    logger.debug("Caching response with key %s: %d bytes, gzip %s bytes, br %s bytes, ETag %s",
+                 cache_key, cached_response.content_length,
+                 len(cached_response.gzip_body) if cached_response.gzip_body is not None else '-',
+                 len(cached_response.br_body) if cached_response.br_body is not None else '-',
+                 cached_response.etag)
+    flask_cache.set(cache_key, cached_response, timeout)
+
+
+def store_json_body(cache_key, body: bytes, timeout, stale_after=None):
+    """
+    Save on flask_cache a payload already serialized as JSON bytes
+    Args:
+        cache_key (str): the cache key (the REST API URI)
+        body (bytes): JSON document, UTF-8 encoded
+        timeout (int): cache validity, in seconds
+        stale_after (int): optional time after which the payload is served as stale, in seconds
+
+    Returns: N/A
+
+    """
+    store_cached_response(cache_key, build_cached_response(body), timeout, stale_after)
+
+
+def store_json_response(cache_key, data, timeout, cls=None, stale_after=None):
+    """
+    Serialize data as JSON and save it on flask_cache, as a pre-compressed response
+    Args:
+        cache_key (str): the cache key (the REST API URI)
+        data (): a JSON serializable object
+        timeout (int): cache validity, in seconds
+        cls (): optional JSONEncoder class used for serialization
+        stale_after (int): optional time after which the payload is served as stale, in seconds
+
+    Returns: N/A
+
+    """
+    store_json_body(cache_key, json.dumps(data, cls=cls).encode('utf-8'), timeout, stale_after)
+
+
+def make_flask_response(cached_response):
+    """
+    Build the Flask Response for the current request from a cached response.
+    A request with a matching If-None-Match header is answered with 304.
+    Stale responses report their age in the Age and Warning headers.
+    Args:
+        cached_response (CachedResponse): the response loaded from cache
+
+    Returns: a Flask Response
+
+    """
+    # Responses saved before the introduction of the response store
+    if cached_response is None or isinstance(cached_response, Response):
+        return cached_response
+    now = time.time()
+    if cached_response.etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(cached_response.etag)
+        return _check_stale(response, cached_response, now)
+    encoding, body = cached_response.encoded_body(request.headers.get('Accept-Encoding'))
+    response = Response(body, mimetype=cached_response.mimetype, status=200,
+                        direct_passthrough=True)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(body))
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(cached_response.etag)
+    return _check_stale(response, cached_response, now)
+
+
+def _check_stale(response, cached_response, now):
+    if cached_response.stale_time is not None and now > cached_response.stale_time:
+        set_staleness_headers(response, now - cached_response.stored_time)
+    return response
+
+
+def get_cached_response(cache_key):
+    """
+    Retrieve from flask_cache the response saved with the specified key
+    Args:
+        cache_key (str): the cache key (the REST API URI)
+
+    Returns: a Flask Response, or None if key is not cached
+
+    """
+    return make_flask_response(flask_cache.get(cache_key))
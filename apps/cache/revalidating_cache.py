@@ -0,0 +1,233 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) - ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from flask import current_app, g, has_app_context, has_request_context
+
+from apps import flask_cache
+
+logger = logging.getLogger(__name__)
+
+# Maximum time a request waits for a load in progress, before serving what is on cache
+DEFAULT_LOAD_WAIT_TIMEOUT = 1800
+
+# Period of the checks of loads in progress on other processes
+LOAD_POLL_INTERVAL = 1
+
+# Maximum time a request on a follower process waits for the leader to load a missing value
+DEFAULT_LEADER_WAIT_TIMEOUT = 60
+
+STALE_WARNING = '110 - "Response is Stale"'
+
+stored_time_key_suffix = '/stored-time'
+
+loading_key_prefix = '/loading/'
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """
+    Validity of a cached value:
+        soft_ttl: seconds after which the value is served as stale, while a refresh is requested
+        hard_ttl: seconds after which the value is removed from cache
+    """
+    soft_ttl: int
+    hard_ttl: int
+
+
+# Data refreshed every hour: stale after two missed refreshes
+HOURLY_REFRESH_POLICY = CachePolicy(soft_ttl=2 * 3600, hard_ttl=3 * 86400)
+
+# Data refreshed every 4 hours
+FOUR_HOURS_REFRESH_POLICY = CachePolicy(soft_ttl=8 * 3600, hard_ttl=3 * 86400)
+
+# Data refreshed every day
+DAILY_REFRESH_POLICY = CachePolicy(soft_ttl=26 * 3600, hard_ttl=7 * 86400)
+
+_flights_lock = threading.Lock()
+_flights = {}
+
+_background_refreshes = set()
+
+
+def single_flight(flight_name, wait_timeout=DEFAULT_LOAD_WAIT_TIMEOUT):
+    """
+    Decorate a cache loader, so that calls issued while the loader is running (with the same
+    arguments) wait for the running execution, instead of loading the same data again.
+    Executions on other processes sharing the cache are detected by a marker on cache.
+    Args:
+        flight_name (str): name identifying the loader
+        wait_timeout (int): maximum time waiting for the running execution, in seconds
+
+    Returns: the decorator
+
+    """
+
+    def decorator(loader):
+        @functools.wraps(loader)
+        def wrapper(*args, **kwargs):
+            flight_key = flight_name + ''.join(f'/{arg}' for arg in args) + \
+                ''.join(f'/{name}={value}' for name, value in sorted(kwargs.items()))
+            with _flights_lock:
+                done = _flights.get(flight_key)
+                is_owner = done is None
+                if is_owner:
+                    done = threading.Event()
+                    _flights[flight_key] = done
+            if not is_owner:
+                logger.info("Load %s already in progress: waiting for it", flight_key)
+                done.wait(wait_timeout)
+                return
+            try:
+                loading_key = loading_key_prefix + flight_key
+                if not flask_cache.add(loading_key, os.getpid(), timeout=wait_timeout):
+                    logger.info("Load %s in progress on process %s: waiting for it",
+                                flight_key, flask_cache.get(loading_key))
+                    _wait_key_removed(loading_key, wait_timeout)
+                    return
+                try:
+                    loader(*args, **kwargs)
+                finally:
+                    flask_cache.delete(loading_key)
+            finally:
+                with _flights_lock:
+                    del _flights[flight_key]
+                done.set()
+
+        return wrapper
+
+    return decorator
+
+
+def _wait_key_removed(cache_key, timeout):
+    deadline = time.monotonic() + timeout
+    while flask_cache.has(cache_key) and time.monotonic() < deadline:
+        time.sleep(LOAD_POLL_INTERVAL)
+
+
+def set_value(cache_key, value, policy: CachePolicy):
+    """
+    Save a value on cache, recording the time of storage to detect stale values
+    """
+    flask_cache.set_many({cache_key: value, cache_key + stored_time_key_suffix: time.time()},
+                         timeout=policy.hard_ttl)
+
+
+def get_value(cache_key, loader, policy: CachePolicy):
+    """
+    Retrieve a value saved with set_value:
+    - if missing, the loader is executed and the request waits for it (concurrent requests share
+      the same load, if the loader is decorated with single_flight)
+    - if older than the policy soft TTL, the value is returned, and the loader is executed in
+      background; the response to the current request is marked as stale
+    Only the cache refresh leader executes the loader: on the other processes, a missing value
+    is awaited until the leader saves it, and a stale value is returned as is.
+    Args:
+        cache_key (str): the cache key
+        loader (): function without arguments, saving the value on cache
+        policy (CachePolicy): the validity of the value
+
+    Returns: the cached value, or None if the loader could not save it
+
+    """
+    value, stored_time = flask_cache.get_many(cache_key, cache_key + stored_time_key_suffix)
+    if value is None:
+        if _is_refresh_follower():
+            logger.info("Key %s not found on cache: waiting for the cache refresh leader", cache_key)
+            return _wait_key_stored(cache_key, DEFAULT_LEADER_WAIT_TIMEOUT)
+        logger.info("Key %s not found on cache: loading it", cache_key)
+        loader()
+        return flask_cache.get(cache_key)
+    age = time.time() - stored_time if stored_time is not None else 0
+    if age > policy.soft_ttl:
+        _mark_request_stale(age)
+        if _is_refresh_follower():
+            logger.info("Key %s stale since %d seconds: left to the cache refresh leader",
+                        cache_key, age - policy.soft_ttl)
+        else:
+            logger.info("Key %s stale since %d seconds: refreshing it in background",
+                        cache_key, age - policy.soft_ttl)
+            _refresh_in_background(cache_key, loader)
+    return value
+
+
+def _is_refresh_follower():
+    """
+    Returns: True if a cache refresh coordinator is configured, and this process is not the leader
+    """
+    if not has_app_context():
+        return False
+    coordinator = current_app.extensions.get('cache_refresh_coordinator')
+    return coordinator is not None and not coordinator.is_leader()
+
+
+def _wait_key_stored(cache_key, timeout):
+    deadline = time.monotonic() + timeout
+    value = flask_cache.get(cache_key)
+    while value is None and time.monotonic() < deadline:
+        time.sleep(LOAD_POLL_INTERVAL)
+        value = flask_cache.get(cache_key)
+    if value is None:
+        logger.warning("Key %s not loaded by the cache refresh leader within %d seconds", cache_key, timeout)
+    return value
+
+
+def _refresh_in_background(cache_key, loader):
+    with _flights_lock:
+        if cache_key in _background_refreshes:
+            return
+        _background_refreshes.add(cache_key)
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def _refresh():
+        try:
+            if app is not None:
+                with app.app_context():
+                    loader()
+            else:
+                loader()
+        except Exception as ex:
+            logger.error("Error refreshing key %s in background: %s", cache_key, ex)
+        finally:
+            with _flights_lock:
+                _background_refreshes.discard(cache_key)
+
+    threading.Thread(target=_refresh, name=f'refresh-{cache_key}', daemon=True).start()
+
+
+def _mark_request_stale(age):
+    if has_request_context():
+        g.cache_stale_age = max(age, g.get('cache_stale_age', 0))
+
+
+def set_staleness_headers(response, age):
+    response.headers['Age'] = str(int(age))
+    response.headers['Warning'] = STALE_WARNING
+    return response
+
+
+def add_staleness_headers(response):
+    """
+    After request handler: mark responses built from stale cached values
+    """
+    age = g.get('cache_stale_age')
+    if age is not None:
+        set_staleness_headers(response, age)
+    return response
@@ -0,0 +1,206 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) - ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from czml import czml
+
+from apps.cache.response_store import CachedResponse, build_cached_response
+
+logger = logging.getLogger(__name__)
+
+# Km
+EARTH_RADIUS = 6371.0
+
+DEFAULT_MASK_POINTS = 72
+
+DEFAULT_STATION_COLOR = [215, 222, 252, 255]
+
+DEFAULT_STATION_MARKER = 'static/assets/img/antenna.png'
+
+DEFAULT_STATION_MARKER_SCALE = 0.5
+
+# Used when no ground_stations_config is configured.
+# Station positions are [longitude (deg), latitude (deg), height (m)]
+DEFAULT_STATIONS_CONFIG = {
+    'color': DEFAULT_STATION_COLOR,
+    'marker': DEFAULT_STATION_MARKER,
+    'stations': [
+        {'name': 'Svalbard', 'position': [15.399, 78.228, 450]},
+        {'name': 'Inuvik', 'position': [-133.72181, 68.34986, 15.00]},
+        {'name': 'Maspalomas', 'position': [-15.6332, 27.76329, 153]},
+        {'name': 'Matera', 'position': [16.7046, 40.6486, 536.9]},
+        {'name': 'Neustrelitz', 'position': [13.0670437, 53.3622189, 73.00]}
+    ]
+}
+
+
+@dataclass
+class VisibilityMask:
+    """
+    Area where a satellite at the given altitude is seen by a station
+    above the minimum elevation
+    """
+    satellite_altitude: float
+    min_elevation: float = 5.0
+    num_points: int = DEFAULT_MASK_POINTS
+
+
+@dataclass
+class GroundStation:
+    name: str
+    longitude: float
+    latitude: float
+    height: float
+    color: List[int]
+    marker: str
+    visibility_mask: Optional[VisibilityMask] = None
+    horizon_circle: Optional[np.ndarray] = None
+
+
+def horizon_circle(longitude, latitude, satellite_altitude, min_elevation, num_points=DEFAULT_MASK_POINTS):
+    """
+    Compute the ground circle where a satellite is seen by a station at the minimum elevation
+    (spherical Earth)
+    Args:
+        longitude (): station longitude, in degrees
+        latitude (): station latitude, in degrees
+        satellite_altitude (): satellite altitude, in km
+        min_elevation (): minimum elevation, in degrees
+        num_points (): number of points of the circle
+
+    Returns: an array (num_points + 1, 2) of [longitude, latitude] in degrees,
+        closed on the first point
+
+    """
+    elevation = np.radians(min_elevation)
+    # Earth central angle between the station and the sub-satellite point
+    central_angle = np.arccos(EARTH_RADIUS / (EARTH_RADIUS + satellite_altitude) * np.cos(elevation)) - elevation
+    station_lon = np.radians(longitude)
+    station_lat = np.radians(latitude)
+    azimuths = np.linspace(0.0, 2.0 * np.pi, num_points + 1)
+    circle_lat = np.arcsin(np.sin(station_lat) * np.cos(central_angle) +
+                           np.cos(station_lat) * np.sin(central_angle) * np.cos(azimuths))
+    circle_lon = station_lon + np.arctan2(np.sin(azimuths) * np.sin(central_angle) * np.cos(station_lat),
+                                          np.cos(central_angle) - np.sin(station_lat) * np.sin(circle_lat))
+    circle = np.column_stack(((np.degrees(circle_lon) + 540.0) % 360.0 - 180.0, np.degrees(circle_lat)))
+    circle[-1] = circle[0]
+    return circle
+
+
+def parse_stations_config(stations_config) -> List[GroundStation]:
+    """
+    Build the ground stations from the configuration: color and marker can be
+    set for each station, or for all the stations
+    Args:
+        stations_config (dict): the ground_stations_config configuration
+
+    Returns: the list of GroundStation, with the horizon circles of the visibility masks
+
+    """
+    default_color = stations_config.get('color', DEFAULT_STATION_COLOR)
+    default_marker = stations_config.get('marker', DEFAULT_STATION_MARKER)
+    stations = []
+    for station_config in stations_config.get('stations', []):
+        longitude, latitude, height = station_config['position']
+        mask_config = station_config.get('visibility_mask')
+        station = GroundStation(station_config['name'], longitude, latitude, height,
+                                station_config.get('color', default_color),
+                                station_config.get('marker', default_marker),
+                                VisibilityMask(**mask_config) if mask_config else None)
+        if station.visibility_mask is not None:
+            mask = station.visibility_mask
+            station.horizon_circle = horizon_circle(longitude, latitude, mask.satellite_altitude,
+                                                    mask.min_elevation, mask.num_points)
+        stations.append(station)
+    return stations
+
+
+class StationAssetRegistry:
+    """
+    Ground stations displayed on the globe, loaded from configuration.
+    The CZML document is built, serialized and compressed once for each
+    version of the configuration
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._stations: List[GroundStation] = []
+        self._cached_response: Optional[CachedResponse] = None
+
+    @staticmethod
+    def config_version(stations_config):
+        return hashlib.sha1(json.dumps(stations_config, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def stations(self):
+        return self._stations
+
+    def load(self, stations_config) -> CachedResponse:
+        """
+        Load the stations configuration: if the configuration did not change,
+        the already built response is returned
+        Args:
+            stations_config (dict): the ground_stations_config configuration
+
+        Returns: the CachedResponse with the stations CZML document
+
+        """
+        version = self.config_version(stations_config)
+        with self._lock:
+            if version != self._version:
+                stations = parse_stations_config(stations_config)
+                body = self.build_czml(stations).dumps().encode('utf-8')
+                self._cached_response = build_cached_response(body)
+                self._stations = stations
+                self._version = version
+                logger.info("Loaded %d ground stations, configuration version %s", len(stations), version)
+            return self._cached_response
+
+    @staticmethod
+    def build_czml(stations: List[GroundStation]) -> czml.CZML:
+        """
+        Build the CZML document of the stations: each station is a billboard;
+        visibility masks are polylines on the horizon circles
+        """
+        doc = czml.CZML()
+        doc.packets.append(czml.CZMLPacket(id='document', version='1.0'))
+        for station in stations:
+            packet = czml.CZMLPacket(id=station.name)
+            bb = czml.Billboard(scale=DEFAULT_STATION_MARKER_SCALE, show=True)
+            bb.image = station.marker
+            bb.color = {'rgba': station.color}
+            packet.billboard = bb
+            packet.position = {'cartographicDegrees': [station.longitude, station.latitude, station.height]}
+            doc.packets.append(packet)
+            if station.horizon_circle is not None:
+                mask_packet = czml.CZMLPacket(id=f"{station.name}-visibility-mask")
+                mask_line = czml.Polyline(show=True, width=1.0, followSurface=True)
+                mask_line.material = {'solidColor': {'color': {'rgba': station.color}}}
+                mask_line.positions = {'cartographicDegrees': np.column_stack(
+                    (np.round(station.horizon_circle, 5), np.zeros(len(station.horizon_circle)))).ravel().tolist()}
+                mask_packet.polyline = mask_line
+                doc.packets.append(mask_packet)
+        return doc
@@ -16,17 +16,16 @@ def read_config_file(filename):
 
 
 def manage_cache_config(environment):
+    # Each cache content is replaced at once: readers keep using
+    # the previous snapshot until the new one is published
     config = read_config_file(environment)['config']
-    for key in config.keys():
-        ConfigCache.store_object(key, config[key])
+    ConfigCache.store_objects(config)
 
     config = read_config_file(ConfigCache.load_object('filePublicationProductTree'))
-    for key in config.keys():
-        PublicationProductTreeCache.store_object(key, config[key])
+    PublicationProductTreeCache.store_objects(config)
 
     config = read_config_file(ConfigCache.load_object('fileMissionTimeliness'))
-    for key in config.keys():
-        MissionTimelinessCache.store_object(key, config[key])
+    MissionTimelinessCache.store_objects(config)
 
 
 class Config(object):
@@ -12,20 +12,76 @@ behalf of TPZ to fulfill the purpose for which the document was
 delivered to him.
 """
 import logging
+import threading
+import time
 from datetime import timedelta
+from time import perf_counter
 
 from elasticsearch import Elasticsearch, RequestsHttpConnection
+from elasticsearch.exceptions import TransportError
 from elasticsearch.helpers import scan
+from requests.adapters import HTTPAdapter
 
 from apps.cache.cache import ConfigCache
 
 logger = logging.getLogger(__name__)
 
+# Default connection settings, overridden by the optional keys
+# with the same name in "elastic_config" configuration
+DEFAULT_POOL_MAXSIZE = 10
+# Default timeout of a single request, in seconds
+DEFAULT_REQUEST_TIMEOUT = 300
+DEFAULT_MAX_RETRIES = 3
+# Delay before the first retry, in seconds: doubled at each further retry
+DEFAULT_RETRY_BACKOFF = 1.0
+# Timeout of the health probe, in seconds
+HEALTH_PROBE_TIMEOUT = 10
+
+# HTTP status codes of transient failures, to be retried
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
+class PooledRequestsHttpConnection(RequestsHttpConnection):
+    """
+    Requests based connection keeping a pool of persistent (keep-alive) HTTP connections,
+    and retrying failed requests with exponential backoff
+    """
+
+    def __init__(self, pool_maxsize=DEFAULT_POOL_MAXSIZE, connection_retries=DEFAULT_MAX_RETRIES,
+                 retry_backoff=DEFAULT_RETRY_BACKOFF, **kwargs):
+        super(PooledRequestsHttpConnection, self).__init__(**kwargs)
+        self._max_retries = connection_retries
+        self._retry_backoff = retry_backoff
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @staticmethod
+    def _is_transient(ex):
+        # Connection errors have status 'N/A'
+        return not isinstance(ex.status_code, int) or ex.status_code in RETRY_STATUS_CODES
+
+    def perform_request(self, method, url, params=None, body=None, timeout=None, ignore=(), headers=None):
+        attempt = 0
+        while True:
+            try:
+                return super(PooledRequestsHttpConnection, self).perform_request(method, url, params, body,
+                                                                                 timeout=timeout, ignore=ignore,
+                                                                                 headers=headers)
+            except TransportError as ex:
+                if attempt >= self._max_retries or not self._is_transient(ex):
+                    raise
+                delay = self._retry_backoff * (2 ** attempt)
+                attempt += 1
+                logger.warning("Elastic request %s %s failed (%s): retry %d of %d in %.1f seconds",
+                               method, url, ex, attempt, self._max_retries, delay)
+                time.sleep(delay)
+
 
 class ElasticClient:
 
     def __init__(self, elastic_scheme=None, elastic_host=None, elastic_port=None, elastic_user=None,
-                 elastic_password=None, verify_certs=False, ssl_show_warn=False):
+                 elastic_password=None, verify_certs=False, ssl_show_warn=False, **connection_options):
         self.__client = None
         if elastic_scheme is None or elastic_host is None or elastic_port is None or elastic_user is None or \
                 elastic_password is None or verify_certs is None or ssl_show_warn is False:
@@ -34,31 +90,40 @@ class ElasticClient:
             cfg_ssl_show_warn = (elastic_config['ssl_show_warn'] == "true")
             self.init(elastic_config['elastic_scheme'], elastic_config['elastic_host'], elastic_config['elastic_port'],
                       elastic_config['elastic_user'], elastic_config['elastic_password'],
-                      cfg_verify_certs, cfg_ssl_show_warn)
+                      cfg_verify_certs, cfg_ssl_show_warn, **_connection_options(elastic_config))
         else:
             self.init(elastic_scheme, elastic_host, elastic_port, elastic_user, elastic_password, verify_certs,
-                      ssl_show_warn)
+                      ssl_show_warn, **connection_options)
 
     def init(self, elastic_scheme, elastic_host, elastic_port, elastic_user, elastic_password, verify_certs,
-             ssl_show_warn):
+             ssl_show_warn, pool_maxsize=DEFAULT_POOL_MAXSIZE, request_timeout=DEFAULT_REQUEST_TIMEOUT,
+             max_retries=DEFAULT_MAX_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF):
 
+        self._request_timeout = request_timeout
         # Create the client instance
+        # Retries are performed by the connection, applying the backoff:
+        # the transport performs a single attempt
         self.__client = Elasticsearch(
             elastic_host,
             http_auth=(elastic_user, elastic_password),
-            connection_class=RequestsHttpConnection,
+            connection_class=PooledRequestsHttpConnection,
             scheme=elastic_scheme,
             port=elastic_port,
-            timeout=999999,
+            timeout=request_timeout,
+            max_retries=0,
             verify_certs=verify_certs,
-            ssl_show_warn=ssl_show_warn
+            ssl_show_warn=ssl_show_warn,
+            pool_maxsize=pool_maxsize,
+            connection_retries=max_retries,
+            retry_backoff=retry_backoff
         )
 
-    def count(self, index, body=None):
+    def count(self, index, body=None, request_timeout=None):
         if body is None:
             body = {'match_all': {}}
         # print("Elastic Search Count: ", body)
-        result = self.get_connection().count(index=index, body=body)
+        result = self.get_connection().count(index=index, body=body,
+                                             request_timeout=self._get_request_timeout(request_timeout))
         # print("Result: ", result)
         return result
 
@@ -69,8 +134,30 @@ class ElasticClient:
         end_date_str = to_date.strftime('%Y-%m-%dT00:00:00')
         return start_date_str, end_date_str
 
+    def _get_request_timeout(self, request_timeout):
+        return self._request_timeout if request_timeout is None else request_timeout
+
     def get_info(self):
-        return self.__client.info()
+        return self.__client.info(request_timeout=self._request_timeout)
+
+    def ping(self, request_timeout=HEALTH_PROBE_TIMEOUT):
+        """
+        Health probe: check that the Elastic cluster is reachable
+        Returns: a dictionary with the probe outcome, and the probe duration in seconds
+
+        """
+        probe_start_time = perf_counter()
+        health = {'available': False}
+        try:
+            info = self.__client.info(request_timeout=request_timeout)
+            health['available'] = True
+            health['cluster_name'] = info.get('cluster_name')
+            health['version'] = info.get('version', {}).get('number')
+        except Exception as ex:
+            logger.error("Elastic health probe failed: %s", ex)
+            health['error'] = str(ex)
+        health['duration'] = perf_counter() - probe_start_time
+        return health
 
     def get_connection(self):
         return self.__client
@@ -112,7 +199,7 @@ class ElasticClient:
     #    put {"match_all": {}}
     # It is superflous paissng "query" dictionary, if
     # it is expected always to be specified!!!!!
-    def query_scan(self, index, query=None):
+    def query_scan(self, index, query=None, request_timeout=None):
         if query is None:
             query = {"query": {"match_all": {}}}
         logger.debug("Executing Elastic query : %s, on index : %s",
@@ -121,11 +208,12 @@ class ElasticClient:
             self.get_connection(),
             index=index,
             query=query,
-            clear_scroll=False
+            clear_scroll=False,
+            request_timeout=self._get_request_timeout(request_timeout)
         )
         return result
 
-    def query_scan_date_range(self, index, date_key, from_date, to_date, query=None):
+    def query_scan_date_range(self, index, date_key, from_date, to_date, query=None, request_timeout=None):
         """
         Execute a Scan on elastic, on the specified index,
         selecting data using the specified Date Range.
@@ -162,14 +250,15 @@ class ElasticClient:
             self.get_connection(),
             index=index,
             query=query,
-            clear_scroll=False
+            clear_scroll=False,
+            request_timeout=self._get_request_timeout(request_timeout)
         )
         return result
 
     def refresh_index(self, index):
         self.get_connection().indices.refresh(index)
 
-    def search(self, index, from_element=0, size=0, query=None, aggs=None):
+    def search(self, index, from_element=0, size=0, query=None, aggs=None, request_timeout=None):
         if query is None:
             query = {'match_all': {}}
         if aggs is not None:
@@ -178,9 +267,55 @@ class ElasticClient:
             body = {'size': size, 'from': from_element, 'query': query}
         # print("Elastic Search: ", body)
         try:
-            result = self.get_connection().search(index=index, body=body, request_cache=True)
+            result = self.get_connection().search(index=index, body=body, request_cache=True,
+                                                  request_timeout=self._get_request_timeout(request_timeout))
         except Exception as ex:
             logger.error("Failure executing Elastic query: %s on index %s",
                          body, index)
             raise ex
         return result
+
+
+def _connection_options(elastic_config):
+    return {
+        'pool_maxsize': int(elastic_config.get('pool_maxsize', DEFAULT_POOL_MAXSIZE)),
+        'request_timeout': float(elastic_config.get('request_timeout', DEFAULT_REQUEST_TIMEOUT)),
+        'max_retries': int(elastic_config.get('max_retries', DEFAULT_MAX_RETRIES)),
+        'retry_backoff': float(elastic_config.get('retry_backoff', DEFAULT_RETRY_BACKOFF))
+    }
+
+
+_clients_lock = threading.Lock()
+_clients = {}
+
+
+def get_elastic_client() -> ElasticClient:
+    """
+    Retrieve the client shared by the whole process (scheduler jobs and request handlers),
+    connected according to the current "elastic_config" configuration.
+    A new client is created only when the configuration changes.
+    Returns: an ElasticClient instance
+
+    """
+    elastic_config = ConfigCache.load_object("elastic_config")
+    client_key = tuple(sorted((key, str(value)) for key, value in elastic_config.items()))
+    client = _clients.get(client_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(client_key)
+            if client is None:
+                logger.info("Creating Elastic client for host %s", elastic_config.get('elastic_host'))
+                client = ElasticClient()
+                # Drop clients built with a previous configuration
+                _clients.clear()
+                _clients[client_key] = client
+    return client
+
+
+def elastic_health():
+    """
+    Probe the Elastic cluster with the shared client
+    Returns: a dictionary with the probe outcome
+
+    """
+    return get_elastic_client().ping()
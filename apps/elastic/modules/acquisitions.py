@@ -68,7 +68,7 @@ def _get_cds_acquisitions(start_date, end_date):
 
         # Auxiliary variable declaration
         indices = ["cds-acquisition-pass-status"]
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results from Elastic database
         for index in indices:
@@ -146,7 +146,7 @@ def _get_cds_edrs_acquisitions(start_date, end_date):
 
         # Auxiliary variable declaration
         indices = ["cds-edrs-acquisition-pass-status"]
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results from Elastic database
         for index in indices:
@@ -43,7 +43,7 @@ def fetch_anomalies_last_quarter():
         # Auxiliary variable declaration
         anomalies = []
         indices = ["cds-cams-tickets-static"]
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results from Elastic database
         for index in indices:
@@ -88,7 +88,7 @@ def fetch_anomalies_prev_quarter():
         # Auxiliary variable declaration
         anomalies = []
         indices = ["cds-cams-tickets-static"]
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results from Elastic database
         for index in indices:
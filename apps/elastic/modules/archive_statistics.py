@@ -25,7 +25,7 @@ logger = logging.getLogger(__name__)
 def get_cds_archive_size_by_mission(start_date, end_date, mission):
     logger.debug(f"[BEG] CDS LONG TERM ARCHIVE VOLUME for mission {mission}, start: {start_date}, end: {end_date}")
     index = 'cds-publication'
-    elastic = elastic_client.ElasticClient()
+    elastic = elastic_client.get_elastic_client()
     results = []
 
     # TIme API
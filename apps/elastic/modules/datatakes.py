@@ -12,55 +12,41 @@ behalf of  to fulfill the purpose for which the document was
 delivered to him.
 """
 
+import copy
 import logging
+import threading
 from datetime import datetime, timedelta
 
 from dateutil.relativedelta import relativedelta
 
 import apps.ingestion.anomalies_ingestor as anomalies_ingestor
+from apps.cache.cache import ConfigCache
 from apps.elastic import client as elastic_client
+from apps.elastic.modules import datatakes_completeness
 from apps.models import anomalies as anomalies_model
 from apps.utils import date_utils
 
 logger = logging.getLogger(__name__)
 
-level_ids = {
-    'S3': {
-        'L0_': 'L0_',
-        'L1_': 'L1_',
-        'L2_': 'L2_'
-    },
-    'S5': {
-        'L0_': 'L0_',
-        'L1_': 'L1B',
-        'L2_': 'L2_'
-    }
-}
-
-satellites_mission_map = {
-    'S1A': 'S1',
-    'S1B': 'S1',
-    'S2A': 'S2',
-    'S2B': 'S2',
-    'S3A': 'S3',
-    'S3B': 'S3',
-    'S5P': 'S5'
-}
-
-mission_time_thresholds = {
-    'S1': 8,
-    'S2': 10,
-    'S3': 696,
-    'S5': 48
-}
-
 ELASTIC_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
 
+# Field with the last update time of datatake and completeness documents, used by the incremental refresh;
+# overridden by "update_time_field" in "datatakes_refresh_config" configuration
+DEFAULT_UPDATE_TIME_FIELD = '@timestamp'
+
+# Indices with the datatake and completeness documents
+DATATAKE_INDICES = ['cds-datatake', 'cds-s3-completeness', 'cds-s5-completeness']
+
+# Margin subtracted to the high-water mark, to retrieve documents indexed late
+DEFAULT_UPDATE_TIME_OVERLAP_MINUTES = 15
 
-def fetch_anomalies_datatakes_last_quarter():
+
+def fetch_anomalies_datatakes_last_quarter(full_refresh=False):
     """
         Fetch the datatakes in the last 3 months from Elastic DB using the exposed REST APIs. The start time is set at
         00:00:00 of the first day of the temporal interval; the stop time is set at 23:59:59 of the day after.
+        Datatakes are kept in a local store: unless a full refresh is requested, only the documents updated since
+        the previous refresh are retrieved.
         """
 
     # Retrieve data takes in the last 3 months and store results of query in cache
@@ -69,7 +55,15 @@ def fetch_anomalies_datatakes_last_quarter():
     end_date = end_date + relativedelta(days=1)
 
     # Retrieve datatakes from Elastic client
-    dt_last_quarter = _get_cds_datatakes(start_date, end_date)
+    try:
+        if full_refresh or not last_quarter_store.is_loaded():
+            dt_last_quarter = last_quarter_store.rebuild(start_date, end_date)
+        else:
+            dt_last_quarter = last_quarter_store.refresh(start_date, end_date)
+    except Exception as ex:
+        # The store is left untouched: retrieve the available datatakes, as done before the store
+        logger.error("Failure updating datatakes store: %s", ex)
+        dt_last_quarter = _get_cds_datatakes(start_date, end_date)
 
     # Re-evaluate the impact of anomalies on datatakes completeness
     _refresh_anomalies_status(dt_last_quarter)
@@ -110,6 +104,179 @@ def fetch_datatake_details(datatake_id):
         return "Unrecongnized datatake ID: " + datatake_id
 
 
+def get_update_time_field():
+    refresh_config = ConfigCache.load_object("datatakes_refresh_config") or {}
+    return refresh_config.get("update_time_field", DEFAULT_UPDATE_TIME_FIELD)
+
+
+def get_update_time_overlap():
+    refresh_config = ConfigCache.load_object("datatakes_refresh_config") or {}
+    return timedelta(minutes=int(refresh_config.get("update_time_overlap_minutes",
+                                                    DEFAULT_UPDATE_TIME_OVERLAP_MINUTES)))
+
+
+class DatatakeStore:
+    """
+    Datatakes of a sliding time interval, keyed by datatake ID.
+    S3 and S5 products are kept as well, grouped by datatake, so that the completeness
+    of a datatake can be recomputed when only some of its products are updated.
+    The high-water mark is the time of the last successful retrieval: a refresh
+    only scans documents updated after it (minus a safety overlap), computes the
+    completeness of the changed datatakes, and evicts datatakes out of the interval.
+    Refreshes are incremental only once the documents are verified to carry the update time field.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datatakes = {}
+        self._products = {}
+        self._high_water_mark = None
+        self._update_time_field_checked = False
+
+    def is_loaded(self):
+        return self._high_water_mark is not None
+
+    @property
+    def high_water_mark(self):
+        return self._high_water_mark
+
+    def rebuild(self, start_date: datetime, end_date: datetime):
+        """
+        Reload all the datatakes in the interval, discarding the current content
+        Args:
+            start_date (datetime): beginning of the interval (the whole day is included)
+            end_date (datetime): end of the interval (the whole day is included)
+
+        Returns: the list of datatakes in the interval
+
+        """
+        with self._lock:
+            return self._rebuild(start_date, end_date)
+
+    def refresh(self, start_date: datetime, end_date: datetime):
+        """
+        Update the store with the documents changed since the last retrieval,
+        and evict the datatakes started before the beginning of the interval
+        Args:
+            start_date (datetime): beginning of the interval (the whole day is included)
+            end_date (datetime): end of the interval (the whole day is included)
+
+        Returns: the list of datatakes in the interval
+
+        """
+        with self._lock:
+            if not self._update_time_field_checked:
+                update_time_field = get_update_time_field()
+                if not _update_time_field_available(update_time_field):
+                    logger.error("Datatake documents have no update time field %s: "
+                                 "incremental refresh replaced by a full rebuild; "
+                                 "check \"update_time_field\" in \"datatakes_refresh_config\" configuration",
+                                 update_time_field)
+                    return self._rebuild(start_date, end_date)
+                self._update_time_field_checked = True
+            updated_since = self._high_water_mark - get_update_time_overlap()
+            logger.info("[BEG] Refreshing datatakes store with documents updated since %s", updated_since)
+            retrieval_time = datetime.utcnow()
+            s1s2_records, s3_products, s5_products = _get_cds_datatake_records(start_date, end_date,
+                                                                               updated_since=updated_since,
+                                                                               strict=True)
+            changed_ids = self._upsert(s1s2_records, s3_products, s5_products)
+            evicted_ids = self._evict(start_date)
+            self._refresh_completeness_status()
+            self._high_water_mark = retrieval_time
+            logger.info("[END] Refreshing datatakes store: %d changed, %d evicted, %d datatakes",
+                        len(changed_ids), len(evicted_ids), len(self._datatakes))
+            return self.datatakes()
+
+    def datatakes(self):
+        # Copies: the stored datatakes are updated in place by the next refreshes
+        return copy.deepcopy(list(self._datatakes.values()))
+
+    def _rebuild(self, start_date: datetime, end_date: datetime):
+        logger.info("[BEG] Rebuilding datatakes store from %s to %s", start_date, end_date)
+        retrieval_time = datetime.utcnow()
+        s1s2_records, s3_products, s5_products = _get_cds_datatake_records(start_date, end_date, strict=True)
+        self._datatakes = {}
+        self._products = {}
+        self._upsert(s1s2_records, s3_products, s5_products)
+        self._high_water_mark = retrieval_time
+        logger.info("[END] Rebuilding datatakes store: %d datatakes", len(self._datatakes))
+        return self.datatakes()
+
+    def _upsert(self, s1s2_records, s3_products, s5_products):
+        changed_ids = set()
+        for dt in datatakes_completeness.build_s1s2_datatakes(s1s2_records):
+            self._datatakes[dt['_id']] = dt
+            changed_ids.add(dt['_id'])
+        for products, mission in ((s3_products, 'S3'), (s5_products, 'S5')):
+            mission_changed_ids = {}
+            for prod in products:
+                dt_id = prod['_source']['datatake_id']
+                self._products.setdefault(dt_id, {})[prod['_id']] = prod
+                mission_changed_ids[dt_id] = None
+            self._rebuild_products_datatakes(mission_changed_ids, mission)
+            changed_ids.update(mission_changed_ids)
+        return changed_ids
+
+    def _rebuild_products_datatakes(self, dt_ids, mission):
+        dt_products = [prod for dt_id in dt_ids for prod in self._products[dt_id].values()]
+        for datatake in datatakes_completeness.build_products_datatakes(dt_products, mission):
+            self._datatakes[datatake['_source']['datatake_id']] = datatake
+
+    def _evict(self, start_date: datetime):
+        # Same granularity of the Elastic query: datatakes are selected by day
+        start_day = start_date.strftime('%Y-%m-%d')
+        evicted_ids = set()
+        reduced_ids = {'S3': [], 'S5': []}
+        for dt_id, dt_prods in list(self._products.items()):
+            expired_prod_ids = [prod_id for prod_id, prod in dt_prods.items()
+                                if prod['_source']['observation_time_start'][:10] < start_day]
+            if not expired_prod_ids:
+                continue
+            for prod_id in expired_prod_ids:
+                dt_prods.pop(prod_id)
+            if not dt_prods:
+                self._products.pop(dt_id)
+                self._datatakes.pop(dt_id, None)
+                evicted_ids.add(dt_id)
+            else:
+                reduced_ids['S3' if dt_id.startswith('S3') else 'S5'].append(dt_id)
+        for mission, dt_ids in reduced_ids.items():
+            self._rebuild_products_datatakes(dt_ids, mission)
+        for dt_id, dt in list(self._datatakes.items()):
+            if dt_id not in self._products and dt['_source']['observation_time_start'][:10] < start_day:
+                self._datatakes.pop(dt_id)
+                evicted_ids.add(dt_id)
+        return evicted_ids
+
+    def _refresh_completeness_status(self):
+        # The status depends on the time elapsed since sensing stop: it changes also for unchanged datatakes
+        datatakes_completeness.set_completeness_status([dt['_source'] for dt in self._datatakes.values()])
+
+
+last_quarter_store = DatatakeStore()
+
+
+def _update_time_field_available(update_time_field):
+    """
+    Check that the datatake documents carry the field used by the incremental refresh:
+    each non-empty index must have documents with the field
+    Args:
+        update_time_field (str): the name of the update time field
+
+    Returns: True if the field is available in all the datatake indices
+
+    """
+    elastic = elastic_client.get_elastic_client()
+    for index in DATATAKE_INDICES:
+        if elastic.count(index, body={"query": {"match_all": {}}})['count'] == 0:
+            continue
+        if elastic.count(index, body={"query": {"exists": {"field": update_time_field}}})['count'] == 0:
+            logger.warning("No document in index %s with field %s", index, update_time_field)
+            return False
+    return True
+
+
 def _get_cds_datatakes(start_date: datetime, end_date: datetime):
     end_date_str = end_date.strftime('%d-%m-%Y')
     start_date_str = start_date.strftime('%d-%m-%Y')
@@ -122,84 +289,70 @@ def _get_cds_datatakes(start_date: datetime, end_date: datetime):
 
 def _get_cds_s1s2_datatakes(start_date, end_date):
     """
-        Fetch the datatakes of S1 and S2 missions in the last 3 months from Elastic DB using the exposed REST APIs. The
-        start time is set at 00:00:00 of the first day of the temporal interval; the stop time is set at 23:59:59.
+        Fetch the datatakes of S1 and S2 missions in the interval, and calculate their completeness
         """
+    return datatakes_completeness.build_s1s2_datatakes(_get_cds_s1s2_datatake_records(start_date, end_date))
 
-    results = []
-    try:
-
-        # Define start and end dates range
-        start_date = datetime.strptime(start_date, '%d-%m-%Y')
-        end_date = datetime.strptime(end_date, '%d-%m-%Y')
-
-        # Auxiliary variable declaration
-        indices = ["cds-datatake"]
-        elastic = elastic_client.ElasticClient()
-
-        # Fetch results from Elastic database
-        for index in indices:
-            try:
-                result = elastic.query_date_range_selected_fields(index=index,
-                                                                  date_key='observation_time_start',
-                                                                  from_date=start_date,
-                                                                  to_date=end_date,
-                                                                  selected_fields=['key', 'datatake_id',
-                                                                                   'satellite_unit',
-                                                                                   'observation_time_start',
-                                                                                   'observation_time_stop',
-                                                                                   'l0_sensing_duration',
-                                                                                   'instrument_mode',
-                                                                                   '*_local_percentage',
-                                                                                   'cams_tickets', 'cams_origin',
-                                                                                   'cams_description',
-                                                                                   'last_attached_ticket'])
-
-                # Convert result into array
-                logger.debug("Adding result from cds_s1s2_datatakes query for end date: %s",
-                             end_date)
-                results += result
 
-            except ConnectionError as cex:
-                logger.error("Connection Error: %s", cex)
-                raise cex
+def _get_cds_s3_datatakes(start_date, end_date):
+    """
+        Fetch the products of S3 satellites in the interval, and build the datatakes with their completeness
+        """
+    return datatakes_completeness.build_products_datatakes(
+        _get_cds_completeness_products('cds-s3-completeness', start_date, end_date), 'S3')
 
-            except Exception as ex:
-                logger.warning("(cds_s1s2_datatakes) Received Elastic error for index: %s", index)
-                logger.error(ex)
 
-    except Exception as ex:
-        logger.error(ex)
+def _get_cds_s5_datatakes(start_date, end_date):
+    """
+        Fetch the products of S5p satellite in the interval, and build the datatakes with their completeness
+        """
+    return datatakes_completeness.build_products_datatakes(
+        _get_cds_completeness_products('cds-s5-completeness', start_date, end_date), 'S5')
 
-    # Calculate completeness for every datatakes
-    for dt in results:
-        dt_id = dt['_id']
-        completeness = {}
-        if 'S1A' in dt_id:
-            completeness = _calc_s1_datatake_completeness(dt)
-        elif 'S2' in dt_id:
-            completeness = _calc_s2_datatake_completeness(dt)
-        for key in list(dt['_source']):
-            if key.endswith('local_percentage'):
-                dt['_source'].pop(key)
-        dt['_source']['datatake_id'] = dt_id
-        if 'L0_' in completeness:
-            dt['_source']['L0_'] = completeness['L0_']
-        if 'L1_' in completeness:
-            dt['_source']['L1_'] = completeness['L1_']
-        if 'L2_' in completeness:
-            dt['_source']['L2_'] = completeness['L2_']
-
-        # Calculate and append the completeness status
-        dt['_source']['completeness_status'] = _calc_datatake_completeness_status(dt['_source'])
 
-    # Return the response
-    return results
+def _get_cds_datatake_records(start_date: datetime, end_date: datetime, updated_since=None, strict=False):
+    """
+    Fetch the documents needed to build the datatakes observed in the interval
+    Args:
+        start_date (datetime): beginning of the interval (the whole day is included)
+        end_date (datetime): end of the interval (the whole day is included)
+        updated_since (datetime): if specified, only the documents updated after this (UTC) time are retrieved
+        strict (bool): if True, Elastic errors are raised instead of returning the documents retrieved so far
 
+    Returns: a tuple (S1/S2 datatake records, S3 products, S5 products)
 
-def _get_cds_s3_datatakes(start_date, end_date):
     """
-        Fetch the datatakes of S3 satellites in the last 3 months from Elastic DB using the exposed REST APIs. The
+    end_date_str = end_date.strftime('%d-%m-%Y')
+    start_date_str = start_date.strftime('%d-%m-%Y')
+    return (_get_cds_s1s2_datatake_records(start_date_str, end_date_str, updated_since, strict),
+            _get_cds_completeness_products('cds-s3-completeness', start_date_str, end_date_str,
+                                           updated_since, strict),
+            _get_cds_completeness_products('cds-s5-completeness', start_date_str, end_date_str,
+                                           updated_since, strict))
+
+
+def _query_datatake_documents(elastic, index, start_date, end_date, selected_fields, updated_since=None):
+    start_date_str, end_date_str = elastic.date_interval_to_elastic_range(start_date, end_date)
+    query = {"range": {
+        'observation_time_start': {
+            'gte': start_date_str,
+            'lt': end_date_str
+        }
+    }}
+    if updated_since is not None:
+        query = {"bool": {"must": [
+            query,
+            {"range": {get_update_time_field(): {'gte': updated_since.strftime(ELASTIC_TIME_FORMAT)}}}
+        ]}}
+    return elastic.query_scan(index=index,
+                              query={
+                                  "query": query,
+                                  "_source": selected_fields})
+
+
+def _get_cds_s1s2_datatake_records(start_date, end_date, updated_since=None, strict=False):
+    """
+        Fetch the datatakes of S1 and S2 missions in the last 3 months from Elastic DB using the exposed REST APIs. The
         start time is set at 00:00:00 of the first day of the temporal interval; the stop time is set at 23:59:59.
         """
 
@@ -211,27 +364,28 @@ def _get_cds_s3_datatakes(start_date, end_date):
         end_date = datetime.strptime(end_date, '%d-%m-%Y')
 
         # Auxiliary variable declaration
-        indices = ['cds-s3-completeness']
-        elastic = elastic_client.ElasticClient()
+        indices = ["cds-datatake"]
+        elastic = elastic_client.get_elastic_client()
 
-        # Fetch results (products) from Elastic database
-        # Mission-Completeness Index
+        # Fetch results from Elastic database
         for index in indices:
             try:
-                result = elastic.query_date_range_selected_fields(index=index,
-                                                                  date_key='observation_time_start',
-                                                                  from_date=start_date,
-                                                                  to_date=end_date,
-                                                                  selected_fields=['datatake_id', 'satellite_unit',
-                                                                                   'observation_time_start',
-                                                                                   'observation_time_stop',
-                                                                                   'product_level', 'product_type',
-                                                                                   'status', 'percentage',
-                                                                                   'cams_tickets', 'cams_origin',
-                                                                                   'cams_description',
-                                                                                   'last_attached_ticket'])
+                result = _query_datatake_documents(elastic, index, start_date, end_date,
+                                                   ['key', 'datatake_id',
+                                                    'satellite_unit',
+                                                    'observation_time_start',
+                                                    'observation_time_stop',
+                                                    'l0_sensing_duration',
+                                                    'instrument_mode',
+                                                    '*_local_percentage',
+                                                    'cams_tickets', 'cams_origin',
+                                                    'cams_description',
+                                                    'last_attached_ticket'],
+                                                   updated_since)
+
                 # Convert result into array
-                logger.debug("Adding result from cds_s3_datatakes query")
+                logger.debug("Adding result from cds_s1s2_datatakes query for end date: %s",
+                             end_date)
                 results += result
 
             except ConnectionError as cex:
@@ -239,66 +393,24 @@ def _get_cds_s3_datatakes(start_date, end_date):
                 raise cex
 
             except Exception as ex:
-                logger.warning("(cds_s3_datatakes) Received Elastic error for index: %s", index)
-
+                logger.warning("(cds_s1s2_datatakes) Received Elastic error for index: %s", index)
                 logger.error(ex)
+                if strict:
+                    raise ex
 
     except Exception as ex:
         logger.error(ex)
+        if strict:
+            raise ex
 
-    # Group S3 products according to datatake instances
-    prod_dict = {}
-    for prod in results:
-        dt_id = prod['_source']['datatake_id']
-        # prod_dict.setdefault(dt_id, []).append(prod)
-        if dt_id not in prod_dict:
-            prod_dict[dt_id] = []
-        prod_dict[dt_id].append(prod)
-
-    # Build and collect datatake instances
-    datatakes = []
-    for dt_id, dt_prods in prod_dict.items():
-        datatake = {'_source': {}}
-        datatake['_source']['datatake_id'] = dt_id
-        datatake['_source']['satellite_unit'] = dt_id[0: 3]
-        datatake['_source']['instrument_mode'] = dt_prods[0]['_source']['product_type'][5: 8]
-        observation_window = _calc_s3_s5_datatake_observation_window(dt_prods)
-        datatake['_source']['observation_time_start'] = observation_window['observation_time_start']
-        datatake['_source']['observation_time_stop'] = observation_window['observation_time_stop']
-        completeness = _calc_s3_datatake_completeness(dt_prods)
-        if 'L0_' in completeness:
-            datatake['_source']['L0_'] = completeness['L0_']
-        if 'L1_' in completeness:
-            datatake['_source']['L1_'] = completeness['L1_']
-        if 'L2_' in completeness:
-            datatake['_source']['L2_'] = completeness['L2_']
-
-        # Calculate and append the completeness status
-        datatake['_source']['completeness_status'] = _calc_datatake_completeness_status(datatake['_source'])
-
-        # Append CAMS related information
-        for prod in dt_prods:
-            prod_info = prod['_source']
-            if 'cams_tickets' in prod_info:
-                datatake['_source']['cams_tickets'] = prod_info['cams_tickets']
-            if 'cams_origin' in prod_info:
-                datatake['_source']['cams_origin'] = prod_info['cams_origin']
-            if 'cams_description' in prod_info:
-                datatake['_source']['cams_description'] = prod_info['cams_description']
-            if 'last_attached_ticket' in prod_info:
-                datatake['_source']['last_attached_ticket'] = prod_info['last_attached_ticket']
-
-        # Append the datatake in the list
-        datatakes.append(datatake)
-
-    # Return the datatakes list
-    return datatakes
+    # Return the response
+    return results
 
 
-def _get_cds_s5_datatakes(start_date, end_date):
+def _get_cds_completeness_products(index, start_date, end_date, updated_since=None, strict=False):
     """
-        Fetch the datatakes of S5p satellite in the last 3 months from Elastic DB using the exposed REST APIs. The
-        start time is set at 00:00:00 of the first day of the temporal interval; the stop time is set at 23:59:59.
+        Fetch the products of S3 or S5p satellites in the last 3 months from Elastic DB using the exposed REST APIs.
+        The start time is set at 00:00:00 of the first day of the temporal interval; the stop time is set at 23:59:59.
         """
 
     results = []
@@ -309,332 +421,41 @@ def _get_cds_s5_datatakes(start_date, end_date):
         end_date = datetime.strptime(end_date, '%d-%m-%Y')
 
         # Auxiliary variable declaration
-        indices = ['cds-s5-completeness']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results (products) from Elastic database
-        for index in indices:
-            try:
-                result = elastic.query_date_range_selected_fields(index=index,
-                                                                  date_key='observation_time_start',
-                                                                  from_date=start_date,
-                                                                  to_date=end_date,
-                                                                  selected_fields=['datatake_id', 'satellite_unit',
-                                                                                   'observation_time_start',
-                                                                                   'observation_time_stop',
-                                                                                   'product_level', 'product_type',
-                                                                                   'status', 'percentage',
-                                                                                   'cams_tickets', 'cams_origin',
-                                                                                   'cams_description',
-                                                                                   'last_attached_ticket'])
-                # Convert result into array
-                logger.debug("Adding result from cds_s5_datatakes query")
-                results += result
-
-            except ConnectionError as cex:
-                logger.error("Connection Error: %s", cex)
-
-            except Exception as ex:
-                logger.warning("(cds_s5_datatakes) Received Elastic error for index: %s", index)
-                logger.error(ex)
+        # Mission-Completeness Index
+        try:
+            result = _query_datatake_documents(elastic, index, start_date, end_date,
+                                               ['datatake_id', 'satellite_unit',
+                                                'observation_time_start',
+                                                'observation_time_stop',
+                                                'product_level', 'product_type',
+                                                'status', 'percentage',
+                                                'cams_tickets', 'cams_origin',
+                                                'cams_description',
+                                                'last_attached_ticket'],
+                                               updated_since)
+            # Convert result into array
+            logger.debug("Adding result from %s query", index)
+            results += result
+
+        except ConnectionError as cex:
+            logger.error("Connection Error: %s", cex)
+            raise cex
+
+        except Exception as ex:
+            logger.warning("Received Elastic error for index: %s", index)
+            logger.error(ex)
+            if strict:
+                raise ex
 
     except Exception as ex:
         logger.error(ex)
+        if strict:
+            raise ex
 
-    # Group S5 products according to datatake instances
-    # Group datatake products
-    prod_dict = {}
-    for prod in results:
-        dt_id = prod['_source']['datatake_id']
-        # prod_dict.setdefault(dt_id, []).append(prod)
-        if dt_id not in prod_dict:
-            prod_dict[dt_id] = []
-        prod_dict[dt_id].append(prod)
-
-    # Build and collect datatake instances
-    datatakes = []
-    for dt_id, dt_prods in prod_dict.items():
-        datatake = {'_source': {}}
-        datatake['_source']['datatake_id'] = dt_id
-        datatake['_source']['satellite_unit'] = dt_id[0: 3]
-        datatake['_source']['instrument_mode'] = dt_prods[0]['_source']['product_type'][5: 8]
-        observation_window = _calc_s3_s5_datatake_observation_window(dt_prods)
-        datatake['_source']['observation_time_start'] = observation_window['observation_time_start']
-        datatake['_source']['observation_time_stop'] = observation_window['observation_time_stop']
-        completeness = _calc_s5_datatake_completeness(dt_prods)
-        if 'L0_' in completeness:
-            datatake['_source']['L0_'] = completeness['L0_']
-        if 'L1_' in completeness:
-            datatake['_source']['L1_'] = completeness['L1_']
-        if 'L2_' in completeness:
-            datatake['_source']['L2_'] = completeness['L2_']
-
-        # Calculate and append the completeness status
-        datatake['_source']['completeness_status'] = _calc_datatake_completeness_status(datatake['_source'])
-
-        # Append CAMS related information
-        for prod in dt_prods:
-            prod_info = prod['_source']
-            if 'cams_tickets' in prod_info:
-                datatake['_source']['cams_tickets'] = prod_info['cams_tickets']
-            if 'cams_origin' in prod_info:
-                datatake['_source']['cams_origin'] = prod_info['cams_origin']
-            if 'cams_description' in prod_info:
-                datatake['_source']['cams_description'] = prod_info['cams_description']
-            if 'last_attached_ticket' in prod_info:
-                datatake['_source']['last_attached_ticket'] = prod_info['last_attached_ticket']
-
-        # Append the datatake in the list
-        datatakes.append(datatake)
-
-    # Return the datatakes list
-    return datatakes
-
-
-def _calc_s1_datatake_completeness(datatake):
-    """
-        Calculate the completeness of S1 datatakes.
-        """
-
-    dt_id = datatake['_id']
-    completeness = {'datatakeID': dt_id}
-    keys = datatake['_source'].keys()
-    l0_count = 0
-    l0_perc = 0
-    l1_count = 0
-    l1_perc = 0
-    l2_count = 0
-    l2_perc = 0
-
-    # TODO: Replace with RE matching
-    # TODO: Matching strings for Levels depends on mission
-    for key in keys:
-        if ('_0C_' in key or '_0S_' in key or '_0A_' in key or '_0N_' in key) and ('percentage' in key):
-            l0_count += 1
-            l0_perc += datatake['_source'][key]
-        elif ('_1A_' in key or '_1S_' in key) and ('percentage' in key):
-            l1_count += 1
-            l1_perc += datatake['_source'][key]
-        elif ('_2A_' in key or '_2S_' in key) and ('percentage' in key):
-            l2_count += 1
-            l2_perc += datatake['_source'][key]
-    if l0_count != 0:
-        completeness['L0_'] = l0_perc / l0_count
-    if l1_count != 0:
-        completeness['L1_'] = l1_perc / l1_count
-    if l2_count != 0:
-        completeness['L2_'] = l2_perc / l2_count
-    return completeness
-
-
-def _calc_s2_datatake_completeness(datatake):
-    """
-        Calculate the completeness of S2 datatakes.
-        """
-
-    dt_id = datatake['_id']
-    completeness = {'datatakeID': dt_id}
-    keys = datatake['_source'].keys()
-    l0_count = 0
-    l0_perc = 0
-    l1_count = 0
-    l1_perc = 0
-    l2_count = 0
-    l2_perc = 0
-    for key in keys:
-        if ('L0_' in key) and ('percentage' in key):
-            l0_count += 1
-            l0_perc += datatake['_source'][key]
-        elif ('L1B_' in key or 'L1C_' in key) and ('percentage' in key):
-            l1_count += 1
-            l1_perc += datatake['_source'][key]
-        elif ('L2A_' in key or '_2S_' in key) and ('percentage' in key):
-            l2_count += 1
-            l2_perc += datatake['_source'][key]
-    if l0_count != 0:
-        completeness['L0_'] = l0_perc / l0_count
-    if l1_count != 0:
-        completeness['L1_'] = l1_perc / l1_count
-    if l2_count != 0:
-        completeness['L2_'] = l2_perc / l2_count
-    return completeness
-
-
-def _calc_s3_datatake_completeness(prod_list):
-    """
-    Calculate the completeness of S3 datatakes, given the global list of products and
-    considering only the relevant product types.
-    """
-    mission_level_ids = level_ids['S3']
-
-    dt_id = prod_list[0]['_source']['datatake_id']
-    completeness = {'datatakeID': dt_id}
-    l0_count = 0
-    l0_perc = 0
-    l1_count = 0
-    l1_perc = 0
-    l2_count = 0
-    l2_perc = 0
-    mission = 'S3'
-    for prod in prod_list:
-        if 'L0_' in prod['_source']['product_level'] and 'percentage' in prod['_source']:
-            l0_count += 1
-            l0_perc += prod['_source']['percentage']
-        elif 'L1_' in prod['_source']['product_level'] and 'percentage' in prod['_source']:
-            l1_count += 1
-            l1_perc += prod['_source']['percentage']
-        elif 'L2_' in prod['_source']['product_level'] and 'percentage' in prod['_source']:
-            l2_count += 1
-            l2_perc += prod['_source']['percentage']
-    if l0_count != 0:
-        completeness['L0_'] = l0_perc / l0_count
-    if l1_count != 0:
-        completeness['L1_'] = l1_perc / l1_count
-    if l2_count != 0:
-        completeness['L2_'] = l2_perc / l2_count
-    return completeness
-
-
-def _calc_s5_datatake_completeness(prod_list):
-    """
-    Calculate the completeness of S3 and S5p datatakes, given the global list of products and
-    the product types of interest.
-    """
-    mission_level_ids = level_ids['S5']
-
-    dt_id = prod_list[0]['_source']['datatake_id']
-    completeness = {'datatakeID': dt_id}
-    l0_count = 0
-    l0_perc = 0
-    l1_count = 0
-    l1_perc = 0
-    l2_count = 0
-    l2_perc = 0
-    for prod in prod_list:
-        if mission_level_ids['L0_'] in prod['_source']['product_level'] and 'percentage' in prod['_source']:
-            l0_count += 1
-            l0_perc += prod['_source']['percentage']
-        elif mission_level_ids['L1_'] in prod['_source']['product_level'] and 'percentage' in prod['_source']:
-            l1_count += 1
-            l1_perc += prod['_source']['percentage']
-        elif mission_level_ids['L2_'] in prod['_source']['product_level'] and 'percentage' in prod['_source']:
-            l2_count += 1
-            l2_perc += prod['_source']['percentage']
-    if l0_count != 0:
-        completeness['L0_'] = l0_perc / l0_count
-    if l1_count != 0:
-        completeness['L1_'] = l1_perc / l1_count
-    if l2_count != 0:
-        completeness['L2_'] = l2_perc / l2_count
-    return completeness
-
-
-def _calc_datatake_completeness_status(datatake):
-    """
-    Computes Completeness status With two group of values:
-    ACQ completeness
-    PUB completeness
-    The status is expressed with a string, and includes the numeric value
-
-    Args:
-        datatake (): a dictionary representing a datatake, cinluding a
-        list of completeness values for L0/L1/L2 levels (in form of dictionary)
-
-    Returns: No Return: completeness status information is added to datatake
-    dictionary
-    """
-
-    # Auxiliary variables declaration
-    completeness_status = {'ACQ': {'status': '', 'percentage': 0},
-                           'PUB': {'status': '', 'percentage': 0}
-                           }
-
-    completeness_threshold = 90.0
-
-    dt_level_completeness = datatake
-    dt_sat_unit = datatake['satellite_unit']
-    dt_mission = satellites_mission_map.get(dt_sat_unit)
-    time_threshold = mission_time_thresholds[dt_mission]
-    failure_threshold = 10
-
-    # Read Current Time in comparison with sensing stop time
-    now = datetime.now()
-    sensing_stop = datetime.strptime(datatake['observation_time_stop'], ELASTIC_TIME_FORMAT)
-
-    # If the current date is before the sensing time stop, the status is PLANNED - move to the next record
-    if now <= sensing_stop:
-        completeness_status['ACQ']['status'] = 'PLANNED'
-        completeness_status['ACQ']['percentage'] = 0
-        completeness_status['PUB']['status'] = 'PLANNED'
-        completeness_status['PUB']['percentage'] = 0
-        return completeness_status
-
-    # Set the ACQ completeness percentage
-    # Manage rare events when L0 is not present, but L1 or L2 are available instead, i.e. for S5P datatakes
-    if 'L0_' in dt_level_completeness:
-        completeness_status['ACQ']['percentage'] = dt_level_completeness['L0_']
-    elif 'L1_' in dt_level_completeness:
-        completeness_status['ACQ']['percentage'] = dt_level_completeness['L1_']
-    elif 'L2_' in dt_level_completeness:
-        completeness_status['ACQ']['percentage'] = dt_level_completeness['L2_']
-    else:
-        completeness_status['ACQ']['percentage'] = 0
-
-    # Set the PUB completeness percentage
-    count = 0
-    perc = 0
-    if 'L0_' in dt_level_completeness:
-        count += 1
-        perc += dt_level_completeness['L0_']
-    if 'L1_' in dt_level_completeness:
-        count += 1
-        perc += dt_level_completeness['L1_']
-    if 'L2_' in dt_level_completeness:
-        count += 1
-        perc += dt_level_completeness['L2_']
-    completeness_status['PUB']['percentage'] = perc / count if count > 0 else 0.0
-
-    # Override the ACQ completeness percentage when it is lower than the PUB percentage
-    if completeness_status['ACQ']['percentage'] < completeness_status['PUB']['percentage']:
-        completeness_status['ACQ']['percentage'] = completeness_status['PUB']['percentage']
-
-    # If the current date is within the defined time threshold w.r.t. the sensing stop time,
-    # the ACQ and PUB status are set to PROCESSING - move to the next record
-    sensing_elapsed_time = now - sensing_stop
-    if sensing_elapsed_time < timedelta(hours=time_threshold):
-        completeness_status['ACQ']['status'] = 'ACQUIRED' if completeness_status['ACQ'][
-                                                                 'percentage'] > completeness_threshold else 'PROCESSING'
-        completeness_status['PUB']['status'] = 'PUBLISHED' if completeness_status['PUB'][
-                                                                  'percentage'] > completeness_threshold else 'PROCESSING'
-        return completeness_status
-
-    # If the current date is within an increased time threshold w.r.t. the sensing stop time and the
-    # completeness is below the completeness_threshold, it is likely that we are experiencing a delay in the processing.
-    # In this case, the ACQ and PUB status are set to DELAYED - move to the next record
-    if (sensing_elapsed_time < timedelta(hours=time_threshold * 1.2)) and (
-            completeness_status['PUB']['percentage'] < completeness_threshold):
-        completeness_status['ACQ']['status'] = 'ACQUIRED' if completeness_status['ACQ'][
-                                                                 'percentage'] > completeness_threshold else 'DELAYED'
-        completeness_status['PUB']['status'] = 'DELAYED'
-        return completeness_status
-
-    # In all other cases, if the completion percentage is below 90%, the status is partial;
-    # If the completion percentage is below 5%, the product is assumed to be lost
-    if completeness_status['ACQ']['percentage'] >= completeness_threshold:
-        completeness_status['ACQ']['status'] = 'ACQUIRED'
-    elif failure_threshold <= completeness_status['ACQ']['percentage'] < completeness_threshold:
-        completeness_status['ACQ']['status'] = 'PARTIAL'
-    else:
-        completeness_status['ACQ']['status'] = 'LOST'
-
-    if completeness_status['PUB']['percentage'] >= completeness_threshold:
-        completeness_status['PUB']['status'] = 'PUBLISHED'
-    elif failure_threshold <= completeness_status['PUB']['percentage'] < completeness_threshold:
-        completeness_status['PUB']['status'] = 'PARTIAL'
-    else:
-        completeness_status['PUB']['status'] = 'LOST'
-
-    return completeness_status
+    return results
 
 
 def _calc_s3_s5_datatake_observation_window(prod_list):
@@ -681,9 +502,10 @@ def _refresh_anomalies_status(dt_last_quarter):
     # Retrieve the anomalies in a sliding window, from today and up to 3 months in the past
     list_anomalies = anomalies_ingestor.AnomaliesIngestor().get_anomalies_elastic()
 
-    # Loop over all retrieved anomalies, and save or update them considering the impact on production
+    # Loop over all retrieved anomalies, and update them considering the impact on production
+    datatakes_completeness_by_key = {}
     for anomaly in list_anomalies:
-        datatakes_completeness = []
+        anomaly_completeness = []
         if anomaly.get('environment') is not None and len(anomaly.get('environment')) > 0:
             datatake_ids = anomaly.get('environment').split(';')
             for datatake_id in datatake_ids:
@@ -691,12 +513,15 @@ def _refresh_anomalies_status(dt_last_quarter):
                     continue
                 datatake_id_mod = datatake_id.strip().replace('SNP', 'S5P')
                 if datatake_id_mod in total_datatakes_completeness:
-                    datatakes_completeness.append(total_datatakes_completeness[datatake_id_mod])
+                    anomaly_completeness.append(total_datatakes_completeness[datatake_id_mod])
                 else:
                     entry = {'datatakeID': datatake_id_mod}
-                    datatakes_completeness.append(entry)
-        # TODO: What if the anomaly is a new one, that was not saved on DB?
-        anomalies_model.update_datatakes_completeness(key=anomaly['key'], datatakes_completeness=datatakes_completeness)
+                    anomaly_completeness.append(entry)
+        datatakes_completeness_by_key[anomaly['key']] = anomaly_completeness
+    # TODO: What if the anomaly is a new one, that was not saved on DB?
+    result = anomalies_model.update_datatakes_completeness_many(datatakes_completeness_by_key)
+    if result is not None:
+        logger.debug("Anomalies datatakes completeness: %d updated, %d unchanged", result.updated, result.unchanged)
     logger.debug("[END] Refreshing Anomalies Status")
 
 
@@ -710,7 +535,7 @@ def _get_cds_s1s2_datatake_details(datatake_id):
 
         # Auxiliary variable declaration
         indices = ["cds-datatake"]
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         sel_keys = ['key', 'timeliness', 'satellite_unit', 'absolute_orbit', 'polarization', 'instrument_mode',
                     'sensing_global_percentage', 'cams_tickets', 'cams_origin', 'cams_description',
                     'last_attached_ticket', 'observation_time_start', 'observation_time_stop',
@@ -749,7 +574,7 @@ def _get_cds_s3_datatake_details(datatake_id):
 
         # Auxiliary variable declaration
         indices = ['cds-s3-completeness']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results (products) from Elastic database
         for index in indices:
@@ -806,7 +631,7 @@ def _get_cds_s5_datatake_details(datatake_id):
 
         # Auxiliary variable declaration
         indices = ["cds-s5-completeness"]
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results from Elastic database
         for index in indices:
@@ -0,0 +1,377 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) - ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+level_ids = {
+    'S3': {
+        'L0_': 'L0_',
+        'L1_': 'L1_',
+        'L2_': 'L2_'
+    },
+    'S5': {
+        'L0_': 'L0_',
+        'L1_': 'L1B',
+        'L2_': 'L2_'
+    }
+}
+
+satellites_mission_map = {
+    'S1A': 'S1',
+    'S1B': 'S1',
+    'S2A': 'S2',
+    'S2B': 'S2',
+    'S3A': 'S3',
+    'S3B': 'S3',
+    'S5P': 'S5'
+}
+
+mission_time_thresholds = {
+    'S1': 8,
+    'S2': 10,
+    'S3': 696,
+    'S5': 48
+}
+
+LEVELS = ('L0_', 'L1_', 'L2_')
+
+# Substrings of local percentage field names identifying the product level, for S1 and S2 datatakes
+s1s2_level_patterns = {
+    'S1': (('_0C_', '_0S_', '_0A_', '_0N_'), ('_1A_', '_1S_'), ('_2A_', '_2S_')),
+    'S2': (('L0_',), ('L1B_', 'L1C_'), ('L2A_', '_2S_'))
+}
+
+# Product types not considered in the computation of S3 and S5 observation window
+OBSERVATION_WINDOW_ESCAPE_SEQ = ('DO', 'NAV', 'GM', 'TN', 'HKM', 'HKM2', 'OPER')
+
+MAX_OBSERVATION_WINDOW = timedelta(minutes=97)
+
+COMPLETENESS_THRESHOLD = 90.0
+
+FAILURE_THRESHOLD = 10
+
+NO_LEVEL = -1
+
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def elastic_times_to_epoch(time_strings):
+    """
+    Convert times in Elastic format to integers
+    Args:
+        time_strings (): sequence of time strings, in format '%Y-%m-%dT%H:%M:%S.%fZ'
+
+    Returns: a numpy array of microseconds since epoch
+
+    """
+    if len(time_strings) == 0:
+        return np.zeros(0, dtype=np.int64)
+    times = np.char.rstrip(np.asarray(time_strings, dtype=str), 'Z')
+    return times.astype('datetime64[us]').astype(np.int64)
+
+
+def epoch_to_elastic_times(epoch_us):
+    """
+    Format times in microseconds since epoch as done for S3 and S5 datatakes observation window
+    Args:
+        epoch_us (): numpy array of microseconds since epoch
+
+    Returns: a list of time strings, in format '%Y-%m-%dT%H:%M:%S.%fZ', with milliseconds precision if exact
+
+    """
+    time_strings = np.datetime_as_string(epoch_us.astype('datetime64[us]'), unit='us').tolist()
+    return [(time_string + 'Z').replace('000Z', 'Z') for time_string in time_strings]
+
+
+def _level_completeness(group_codes, level_codes, percentages, num_groups):
+    """
+    Average the percentages of the products of each group, level by level
+    Args:
+        group_codes (): array with the group (datatake) index of each product
+        level_codes (): array with the level index of each product, NO_LEVEL if not counted
+        percentages (): array with the percentage of each product
+        num_groups (int): the number of groups
+
+    Returns: a (num_groups, number of levels) float array; NaN where no product of the level is present
+
+    """
+    completeness = np.full((num_groups, len(LEVELS)), np.nan)
+    for level_idx in range(len(LEVELS)):
+        level_mask = level_codes == level_idx
+        # bincount adds the weights following the products order: sums match a sequential loop
+        level_sum = np.bincount(group_codes[level_mask], weights=percentages[level_mask], minlength=num_groups)
+        level_count = np.bincount(group_codes[level_mask], minlength=num_groups)
+        present = level_count > 0
+        completeness[present, level_idx] = level_sum[present] / level_count[present]
+    return completeness
+
+
+def _set_level_completeness(sources, completeness):
+    for source, dt_completeness in zip(sources, completeness.tolist()):
+        for level, value in zip(LEVELS, dt_completeness):
+            if value == value:
+                source[level] = value
+
+
+def set_completeness_status(sources, now=None):
+    """
+    Compute, for a list of datatakes, the Completeness status With two group of values:
+    ACQ completeness
+    PUB completeness
+    The status is expressed with a string, and includes the numeric value
+
+    Args:
+        sources (): list of datatakes (_source dictionaries), including the completeness
+            values for L0/L1/L2 levels on fields 'L0_', 'L1_', 'L2_'
+        now (datetime): reference time; current time if not specified
+
+    Returns: No Return: completeness status information is added to each datatake on
+        field 'completeness_status'
+    """
+    if not sources:
+        return
+    _set_completeness_status(sources,
+                             elastic_times_to_epoch([source['observation_time_stop'] for source in sources]),
+                             now)
+
+
+def _set_completeness_status(sources, sensing_stop, now=None):
+    if now is None:
+        now = datetime.now()
+    now_us = np.datetime64(now, 'us').astype(np.int64)
+
+    # Columns: level completeness, mission time thresholds
+    levels = np.array([[source.get(level, np.nan) for level in LEVELS] for source in sources], dtype=float)
+    mission_thresholds = {}
+    for mission, time_threshold in mission_time_thresholds.items():
+        mission_thresholds[mission] = (timedelta(hours=time_threshold) // ONE_MICROSECOND,
+                                       timedelta(hours=time_threshold * 1.2) // ONE_MICROSECOND)
+    thresholds = np.array([mission_thresholds[satellites_mission_map.get(source['satellite_unit'])]
+                           for source in sources], dtype=np.int64)
+
+    present = ~np.isnan(levels)
+    level_count = present.sum(axis=1)
+    has_level = level_count > 0
+
+    # ACQ percentage: first available level; PUB percentage: average of available levels
+    acq_percentage = np.where(present[:, 0], levels[:, 0],
+                              np.where(present[:, 1], levels[:, 1],
+                                       np.where(present[:, 2], levels[:, 2], 0.0)))
+    zero_filled = np.where(present, levels, 0.0)
+    level_sum = zero_filled[:, 0] + zero_filled[:, 1] + zero_filled[:, 2]
+    pub_percentage = np.where(has_level, level_sum / np.maximum(level_count, 1), 0.0)
+    acq_percentage = np.where(acq_percentage < pub_percentage, pub_percentage, acq_percentage)
+
+    # Status codes, evaluated in order of precedence
+    elapsed = now_us - sensing_stop
+    planned = now_us <= sensing_stop
+    processing = ~planned & (elapsed < thresholds[:, 0])
+    delayed = ~planned & ~processing & (elapsed < thresholds[:, 1]) & (pub_percentage < COMPLETENESS_THRESHOLD)
+    acq_above = acq_percentage > COMPLETENESS_THRESHOLD
+    pub_above = pub_percentage > COMPLETENESS_THRESHOLD
+    acq_complete = acq_percentage >= COMPLETENESS_THRESHOLD
+    pub_complete = pub_percentage >= COMPLETENESS_THRESHOLD
+    acq_partial = ~acq_complete & (acq_percentage >= FAILURE_THRESHOLD)
+    pub_partial = ~pub_complete & (pub_percentage >= FAILURE_THRESHOLD)
+
+    acq_status = np.select([planned,
+                            processing & acq_above, processing,
+                            delayed & acq_above, delayed,
+                            acq_complete, acq_partial],
+                           ['PLANNED', 'ACQUIRED', 'PROCESSING', 'ACQUIRED', 'DELAYED', 'ACQUIRED', 'PARTIAL'],
+                           'LOST')
+    pub_status = np.select([planned,
+                            processing & pub_above, processing,
+                            delayed,
+                            pub_complete, pub_partial],
+                           ['PLANNED', 'PUBLISHED', 'PROCESSING', 'DELAYED', 'PUBLISHED', 'PARTIAL'],
+                           'LOST')
+
+    for source, is_planned, is_measured, acq_status_i, acq_perc_i, pub_status_i, pub_perc_i in zip(
+            sources, planned.tolist(), has_level.tolist(),
+            acq_status.tolist(), acq_percentage.tolist(), pub_status.tolist(), pub_percentage.tolist()):
+        if is_planned:
+            acq_perc_i = 0
+            pub_perc_i = 0
+        elif not is_measured:
+            acq_perc_i = 0
+        source['completeness_status'] = {'ACQ': {'status': acq_status_i, 'percentage': acq_perc_i},
+                                         'PUB': {'status': pub_status_i, 'percentage': pub_perc_i}
+                                         }
+
+
+def _s1s2_key_level(mission, key):
+    if 'percentage' not in key:
+        return NO_LEVEL
+    for level_idx, patterns in enumerate(s1s2_level_patterns[mission]):
+        if any(pattern in key for pattern in patterns):
+            return level_idx
+    return NO_LEVEL
+
+
+def build_s1s2_datatakes(records):
+    """
+    Calculate the completeness of S1 and S2 datatakes records, as retrieved from Elastic DB:
+    the local percentages of the products are replaced by the completeness of each level,
+    and by the completeness status
+    Args:
+        records (): list of datatake records
+
+    Returns: the list of records, updated
+
+    """
+    key_levels = {}
+    group_codes = []
+    level_codes = []
+    percentages = []
+    for dt_idx, dt in enumerate(records):
+        dt_id = dt['_id']
+        if 'S1A' in dt_id:
+            mission = 'S1'
+        elif 'S2' in dt_id:
+            mission = 'S2'
+        else:
+            continue
+        dt_source = dt['_source']
+        for key in dt_source:
+            level_idx = key_levels.get((mission, key))
+            if level_idx is None:
+                level_idx = key_levels.setdefault((mission, key), _s1s2_key_level(mission, key))
+            if level_idx != NO_LEVEL:
+                group_codes.append(dt_idx)
+                level_codes.append(level_idx)
+                percentages.append(dt_source[key])
+    completeness = _level_completeness(np.array(group_codes, dtype=np.int64),
+                                       np.array(level_codes, dtype=np.int64),
+                                       np.array(percentages, dtype=float),
+                                       len(records))
+
+    sources = []
+    for dt in records:
+        dt_source = dt['_source']
+        for key in [key for key in dt_source if key.endswith('local_percentage')]:
+            dt_source.pop(key)
+        dt_source['datatake_id'] = dt['_id']
+        sources.append(dt_source)
+    _set_level_completeness(sources, completeness)
+    set_completeness_status(sources)
+    return records
+
+
+def _product_level(mission_level_ids, product_level):
+    for level_idx, level_id in enumerate(mission_level_ids):
+        if level_id in product_level:
+            return level_idx
+    return NO_LEVEL
+
+
+def build_products_datatakes(products, mission):
+    """
+    Group S3 or S5 products according to datatake instances, and build the datatakes,
+    computing completeness, observation window and completeness status of all datatakes at once
+    Args:
+        products (): list of product records, as retrieved from the mission completeness index
+        mission (str): 'S3' or 'S5'
+
+    Returns: the list of datatakes, in order of first occurrence in the products list
+
+    """
+    if not products:
+        return []
+    mission_level_ids = [level_ids[mission][level] for level in LEVELS]
+
+    # Columns of the products: level and relevance are evaluated once for each distinct level and type
+    dt_codes = {}
+    product_level_codes = {}
+    product_type_relevance = {}
+    group_codes = np.empty(len(products), dtype=np.int64)
+    level_codes = np.empty(len(products), dtype=np.int64)
+    relevant = np.empty(len(products), dtype=bool)
+    percentages = np.zeros(len(products))
+    time_start = []
+    time_stop = []
+    for prod_idx, prod in enumerate(products):
+        prod_info = prod['_source']
+        group_codes[prod_idx] = dt_codes.setdefault(prod_info['datatake_id'], len(dt_codes))
+        product_level = prod_info['product_level']
+        level_idx = product_level_codes.get(product_level)
+        if level_idx is None:
+            level_idx = product_level_codes.setdefault(product_level,
+                                                       _product_level(mission_level_ids, product_level))
+        # The level is counted only if the percentage is available
+        if 'percentage' in prod_info:
+            level_codes[prod_idx] = level_idx
+            percentages[prod_idx] = prod_info['percentage']
+        else:
+            level_codes[prod_idx] = NO_LEVEL
+        product_type = prod_info['product_type']
+        is_relevant = product_type_relevance.get(product_type)
+        if is_relevant is None:
+            is_relevant = product_type_relevance.setdefault(
+                product_type, not any(escape_seq in product_type for escape_seq in OBSERVATION_WINDOW_ESCAPE_SEQ))
+        relevant[prod_idx] = is_relevant
+        time_start.append(prod_info['observation_time_start'])
+        time_stop.append(prod_info['observation_time_stop'])
+    num_groups = len(dt_codes)
+    dt_ids = list(dt_codes)
+    completeness = _level_completeness(group_codes, level_codes, percentages, num_groups)
+
+    # Observation window: the window starts from the times of the first product of the datatake, and is extended
+    # by the times of the relevant products; the stop time is bounded to the maximum datatake duration
+    time_start = elastic_times_to_epoch(time_start)
+    time_stop = elastic_times_to_epoch(time_stop)
+    _, first_product = np.unique(group_codes, return_index=True)
+    window_start = time_start[first_product]
+    window_stop = time_stop[first_product]
+    np.minimum.at(window_start, group_codes[relevant], time_start[relevant])
+    np.maximum.at(window_stop, group_codes[relevant], time_stop[relevant])
+    has_relevant = np.bincount(group_codes[relevant], minlength=num_groups) > 0
+    bounded_stop = np.minimum(window_stop, window_start + MAX_OBSERVATION_WINDOW // ONE_MICROSECOND)
+    window_stop = np.where(has_relevant, bounded_stop, window_stop)
+
+    # Build and collect datatake instances
+    datatakes = []
+    for dt_id, first_idx, start_str, stop_str in zip(dt_ids, first_product.tolist(),
+                                                      epoch_to_elastic_times(window_start),
+                                                      epoch_to_elastic_times(window_stop)):
+        datatake = {'_source': {}}
+        datatake['_source']['datatake_id'] = dt_id
+        datatake['_source']['satellite_unit'] = dt_id[0: 3]
+        datatake['_source']['instrument_mode'] = products[first_idx]['_source']['product_type'][5: 8]
+        datatake['_source']['observation_time_start'] = start_str
+        datatake['_source']['observation_time_stop'] = stop_str
+        datatakes.append(datatake)
+    sources = [datatake['_source'] for datatake in datatakes]
+    _set_level_completeness(sources, completeness)
+    _set_completeness_status(sources, window_stop)
+
+    # Append CAMS related information: the last product providing each field is taken
+    for prod_idx, prod in enumerate(products):
+        prod_info = prod['_source']
+        dt_source = sources[group_codes[prod_idx]]
+        if 'cams_tickets' in prod_info:
+            dt_source['cams_tickets'] = prod_info['cams_tickets']
+        if 'cams_origin' in prod_info:
+            dt_source['cams_origin'] = prod_info['cams_origin']
+        if 'cams_description' in prod_info:
+            dt_source['cams_description'] = prod_info['cams_description']
+        if 'last_attached_ticket' in prod_info:
+            dt_source['last_attached_ticket'] = prod_info['last_attached_ticket']
+
+    return datatakes
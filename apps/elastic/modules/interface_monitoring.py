@@ -68,7 +68,7 @@ def _get_cds_interface_monitoring(start_date, end_date, service_name):
 
         # Auxiliary variable declaration
         indices = ["cds-interface-status-monitoring"]
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results from Elastic database
         for index in indices:
@@ -11,8 +11,8 @@ disclose in whole or in part, information contained herein except for or on
 behalf of  to fulfill the purpose for which the document was 
 delivered to him.
 """
-import copy
 import logging
+from datetime import timedelta
 from time import perf_counter
 
 from apps.cache.cache import PublicationProductTreeCache
@@ -56,13 +56,44 @@ def _get_publication_base_query(start_date, end_date, mission, publication_servi
     }
 
 
+def _get_product_type_buckets(elastic, index, start_date, end_date, mission, publication_service,
+                              product_types, sub_aggs=None):
+    """
+    Retrieve the publication statistics of all the specified product types with
+    a single terms aggregation on product type.
+
+    Args:
+        elastic (): the Elastic client
+        index (str): the index to be queried
+        start_date (): Start date of the interval for the statistics
+        end_date (): End date of the interval for the statistics
+        mission (str): the mission
+        publication_service (str): the publication service id
+        product_types (list): the product types to be aggregated
+        sub_aggs (dict): optional aggregations computed on each product type bucket
+
+    Returns: a dictionary product type -> aggregation bucket; product types
+    without published products are not included
+
+    """
+    query = _get_publication_base_query(start_date, end_date, mission, publication_service)
+    query["bool"]["must"].append({"terms": {"product_type": list(product_types)}})
+    product_type_aggs = {"terms": {"field": "product_type", "size": max(len(product_types), 1)}}
+    if sub_aggs is not None:
+        product_type_aggs["aggs"] = sub_aggs
+    aggs = {"product_types": product_type_aggs}
+    result = elastic.search(index=index, query=query, aggs=aggs, size=0)
+    return {bucket['key']: bucket
+            for bucket in result['aggregations']['product_types']['buckets']}
+
+
 def get_cds_publication_size_by_mission(start_date, end_date, mission):
     logger.debug(f"[BEG] CDS PUBLICATION VOLUME for mission {mission}, start: {start_date}, end: {end_date}")
     index = 'cds-publication'
-    elastic = elastic_client.ElasticClient()
+    elastic = elastic_client.get_elastic_client()
     results = []
 
-    productLevel_list = PublicationProductTreeCache.load_object(mission).get('levels')
+    level_product_types = PublicationProductTreeCache.product_types(mission)
     publication_service = PublicationProductTreeCache.load_object("current_publication_service")
     aggs = {
         "content_length_sum": {"sum": {"field": "content_length"}}
@@ -70,58 +101,22 @@ def get_cds_publication_size_by_mission(start_date, end_date, mission):
 
     # TIme API
     api_start_time = perf_counter()
+    product_types = sorted({product_type for _, product_type in level_product_types})
+    try:
+        product_type_buckets = _get_product_type_buckets(elastic, index, start_date, end_date,
+                                                         mission, publication_service,
+                                                         product_types, aggs)
+    except Exception as ex:
+        logger.error("Failure on mission %s: %s", mission, ex)
+        return results
 
-    for productLevel, productType_list in productLevel_list.items():
-        for productType in productType_list:
-            query = {
-                "bool": {
-                    "must": [
-                        {
-                            "range": {
-                                "publication_date": {
-                                    "gte": start_date,
-                                    "lte": end_date
-                                }
-                            }
-                        },
-                        {
-                            "term": {
-                                "mission": mission
-                            }
-                        },
-                        {
-                            "term": {
-                                "product_type": productType
-                            }
-                        },
-                        {
-                            "term": {
-                                "service_type": 'DD'
-                            }
-                        },
-                        {
-                            "term": {
-                                "service_id": publication_service
-                            }
-                        }
-                    ]
-                }
-            }
-
-            try:
-                # Make Time Measurement for single query execution
-                query_start_time = perf_counter()
-                result = \
-                    elastic.search(index=index, query=query, aggs=aggs, size=0)['aggregations']['content_length_sum'][
-                        'value']
-                results.append({'index': index, 'mission': mission, 'productLevel': productLevel,
-                                'productType': productType, 'content_length_sum': result})
-                query_end_time = perf_counter()
-                logger.debug(
-                    f"Query for mission {mission}, product_type: {productType}, start: {start_date},  Query Execution Time : {query_end_time - query_start_time:0.6f}")
-            except Exception as ex:
-                logger.error("Failure on mission %s, product type %s: %s", mission, productType,ex)
-                continue
+    # Map the buckets on the configured product tree: product types
+    # without publications are reported with zero volume
+    for product_level, product_type in level_product_types:
+        bucket = product_type_buckets.get(product_type)
+        content_length_sum = bucket['content_length_sum']['value'] if bucket is not None else 0.0
+        results.append({'index': index, 'mission': mission, 'productLevel': product_level,
+                        'productType': product_type, 'content_length_sum': content_length_sum})
 
     # Make Time Measurement for API measurement
     api_end_time = perf_counter()
@@ -150,37 +145,88 @@ def get_cds_publication_count_by_mission(start_date, end_date, mission):
     """
     logger.debug(f"[BEG] CDS PUBLICATION COUNT for mission {mission}, start: {start_date}, end: {end_date}")
     index = 'cds-publication'
-    elastic = elastic_client.ElasticClient()
+    elastic = elastic_client.get_elastic_client()
     results = []
-    # TODO get object and extract productLevel list and filename end
-    productLevel_list = PublicationProductTreeCache.load_object(mission).get('levels')
+    level_product_types = PublicationProductTreeCache.product_types(mission)
     publication_service = PublicationProductTreeCache.load_object("current_publication_service")
-    product_type_format_query = _get_publication_base_query(start_date, end_date,
-                                                            mission, publication_service)
-    logger.debug("CDS PUBLICATION COUNT - reference base query: %s", product_type_format_query)
     # TIme API
     api_start_time = perf_counter()
-    for product_level, productType_list in productLevel_list.items():
-        for product_type in productType_list:
-            query = copy.deepcopy(product_type_format_query)
-            query["bool"]["must"].append({"term": {"product_type": product_type}})
-            body = {"query": query}
-
-            try:
-                result = elastic.count(index=index, body=body)['count']
-                # logger.debug("Received COUNT result %s for mission %s, level %s, type %s",
-                #            result, mission, productLevel, productType)
-                results.append({'index': index, 'mission': mission, 'productLevel': product_level,
-                                'productType': product_type, 'count': result})
-            except Exception as ex:
-                logger.error("Failure on mission %s: %s", mission, ex)
-                continue
+    product_types = sorted({product_type for _, product_type in level_product_types})
+    try:
+        product_type_buckets = _get_product_type_buckets(elastic, index, start_date, end_date,
+                                                         mission, publication_service,
+                                                         product_types)
+    except Exception as ex:
+        logger.error("Failure on mission %s: %s", mission, ex)
+        return results
+
+    # Map the buckets on the configured product tree: product types
+    # without publications are reported with zero count
+    for product_level, product_type in level_product_types:
+        bucket = product_type_buckets.get(product_type)
+        results.append({'index': index, 'mission': mission, 'productLevel': product_level,
+                        'productType': product_type, 'count': bucket['doc_count'] if bucket is not None else 0})
     api_end_time = perf_counter()
     logger.debug(
         f"CDS PUBLICATION COUNT for mission {mission}, start: {start_date}, end: {end_date} - Execution Time : {api_end_time - api_start_time:0.6f}")
     return results
 
 
+def _get_service_subperiod_buckets(elastic, index, start_date, end_date, mission, services,
+                                   subperiods, sub_aggs=None):
+    """
+    Retrieve the publication statistics of each service in each subperiod with
+    a single query: a range aggregation with the subperiods boundaries, nested
+    under a terms aggregation on service id.
+    Range aggregation excludes the subperiod end: the last subperiod end is
+    moved forward, to include the interval end.
+
+    Args:
+        elastic (): the Elastic client
+        index (str): the index to be queried
+        start_date (): Start date of the trend interval
+        end_date (): End date of the trend interval
+        mission (str): the mission
+        services (list): the publication services ids
+        subperiods (list): the subperiods of the interval, as returned by get_interval_subperiods
+        sub_aggs (dict): optional aggregations computed on each subperiod bucket
+
+    Returns: a dictionary service id -> list of subperiod buckets, ordered as subperiods;
+    the item is None for subperiods without published products
+
+    """
+    query = {
+        "bool": {
+            "must": [
+                {"range": {"publication_date": {"gte": start_date, "lte": end_date}}},
+                {"term": {"mission": mission}},
+                {"term": {"service_type": 'DD'}},
+                {"terms": {"service_id": list(services)}}
+            ]
+        }
+    }
+    ranges = []
+    for subperiod in subperiods:
+        ranges.append({"from": subperiod['start_date'], "to": subperiod['end_date']})
+    ranges[-1]["to"] = subperiods[-1]['end_date'] + timedelta(milliseconds=1)
+    subperiod_aggs = {"range": {"field": "publication_date", "ranges": ranges}}
+    if sub_aggs is not None:
+        subperiod_aggs["aggs"] = sub_aggs
+    aggs = {
+        "services": {
+            "terms": {"field": "service_id", "size": max(len(services), 1)},
+            "aggs": {"subperiods": subperiod_aggs}
+        }
+    }
+    result = elastic.search(index=index, query=query, aggs=aggs, size=0)
+    service_buckets = {service_id: [None] * len(subperiods) for service_id in services}
+    for service_bucket in result['aggregations']['services']['buckets']:
+        subperiod_buckets = service_bucket['subperiods']['buckets']
+        service_buckets[service_bucket['key']] = [bucket if bucket['doc_count'] > 0 else None
+                                                  for bucket in subperiod_buckets]
+    return service_buckets
+
+
 def get_cds_publication_size_trend_by_mission(start_date, end_date, mission, num_periods):
     """
 
@@ -201,8 +247,7 @@ def get_cds_publication_size_trend_by_mission(start_date, end_date, mission, num
 
     trend_result = {'mission': mission, 'service_trend': {}, 'num_periods': num_periods}
     index = 'cds-publication'
-    elastic = elastic_client.ElasticClient()
-    service_results = {}
+    elastic = elastic_client.get_elastic_client()
     subperiods = utils.get_interval_subperiods(start_date, end_date, int(num_periods))
 
     aggs = {
@@ -210,42 +255,18 @@ def get_cds_publication_size_trend_by_mission(start_date, end_date, mission, num
     }
     # TIme API
     api_start_time = perf_counter()
-    # TODO: using multiple month-based indices would lead to possible errors for periods
-    # spanning over adjacent months
-    # e.g.: if periodi is a a week, and the week is overlapping two consecutive monghs,
-    # the two values from the first and the second month should be added for the same period.
-    #   i.e., we should check if there results related to the same sub-period, and collapse into
-    #    one single result, by summing the values
     services = PublicationProductTreeCache.load_object("active_publication_services")
-
-    #    for index in indices:
-    for service_id in services:
-        logger.debug("Publication Size Trend: Collecting statistics for service %s", service_id)
-        results = []
-        for period_id, subperiod in enumerate(subperiods, start=1):
-            # logger.debug("Publication Size Trend: Querying Mission %s, for period %d, subperiod: %s",
-            #             mission, period_id, subperiod)
-            subperiod_query = _get_publication_base_query(subperiod['start_date'], subperiod['end_date'],
-                                                          mission, service_id)
-            #
-            # logger.debug("CDS TREND VOLUEM - Query: %s", subperiod_query)
-            try:
-                result = \
-                    elastic.search(index=index, query=subperiod_query,
-                                   aggs=aggs,
-                                   size=0)['aggregations']['content_length_sum']['value']
-                # logger.debug("Received size result %s for mission %s, subperiod %s, dates %s",
-                #             result, mission, period_id, subperiod)
-                # Todo: change format of result: specify subperiod date range and put
-                # count as a field of the record
-                results.append(result)
-            except Exception as ex:
-                logger.error("Failure on mission %s: %s", mission, ex)
-                continue
-        service_results[service_id] = results
-        #logger.debug("Mission: %s, results per service: %s", mission, service_results)
-    # If multiple period id results, they should be summed up!
-    trend_result['service_trend'] = service_results
+    try:
+        service_buckets = _get_service_subperiod_buckets(elastic, index, start_date, end_date,
+                                                         mission, services, subperiods, aggs)
+    except Exception as ex:
+        logger.error("Failure on mission %s: %s", mission, ex)
+        service_buckets = {service_id: [] for service_id in services}
+    trend_result['service_trend'] = {
+        service_id: [bucket['content_length_sum']['value'] if bucket is not None else 0.0
+                     for bucket in buckets]
+        for service_id, buckets in service_buckets.items()
+    }
     logger.debug("Retrieved Trend: %s", trend_result)
     api_end_time = perf_counter()
     logger.debug(
@@ -273,44 +294,22 @@ def get_cds_publication_trend_by_mission(start_date, end_date, mission, num_peri
 
     trend_result = {'mission': mission, 'service_trend': {}, 'num_periods': num_periods}
     index = 'cds-publication'
-    elastic = elastic_client.ElasticClient()
-    service_results = {}
+    elastic = elastic_client.get_elastic_client()
     subperiods = utils.get_interval_subperiods(start_date, end_date, int(num_periods))
     # TIme API
     api_start_time = perf_counter()
-    # TODO: using multiple month-based indices would lead to possible errors for periods
-    # spanning over adjacent months
-    # e.g.: if periodi is a a week, and the week is overlapping two consecutive monghs,
-    # the two values from the first and the second month should be added for the same period.
-    #   i.e., we should check if there results related to the same sub-period, and collapse into
-    #    one single result, by summing the values
     services = PublicationProductTreeCache.load_object("active_publication_services")
-    #    for index in indices:
-    for service_id in services:
-        logger.debug("Publication Trend: Collecting statistics for service %s", service_id)
-        results = []
-        for period_id, subperiod in enumerate(subperiods, start=1):
-            #logger.debug("Publication Trend: Querying Mission %s, for period %d, subperiod: %s",
-            #             mission, period_id, subperiod)
-            subperiod_query = _get_publication_base_query(subperiod['start_date'], subperiod['end_date'],
-                                                          mission, service_id)
-            query = {"query": subperiod_query}
-            try:
-                result = elastic.count(index=index, body=query)['count']
-                logger.debug("Received result %s for mission %s, subperiod %s, dates %s",
-                             result, mission, period_id, subperiod)
-                logger.debug("Publication Statistics Trend Count from index %s, query %s", index, query)
-                # Todo: change format of result: specify subperiod date range and put
-                # count as a field of the record
-                results.append(result)
-            except Exception as ex:
-                logger.error("Failure on mission %s: %s", mission, ex)
-                continue
-        service_results[service_id] = results
-        #logger.debug("Mission: %s, results per service: %s", mission, service_results)
-    # If multiple period id results, they should be summed up!
-    trend_result['service_trend'] = service_results
-    #logger.debug("Retrieved Trend: %s", trend_result)
+    try:
+        service_buckets = _get_service_subperiod_buckets(elastic, index, start_date, end_date,
+                                                         mission, services, subperiods)
+    except Exception as ex:
+        logger.error("Failure on mission %s: %s", mission, ex)
+        service_buckets = {service_id: [] for service_id in services}
+    trend_result['service_trend'] = {
+        service_id: [bucket['doc_count'] if bucket is not None else 0
+                     for bucket in buckets]
+        for service_id, buckets in service_buckets.items()
+    }
     api_end_time = perf_counter()
     logger.debug(
         f"[END] CDS PUBLICATION TREND for mission {mission}, start: {start_date}, end: {end_date} - Execution Time : {api_end_time - api_start_time:0.6f}")
@@ -20,7 +20,7 @@ def get_cds_publication_size_complex(start_date, end_date, mission, product_leve
         mission/product level/product type
     """
     index = 'cds-publication'
-    elastic = elastic_client.ElasticClient()
+    elastic = elastic_client.get_elastic_client()
     results = []
     try:
         query = {
@@ -70,7 +70,7 @@ def get_cds_publication_size_complex(start_date, end_date, mission, product_leve
 
 def get_cds_publication_count_complex(start_date, end_date, mission, product_level, product_type):
     index = 'cds-publication'
-    elastic = elastic_client.ElasticClient()
+    elastic = elastic_client.get_elastic_client()
     results = []
     try:
         query = {"query": {
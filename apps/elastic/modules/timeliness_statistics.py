@@ -19,7 +19,7 @@ from time import perf_counter
 from dateutil.relativedelta import relativedelta
 
 from apps.cache.cache import MissionTimelinessCache
-from apps.elastic.client import ElasticClient
+from apps.elastic.client import get_elastic_client
 from apps.elastic.modules.timeliness_query import TimelinessElasticQuery, TimelinessConfigurationKeys
 
 logger = logging.getLogger(__name__)
@@ -139,7 +139,7 @@ def _retrieve_elastic_timeliness(mission, query_builder,
                                  sensors_cfg,
                                  stats_aggs, thresholds_list, timeliness):
     index_name = 'cds-publication'
-    elastic = ElasticClient()
+    elastic = get_elastic_client()
     # Query section: includes must clauses,
     stat_query = query_builder.create_query("statistics")
     results = []
@@ -214,12 +214,7 @@ def get_cds_mission_timeliness_statistics(start_date: datetime, end_date: dateti
     """
     results = []
     # Extract list of timeliness types for this mission
-    mission_timeliness_cfg = MissionTimelinessCache.load_object(mission)
-    timeliness_types = MissionTimelinessCache.load_object('timeliness_types')
-    mission_timeliness_types = [typ
-                                for typ in timeliness_types
-                                if typ in mission_timeliness_cfg
-                                ]
+    mission_timeliness_types = MissionTimelinessCache.mission_timeliness_types(mission)
     # TODO: Make resustl a Dictionary, and add Start/end date
     logger.debug("Querying timeliness for mission %s from %s to %s excluded",
                 mission, start_date, end_date)
@@ -68,7 +68,7 @@ def _get_cds_unavailability(start_date, end_date):
 
         # Auxiliary variable declaration
         indices = ["cds-sat-unavailability"]
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
 
         # Fetch results from Elastic database
         for index in indices:
@@ -22,6 +22,7 @@ from urllib.parse import urlparse
 
 from apps.cache.cache import ConfigCache
 from apps.ingestion import news_scraper as scraper
+from apps.ingestion.acquisition_plans.kml_fetcher import AcqPlanKmlFetcher, KmlFetchStatus
 from apps.utils import html_utils as html_utils
 
 logger = logging.getLogger(__name__)
@@ -277,22 +278,26 @@ class AcqPlanKmlLinkIngestor:
         self.mission_acqplan_fragments = acqplan_fragmts
         self.mission_kml_loader = kml_loader
         self._mission = mission
+        self._kml_fetcher = None
+        self.fetch_results = {}
 
-    @staticmethod
-    def _download_kml(kml_link: SatelliteAcqPlanLink):
-        # TODO: use a AcqPlanRetriever injected in the class object
-        return html_utils.get_html_page(kml_link.full_url,
-                                        decode_utf=False)
+    def _get_kml_fetcher(self):
+        # Created on first use: fetcher configuration is read from the Config Cache
+        if self._kml_fetcher is None:
+            self._kml_fetcher = AcqPlanKmlFetcher()
+        return self._kml_fetcher
 
-    def _load_kml_fragments(self,  sat_kml_links):
+    def _load_kml_fragments(self,  sat_kml_links, from_date=None):
         """
         Download KML files from Links associated to Satellites
         of this mission
         Extract from KML files fragments and save them to interval
         repository of acqplan kml fragments (daily based)
+        Links whose interval is covered by newer links are not downloaded.
         Args:
             sat_kml_links (): a dictionary mapping satellites to a list
-            of url strings for KML files to be downloaded
+            of url strings for KML files to be downloaded, from the newest
+            from_date (datetime): data before this date are not needed
 
         Returns:
 
@@ -307,11 +312,17 @@ class AcqPlanKmlLinkIngestor:
                 # Instantiate a new Loader, mission dependent,
                 # in charge of extracting daily fragments from Satellite Acquisiton KML file
                 satellite_loader = self.mission_kml_loader()
-                for kml_link in kml_links:
-                    logger.info("Mission: %s - Downloading Acquisition Plan KML from link %s for satellite %s",
-                                 self._mission,
-                                 kml_link, sat)
-                    kml_file = self._download_kml(kml_link)
+                logger.info("Mission: %s - Downloading Acquisition Plan KML from links %s for satellite %s",
+                            self._mission,
+                            kml_links, sat)
+                # Files are downloaded in parallel, and loaded in order of links
+                fetch_results = self._get_kml_fetcher().fetch(kml_links, from_date)
+                self.fetch_results[sat] = fetch_results
+                for fetch_result in fetch_results:
+                    kml_link = fetch_result.link
+                    kml_file = fetch_result.content
+                    if fetch_result.status == KmlFetchStatus.SKIPPED:
+                        continue
                     if kml_file is not None:
                         try:
                             # Extract from file KML daily fragments on Fragments Table
@@ -339,6 +350,6 @@ class AcqPlanKmlLinkIngestor:
         # self._retrieve_link_urls(mission, ["S1A", "S1B"], "archive")
         mission_kml_links = self._acqplan_retriever.select_links(from_date)
         # download the selected acquisition plans
-        #  from the oldest to the newest
+        #  from the newest to the oldest
         # And split in fragments (by folder)
-        self._load_kml_fragments(mission_kml_links)
\ No newline at end of file
+        self._load_kml_fragments(mission_kml_links, datetime.strptime(from_date, "%Y-%m-%d"))
\ No newline at end of file
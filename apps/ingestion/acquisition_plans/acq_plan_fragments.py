@@ -12,6 +12,7 @@ behalf of  to fulfill the purpose for which the document was
 delivered to him.
 """
 
+import bisect
 import datetime
 import logging
 from dataclasses import dataclass
@@ -170,6 +171,11 @@ class AcqPlanDayFragment:
         self.day = day_str
         self.folder_kml = folder
         self.placemark_table = None
+        # Index of the Placemarks in folder, built on first use:
+        # Placemarks (and their sort keys) in folder order, and set of Placemark names
+        self._placemark_keys = None
+        self._placemark_elements = None
+        self._placemark_name_set = None
         # PLACEMARK have elements:
         # <name>2023-06-27T19:10:41</name>
         # <TimeSpan>
@@ -200,6 +206,11 @@ class AcqPlanDayFragment:
     def placemark_names(self):
         return [pm.name.text for pm in self.placemark_list]
 
+    @property
+    def placemark_name_set(self):
+        self._ensure_placemark_index()
+        return self._placemark_name_set
+
     @property
     def placemark_ids(self):
         return [pm.name for pm in self.placemark_list]
@@ -234,6 +245,55 @@ class AcqPlanDayFragment:
             end_time_str = self._set_utc_format(str(time_interval['end']))
             pm.TimeSpan[0] = KML.TimeSpan(KML.begin(start_time_str),
                                           KML.end(end_time_str))
+        # Sort keys have changed
+        self._invalidate_placemark_index()
+
+    @staticmethod
+    def _placemark_sort_key(placemark):
+        # Placemarks are sorted by end time
+        return str(placemark.TimeSpan.end)
+
+    def _invalidate_placemark_index(self):
+        self._placemark_keys = None
+        self._placemark_elements = None
+        self._placemark_name_set = None
+
+    def _ensure_placemark_index(self):
+        """
+        Build the index of the Placemarks in folder, if not yet available;
+        Placemarks in folder are sorted, if needed.
+        The index is then updated by the methods adding/removing Placemarks
+        """
+        if self._placemark_keys is not None:
+            return
+        placemarks = list(self.placemark_list)
+        keys = [self._placemark_sort_key(pm) for pm in placemarks]
+        if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+            sorted_positions = sorted(range(len(keys)), key=keys.__getitem__)
+            placemarks = [placemarks[i] for i in sorted_positions]
+            keys = [keys[i] for i in sorted_positions]
+            place_folder = self.placemarks_folder
+            for pm in placemarks:
+                place_folder.append(pm)
+        self._placemark_keys = keys
+        self._placemark_elements = placemarks
+        self._placemark_name_set = {pm.name.text for pm in placemarks}
+
+    def _placemark_position(self, placemark):
+        # Position of placemark in index, or None if not present
+        key = self._placemark_sort_key(placemark)
+        position = bisect.bisect_left(self._placemark_keys, key)
+        while position < len(self._placemark_keys) and self._placemark_keys[position] == key:
+            if self._placemark_elements[position] is placemark:
+                return position
+            position += 1
+        return None
+
+    def _remove_index_position(self, position):
+        pm = self._placemark_elements.pop(position)
+        del self._placemark_keys[position]
+        self._placemark_name_set.discard(pm.name.text)
+        return pm
 
     def _compute_coverage_interval(self):
         """
@@ -261,22 +321,24 @@ class AcqPlanDayFragment:
 
         """
         reference_time_str = datetime.datetime.strftime(time_interval.start,
-                                                        INTERVAL_TIME_FMT)
+                                                        INTERVAL_TIME_FMT).rstrip('Z')
         place_folder = self.placemarks_folder
         logger.debug("Removing from folder %s placemarks from %s, to %s",
                      place_folder.name,
                      time_interval.start, time_interval.end)
-        # logger.debug("Folder as string: %s", etree.tostring(place_folder))
-        if hasattr(place_folder, 'Placemark'):
-            logger.debug("Extracting list of placemarks to remove")
-            logger.debug("Fist Placemark in current folder: %s, last : %s",
-                         place_folder.Placemark[0].name,
-                         place_folder.Placemark[len(place_folder.Placemark) - 1].name)
-            pm_to_remove = [pm for pm in place_folder.Placemark if pm.name.text >= reference_time_str]
+        self._ensure_placemark_index()
+        if self._placemark_keys:
+            # Placemarks starting after reference time end after it:
+            # skip the ones ending before it
+            first_position = bisect.bisect_left(self._placemark_keys, reference_time_str)
+            positions_to_remove = [position
+                                   for position in range(first_position, len(self._placemark_keys))
+                                   if str(self._placemark_elements[position].TimeSpan.begin).rstrip('Z')
+                                   >= reference_time_str]
             logger.debug("Found %d Placemarks to remove",
-                         len(pm_to_remove))
-            for pm in pm_to_remove:
-                place_folder.remove(pm)
+                         len(positions_to_remove))
+            for position in reversed(positions_to_remove):
+                place_folder.remove(self._remove_index_position(position))
             logger.debug("Completed removal of Placemarks in Interval for Fragment of day %s", self.day)
         else:
             logger.debug("Placemark Folder for Fragment for day %s had no placemarks", self.day)
@@ -295,7 +357,11 @@ class AcqPlanDayFragment:
                      place_folder.name)
         # logger.debug("Folder as string: %s", etree.tostring(place_folder))
         if hasattr(place_folder, 'Placemark'):
+            self._ensure_placemark_index()
             for pm in pm_list:
+                position = self._placemark_position(pm)
+                if position is not None:
+                    self._remove_index_position(position)
                 place_folder.remove(pm)
             logger.debug("Removal completed")
 
@@ -308,15 +374,19 @@ class AcqPlanDayFragment:
                      place_folder.name)
         logger.debug("Placemark object being added id: %s", id(placemark))
 
-        # TODO: Insert after last placemark with name < placemark.name
-        # Find last item in placemark list with name 
-        # last_pm = next((pm 
-        #            for pm in reversed(place_folder.Placemark) 
-        #            if pm.name < placemark.interval.start), None)
-        # get last item position ( considering case where all items were before new placemark
-        #                   and case where all items were after new placemark)
-        #   Insert new placemark at that position!
-        place_folder.append(placemark)
+        # Insert after the last placemark with sort key <= placemark sort key
+        self._ensure_placemark_index()
+        key = self._placemark_sort_key(placemark)
+        position = bisect.bisect_right(self._placemark_keys, key)
+        if position < len(self._placemark_elements):
+            self._placemark_elements[position].addprevious(placemark)
+        elif self._placemark_elements:
+            self._placemark_elements[-1].addnext(placemark)
+        else:
+            place_folder.append(placemark)
+        self._placemark_keys.insert(position, key)
+        self._placemark_elements.insert(position, placemark)
+        self._placemark_name_set.add(placemark.name.text)
 
     def merge(self, other_fragment):
         """
@@ -362,7 +432,8 @@ class AcqPlanDayFragment:
         # append to self placemarks placemarks from other_fragm
         other_place_folder = other_fragm.placemarks_folder
         logger.debug("Adding placemarks from other folder")
-        for pm in other_place_folder.Placemark:
+        other_fragm._invalidate_placemark_index()
+        for pm in list(other_place_folder.Placemark):
             self._add_placemark(pm)
         # Cases: self.interval < other.interval
         #   self.interval includes other.interval
@@ -379,8 +450,10 @@ class AcqPlanDayFragment:
 
         # Integrate presence of Placemark attribute, with length of corresponding array
         if hasattr(other_place_folder, 'Placemark'):
-            for pm in other_place_folder.Placemark:
-                if pm.name.text not in self.placemark_names:
+            # Placemarks are moved from the other folder
+            other_fragm._invalidate_placemark_index()
+            for pm in list(other_place_folder.Placemark):
+                if pm.name.text not in self.placemark_name_set:
                     logger.debug("Adding not existent Placemark %s", pm.name.text)
                     self._add_placemark(pm)
                 # else:
@@ -391,17 +464,12 @@ class AcqPlanDayFragment:
                            self.day)
 
     def sort_placemarks(self):
-        # TODO Unit test to be defined
-        pm_folder = self.placemarks_folder
-        # TODO: USE DIRECTLY self.placemark_list
-        if hasattr(pm_folder, 'Placemark'):
-
-            placemarks = list(pm_folder.Placemark)
-    
-            placemarks.sort(key=lambda plm: plm.TimeSpan.end)
-            self.remove_placemarks(placemarks)
-            for pm in placemarks:
-                pm_folder.append(pm)
+        """
+        Sort the Placemarks by end time: Placemarks are sorted when the
+        fragment index is built; added Placemarks are inserted in order
+        """
+        if hasattr(self.placemarks_folder, 'Placemark'):
+            self._ensure_placemark_index()
         else:
             logger.warning("Tried to sort not existent Placemarks for Fragment %s",
                            self.day)
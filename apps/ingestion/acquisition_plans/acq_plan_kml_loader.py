@@ -11,11 +11,50 @@ disclose in whole or in part, information contained herein except for or on
 behalf of  to fulfill the purpose for which the document was 
 delivered to him.
 """
-from pykml import parser as KMLparser
+from lxml import etree, objectify
 from pykml.factory import KML_ElementMaker as KML
 
 from apps.ingestion.acquisition_plans.acq_plan_fragments import logger
 
+# Size of the blocks of KML text fed to the parser
+KML_PARSE_CHUNK_SIZE = 1024 * 1024
+
+
+def _local_tag(element):
+    return etree.QName(element).localname
+
+
+def _iter_kml_elements(kml_source, tags, chunk_size=KML_PARSE_CHUNK_SIZE):
+    """
+    Parse a KML incrementally, yielding the elements with the requested tags
+    as soon as they are complete (i.e. their end tag has been read).
+    Elements are built as objectified elements, as done by pykml parser,
+    and can be removed from the tree once processed, to release their memory.
+    Args:
+        kml_source (): the KML text (bytes or str), or a binary file object
+        tags (): the local names of the elements to be returned
+        chunk_size (int): size of the blocks of text fed to the parser
+
+    Returns: a generator of the complete elements
+
+    """
+    parser = etree.XMLPullParser(events=('end',), tag=[f'{{*}}{tag}' for tag in tags],
+                                 remove_blank_text=True)
+    parser.set_element_class_lookup(objectify.ObjectifyElementClassLookup())
+    if hasattr(kml_source, 'read'):
+        chunks = iter(lambda: kml_source.read(chunk_size), b'')
+    else:
+        chunks = (kml_source[offset:offset + chunk_size] for offset in range(0, len(kml_source), chunk_size))
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            yield element
+    parser.close()
+
+
+def _is_document_child(element):
+    return _local_tag(element.getparent()) == 'Document'
+
 
 class S1MissionAcqPlanLoader:
     def __init__(self):
@@ -41,16 +80,48 @@ class S1MissionAcqPlanLoader:
             pm.append(pm_polygon)
             # pm.remove(pm_ring)
 
+    @staticmethod
+    def _detach_day_folder(kml_folder):
+        """
+        Move the content of a parsed day Folder to a new Folder,
+        not bound to the parsed document
+        Args:
+            kml_folder (): the day Folder, in the parsed tree
+
+        Returns: the new day Folder
+
+        """
+        day_folder = kml_folder.makeelement(kml_folder.tag, nsmap=kml_folder.nsmap)
+        for child in list(kml_folder.iterchildren()):
+            day_folder.append(child)
+        return day_folder
+
     def load_acqplan_kml(self, kml_string, fragments_table):
+        """
+        Parse the KML while it is read: each day Folder is
+        added to the fragments table as soon as it is complete, and
+        removed from the parsed tree.
+        Args:
+            kml_string (): the KML text, or a binary file object
+            fragments_table (): the table receiving the daily folders
+
+        Returns:
+
+        """
         if kml_string is None:
             raise Exception("AcqPlan not available")
-        parsed_kml = KMLparser.fromstring(kml_string)
-        for folder in parsed_kml.Document.Folder:
-            try:
-                self._convert_placemark_line_style(folder)
-                fragments_table.process_kml_folder(folder)
-            except Exception as ex:
-                logger.error("Error while loading S1 KML Folder : %s", ex, exc_info=1)
+        for element in _iter_kml_elements(kml_string, ('Folder', 'Style')):
+            if not _is_document_child(element):
+                continue
+            # Document Styles are not used
+            if _local_tag(element) == 'Folder':
+                try:
+                    folder = self._detach_day_folder(element)
+                    self._convert_placemark_line_style(folder)
+                    fragments_table.process_kml_folder(folder)
+                except Exception as ex:
+                    logger.error("Error while loading S1 KML Folder : %s", ex, exc_info=1)
+            element.getparent().remove(element)
 
 
 class S2MissionAcqPlanLoader:
@@ -75,46 +146,62 @@ class S2MissionAcqPlanLoader:
         sub_folder = day_folder.Folder
         sub_folder.append(kml_placemark)
 
-    def _extract_mode_datatakes(self, kml_folder, sat_name):
+    def _extract_placemark(self, kml_placemark):
         """
-        Extract from KML Folder the Placemark Objects
-        Assign them to a Day KML Folder (create if not existing)
-        according to datatake date
+        Assign a Placemark, as soon as parsed, to a Day KML Folder (create if not existing)
+        according to datatake date.
+        Only the Placemarks in the first sub folder of a Mode folder are considered
         Args:
-            kml_folder ():
+            kml_placemark (): the Placemark element, in the parsed tree
 
         Returns:
-            saves in instance the folder placemark to one or more
+            True if the placemark has been moved to one or more
             daily folders
         """
-        subfolder = kml_folder.Folder[0]
-        for pm in subfolder.Placemark:
-            # Read Interval
-
-            # Take interval Day(s)
-            start_day_str = str(pm.TimeSpan[0]['begin']).split("T")[0]
-            end_day_str = str(pm.TimeSpan[0]['end']).split("T")[0]
-            # According to configuration: if only one ad folder, add to start day folder
-            # otherwise, add to both days folders
-            # Add to Daily Folder
-            self._add_to_daily_folder(start_day_str, sat_name, pm)
-            if self._allocate_every_day and start_day_str != end_day_str:
-                self._add_to_daily_folder(end_day_str, sat_name, pm)
+        subfolder = kml_placemark.getparent()
+        mode_folder = subfolder.getparent()
+        if mode_folder.Folder[0] is not subfolder:
+            return False
+        sat_name = str(mode_folder.getparent().name)
+        # Take interval Day(s)
+        start_day_str = str(kml_placemark.TimeSpan[0]['begin']).split("T")[0]
+        end_day_str = str(kml_placemark.TimeSpan[0]['end']).split("T")[0]
+        # According to configuration: if only one ad folder, add to start day folder
+        # otherwise, add to both days folders
+        # Add to Daily Folder
+        self._add_to_daily_folder(start_day_str, sat_name, kml_placemark)
+        if self._allocate_every_day and start_day_str != end_day_str:
+            self._add_to_daily_folder(end_day_str, sat_name, kml_placemark)
+        return True
 
     def load_acqplan_kml(self, kml_string, fragments_table):
-        parsed_kml = KMLparser.fromstring(kml_string)
+        """
+        Parse the KML while it is read: Placemarks are assigned
+        to the daily folders one by one, and the parsed elements are
+        removed from the tree once processed
+        Args:
+            kml_string (): the KML text, or a binary file object
+            fragments_table (): the table receiving the daily folders
+
+        Returns:
+
+        """
         # Folder at first level in document
         # is satellite  folder
         # that contain Mode acquisitions folders
         # Placemarks (datatakes) are contained in MOde folders
-        for folder in parsed_kml.Document.Folder:
-            sat_name = str(folder.name)
-            logger.debug("Parsing S2 KML folder with nme %s", sat_name)
-            for mode_folder in folder.Folder:
-                mode_name = str(mode_folder.name)
-                logger.debug("Extracting Placemarks from folder for mode %s, satellite %s",
-                             mode_name, sat_name)
-                self._extract_mode_datatakes(mode_folder, sat_name)
+        for element in _iter_kml_elements(kml_string, ('Placemark', 'Folder', 'Style')):
+            if _local_tag(element) == 'Placemark':
+                if not self._extract_placemark(element):
+                    element.getparent().remove(element)
+            elif _is_document_child(element):
+                # Satellite folder, or Document Style
+                element.getparent().remove(element)
+            elif _is_document_child(element.getparent()):
+                # Mode folder: its sub folders are released with it
+                logger.debug("Extracted Placemarks from folder for mode %s, satellite %s",
+                             element.name, element.getparent().name)
+                element.getparent().remove(element)
 
         for day_str, day_folder in self._day_folders.items():
             try:
@@ -0,0 +1,212 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) -
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+from lxml import etree
+from pykml.factory import KML_ElementMaker as KML
+
+from apps.ingestion.acquisition_plans.acq_plan_fragments import AcqPlanDayFragment
+
+logger = logging.getLogger(__name__)
+
+# Placemark children stored in dedicated columns; any other child (e.g. the geometry)
+# is stored as a shape template
+_PLACEMARK_COLUMN_TAGS = ('name', 'visibility', 'TimeSpan', 'styleUrl', 'ExtendedData')
+
+_COORDINATES_TAG = 'coordinates'
+
+# Placeholder for coordinates in shape templates
+_COORDINATES_SLOT = None
+
+
+def _local_tag(element):
+    return etree.QName(element).localname
+
+
+def _element_text(element):
+    return str(element.text) if element.text is not None else ''
+
+
+def _parse_coordinates(coordinates_text):
+    """
+    Args:
+        coordinates_text (str): KML coordinates: tuples "lon,lat[,alt]" separated by spaces
+
+    Returns: a tuple (number of values of each tuple, list of float values)
+
+    """
+    tuples = coordinates_text.split()
+    if not tuples:
+        return 0, []
+    dimension = tuples[0].count(',') + 1
+    return dimension, [float(value) for coord_tuple in tuples for value in coord_tuple.split(',')]
+
+
+def _format_coordinate(value):
+    value_str = repr(value)
+    return value_str[:-2] if value_str.endswith('.0') else value_str
+
+
+def _format_coordinates(values, dimension):
+    formatted = [_format_coordinate(value) for value in values.tolist()]
+    return ' '.join(','.join(formatted[i:i + dimension]) for i in range(0, len(formatted), dimension))
+
+
+def _times_to_epoch(time_strings):
+    # Times are UTC, with optional fraction of seconds and 'Z' suffix
+    times = np.array([time_str.rstrip('Z') for time_str in time_strings], dtype='datetime64[ms]')
+    return times.astype('int64') / 1000.0
+
+
+@dataclass
+class CompactDayFragment:
+    """
+    Columnar representation of a daily Acquisition Plan fragment, saved on cache
+    in place of the KML tree: one entry for each placemark in each column.
+    The coordinates of all the placemarks are stored in a single float array;
+    each coordinates element in a placemark shape corresponds to a slice of the array.
+    Shapes (the geometry elements, without coordinates) and Extended Data names are
+    shared between placemarks.
+    The KML folder is built only on request, with to_day_fragment.
+    """
+    day: str
+    folder_name: str
+    names: List[str] = field(default_factory=list)
+    visibility: List[Optional[str]] = field(default_factory=list)
+    begin_times: List[str] = field(default_factory=list)
+    end_times: List[str] = field(default_factory=list)
+    begin_epochs: np.ndarray = None
+    end_epochs: np.ndarray = None
+    styles: List[Optional[str]] = field(default_factory=list)
+    data_layouts: List[Tuple[str, ...]] = field(default_factory=list)
+    data_layout_ids: List[int] = field(default_factory=list)
+    data_values: List[Tuple[str, ...]] = field(default_factory=list)
+    shapes: List[tuple] = field(default_factory=list)
+    shape_ids: List[int] = field(default_factory=list)
+    coordinates: np.ndarray = None
+    coordinate_offsets: np.ndarray = None
+    coordinate_dimensions: np.ndarray = None
+
+    @property
+    def num_placemarks(self):
+        return len(self.names)
+
+    def get_data_record(self, placemark_index, data_name):
+        layout = self.data_layouts[self.data_layout_ids[placemark_index]]
+        if data_name not in layout:
+            return None
+        return self.data_values[placemark_index][layout.index(data_name)]
+
+    @classmethod
+    def from_day_fragment(cls, day_fragment: AcqPlanDayFragment):
+        """
+        Build the columnar representation of a daily fragment
+        Args:
+            day_fragment (AcqPlanDayFragment): a fragment with a KML folder
+
+        Returns: a CompactDayFragment
+
+        """
+        compact = cls(day=day_fragment.day,
+                      folder_name=str(day_fragment.placemarks_folder.name))
+        layout_index = {}
+        shape_index = {}
+        coordinates = []
+        offsets = [0]
+        dimensions = []
+
+        def _shape_template(element):
+            tag = _local_tag(element)
+            if tag == _COORDINATES_TAG:
+                dimension, values = _parse_coordinates(_element_text(element))
+                coordinates.extend(values)
+                offsets.append(len(coordinates))
+                dimensions.append(dimension)
+                return tag, _COORDINATES_SLOT
+            sub_elements = list(element.iterchildren(tag=etree.Element))
+            if not sub_elements:
+                return tag, _element_text(element)
+            return tag, tuple(_shape_template(child) for child in sub_elements)
+
+        for pm in day_fragment.placemark_list:
+            children = {}
+            shape = []
+            for child in pm.iterchildren(tag=etree.Element):
+                tag = _local_tag(child)
+                if tag in _PLACEMARK_COLUMN_TAGS:
+                    children[tag] = child
+                else:
+                    shape.append(_shape_template(child))
+            compact.names.append(_element_text(children['name']) if 'name' in children else '')
+            compact.visibility.append(_element_text(children['visibility']) if 'visibility' in children else None)
+            time_span = children['TimeSpan']
+            compact.begin_times.append(str(time_span.begin))
+            compact.end_times.append(str(time_span.end))
+            compact.styles.append(_element_text(children['styleUrl']) if 'styleUrl' in children else None)
+            data_records = children['ExtendedData'].Data if 'ExtendedData' in children and \
+                hasattr(children['ExtendedData'], 'Data') else []
+            layout = tuple(str(data.attrib['name']) for data in data_records)
+            compact.data_layout_ids.append(layout_index.setdefault(layout, len(layout_index)))
+            compact.data_values.append(tuple(_element_text(data.value) for data in data_records))
+            shape = tuple(shape)
+            compact.shape_ids.append(shape_index.setdefault(shape, len(shape_index)))
+        compact.data_layouts = list(layout_index)
+        compact.shapes = list(shape_index)
+        compact.begin_epochs = _times_to_epoch(compact.begin_times)
+        compact.end_epochs = _times_to_epoch(compact.end_times)
+        compact.coordinates = np.array(coordinates, dtype=np.float64)
+        compact.coordinate_offsets = np.array(offsets, dtype=np.int64)
+        compact.coordinate_dimensions = np.array(dimensions, dtype=np.int8)
+        return compact
+
+    def _build_shape_element(self, template, slot_counter):
+        tag, content = template
+        if content is _COORDINATES_SLOT:
+            slot = next(slot_counter)
+            values = self.coordinates[self.coordinate_offsets[slot]:self.coordinate_offsets[slot + 1]]
+            return getattr(KML, tag)(_format_coordinates(values, int(self.coordinate_dimensions[slot])))
+        if isinstance(content, tuple):
+            return getattr(KML, tag)(*[self._build_shape_element(child, slot_counter) for child in content])
+        return getattr(KML, tag)(content)
+
+    def _build_placemark(self, index, slot_counter):
+        children = [KML.name(self.names[index])]
+        if self.visibility[index] is not None:
+            children.append(KML.visibility(self.visibility[index]))
+        children.append(KML.TimeSpan(KML.begin(self.begin_times[index]),
+                                     KML.end(self.end_times[index])))
+        if self.styles[index] is not None:
+            children.append(KML.styleUrl(self.styles[index]))
+        layout = self.data_layouts[self.data_layout_ids[index]]
+        children.append(KML.ExtendedData(*[KML.Data(KML.value(value), name=data_name)
+                                           for data_name, value in zip(layout, self.data_values[index])]))
+        children.extend(self._build_shape_element(template, slot_counter)
+                        for template in self.shapes[self.shape_ids[index]])
+        return KML.Placemark(*children)
+
+    def to_day_fragment(self):
+        """
+        Build the KML folder of the fragment
+        Returns: an AcqPlanDayFragment
+
+        """
+        slot_counter = iter(range(len(self.coordinate_dimensions)))
+        placemarks_folder = KML.Folder(KML.name(self.folder_name))
+        for index in range(self.num_placemarks):
+            placemarks_folder.append(self._build_placemark(index, slot_counter))
+        return AcqPlanDayFragment(self.day, KML.Folder(KML.name(self.day), placemarks_folder))
@@ -0,0 +1,321 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) -
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import hashlib
+import http.client
+import json
+import logging
+import os
+import ssl
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import perf_counter
+from typing import List, Optional
+from urllib.parse import urljoin, urlsplit
+
+from apps.cache.cache import ConfigCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FETCH_WORKERS = 4
+
+# Seconds
+DEFAULT_FETCH_TIMEOUT = 60
+
+DEFAULT_KML_STORE_DIR = os.path.join(tempfile.gettempdir(), 'cops-dashboard-acqplans-kml')
+
+MAX_REDIRECTS = 5
+
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class KmlFetchStatus:
+    DOWNLOADED = 'downloaded'
+    NOT_MODIFIED = 'not-modified'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+
+
+@dataclass
+class KmlFetchResult:
+    """
+    Outcome of the retrieval of a KML link: content is set for downloaded and not modified files
+    """
+    link: 'SatelliteAcqPlanLink'
+    status: str
+    duration: float = 0.0
+    size: int = 0
+    error: Optional[str] = None
+    content: Optional[bytes] = field(default=None, repr=False)
+
+
+def _link_interval(link: 'SatelliteAcqPlanLink', from_date: Optional[datetime]):
+    start_date = link.start_date if from_date is None else max(link.start_date, from_date)
+    return start_date, link.end_date
+
+
+def _is_interval_covered(start_date, end_date, intervals):
+    covered_until = start_date
+    for interval_start, interval_end in sorted(intervals):
+        if interval_start > covered_until:
+            break
+        covered_until = max(covered_until, interval_end)
+        if covered_until >= end_date:
+            return True
+    return covered_until >= end_date
+
+
+def select_uncovered_links(links: List['SatelliteAcqPlanLink'], from_date=None, covering_links=()):
+    """
+    Select the links adding acquisition plan data: links are expected from the newest to the oldest;
+    a link is skipped if its interval (after from_date) is fully covered by the intervals
+    of the covering links and of the newer selected links.
+    Args:
+        links (): list of SatelliteAcqPlanLink, sorted from the newest
+        from_date (datetime): data before this date are not needed
+        covering_links (): links whose data are already available
+
+    Returns: the list of selected links, in the same order
+
+    """
+    intervals = [_link_interval(link, from_date) for link in covering_links]
+    selected_links = []
+    for link in links:
+        start_date, end_date = _link_interval(link, from_date)
+        if start_date > end_date or _is_interval_covered(start_date, end_date, intervals):
+            logger.debug("Acquisition Plan link %s already covered: skipped", link)
+            continue
+        selected_links.append(link)
+        intervals.append((start_date, end_date))
+    return selected_links
+
+
+class KmlFileStore:
+    """
+    On disk store of the downloaded KML files, keyed by URL: for each file, the ETag and Last-Modified
+    headers are saved, to issue conditional requests
+    """
+
+    def __init__(self, store_dir=DEFAULT_KML_STORE_DIR):
+        self._store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _paths(self, url):
+        url_hash = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return (os.path.join(self._store_dir, f"{url_hash}.kml"),
+                os.path.join(self._store_dir, f"{url_hash}.json"))
+
+    def get_validators(self, url):
+        content_path, meta_path = self._paths(url)
+        if not os.path.exists(content_path) or not os.path.exists(meta_path):
+            return {}
+        try:
+            with open(meta_path, 'r') as meta_file:
+                return json.load(meta_file).get('validators', {})
+        except (OSError, ValueError) as ex:
+            logger.warning("Invalid KML store metadata for URL %s: %s", url, ex)
+            return {}
+
+    def load(self, url):
+        content_path, _ = self._paths(url)
+        try:
+            with open(content_path, 'rb') as content_file:
+                return content_file.read()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write_atomic(path, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+
+    def save(self, url, content: bytes, validators: dict):
+        content_path, meta_path = self._paths(url)
+        self._write_atomic(content_path, content)
+        self._write_atomic(meta_path, json.dumps({'url': url, 'validators': validators}).encode('utf-8'))
+
+
+class _HttpConnectionPool:
+    """
+    Keep open the connections to the KML hosts, to be reused by the following downloads
+    """
+
+    def __init__(self, timeout):
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._ssl_context = ssl.create_default_context()
+        self._ssl_context.check_hostname = False
+        self._ssl_context.verify_mode = ssl.CERT_NONE
+
+    def _connect(self, scheme, netloc):
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self._timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(netloc, timeout=self._timeout)
+
+    def request(self, url, headers):
+        """
+        Execute a GET request, following redirects
+        Returns: a tuple (status, response headers, body)
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = self._request_once(url, headers)
+            if status not in _REDIRECT_STATUSES or 'Location' not in response_headers:
+                return status, response_headers, body
+            url = urljoin(url, response_headers['Location'])
+        raise Exception(f"Too many redirects for URL {url}")
+
+    def _request_once(self, url, headers):
+        url_parts = urlsplit(url)
+        pool_key = (url_parts.scheme, url_parts.netloc)
+        path = url_parts.path + (f"?{url_parts.query}" if url_parts.query else '')
+        with self._lock:
+            idle_connections = self._idle.setdefault(pool_key, [])
+            connection = idle_connections.pop() if idle_connections else None
+        reused = connection is not None
+        if connection is None:
+            connection = self._connect(*pool_key)
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            if not reused:
+                raise
+            # The server closed the idle connection: retry on a new one
+            connection = self._connect(*pool_key)
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                self._idle[pool_key].append(connection)
+        return response.status, response.headers, body
+
+    def close(self):
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
+
+
+class AcqPlanKmlFetcher:
+    """
+    Download Acquisition Plan KML files:
+    - links covered by newer links are not downloaded
+    - files are downloaded in parallel, on a bounded pool of workers reusing the connections
+    - files are saved on disk, and downloaded again only if modified (ETag/Last-Modified)
+    The outcome and the time of each link retrieval are available in fetch_results.
+    """
+
+    def __init__(self, store: KmlFileStore = None, max_workers=None, timeout=None):
+        fetch_config = ConfigCache.load_object("acqplans_fetch_config") or {}
+        self._store = store if store is not None else \
+            KmlFileStore(fetch_config.get('store_dir', DEFAULT_KML_STORE_DIR))
+        self._max_workers = max_workers or int(fetch_config.get('max_workers', DEFAULT_FETCH_WORKERS))
+        self._timeout = timeout or int(fetch_config.get('timeout', DEFAULT_FETCH_TIMEOUT))
+        self.fetch_results: List[KmlFetchResult] = []
+
+    def fetch(self, links: List['SatelliteAcqPlanLink'], from_date: datetime = None):
+        """
+        Retrieve the KML files of the links not covered by newer links.
+        If the download of a link fails, the older links covering its interval are retrieved.
+        Args:
+            links (): list of SatelliteAcqPlanLink, sorted from the newest
+            from_date (datetime): data before this date are not needed
+
+        Returns: a list of KmlFetchResult, one for each link, in the same order
+
+        """
+        results = {}
+        connection_pool = _HttpConnectionPool(self._timeout)
+        try:
+            with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='kml-fetch') as executor:
+                available_links = []
+                links_to_fetch = select_uncovered_links(links, from_date)
+                while links_to_fetch:
+                    for link, result in zip(links_to_fetch,
+                                            executor.map(lambda lnk: self._fetch_link(lnk, connection_pool),
+                                                         links_to_fetch)):
+                        results[link.ref_url] = result
+                        if result.content is not None:
+                            available_links.append(link)
+                    # Links not yet retrieved, needed to replace the failed ones
+                    links_to_fetch = select_uncovered_links([link for link in links
+                                                             if link.ref_url not in results],
+                                                            from_date, available_links)
+        finally:
+            connection_pool.close()
+        self.fetch_results = [results.get(link.ref_url, KmlFetchResult(link, KmlFetchStatus.SKIPPED))
+                              for link in links]
+        self._log_results()
+        return self.fetch_results
+
+    def _log_results(self):
+        for result in self.fetch_results:
+            logger.info("Acquisition Plan KML %s: %s, %d bytes, %0.3f s%s",
+                        result.link, result.status, result.size, result.duration,
+                        f" - {result.error}" if result.error else '')
+
+    def _fetch_link(self, link: 'SatelliteAcqPlanLink', connection_pool: _HttpConnectionPool):
+        url = link.full_url
+        start_time = perf_counter()
+        try:
+            if urlsplit(url).scheme not in ('http', 'https'):
+                with urllib.request.urlopen(url, timeout=self._timeout) as fp:
+                    content = fp.read()
+                status = KmlFetchStatus.DOWNLOADED
+            else:
+                status, content = self._fetch_http(url, connection_pool)
+        except Exception as ex:
+            logger.error("While downloading Acquisition Plan KML %s, received error: %s", url, ex)
+            return KmlFetchResult(link, KmlFetchStatus.FAILED, perf_counter() - start_time, error=str(ex))
+        return KmlFetchResult(link, status, perf_counter() - start_time, len(content), content=content)
+
+    def _fetch_http(self, url, connection_pool: _HttpConnectionPool):
+        validators = self._store.get_validators(url)
+        request_headers = {}
+        if 'etag' in validators:
+            request_headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            request_headers['If-Modified-Since'] = validators['last_modified']
+        status, response_headers, body = connection_pool.request(url, request_headers)
+        if status == 304:
+            content = self._store.load(url)
+            if content is not None:
+                return KmlFetchStatus.NOT_MODIFIED, content
+            # Stored file removed in the meantime
+            status, response_headers, body = connection_pool.request(url, {})
+        if status != 200:
+            raise Exception(f"HTTP status {status}")
+        new_validators = {}
+        if response_headers.get('ETag'):
+            new_validators['etag'] = response_headers['ETag']
+        if response_headers.get('Last-Modified'):
+            new_validators['last_modified'] = response_headers['Last-Modified']
+        try:
+            self._store.save(url, body, new_validators)
+        except OSError as ex:
+            logger.warning("Acquisition Plan KML %s could not be saved on disk: %s", url, ex)
+        return KmlFetchStatus.DOWNLOADED, body
@@ -13,6 +13,7 @@ delivered to him.
 """
 from datetime import datetime
 
+import numpy as np
 from pykml.factory import KML_ElementMaker as KML
 
 from apps.ingestion.acquisition_plans.acq_plan_fragments import INTERVAL_TIME_FMT, AcqDatatake
@@ -134,6 +135,10 @@ def _points_to_coordinates(point_list):
     # Order in generated string for each point is:
     # Longitude, latitude, altitude
     n = 5
+    if isinstance(point_list, np.ndarray):
+        # Array with a row for each point: longitude, latitude, altitude
+        point_format = f"%.{n}f,%.{n}f,%g"
+        return ' '.join([point_format] * len(point_list)) % tuple(point_list.ravel().tolist())
     point_coords = [",".join([f"{pnt.lon:.{n}f}",
                               f"{pnt.lat:.{n}f}",
                               f"{pnt.altitude}"])
@@ -177,11 +182,8 @@ def build_acquisition_polygon_placemark(acquisition_datatake: DatatakeAcquisitio
     # No space should be present around commas.
     # Decimal separator is dot
     #<coordinates>-164.23240,69.84658,0 -170.43121,59.44702,0 -174.83276,59.86316,0 -170.70917,70.36110,0 -164.23240,69.84658,0</coordinates>
+    # Acquisition points are a closed ring, with normalized longitudes
     dt_points = acquisition_datatake.acquisition_points
-    polygon_dt_points = dt_points[:]
-    # Add last point equal to first point to close the polygon
-    polygon_dt_points.append(dt_points[0])
-    # Normalize Acquistion Point Longitudes
     dt_point_coords_str = _points_to_coordinates(dt_points)
     pm_ring = KML.LinearRing(KML.coordinates(dt_point_coords_str)
                              )
@@ -15,17 +15,18 @@ import logging
 import math
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from skyfield.api import EarthSatellite
-from skyfield.api import load as sky_load
+from typing import List
+
+import numpy as np
 from skyfield.toposlib import wgs84 as sky_wgs84, GeographicPosition
 
 from sgp4.earth_gravity import wgs72
 from sgp4.io import twoline2rv
 
-import pytz
 from skyfield.units import Angle
 
 from apps.elastic.modules.datatakes import ELASTIC_TIME_FORMAT
+from apps.ingestion.acquisition_plans.tle_repository import satellite_propagators
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +63,19 @@ class GeographicGeoPoint:
         self.lat = math.radians(self.lat)
         self.lon = math.radians(self.lon)
 
+@dataclass
+class OrbitSamples:
+    """
+    Sub satellite points computed for a time interval:
+    num_samples points from start to end time, plus the optional extra point.
+    Latitudes and longitudes are in radians, elevations in metres
+    """
+    num_samples: int
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    elevations: np.ndarray
+
+
 class DatatakeAcquisition:
     def __init__(self, datatake):
         # NOTE: Temporary untile Datatake data are loaded on sub-dictionary
@@ -107,70 +121,86 @@ class OrbitPropagatorSkyfield:
         # self.tle_obj = twoline2rv(tle_data[1], tle_data[2], wgs72)
         self._step = step
         self._add_extra_point = extra_point
-        self._timescale = sky_load.timescale()
-        self._satellite = EarthSatellite(tle_data[1], tle_data[2], tle_data[0], self._timescale)
+        # Satellites and timescale are shared by all the propagators of the same TLE
+        self._timescale = satellite_propagators.timescale
+        self._satellite = satellite_propagators.get_satellite(tle_data)
         logger.debug("Orbit Propagator (Skyfield) - step: %s, satellite: %s",
                      step, self._satellite)
 
     # Request positions from start to end included, plus an optional additional one
     # positions shall be timed (to allow for transformation to LLA)
-    def _generate_orbit_ecef_positions(self, start_time: datetime, end_time: datetime):
-        logger.debug("Propagating orbit for satellite %s, from %s, to %s, with step %s sec, add extra point: %s",
-                     self._satellite.name, start_time, end_time,
-                     self._step,
-                     self._add_extra_point)
-        # Include start point, and a point at end time
-        number_of_positions = int((end_time - start_time).total_seconds() / self._step) + 2
+    def _sample_offsets(self, start_time: datetime, end_time: datetime):
+        """
+        Compute the times of the positions for an interval,
+        as seconds from start time
+        Args:
+            start_time (datetime):
+            end_time (datetime):
 
+        Returns: a tuple, containing the number of positions from start to end,
+            and the list of offsets (including the extra point, if requested)
+
+        """
+        interval_length = (end_time - start_time).total_seconds()
+        # Include start point, and a point at end time
+        number_of_positions = int(interval_length / self._step) + 2
         time_step = 0
-        positions = []
+        offsets = []
         for _ in range(number_of_positions):
-
-            current_time = start_time + timedelta(seconds=time_step)
-            if current_time > end_time:
-                current_time = end_time
-                time_step = (current_time - start_time).total_seconds()
-            geocentric = self._generate_ecef_pos(current_time)
-            positions.append(geocentric)
+            if time_step > interval_length:
+                time_step = interval_length
+            offsets.append(time_step)
             time_step += self._step
         if self._add_extra_point:
-            current_time = start_time + timedelta(seconds=time_step)
-            geocentric = self._generate_ecef_pos(current_time)
-            positions.append(geocentric)
+            offsets.append(time_step)
         # If an extra point is present, number of positions indicates the
         # points from start to end, excluding the extra point
-        return number_of_positions, positions
+        return number_of_positions, offsets
 
-    def _generate_ecef_pos(self, postime):
-        ts_datetime = pytz.utc.localize(postime)
-        t = self._timescale.from_datetime(ts_datetime)
-        geocentric = self._satellite.at(t)
-        # t=self._timescale.fromdatetime(postime)
-        # geocentric = self._satellite.at(t.utc())
-        # print("Ecef Position: ", geocentric.position.km, " at time: ", ts_datetime)
-        return geocentric
-
-    def add_extra_point(self, flag):
-        self._add_extra_point = flag
-
-    @staticmethod
-    def _orb_ecef_2_lla_points( ecef_points):
+    def get_orbit_samples(self, intervals) -> List[OrbitSamples]:
         """
-        Converts a list of ECEF points to a list o fLLA points
-        LLA points are computed by taking the SubPoint of the c
-        corresponding ECEF position
+        Propagate the orbit for a list of time intervals.
+        The positions of all the intervals are computed together, on a
+        single array of times, and converted to geographic coordinates as arrays
         Args:
-            ecef_points (): a list of GeographicPosition points
-                representing ECEF positions
+            intervals (): a list of tuples (start_time, end_time), as UTC datetime
 
-        Returns: a list of GeographicPositions
+        Returns: a list of OrbitSamples, one for each interval
 
         """
-        lla_points = []
-        for ecef_pnt in ecef_points:
-            lla_points.append(sky_wgs84.subpoint_of(ecef_pnt))
-        # return map(sky_wgs84.subpoint_of, ecef_points)
-        return lla_points
+        if not intervals:
+            return []
+        logger.debug("Propagating orbit for satellite %s, on %d intervals, with step %s sec, add extra point: %s",
+                     self._satellite.name, len(intervals),
+                     self._step,
+                     self._add_extra_point)
+        reference_time = min(start_time for start_time, _ in intervals)
+        samples_counts = []
+        interval_lengths = []
+        seconds = []
+        for start_time, end_time in intervals:
+            number_of_positions, offsets = self._sample_offsets(start_time, end_time)
+            start_seconds = (start_time - reference_time).total_seconds()
+            samples_counts.append(number_of_positions)
+            interval_lengths.append(len(offsets))
+            seconds.extend(start_seconds + offset for offset in offsets)
+        times = self._timescale.utc(reference_time.year, reference_time.month, reference_time.day,
+                                    reference_time.hour, reference_time.minute,
+                                    reference_time.second + reference_time.microsecond / 1e6 + np.array(seconds))
+        sub_points = sky_wgs84.subpoint_of(self._satellite.at(times))
+        latitudes = sub_points.latitude.radians
+        # Sub points have elevation 0: a scalar is returned
+        elevations = np.broadcast_to(sub_points.elevation.m, latitudes.shape)
+        split_indexes = np.cumsum(interval_lengths)[:-1]
+        return [OrbitSamples(num_samples, interval_latitudes, interval_longitudes, interval_elevations)
+                for num_samples, interval_latitudes, interval_longitudes, interval_elevations in
+                zip(samples_counts,
+                    np.split(latitudes, split_indexes),
+                    np.split(sub_points.longitude.radians, split_indexes),
+                    np.split(elevations, split_indexes))]
+
+    def add_extra_point(self, flag):
+        self._add_extra_point = flag
 
     def get_orbit_lla_points(self, start_time: datetime, end_time: datetime ):
         """
@@ -185,8 +215,11 @@ class OrbitPropagatorSkyfield:
             a list of LLA points, plus an extra optional point (if requested when instattating th eclass)
 
         """
-        num_samples, orb_ecef_positions_list = self._generate_orbit_ecef_positions(start_time, end_time)
-        return num_samples, self._orb_ecef_2_lla_points(orb_ecef_positions_list)
+        samples = self.get_orbit_samples([(start_time, end_time)])[0]
+        return samples.num_samples, [sky_wgs84.latlon(lat, lon, elevation)
+                                     for lat, lon, elevation in zip(np.degrees(samples.latitudes).tolist(),
+                                                                    np.degrees(samples.longitudes).tolist(),
+                                                                    samples.elevations.tolist())]
 
 
 class OrbitPropagator:
@@ -299,21 +332,32 @@ class AcquisitionLineProfileFromOrbit:
             start_time ():
             end_time ():
 
-        Returns: a list of GeographicGeoPoint (in degree, altitude in metres)
+        Returns: an array of points (longitude, latitude in degree, altitude in metres)
 
         """
         logger.debug("Computing Line Image Profile - start: %s, end: %s",
                      start_time, end_time)
+        return self.build_image_profiles([(start_time, end_time)])[0]
+
+    def build_image_profiles(self, intervals):
+        """
+        Build the profiles of a list of time intervals, propagating the orbit
+        for all the intervals together
+        Args:
+            intervals (): a list of tuples (start_time, end_time)
+
+        Returns: a list of profiles, one for each interval; each profile is
+            an array of points (longitude, latitude in degree, altitude in metres)
+
+        """
         # Generate Acquisition from Swath and OrbitPositions list
         # NOTE: It could be requested to generate extra orbit position at end and/or start
         # But these extra point should not be part of out
         # For Line Profile, we are not asking for extra points
-        num_points, lla_points = self._orbit_propagator.get_orbit_lla_points(start_time, end_time)
-        logger.debug("Line Image Profile Builder: computed %d points", num_points)
-        return list(map(lambda geop: GeographicGeoPoint(geop.latitude.degrees,
-                                                        geop.longitude.degrees,
-                                                        geop.elevation.m),
-                        lla_points))
+        return [np.column_stack((np.degrees(samples.longitudes),
+                                 np.degrees(samples.latitudes),
+                                 samples.elevations))
+                for samples in self._orbit_propagator.get_orbit_samples(intervals)]
 
 
 class GeoPointOperations:
@@ -356,6 +400,48 @@ class GeoPointOperations:
 #                           math.cos(lat1_rad) * math.sin(lat2_rad) - math.sin(lat1_rad) * math.cos(lat1_rad) * math.cos(delta_lon))
         return Angle(radians=theta)
 
+    @staticmethod
+    def get_north_bearings(lat1_rad, lon1_rad, lat2_rad, lon2_rad):
+        """
+        Array version of get_point_north_bearing
+        Args:
+            lat1_rad (): latitudes of the points, in radians
+            lon1_rad (): longitudes of the points, in radians
+            lat2_rad (): latitudes of the next points, in radians
+            lon2_rad (): longitudes of the next points, in radians
+
+        Returns: the array of the bearings, in radians
+
+        """
+        delta_lon = lon2_rad - lon1_rad
+        a = np.sin(delta_lon) * np.cos(lat2_rad)
+        b = np.cos(lat1_rad) * np.sin(lat2_rad) - np.sin(lat1_rad) * np.cos(lat2_rad) * np.cos(delta_lon)
+        return np.arctan2(a, b)
+
+    @classmethod
+    def get_targets(cls, lat_rad, lon_rad, bearing_rad, gc_distance):
+        """
+        Array version of get_target
+        Args:
+            lat_rad (): latitudes of the starting points, in radians
+            lon_rad (): longitudes of the starting points, in radians
+            bearing_rad (): directions, in radians
+            gc_distance (): distance, in metres
+
+        Returns: a tuple with the arrays of latitudes and longitudes of the targets, in degrees
+
+        """
+        distance_arc = gc_distance / cls.EarthRadius
+        distance_arc_sin = math.sin(distance_arc)
+        distance_arc_cos = math.cos(distance_arc)
+        point_lat_cos = np.cos(lat_rad)
+        point_lat_sin = np.sin(lat_rad)
+        lat2 = np.arcsin(point_lat_sin * distance_arc_cos +
+                         point_lat_cos * distance_arc_sin * np.cos(bearing_rad))
+        lon2 = lon_rad + np.arctan2(np.sin(bearing_rad) * distance_arc_sin * point_lat_cos,
+                                    distance_arc_cos - point_lat_sin * np.sin(lat2))
+        return np.degrees(lat2), np.degrees(lon2)
+
     # TODO: to be replaced by a call to a Library function
     # e.g.
     def get_target(self, bearing, gc_distance):
@@ -411,6 +497,48 @@ class GeoPointOperations:
         return GeographicGeoPoint(math.degrees(lat2), math.degrees(lon2), 0)
 
 
+def normalize_longitude_degrees(lon):
+    # Longitudes (scalar or array) in range [-180, 180)
+    return (lon + 540) % 360 - 180
+
+
+def build_swath_ring(latitudes, longitudes, half_swath, num_samples):
+    """
+    Build the footprint of an acquisition: a polygon with the points at half swath
+    distance from the ground track, orthogonal to the track on both sides.
+    The last ground track point is used only to compute the heading of the
+    previous one.
+    Crossing of the antimeridian: the headings do not depend on the longitude
+    range, and the longitudes of the polygon are normalized, so that
+    consecutive points are joined across the antimeridian.
+    Args:
+        latitudes (): ground track latitudes, in radians (num_samples + 1 points)
+        longitudes (): ground track longitudes, in radians
+        half_swath (float): distance of the polygon points from the track, in metres
+        num_samples (int): number of ground track points with a footprint point per side
+
+    Returns: an array with a row for each polygon point (longitude, latitude
+        in degree, altitude): east points, followed by west points in reverse order,
+        and by the first point again, to close the ring
+
+    """
+    track_latitudes = latitudes[:num_samples]
+    track_longitudes = longitudes[:num_samples]
+    north_bearings = GeoPointOperations.get_north_bearings(track_latitudes, track_longitudes,
+                                                           latitudes[1:num_samples + 1],
+                                                           longitudes[1:num_samples + 1])
+    east_lats, east_lons = GeoPointOperations.get_targets(track_latitudes, track_longitudes,
+                                                          north_bearings + math.pi / 2.0, half_swath)
+    west_lats, west_lons = GeoPointOperations.get_targets(track_latitudes, track_longitudes,
+                                                          north_bearings - math.pi / 2.0, half_swath)
+    # West points are reversed, since the last east point is followed by
+    # last west point, and continues in the reverse direction
+    ring_lats = np.concatenate((east_lats, west_lats[::-1], east_lats[:1]))
+    ring_lons = np.concatenate((east_lons, west_lons[::-1], east_lons[:1]))
+    return np.column_stack((normalize_longitude_degrees(ring_lons), ring_lats,
+                            np.zeros_like(ring_lats)))
+
+
 class AcquisitionPolygonProfileFromOrbit:
     HalphPi = math.pi / 2.0
     needs_extra_point = True
@@ -438,83 +566,22 @@ class AcquisitionPolygonProfileFromOrbit:
         # Find East/West points at half Swath distance
         # NOTE: It could be requested to generate extra orbit position at end and/or start
         # But these extra point should not be part of out
-        num_samples, orb_positions_list = self._orbit_propagator.get_orbit_lla_points(start_time,
-                                                                                      end_time)
-        return self._get_acquisition_boundaries(orb_positions_list, num_samples)
+        return self.build_image_profiles([(start_time, end_time)])[0]
 
-    def _get_acquisition_boundaries(self, points_list, num_samples):
+    def build_image_profiles(self, intervals):
         """
-        Build a polygon by computing orthogonal points at "half swath" width
-        for num_samples points in points list
-        it is expected that points list contains an extra point ( in addition to num_samples)
-        to allow computing north hading on the last point
-        For this extra pnt no orthogonal segment is computed
+        Build the profiles of a list of time intervals, propagating the orbit
+        for all the intervals together
         Args:
-            points_list (): a list of Point objects
-                Each Point has 2(3) coordinates.
-                Coordinates can be taken in several ways:
-                    - cartesian
-                    - geodetic
-                    - degree....
+            intervals (): a list of tuples (start_time, end_time)
 
-        Returns:
-
-        """
-        west_points = []
-        east_points = []
-        # print ("Computing ", num_samples, " Orthogonal points; Using ", len(points_list)," points")
-        for index in range(num_samples):
-            # point_vel = velocity_list[index]
-            curr_point = points_list[index]
-            next_point = points_list[index+1]
-            point_ops = GeoPointOperations(curr_point)
-            point_north_heading = point_ops.get_point_north_bearing(next_point)
-            swath_ends = self._get_swath_ends(point_ops, point_north_heading)
-            logger.debug("Computed  orbit point %s, east: %s, west: %s",
-                         curr_point, swath_ends['east'],
-                         swath_ends['west'])
-            west_points.append(swath_ends.get('west'))
-            east_points.append(swath_ends.get('east'))
-        # Combine east and reversed west points in a single list
-        # West points are reversed, since the last east point is followed by
-        # last west point, and continues in the reverse direction
-        # up to first point
-        west_points.reverse()
-        return east_points + west_points
-
-    def _get_swath_ends(self, point_ops: GeoPointOperations,
-                        north_bearing: Angle):
-        """
-
-        Args:
-            point (): Swath to be positioned at this point,
-            expressed in Geodetic coordinates
-            north_bearing (float): azimuth to North, in radians
-
-        Returns:
+        Returns: a list of profiles, one for each interval; each profile is
+            the polygon ring returned by build_swath_ring
 
         """
-        logger.debug("Computing West target  for point %s", point_ops._point.target_name)
-        w_brng = self._get_west_bearing(north_bearing)
-        west_end_point = point_ops.get_target(w_brng, self.half_swath)
-        logger.debug("Computing East target  for point %s", point_ops._point.target_name)
-        e_brng = self._get_east_bearing(north_bearing)
-        east_end_point = point_ops.get_target(e_brng, self.half_swath)
-        return {'west': west_end_point, 'east': east_end_point}
-
-    def _get_east_bearing(self, north_b):
-        east_rad = north_b.radians + self.HalphPi
-        return Angle(radians=east_rad)
-
-    def _get_west_bearing(self, north_b):
-        west_rad = north_b.radians - self.HalphPi
-        return Angle(radians=west_rad)
-
-
-    @staticmethod
-    def _normalize_longitude_degrees(lon):
-        # NOTE: WE NEED DEGREES!
-        return (lon + 540) % 360 - 180
+        return [build_swath_ring(samples.latitudes, samples.longitudes,
+                                 self.half_swath, samples.num_samples)
+                for samples in self._orbit_propagator.get_orbit_samples(intervals)]
 
 
 class OrbitAcquisitionsBuilder:
@@ -537,3 +604,15 @@ class OrbitAcquisitionsBuilder:
 
     def compute_acquisition_points(self, start_time, end_time):
         return self._acquisition_profile_builder.build_image_profile(start_time, end_time)
+
+    def compute_acquisitions_points(self, intervals):
+        """
+        Compute the points of the acquisitions of a list of time intervals,
+        propagating the orbit once for all the intervals
+        Args:
+            intervals (): a list of tuples (start_time, end_time)
+
+        Returns: a list of point lists, one for each interval
+
+        """
+        return self._acquisition_profile_builder.build_image_profiles(intervals)
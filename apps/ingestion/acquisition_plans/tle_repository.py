@@ -0,0 +1,359 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) -
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from satellite_tle import fetch_tle_from_celestrak
+from skyfield.api import EarthSatellite
+from skyfield.api import load as sky_load
+
+from apps.cache.cache import ConfigCache
+
+logger = logging.getLogger(__name__)
+
+norad_id_map = {'S1A': 39634, 'S1B': 41456,
+                'S2A': 40697, 'S2B': 42063,
+                'S3A': 41335, 'S3B': 43437,
+                'S5P': 42969}
+
+# Seconds: CelesTrak updates the elements a few times a day,
+# and asks not to download the same TLE more than once every two hours
+DEFAULT_TLE_MAX_AGE = 6 * 3600
+
+DEFAULT_TLE_STORE_DIR = os.path.join(tempfile.gettempdir(), 'cops-dashboard-tle')
+
+# Maximum number of TLE history records kept for each satellite
+DEFAULT_TLE_HISTORY_SIZE = 60
+
+MAX_CACHED_PROPAGATORS = 64
+
+STORE_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def parse_tle_epoch(line1: str) -> datetime:
+    """
+    Extract the epoch of a TLE from its first line (columns 19-32: YYDDD.DDDDDDDD)
+    Args:
+        line1 (str): the first line of the TLE
+
+    Returns: the epoch, as naive UTC datetime
+
+    """
+    epoch_field = line1[18:32]
+    year = int(epoch_field[:2])
+    year += 2000 if year < 57 else 1900
+    return datetime(year, 1, 1) + timedelta(days=float(epoch_field[2:]) - 1)
+
+
+def parse_tle_norad_id(line1: str) -> int:
+    return int(line1[2:7])
+
+
+@dataclass
+class TleRecord:
+    """
+    Two Lines Element of a satellite, with the time it was retrieved
+    """
+    sat_id: str
+    name: str
+    line1: str
+    line2: str
+    epoch: datetime
+    retrieved_at: datetime
+
+    @classmethod
+    def from_lines(cls, sat_id, tle_lines, retrieved_at=None):
+        name, line1, line2 = [line.strip() for line in tle_lines]
+        return cls(sat_id, name, line1, line2, parse_tle_epoch(line1),
+                   retrieved_at or datetime.utcnow())
+
+    @property
+    def lines(self):
+        """
+        Returns: the tuple (name, line 1, line 2), as returned by fetch_tle_from_celestrak
+        """
+        return self.name, self.line1, self.line2
+
+    def to_dict(self):
+        record_dict = asdict(self)
+        record_dict['epoch'] = self.epoch.strftime(STORE_TIME_FORMAT)
+        record_dict['retrieved_at'] = self.retrieved_at.strftime(STORE_TIME_FORMAT)
+        return record_dict
+
+    @classmethod
+    def from_dict(cls, record_dict):
+        return cls(record_dict['sat_id'], record_dict['name'],
+                   record_dict['line1'], record_dict['line2'],
+                   datetime.strptime(record_dict['epoch'], STORE_TIME_FORMAT),
+                   datetime.strptime(record_dict['retrieved_at'], STORE_TIME_FORMAT))
+
+
+class TleFileStore:
+    """
+    On disk store of the retrieved TLE: for each satellite, a JSON file
+    contains the history of the TLE records, sorted by epoch
+    """
+
+    def __init__(self, store_dir=DEFAULT_TLE_STORE_DIR, history_size=DEFAULT_TLE_HISTORY_SIZE):
+        self._store_dir = store_dir
+        self._history_size = history_size
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, sat_id):
+        return os.path.join(self._store_dir, f"{sat_id}.json")
+
+    def load_history(self, sat_id) -> List[TleRecord]:
+        try:
+            with open(self._path(sat_id), 'r') as store_file:
+                return [TleRecord.from_dict(record) for record in json.load(store_file)]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, KeyError) as ex:
+            logger.warning("Invalid TLE store for satellite %s: %s", sat_id, ex)
+            return []
+
+    def save_history(self, sat_id, history: List[TleRecord]):
+        path = self._path(sat_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as tmp_file:
+            json.dump([record.to_dict() for record in history[-self._history_size:]], tmp_file)
+        os.replace(tmp_path, path)
+
+
+def load_tle_files(tle_dir) -> Dict[int, List[TleRecord]]:
+    """
+    Load the TLE files (three lines, .tle extension) of a folder
+    Args:
+        tle_dir (): the folder containing the TLE files
+
+    Returns: a dictionary of TleRecord lists, sorted by epoch, keyed by NORAD id
+
+    """
+    records = {}
+    if not tle_dir or not os.path.isdir(tle_dir):
+        return records
+    for tle_filename in sorted(os.listdir(tle_dir)):
+        if not tle_filename.endswith('.tle'):
+            continue
+        tle_path = os.path.join(tle_dir, tle_filename)
+        try:
+            with open(tle_path, 'r') as tle_file:
+                tle_lines = [line for line in tle_file.read().splitlines() if line.strip()]
+            norad_id = parse_tle_norad_id(tle_lines[1])
+            sat_id = next((sat for sat, sat_norad_id in norad_id_map.items() if sat_norad_id == norad_id),
+                          str(norad_id))
+            retrieved_at = datetime.utcfromtimestamp(os.path.getmtime(tle_path))
+            records.setdefault(norad_id, []).append(TleRecord.from_lines(sat_id, tle_lines[:3], retrieved_at))
+        except (OSError, IndexError, ValueError) as ex:
+            logger.warning("Invalid TLE file %s: %s", tle_path, ex)
+    for norad_records in records.values():
+        norad_records.sort(key=lambda record: record.epoch)
+    return records
+
+
+class TleRepository:
+    """
+    Provide the TLE of the satellites:
+    - the latest TLE is downloaded from CelesTrak only if the last retrieved one
+      is older than max_age seconds
+    - the retrieved TLE are saved on the store, with the history by epoch
+    - if CelesTrak is not reachable, the latest stored TLE is used,
+      or the latest TLE found in the fallback folder, if configured ("fallback_dir" in tle_config)
+    """
+
+    def __init__(self, store: TleFileStore = None, max_age=None, fallback_dir=None,
+                 fetch_function=fetch_tle_from_celestrak):
+        tle_config = ConfigCache.load_object("tle_config") or {}
+        self._store = store if store is not None else \
+            TleFileStore(tle_config.get('store_dir', DEFAULT_TLE_STORE_DIR))
+        self._max_age = timedelta(seconds=max_age if max_age is not None else
+                                  int(tle_config.get('max_age', DEFAULT_TLE_MAX_AGE)))
+        self._fallback_dir = fallback_dir if fallback_dir is not None else tle_config.get('fallback_dir')
+        if self._fallback_dir and not os.path.isdir(self._fallback_dir):
+            raise ValueError(f"TLE fallback folder {self._fallback_dir} not found: "
+                             f"check 'fallback_dir' in tle_config configuration")
+        self._fetch_function = fetch_function
+        self._lock = threading.Lock()
+        self._history: Dict[str, List[TleRecord]] = {}
+        self._fallback_records: Optional[Dict[int, List[TleRecord]]] = None
+
+    def _sat_history(self, sat_id) -> List[TleRecord]:
+        if sat_id not in self._history:
+            self._history[sat_id] = self._store.load_history(sat_id)
+        return self._history[sat_id]
+
+    def _fallback_history(self, sat_id) -> List[TleRecord]:
+        if self._fallback_records is None:
+            self._fallback_records = load_tle_files(self._fallback_dir)
+        return self._fallback_records.get(norad_id_map.get(sat_id), [])
+
+    def _add_record(self, record: TleRecord):
+        history = self._sat_history(record.sat_id)
+        same_epoch = next((index for index, stored in enumerate(history) if stored.epoch == record.epoch), None)
+        if same_epoch is not None:
+            history[same_epoch] = record
+        else:
+            history.append(record)
+            history.sort(key=lambda stored: stored.epoch)
+        try:
+            self._store.save_history(record.sat_id, history)
+        except OSError as ex:
+            logger.warning("TLE of satellite %s could not be saved on disk: %s", record.sat_id, ex)
+
+    @staticmethod
+    def _last_retrieved(history: List[TleRecord]) -> Optional[TleRecord]:
+        return max(history, key=lambda record: record.retrieved_at) if history else None
+
+    def get_latest(self, sat_id) -> TleRecord:
+        """
+        Get the most recent TLE of a satellite
+        Args:
+            sat_id (str): satellite identifier (e.g. S1A)
+
+        Returns: the TleRecord with the latest epoch
+
+        """
+        with self._lock:
+            history = self._sat_history(sat_id)
+            last_retrieved = self._last_retrieved(history)
+            if last_retrieved is not None and datetime.utcnow() - last_retrieved.retrieved_at < self._max_age:
+                return history[-1]
+            try:
+                tle_lines = self._fetch_function(norad_id_map[sat_id])
+                self._add_record(TleRecord.from_lines(sat_id, tle_lines))
+                logger.info("Retrieved TLE for satellite %s, epoch %s", sat_id, history[-1].epoch)
+                return history[-1]
+            except Exception as ex:
+                if history:
+                    logger.warning("TLE retrieval for satellite %s failed (%s): using stored TLE, epoch %s",
+                                   sat_id, ex, history[-1].epoch)
+                    return history[-1]
+                if not self._fallback_dir:
+                    logger.error("TLE retrieval for satellite %s failed, and no TLE is stored: "
+                                 "no fallback folder configured ('fallback_dir' in tle_config)", sat_id)
+                    raise
+                fallback_history = self._fallback_history(sat_id)
+                if not fallback_history:
+                    raise
+                logger.warning("TLE retrieval for satellite %s failed (%s): using TLE file, epoch %s",
+                               sat_id, ex, fallback_history[-1].epoch)
+                return fallback_history[-1]
+
+    def get_history(self, sat_id) -> List[TleRecord]:
+        """
+        Get the known TLE of a satellite, from the store and the fallback folder
+        Returns: the list of TleRecord, sorted by epoch
+        """
+        with self._lock:
+            records = {record.epoch: record for record in self._fallback_history(sat_id)}
+            records.update((record.epoch, record) for record in self._sat_history(sat_id))
+        return [records[epoch] for epoch in sorted(records)]
+
+    def get_tle_at(self, sat_id, when: datetime) -> Optional[TleRecord]:
+        """
+        Get the TLE to be used to propagate the orbit at a given time:
+        the known TLE with the latest epoch before the time, or the first one
+        if all the TLE are more recent
+        Args:
+            sat_id (str): satellite identifier
+            when (datetime): naive UTC time
+
+        Returns: a TleRecord, or None if no TLE is known for the satellite
+
+        """
+        history = self.get_history(sat_id)
+        if not history:
+            return None
+        previous_records = [record for record in history if record.epoch <= when]
+        return previous_records[-1] if previous_records else history[0]
+
+
+_tle_repository: Optional[TleRepository] = None
+
+_tle_repository_lock = threading.Lock()
+
+
+def get_tle_repository() -> TleRepository:
+    """
+    Returns: the TleRepository shared by the orbit builders, configured from tle_config
+    """
+    global _tle_repository
+    with _tle_repository_lock:
+        if _tle_repository is None:
+            _tle_repository = TleRepository()
+        return _tle_repository
+
+
+def get_latest_tle(sat_id):
+    """
+    Get the latest TLE of a satellite from the shared repository
+    Returns: the tuple (name, line 1, line 2)
+    """
+    return get_tle_repository().get_latest(sat_id).lines
+
+
+class SatellitePropagatorCache:
+    """
+    Memoize the Skyfield EarthSatellite objects, keyed by satellite
+    and TLE epoch, sharing a single timescale
+    """
+
+    def __init__(self, max_size=MAX_CACHED_PROPAGATORS):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._timescale = None
+        self._satellites = OrderedDict()
+
+    @property
+    def timescale(self):
+        with self._lock:
+            if self._timescale is None:
+                self._timescale = sky_load.timescale()
+            return self._timescale
+
+    def get_satellite(self, tle_data) -> EarthSatellite:
+        """
+        Get the EarthSatellite of a TLE
+        Args:
+            tle_data (): a sequence of three TLE lines (name, line 1, line 2)
+
+        Returns: the EarthSatellite built for the same satellite and epoch,
+            if available; a new one otherwise
+
+        """
+        name, line1, line2 = [line.strip() for line in tle_data[:3]]
+        # Line 1 includes NORAD id and epoch
+        satellite_key = (parse_tle_norad_id(line1), line1[18:32])
+        timescale = self.timescale
+        with self._lock:
+            satellite = self._satellites.get(satellite_key)
+            if satellite is not None:
+                self._satellites.move_to_end(satellite_key)
+                return satellite
+            satellite = EarthSatellite(line1, line2, name, timescale)
+            self._satellites[satellite_key] = satellite
+            if len(self._satellites) > self._max_size:
+                self._satellites.popitem(last=False)
+            return satellite
+
+
+satellite_propagators = SatellitePropagatorCache()
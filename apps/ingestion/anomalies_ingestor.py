@@ -20,10 +20,9 @@ from dateutil.relativedelta import relativedelta
 from apps.cache.cache import ConfigCache
 from apps.jira.client import JiraClient
 from apps.elastic.modules import anomalies as anomalies_elastic_client
+from apps.ingestion import text_tokens
+from apps.ingestion.synonym_matcher import CategorizationEngine
 from apps.models import anomalies as anomalies_model
-from apps.models import categories as categories_model
-from apps.models import impacted_item as impacted_item_model
-from apps.models import impacted_satellite as impacted_satellite_model
 from apps.utils import date_utils
 
 logger = logging.getLogger(__name__)
@@ -82,74 +81,11 @@ class AnomaliesIngestor:
                        'text': extract.fields.description, 'category': '', 'impactedItem': '', 'impactedSatellite': '',
                        'start': start, 'end': stop, 'environment': environment, 'webLink': ''}
 
-            title_tokenized = anomaly['title'].replace('[', ' ').replace(']', ' ').replace('(', ' ').replace(')', ' ') \
-                .replace('_', ' ').replace(':', ' ').replace('/', ' ').replace('*', ' ').split()
-            text_tokenized = anomaly['text'].replace('[', ' ').replace(']', ' ').replace('(', ' ').replace(')', ' ') \
-                .replace('_', ' ').replace(':', ' ').replace('/', ' ').replace('*', ' ').split()
-
-            for token in title_tokenized:
-                token = str(token)
-                if self.not_consistent(token):
-                    continue
-                impacted_satellite = impacted_satellite_model.get_impacted_satellite_by_synonymous(token)
-                if impacted_satellite is not None:
-                    anomaly['impactedSatellite'] = impacted_satellite.name
-                    break
-
-            if anomaly['impactedSatellite'] is None or len(anomaly['impactedSatellite']) == 0:
-                for token in text_tokenized:
-                    token = str(token)
-                    if self.not_consistent(token):
-                        continue
-                    impacted_satellite = impacted_satellite_model.get_impacted_satellite_by_synonymous(token)
-                    if impacted_satellite is not None:
-                        anomaly['impactedSatellite'] = impacted_satellite.name
-                        break
-
-            for token in title_tokenized:
-                token = str(token)
-                if self.not_consistent(token):
-                    continue
-                category = categories_model.get_category_by_synonymous(token)
-                if category is not None:
-                    anomaly['category'] = category.name
-                    break
-
-            if anomaly['category'] is None or len(anomaly['category']) == 0:
-                for token in text_tokenized:
-                    token = str(token)
-                    if self.not_consistent(token):
-                        continue
-                    category = categories_model.get_category_by_synonymous(token)
-                    if category is not None:
-                        anomaly['category'] = category.name
-                        break
-                    else:
-                        anomaly['category'] = 'Production'
-
-            for token in title_tokenized:
-                token = str(token)
-                if self.not_consistent(token):
-                    continue
-                impacted_item = impacted_item_model.get_impacted_item_by_category_and_synonymous(anomaly['category'],
-                                                                                                 token)
-                if impacted_item is not None:
-                    anomaly['impactedItem'] = impacted_item.name
-                    break
-
-            if anomaly['impactedItem'] is None or len(anomaly['impactedItem']) == 0:
-                for token in text_tokenized:
-                    token = str(token)
-                    if self.not_consistent(token):
-                        continue
-                    impacted_item = impacted_item_model.get_impacted_item_by_category_and_synonymous(
-                        anomaly['category'], token)
-                    if impacted_item is not None:
-                        anomaly['impactedItem'] = impacted_item.name
-                        break
-
             anomalies.append(anomaly)
 
+        # From the anomaly title and description, try to retrieve the impacted satellite, item and the category
+        self._categorize(anomalies, 'Production')
+
         return anomalies
 
     def get_anomalies_elastic(self, start=None):
@@ -170,88 +106,32 @@ class AnomaliesIngestor:
             environment = ';'.join(extract['_source']['datatake_ids'])
             anomaly['environment'] = environment
 
-            # From tha anomaly title and description, try to retrieve the impacted satellite, item and the category
-            title_tokenized = anomaly['title'].replace('[', ' ').replace(']', ' ').replace('(', ' ').replace(')', ' ') \
-                .replace('_', ' ').replace(':', ' ').replace('/', ' ').replace('*', ' ').split()
-            text_tokenized = anomaly['text'].replace('[', ' ').replace(']', ' ').replace('(', ' ').replace(')', ' ') \
-                .replace('_', ' ').replace(':', ' ').replace('/', ' ').replace('*', ' ').split()
-
-            for token in title_tokenized:
-                token = str(token)
-                if self.not_consistent(token):
-                    continue
-                impacted_satellite = impacted_satellite_model.get_impacted_satellite_by_synonymous(token)
-                if impacted_satellite is not None:
-                    anomaly['impactedSatellite'] = impacted_satellite.name
-                    break
-
-            if anomaly['impactedSatellite'] is None or len(anomaly['impactedSatellite']) == 0:
-                for token in text_tokenized:
-                    token = str(token)
-                    if self.not_consistent(token):
-                        continue
-                    impacted_satellite = impacted_satellite_model.get_impacted_satellite_by_synonymous(token)
-                    if impacted_satellite is not None:
-                        anomaly['impactedSatellite'] = impacted_satellite.name
-                        break
-
-            for token in title_tokenized:
-                token = str(token)
-                if self.not_consistent(token):
-                    continue
-                category = categories_model.get_category_by_synonymous(token)
-                if category is not None:
-                    anomaly['category'] = category.name
-                    break
-
-            if anomaly['category'] is None or len(anomaly['category']) == 0:
-                for token in text_tokenized:
-                    token = str(token)
-                    if self.not_consistent(token):
-                        continue
-                    category = categories_model.get_category_by_synonymous(token)
-                    if category is not None:
-                        anomaly['category'] = category.name
-                        break
-                    else:
-                        anomaly['category'] = 'Acquisition'
+            anomalies.append(anomaly)
 
-            for token in title_tokenized:
-                token = str(token)
-                if self.not_consistent(token):
-                    continue
-                impacted_item = impacted_item_model.get_impacted_item_by_category_and_synonymous(anomaly['category'],
-                                                                                                 token)
-                if impacted_item is not None:
-                    anomaly['impactedItem'] = impacted_item.name
-                    break
+        # From the anomaly title and description, try to retrieve the impacted satellite, item and the category
+        self._categorize(anomalies, 'Acquisition')
 
-            if anomaly['impactedItem'] is None or len(anomaly['impactedItem']) == 0:
-                for token in text_tokenized:
-                    token = str(token)
-                    if self.not_consistent(token):
-                        continue
-                    impacted_item = impacted_item_model.get_impacted_item_by_category_and_synonymous(
-                        anomaly['category'], token)
-                    if impacted_item is not None:
-                        anomaly['impactedItem'] = impacted_item.name
-                        break
+        return anomalies
 
-            anomalies.append(anomaly)
+    def _categorize(self, anomalies, default_category):
+        documents = [text_tokens.document_tokens(anomaly['title'], anomaly['text']) for anomaly in anomalies]
 
-        return anomalies
+        # Synonyms are loaded once, and matched in memory
+        categorization_engine = CategorizationEngine.from_db()
+        for anomaly, categorization in zip(anomalies, categorization_engine.classify_many(documents,
+                                                                                          default_category)):
+            anomaly['impactedSatellite'] = categorization.impacted_satellite
+            anomaly['category'] = categorization.category
+            anomaly['impactedItem'] = categorization.impacted_item
 
     def ingest_anomalies(self, start=None):
         list_anomalies = self.get_anomalies_elastic()
 
-        # Loop over all retrieved anomalies, and save or update them
-        for anomaly in list_anomalies:
-            anomalies_model.update_anomaly(title=anomaly['title'], key=anomaly['key'], text=anomaly['text'],
-                                           publication_date=anomaly['publicationDate'], category=anomaly['category'],
-                                           impacted_satellite=anomaly['impactedSatellite'],
-                                           impacted_item=anomaly['impactedItem'], start=anomaly['start'],
-                                           end=anomaly['end'], environment=anomaly.get('environment'))
+        # Save new anomalies and update the existing ones, in a single transaction
+        result = anomalies_model.upsert_anomalies(list_anomalies)
+        if result is not None:
+            logger.info("Anomalies ingested: %d inserted, %d updated, %d unchanged",
+                        result.inserted, result.updated, result.unchanged)
 
     def not_consistent(self, token):
-        excluded_tokens = ['-', 'in', 'and', 'or', 'the', 'of', 'to', 'due', 'ok', 'i.e', 'i.e.', 'is']
-        return token.isdigit() or len(token) == 1 or token in excluded_tokens
+        return text_tokens.not_consistent(token)
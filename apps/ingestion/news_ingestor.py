@@ -16,9 +16,9 @@ from datetime import datetime
 
 import apps.ingestion.news_scraper as scraper
 import apps.models.news as news_model
-from apps.models import categories as categories_model
-from apps.models import impacted_satellite as impacted_satellite_model
 import apps.utils.html_utils as html_utils
+from apps.ingestion import text_tokens
+from apps.ingestion.synonym_matcher import CategorizationEngine
 from apps.cache.cache import ConfigCache
 
 
@@ -65,59 +65,25 @@ class NewsIngestor:
         news_keywords = ['MANOEUVRE', 'MANEUVER', 'UNAVAILABILITY', 'INFRASTRUCTURE', 'DOWNTIME',
                          'MAINTENANCE', 'CALIBRATION', 'DEGRADED', 'DELAY']
 
+        documents = []
         for news in news_list:
             if any(word in news['title'].upper() for word in news_keywords):
                 categorized_news = news
 
-                title_tokenized = news['title'].replace('[', ' ').replace(']', ' ').replace('(', ' ').replace(')', ' ') \
-                    .replace('_', ' ').replace(':', ' ').replace('/', ' ').replace('*', ' ').split()
-                text_tokenized = news['text'].replace('[', ' ').replace(']', ' ').replace('(', ' ').replace(')', ' ') \
-                    .replace('_', ' ').replace(':', ' ').replace('/', ' ').replace('*', ' ').split()
-
-                for token in title_tokenized:
-                    token = str(token)
-                    if self.not_consistent(token):
-                        continue
-                    impacted_satellite = impacted_satellite_model.get_impacted_satellite_by_synonymous(token)
-                    if impacted_satellite is not None:
-                        categorized_news['impactedSatellite'] = impacted_satellite.name
-                        break
-
-                if categorized_news['impactedSatellite'] is None or len(categorized_news['impactedSatellite']) == 0:
-                    for token in text_tokenized:
-                        token = str(token)
-                        if self.not_consistent(token):
-                            continue
-                        impacted_satellite = impacted_satellite_model.get_impacted_satellite_by_synonymous(token)
-                        if impacted_satellite is not None:
-                            categorized_news['impactedSatellite'] = impacted_satellite.name
-                            break
-
-                for token in title_tokenized:
-                    token = str(token)
-                    if self.not_consistent(token):
-                        continue
-                    category = categories_model.get_category_by_synonymous(token)
-                    if category is not None:
-                        categorized_news['category'] = category.name
-                        break
-
-                if categorized_news['category'] is None or len(categorized_news['category']) == 0:
-                    for token in text_tokenized:
-                        token = str(token)
-                        if self.not_consistent(token):
-                            continue
-                        category = categories_model.get_category_by_synonymous(token)
-                        if category is not None:
-                            categorized_news['category'] = category.name
-                            break
-                        else:
-                            categorized_news['category'] = 'Production'
+                documents.append(text_tokens.document_tokens(news['title'], news['text']))
 
                 final_news_list.append(categorized_news)
             else:
                 continue
 
+        # Synonyms are loaded once, and matched in memory
+        categorization_engine = CategorizationEngine.from_db()
+        for categorized_news, categorization in zip(final_news_list,
+                                                    categorization_engine.classify_many(documents, 'Production',
+                                                                                        with_impacted_item=False)):
+            categorized_news['impactedSatellite'] = categorization.impacted_satellite
+            categorized_news['category'] = categorization.category
+
         return final_news_list
 
     def ingest_news(self):
@@ -131,5 +97,4 @@ class NewsIngestor:
                                    environment=news['environment'])
 
     def not_consistent(self, token):
-        excluded_tokens = ['-', 'in', 'and', 'or', 'the', 'of', 'to', 'due', 'ok', 'i.e', 'i.e.', 'is']
-        return token.isdigit() or len(token) == 1 or token in excluded_tokens
\ No newline at end of file
+        return text_tokens.not_consistent(token)
@@ -11,49 +11,19 @@ disclose in whole or in part, information contained herein except for or on
 behalf of  to fulfill the purpose for which the document was 
 delivered to him.
 """
-import os
-
-from satellite_tle import fetch_tle_from_celestrak
-
 import logging
 
 #from apps.elastic.modules.datatakes import OBSERVATION_START_KEY, OBSERVATION_END_KEY
 #from apps.elastic.modules.datatakes import DATATAKE_ID_KEY
-from apps.cache.modules.acquisitionassets import norad_id_map
 from apps.ingestion.acquisition_plans.fragment_completeness import MissionDatatakeIdHandler
 from apps.ingestion.acquisition_plans.orbit_acquisitions_kml import OrbitAcquisitionKmlFragmentBuilder, \
     _build_datatake_placemark, build_acquisition_line_placemark, build_acquisition_polygon_placemark
 from apps.ingestion.acquisition_plans.orbit_datatake_acquisitions import OrbitAcquisitionsBuilder, \
     AcquisitionLineProfileFromOrbit, DatatakeAcquisition, AcquisitionPolygonProfileFromOrbit
+from apps.ingestion.acquisition_plans.tle_repository import get_latest_tle
 
 logger = logging.getLogger(__name__)
 
-local_tle_files = {
-    "S3A": "S3A_20231012.tle",
-    "S3B": "S3B_20231017.tle",
-    "S5P": "S5P_20231017.tle"
-}
-
-
-def get_latest_tle(satellite):
-    # Otherwise retrieve from CACHE!
-    norad_id = norad_id_map[satellite]
-    try:
-        fetch_tle_from_celestrak(norad_id)
-    except Exception as ex:
-        tle_path = 'test/unit_tests/test_tles'
-        # Retrieve Last TLE from file
-        tle_file = local_tle_files.get(satellite, None)
-        if tle_file is not None:
-            tle_full = os.path.join(tle_path, tle_file)
-            with open(tle_full, 'r') as tle_in:
-                lines = tle_in.readlines()
-                for line in lines:
-                    line.strip()
-            return lines
-        raise ex
-
-
 #ORBIT_PROPAGATION_STEP = 60
 ORBIT_PROPAGATION_STEP = 90
 
@@ -153,15 +123,27 @@ class AcquisitionPlanOrbitDatatakeBuilder:
     #   or define a dataclass to be imported from datatakes
     #   dictionaries
     @staticmethod
-    def _acquisition_from_datatake(datatake, sat_orbit_builder):
-        acq = DatatakeAcquisition(datatake)
+    def _acquisitions_from_datatakes(datatakes, sat_orbit_builder):
+        """
+        Build the acquisitions of a list of datatakes: the orbit is
+        propagated once for all the datatakes
+        Args:
+            datatakes (): a list of datatake dictionaries
+            sat_orbit_builder (OrbitAcquisitionsBuilder):
+
+        Returns: a list of DatatakeAcquisition, in the same order
+
+        """
+        acquisitions = [DatatakeAcquisition(datatake) for datatake in datatakes]
         # NOTE: DT Has no Start/End Time
-        acq.acquisition_points = sat_orbit_builder.compute_acquisition_points(acq.start_time,
-                                                                              acq.end_time)
-        logger.debug("Datatake %s: Computed %d points for acquisition profile",
-                     acq.datatake_id,
-                     len(acq.acquisition_points))
-        return acq
+        acquisitions_points = sat_orbit_builder.compute_acquisitions_points([(acq.start_time, acq.end_time)
+                                                                            for acq in acquisitions])
+        for acq, acq_points in zip(acquisitions, acquisitions_points):
+            acq.acquisition_points = acq_points
+            logger.debug("Datatake %s: Computed %d points for acquisition profile",
+                         acq.datatake_id,
+                         len(acq.acquisition_points))
+        return acquisitions
 
     def _build_satellite_fragments(self, fragment_days, sat_orbit_builder, satellite):
         """
@@ -174,33 +156,35 @@ class AcquisitionPlanOrbitDatatakeBuilder:
         Returns:
 
         """
+        # Acquisitions of all the days are computed together
+        sat_days_datatakes = {}
         for acq_day in fragment_days:
+            day_datatakes = self._daily_datatakes.get(acq_day)
+            if day_datatakes is not None:
+                sat_days_datatakes[acq_day] = day_datatakes.get(satellite) or {}
+        acquisitions = iter(self._acquisitions_from_datatakes([dt
+                                                               for day_sat_datatakes in sat_days_datatakes.values()
+                                                               for dt in day_sat_datatakes.values()],
+                                                              sat_orbit_builder))
+        for acq_day, day_sat_datatakes in sat_days_datatakes.items():
             logger.debug("Building Fragments from Orbit/datatakes - satellite: %s, day: %s",
                          satellite, acq_day)
             # Instantiate a KML Builder for each Day
             # Each builder creates a KML Fragment
             #      Let the KML Fragments Builder create a Fragment for current day
             sat_kml_builder = OrbitAcquisitionKmlFragmentBuilder(acq_day, satellite)
-            #  Retrieve the Daily Datatakes for the satellite (from the cache)
-            day_datatakes = self._daily_datatakes.get(acq_day)
-            if day_datatakes is not None:
-                day_sat_datatakes = day_datatakes.get(satellite)
-                # 2. For each day in Datatakes table
-                #        Create the acquisitions for the current day
-
-                #     Pass the Acquisition lists to the Fragment Builder, in order to append to the current day Fragment
-                if day_sat_datatakes is not None:
-                    for dt_id, dt in day_sat_datatakes.items():
-                        logger.debug("Building acquisition for datatake %s", dt_id)
-                        acq = self._acquisition_from_datatake(dt, sat_orbit_builder)
-                        acq_placemark = _build_datatake_placemark(acq, self._id_key)
-                        acq_placemark.append(self._placemark_geometry_builder_fun(acq))
-                        sat_kml_builder.add_to_daily_folder(acq_day, satellite,
-                                                            acq_placemark)
-
-                # Add the P Mist to current Fragment
-                # Save the KML Fragments on the Mission Acqplan Fragments Area.
-                self._mission_acqplan_fragments[satellite].process_kml_folder(sat_kml_builder.fragment)
+            #     Pass the Acquisition lists to the Fragment Builder, in order to append to the current day Fragment
+            for dt_id in day_sat_datatakes:
+                logger.debug("Building acquisition for datatake %s", dt_id)
+                acq = next(acquisitions)
+                acq_placemark = _build_datatake_placemark(acq, self._id_key)
+                acq_placemark.append(self._placemark_geometry_builder_fun(acq))
+                sat_kml_builder.add_to_daily_folder(acq_day, satellite,
+                                                    acq_placemark)
+
+            # Add the P Mist to current Fragment
+            # Save the KML Fragments on the Mission Acqplan Fragments Area.
+            self._mission_acqplan_fragments[satellite].process_kml_folder(sat_kml_builder.fragment)
 
 
 acq_orbit_mission_satellites = {
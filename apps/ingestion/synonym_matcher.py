@@ -0,0 +1,186 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which TPZ has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of TPZ to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import logging
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from apps import db
+from apps.models.categories import Categories
+from apps.models.impacted_item import ImpactedItem
+from apps.models.impacted_satellite import ImpactedSatellite
+
+logger = logging.getLogger(__name__)
+
+# Cannot be part of a token: matches never span two rows
+_ROW_SEPARATOR = '\x00'
+
+
+class SynonymIndex:
+    """
+    Find the first row whose synonyms contain a token, as the query
+    "synonymous LIKE '%token%'" does, without accessing the DB.
+    The synonyms of all the rows are joined in a single text, in row order:
+    the first occurrence of the token in the text belongs to the first matching row.
+    Results are memoized by token.
+    """
+
+    def __init__(self, rows: Sequence[Tuple[str, Optional[str]]], case_sensitive=True):
+        """
+        Args:
+            rows (): list of tuples (name, synonymous), in DB order
+            case_sensitive (bool): False to match as ILIKE
+        """
+        self._case_sensitive = case_sensitive
+        self._names = [name for name, _ in rows]
+        self._row_starts = []
+        texts = []
+        position = 0
+        for _, synonymous in rows:
+            synonymous = synonymous or ''
+            self._row_starts.append(position)
+            texts.append(synonymous if case_sensitive else synonymous.lower())
+            position += len(synonymous) + len(_ROW_SEPARATOR)
+        self._text = _ROW_SEPARATOR.join(texts)
+        self._matches = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def match(self, token) -> Optional[str]:
+        """
+        Returns: the name of the first row whose synonyms contain the token, or None
+        """
+        if token in self._matches:
+            return self._matches[token]
+        position = self._text.find(token if self._case_sensitive else token.lower()) if self._names else -1
+        name = self._names[bisect_right(self._row_starts, position) - 1] if position >= 0 else None
+        self._matches[token] = name
+        return name
+
+    def first_match(self, tokens: Iterable[str]) -> Optional[str]:
+        """
+        Returns: the match of the first token matching a row, or None
+        """
+        for token in tokens:
+            name = self.match(token)
+            if name is not None:
+                return name
+        return None
+
+
+@dataclass
+class DocumentCategorization:
+    category: str = ''
+    impacted_satellite: str = ''
+    impacted_item: str = ''
+
+
+class CategorizationEngine:
+    """
+    Categorize anomalies and news from the tokens of their title and text, using
+    the synonyms of categories, impacted satellites and impacted items. The synonym
+    tables are loaded once: build a new engine for each ingestion run.
+    Each attribute is taken from the first title token matching a synonym,
+    or from the first text token if no title token matches.
+    """
+
+    def __init__(self, categories, impacted_satellites, impacted_items, like_case_sensitive=True):
+        """
+        Args:
+            categories (): list of tuples (name, synonymous)
+            impacted_satellites (): list of tuples (name, synonymous)
+            impacted_items (): list of tuples (name, category, synonymous)
+            like_case_sensitive (bool): True if the LIKE operator of the DB is case sensitive
+        """
+        self._like_case_sensitive = like_case_sensitive
+        # Categories are searched with ILIKE
+        self._categories = SynonymIndex(categories, case_sensitive=False)
+        self._impacted_satellites = SynonymIndex(impacted_satellites, like_case_sensitive)
+        self._impacted_items = impacted_items
+        self._category_items = {}
+
+    @classmethod
+    def from_db(cls):
+        """
+        Build the engine from the synonym tables
+        """
+        # SQLite LIKE ignores the case of ASCII letters
+        like_case_sensitive = db.engine.dialect.name != 'sqlite'
+        engine = cls([(row.name, row.synonymous) for row in db.session.query(Categories).all()],
+                     [(row.name, row.synonymous) for row in db.session.query(ImpactedSatellite).all()],
+                     [(row.name, row.category, row.synonymous) for row in db.session.query(ImpactedItem).all()],
+                     like_case_sensitive)
+        logger.debug("Categorization engine loaded: %d categories, %d impacted satellites, %d impacted items",
+                     len(engine._categories), len(engine._impacted_satellites), len(engine._impacted_items))
+        return engine
+
+    def _items_index(self, category) -> SynonymIndex:
+        """
+        Returns: the index of the impacted items whose category contains the specified one
+        """
+        if category not in self._category_items:
+            search = category if self._like_case_sensitive else category.lower()
+            # As SQL LIKE, items without category never match
+            self._category_items[category] = SynonymIndex(
+                [(name, synonymous) for name, item_category, synonymous in self._impacted_items
+                 if item_category is not None and
+                 search in (item_category if self._like_case_sensitive else item_category.lower())],
+                self._like_case_sensitive)
+        return self._category_items[category]
+
+    @staticmethod
+    def _title_or_text_match(index: SynonymIndex, title_tokens, text_tokens):
+        name = index.first_match(title_tokens)
+        if name is None:
+            name = index.first_match(text_tokens)
+        return name
+
+    def classify(self, title_tokens: Sequence[str], text_tokens: Sequence[str],
+                 default_category=None, with_impacted_item=True) -> DocumentCategorization:
+        """
+        Categorize a document
+        Args:
+            title_tokens (): the tokens of the title, already filtered
+            text_tokens (): the tokens of the text, already filtered
+            default_category (str): category assigned when no category matches, if the text has tokens
+            with_impacted_item (bool): False to skip the impacted item search
+
+        Returns: a DocumentCategorization; attributes not found are empty strings
+
+        """
+        result = DocumentCategorization()
+        result.impacted_satellite = self._title_or_text_match(self._impacted_satellites,
+                                                              title_tokens, text_tokens) or ''
+        result.category = self._title_or_text_match(self._categories, title_tokens, text_tokens) or ''
+        if not result.category and default_category is not None and len(text_tokens) > 0:
+            result.category = default_category
+        if with_impacted_item:
+            result.impacted_item = self._title_or_text_match(self._items_index(result.category),
+                                                             title_tokens, text_tokens) or ''
+        return result
+
+    def classify_many(self, documents: Iterable[Tuple[Sequence[str], Sequence[str]]],
+                      default_category=None, with_impacted_item=True) -> List[DocumentCategorization]:
+        """
+        Categorize a list of documents
+        Args:
+            documents (): tuples (title tokens, text tokens)
+
+        Returns: a list of DocumentCategorization, in the same order
+
+        """
+        return [self.classify(title_tokens, text_tokens, default_category, with_impacted_item)
+                for title_tokens, text_tokens in documents]
@@ -0,0 +1,55 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which TPZ has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of TPZ to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+from typing import List, Optional, Tuple
+
+# Characters replaced by blanks before splitting the text in tokens
+TOKEN_SEPARATORS = '[]()_:/*'
+
+# Tokens not used for categorization
+EXCLUDED_TOKENS = frozenset(['-', 'in', 'and', 'or', 'the', 'of', 'to', 'due', 'ok', 'i.e', 'i.e.', 'is'])
+
+_SEPARATORS_TABLE = str.maketrans(TOKEN_SEPARATORS, ' ' * len(TOKEN_SEPARATORS))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split a text in tokens, on blanks and on the separator characters
+    Returns: the list of tokens (empty if text is None)
+    """
+    if not text:
+        return []
+    return text.translate(_SEPARATORS_TABLE).split()
+
+
+def not_consistent(token: str) -> bool:
+    """
+    Returns: True if the token is a number, a single character or an excluded word
+    """
+    return token.isdigit() or len(token) == 1 or token in EXCLUDED_TOKENS
+
+
+def consistent_tokens(text: Optional[str]) -> List[str]:
+    """
+    Returns: the tokens of a text usable for categorization, in text order
+    """
+    return [token for token in tokenize(text) if not not_consistent(token)]
+
+
+def document_tokens(title: Optional[str], text: Optional[str]) -> Tuple[List[str], List[str]]:
+    """
+    Tokenize a document once: the same tokens feed all the classifiers
+    Returns: a tuple (title tokens, text tokens), as expected by CategorizationEngine
+    """
+    return consistent_tokens(title), consistent_tokens(text)
@@ -13,6 +13,7 @@ delivered to him.
 """
 
 import logging
+from dataclasses import dataclass
 from datetime import datetime
 
 from apps import db
@@ -20,12 +21,15 @@ from apps.utils.db_utils import generate_uuid
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of keys in a single IN clause (SQLite limits the query parameters)
+KEYS_QUERY_CHUNK_SIZE = 500
+
 
 class Anomalies(db.Model):
     __tablename__ = 'anomalies'
 
     id = db.Column(db.String(64), primary_key=True)
-    key = db.Column(db.String(9999))
+    key = db.Column(db.String(9999), index=True)
     title = db.Column(db.String(9999))
     text = db.Column(db.String(9999))
     publicationDate = db.Column(db.DateTime)
@@ -77,14 +81,7 @@ def update_anomaly(title, key, text, publication_date, category, impacted_satell
             anomaly.environment = environment
             anomaly.modify_date = modify_date
         else:
-            datatakes_completeness = []
-            if environment is not None and len(environment) > 0:
-                datatake_ids = environment.split(';')
-                for datatake_id in datatake_ids:
-                    if datatake_id is None or len(datatake_id) == 0:
-                        continue
-                    entry = {'datatakeID': datatake_id, 'L0_': 0, 'L1_': 0, 'L2_': 0}
-                    datatakes_completeness.append(entry)
+            datatakes_completeness = _initial_datatakes_completeness(environment)
             anomaly = Anomalies(id=str(generate_uuid()), key=key, title=title, text=text,
                                 publicationDate=publication_date, category=category,
                                 impactedSatellite=impacted_satellite, impactedItem=impacted_item, start=start, end=end,
@@ -98,6 +95,96 @@ def update_anomaly(title, key, text, publication_date, category, impacted_satell
     return None
 
 
+@dataclass
+class AnomaliesUpsertResult:
+    """
+    Number of anomalies inserted, updated and left unchanged by a bulk upsert
+    """
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+# Anomaly dictionary keys, as built by the ingestor, of the columns updated on existing anomalies
+_UPDATED_COLUMNS = {'title': 'title', 'text': 'text', 'publicationDate': 'publicationDate',
+                    'start': 'start', 'end': 'end', 'environment': 'environment'}
+
+
+def _initial_datatakes_completeness(environment):
+    datatakes_completeness = []
+    if environment is not None and len(environment) > 0:
+        datatake_ids = environment.split(';')
+        for datatake_id in datatake_ids:
+            if datatake_id is None or len(datatake_id) == 0:
+                continue
+            entry = {'datatakeID': datatake_id, 'L0_': 0, 'L1_': 0, 'L2_': 0}
+            datatakes_completeness.append(entry)
+    return datatakes_completeness
+
+
+def _query_by_keys(keys, *columns):
+    """
+    Query the columns of the anomalies with the specified keys, in chunks of keys
+    Returns: a dictionary of rows, keyed by anomaly key
+    """
+    rows = {}
+    keys = list(keys)
+    for chunk_start in range(0, len(keys), KEYS_QUERY_CHUNK_SIZE):
+        chunk_keys = keys[chunk_start:chunk_start + KEYS_QUERY_CHUNK_SIZE]
+        for row in db.session.query(Anomalies.id, Anomalies.key, *columns).filter(Anomalies.key.in_(chunk_keys)):
+            rows[row.key] = row
+    return rows
+
+
+def upsert_anomalies(anomalies, modify_date=None):
+    """
+    Save a list of anomalies in a single transaction: the existing anomalies are loaded
+    with one query, then new anomalies are inserted and changed anomalies are updated in bulk.
+    As in update_anomaly, only title, text, dates and environment of existing anomalies are updated.
+    Args:
+        anomalies (): list of anomaly dictionaries, as built by the AnomaliesIngestor
+        modify_date (datetime): modification date of inserted and updated anomalies (default: now)
+
+    Returns: an AnomaliesUpsertResult, or None if the transaction failed
+
+    """
+    modify_date = modify_date or datetime.now()
+    result = AnomaliesUpsertResult()
+    # If a key is repeated, the last anomaly is saved
+    anomalies_by_key = {anomaly['key']: anomaly for anomaly in anomalies}
+    try:
+        existing_rows = _query_by_keys(anomalies_by_key.keys(),
+                                       *[getattr(Anomalies, column) for column in _UPDATED_COLUMNS.values()])
+        inserts = []
+        updates = []
+        for key, anomaly in anomalies_by_key.items():
+            values = {column: anomaly.get(anomaly_key) for anomaly_key, column in _UPDATED_COLUMNS.items()}
+            row = existing_rows.get(key)
+            if row is None:
+                inserts.append(dict(values, id=str(generate_uuid()), key=key, category=anomaly.get('category'),
+                                    impactedSatellite=anomaly.get('impactedSatellite'),
+                                    impactedItem=anomaly.get('impactedItem'),
+                                    datatakes_completeness=str(
+                                        _initial_datatakes_completeness(anomaly.get('environment'))),
+                                    newsLink=None, newsTitle=None, modifyDate=modify_date))
+            elif any(getattr(row, column) != value for column, value in values.items()):
+                updates.append(dict(values, id=row.id, modifyDate=modify_date))
+            else:
+                result.unchanged += 1
+        if inserts:
+            db.session.bulk_insert_mappings(Anomalies, inserts)
+        if updates:
+            db.session.bulk_update_mappings(Anomalies, updates)
+        db.session.commit()
+        result.inserted = len(inserts)
+        result.updated = len(updates)
+        return result
+    except Exception as ex:
+        db.session.rollback()
+        logger.error("Saving anomalies, received error: %s", ex, exc_info=True)
+    return None
+
+
 def update_anomaly_categorization(key, category, impacted_item, impacted_satellite, environment, newsLink=None,
                                   newsTitle=None):
     try:
@@ -132,6 +219,49 @@ def update_datatakes_completeness(key, datatakes_completeness):
         return None
 
 
+def update_datatakes_completeness_many(datatakes_completeness_by_key, modify_date=None):
+    """
+    Update the datatakes completeness of a set of anomalies in a single transaction;
+    anomalies not saved on DB are skipped
+    Args:
+        datatakes_completeness_by_key (dict): datatakes completeness list, keyed by anomaly key
+        modify_date (datetime): modification date of updated anomalies (default: now)
+
+    Returns: an AnomaliesUpsertResult (inserted is always 0), or None if the transaction failed
+
+    """
+    modify_date = modify_date or datetime.now()
+    result = AnomaliesUpsertResult()
+    try:
+        existing_rows = _query_by_keys(datatakes_completeness_by_key.keys(), Anomalies.datatakes_completeness)
+        updates = []
+        for key, row in existing_rows.items():
+            datatakes_completeness = str(datatakes_completeness_by_key[key])
+            if row.datatakes_completeness == datatakes_completeness:
+                result.unchanged += 1
+                continue
+            updates.append({'id': row.id, 'datatakes_completeness': datatakes_completeness,
+                            'modifyDate': modify_date})
+        if updates:
+            db.session.bulk_update_mappings(Anomalies, updates)
+        db.session.commit()
+        result.updated = len(updates)
+        return result
+    except Exception as ex:
+        db.session.rollback()
+        logger.error("Updating anomalies datatakes completeness, received error: %s", ex, exc_info=True)
+    return None
+
+
+def create_missing_indexes():
+    """
+    Create the indexes of the anomalies table missing on DB
+    (create_all does not add indexes to already existing tables)
+    """
+    for index in Anomalies.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+
+
 def get_anomalies(start_date=None, end_date=None):
     try:
         if start_date is None or end_date is None:
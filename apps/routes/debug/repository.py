@@ -125,7 +125,7 @@ def get_cds_sat_unavailability(start_date, end_date):
         end_date = datetime.strptime(end_date, '%d-%m-%YT%H:%M:%S')
 
         indices = elastic_utils.get_index_name_from_interval_date('cds-sat-unavailability', start_date, end_date)
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -154,7 +154,7 @@ def get_cds_datatake(start_date, end_date):
 
         indices = ['cds-datatake']
 
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -195,7 +195,7 @@ def get_cds_datatake_selected_fields(start_date, end_date):
 
         indices = ['cds-datatake']
 
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -240,7 +240,7 @@ def get_cds_downlink_datatake_by_datatake_id(start_date, end_date, datatake_id):
         end_date = datetime.strptime(end_date, '%d-%m-%Y')
 
         indices = elastic_utils.get_index_name_from_interval_date('cds-downlink-datatake', start_date, end_date)
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
 
         if datatake_id.upper() == 'ALL':
@@ -277,7 +277,7 @@ def get_cds_s3_completeness(start_date, end_date):
 
         indices = ['cds-s3-completeness']
 
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             logger.info("On index %s", index)
@@ -315,7 +315,7 @@ def get_cds_s3_completeness_selected_fields(start_date, end_date):
 
         indices = ['cds-s3-completeness']
 
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             logger.info("On index %s", index)
@@ -358,7 +358,7 @@ def get_cds_s5_completeness(start_date, end_date):
 
         # indices = utils.get_index_name_from_interval_date('cds-s5-completeness', start_date, end_date)
         indices = ['cds-s5-completeness']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -396,7 +396,7 @@ def get_cds_s5_completeness_selected_fields(start_date, end_date):
 
         # indices = utils.get_index_name_from_interval_date('cds-s5-completeness', start_date, end_date)
         indices = ['cds-s5-completeness']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -434,7 +434,7 @@ def get_cds_interface_status_monitoring():
                             status=401)
 
         indices = ['cds-interface-status-monitoring']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -460,7 +460,7 @@ def get_cds_ddp_data_available(start_date, end_date):
         start_date = datetime.strptime(start_date, '%d-%m-%Y')
         end_date = datetime.strptime(end_date, '%d-%m-%Y')
         indices = elastic_utils.get_index_name_from_interval_year('cds-ddp-data-available', start_date, end_date)
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -484,7 +484,7 @@ def get_maas_collector_journal():
                             status=401)
 
         indices = ['maas-collector-journal']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -508,7 +508,7 @@ def get_cds_s2_tilpar_tiles():
                             status=401)
 
         indices = ['cds-s2-tilpar-tiles']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -532,7 +532,7 @@ def get_external_interfaces_counting():
                             status=401)
 
         indices = ['external-interfaces-counting']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -559,7 +559,7 @@ def get_raw_data_aps_products(start_date, end_date):
         end_date = datetime.strptime(end_date, '%d-%m-%YT%H:%M:%S')
 
         indices = ['raw-data-aps-product']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -592,7 +592,7 @@ def get_raw_data_aps_edrs_products(start_date, end_date):
         end_date = datetime.strptime(end_date, '%d-%m-%YT%H:%M:%S')
 
         indices = ['raw-data-aps-edrs-product']
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
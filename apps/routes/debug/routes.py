@@ -17,9 +17,10 @@ import logging
 from datetime import datetime, timedelta
 from time import perf_counter
 
-from flask import Response, request
+from flask import Response, current_app, request
 from flask_login import login_required
 
+import apps.cache.refresh_coordinator as refresh_coordinator
 import apps.elastic.client as elastic_client
 import apps.elastic.modules.publication as elastic_publication
 import apps.elastic.modules.timeliness as elastic_timeliness
@@ -103,7 +104,7 @@ def get_cds_publication_by_mission(start_date, end_date, platform):
         # indices = utils.get_index_name_from_interval_date('cds-publication', start_date, end_date)
         indices = ['cds-publication']
 
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         start_date_str, end_date_str = elastic.date_interval_to_elastic_range(start_date, end_date)
         logger.info("Querying publications for platform %s from %s to %s excluded",
                     platform, start_date_str, end_date_str)
@@ -266,7 +267,7 @@ def get_cds_product(start_date, end_date, datatake_id):
         end_date = datetime.strptime(end_date, '%d-%m-%Y')
 
         indices = elastic_utils.get_index_name_from_interval_date('cds-product', start_date, end_date)
-        elastic = elastic_client.ElasticClient()
+        elastic = elastic_client.get_elastic_client()
         results = []
         for index in indices:
             try:
@@ -420,3 +421,31 @@ def get_cds_publication_count_by_mission_quarter(year, quarter, mission):
     except Exception as ex:
         logger.error("Failure on mission %s: %s", mission, ex)
         return Response(json.dumps({'error': '500'}), mimetype="application/json", status=500)
+
+
+@blueprint.route('/api/debug/elastic/health', methods=['GET'])
+@login_required
+def get_elastic_health():
+    if not auth_utils.is_user_authorized():
+        return Response(json.dumps("Not authorized", cls=db_utils.AlchemyEncoder), mimetype="application/json",
+                        status=401)
+    health = elastic_client.elastic_health()
+    return Response(json.dumps(health), mimetype="application/json",
+                    status=200 if health['available'] else 503)
+
+
+@blueprint.route('/api/debug/scheduler/jobs', methods=['GET'])
+@login_required
+def get_scheduler_jobs():
+    if not auth_utils.is_user_authorized():
+        return Response(json.dumps("Not authorized", cls=db_utils.AlchemyEncoder), mimetype="application/json",
+                        status=401)
+    job_scheduler = current_app.extensions.get('job_scheduler')
+    if job_scheduler is None:
+        return Response(json.dumps("Scheduler not started"), mimetype="application/json", status=404)
+    coordinator = current_app.extensions.get('cache_refresh_coordinator')
+    return Response(json.dumps({
+        'leader': coordinator is not None and coordinator.is_leader(),
+        'cache_generation': refresh_coordinator.get_cache_generation_info(),
+        'jobs': job_scheduler.get_status()
+    }), mimetype="application/json", status=200)
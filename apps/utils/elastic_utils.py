@@ -43,7 +43,7 @@ def _get_month_subperiods(start_date: datetime, end_date: datetime, index_name):
 
 def get_cds_publication_from_datake(id):
     index = 'cds-publication'
-    elastic = client.ElasticClient()
+    elastic = client.get_elastic_client()
     results = []
     try:
         query = {"query": {"term": {"datatake_id": id}}}
@@ -0,0 +1,313 @@
+# -*- encoding: utf-8 -*-
+"""
+Copernicus Operations Dashboard
+
+Copyright (C) - ${startYear}-${currentYear} ${Telespazio}
+All rights reserved.
+
+This document discloses subject matter in which  has
+proprietary rights. Recipient of the document shall not duplicate, use or
+disclose in whole or in part, information contained herein except for or on
+behalf of  to fulfill the purpose for which the document was
+delivered to him.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+
+DEFAULT_GROUP_LIMIT = 1
+
+# Period of the loop checking the time based triggers
+DEFAULT_POLL_INTERVAL = 1
+
+DEFAULT_PRIORITY = 100
+
+
+class JobState:
+    IDLE = 'idle'
+    PENDING = 'pending'
+    RUNNING = 'running'
+
+
+@dataclass
+class JobMetrics:
+    """
+    Execution statistics of a job: lag is the time from trigger to start of execution,
+    including the time waiting for dependencies and for a free worker
+    """
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    last_trigger: Optional[str] = None
+    last_start: Optional[str] = None
+    last_end: Optional[str] = None
+    last_duration: Optional[float] = None
+    last_lag: Optional[float] = None
+    max_duration: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+@dataclass
+class Job:
+    """
+    A scheduled function.
+    Args:
+        name: unique job name
+        func: the function to execute, without arguments
+        depends_on: names of the jobs that must be completed before this job is started
+        priority: order of execution of ready jobs (lower first), used also for the startup warm-up
+        group: name of the concurrency group; jobs of the same group share the group limit
+        warm_up: if True, the job is executed at startup
+    """
+    name: str
+    func: Callable
+    depends_on: Tuple[str, ...] = ()
+    priority: int = DEFAULT_PRIORITY
+    group: Optional[str] = None
+    warm_up: bool = True
+    state: str = JobState.IDLE
+    completed: bool = False
+    trigger_time: Optional[float] = None
+    sequence: int = 0
+    metrics: JobMetrics = field(default_factory=JobMetrics)
+
+
+class JobScheduler:
+    """
+    Execute jobs on a pool of workers, honoring the declared dependencies:
+    - a job is started only when none of its dependencies is pending or running, and each dependency
+      completed at least once (dependencies never executed are triggered on demand)
+    - a job triggered while pending or running is skipped (no overlapping executions)
+    - the number of running jobs of the same group is bounded by the group limit
+    Ready jobs are started in order of priority, then of trigger.
+    Time based triggers are defined with the "schedule" library, and only submit the jobs.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, group_limits=None, job_wrapper=None,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Args:
+            max_workers (int): number of jobs executed at the same time
+            group_limits (dict): maximum number of running jobs, for each concurrency group
+            job_wrapper (): optional function (job function) -> None, executing the job function
+                in the required context
+            poll_interval (float): seconds between checks of time based triggers
+        """
+        self._max_workers = max_workers
+        self._group_limits = dict(group_limits or {})
+        self._group_running = {}
+        self._job_wrapper = job_wrapper
+        self._poll_interval = poll_interval
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        self._executor = None
+        self._started = False
+
+    def add_job(self, name, func, depends_on=(), priority=DEFAULT_PRIORITY, group=None, warm_up=True):
+        with self._condition:
+            if name in self._jobs:
+                raise ValueError(f"Job {name} already defined")
+            self._jobs[name] = Job(name=name, func=func, depends_on=tuple(depends_on),
+                                   priority=priority, group=group, warm_up=warm_up)
+        return name
+
+    def _check_dependencies(self):
+        for job in self._jobs.values():
+            for dep_name in job.depends_on:
+                if dep_name not in self._jobs:
+                    raise ValueError(f"Job {job.name} depends on undefined job {dep_name}")
+        # Depth first visit, to detect cycles
+        visited = {}
+
+        def _visit(job_name, path):
+            if visited.get(job_name) == 'done':
+                return
+            if visited.get(job_name) == 'visiting':
+                raise ValueError(f"Job dependency cycle: {' -> '.join(path + [job_name])}")
+            visited[job_name] = 'visiting'
+            for dep_name in self._jobs[job_name].depends_on:
+                _visit(dep_name, path + [job_name])
+            visited[job_name] = 'done'
+
+        for name in self._jobs:
+            _visit(name, [])
+
+    def trigger(self, name):
+        """
+        Request the execution of a job; the request is ignored if the job is already pending or running.
+        Returns: True if the job has been queued
+        """
+        with self._condition:
+            queued = self._enqueue(self._jobs[name])
+            if self._started:
+                self._dispatch()
+        return queued
+
+    def _enqueue(self, job: Job):
+        if job.state != JobState.IDLE:
+            logger.info("Job %s is %s: skipping new execution", job.name, job.state)
+            job.metrics.skipped += 1
+            return False
+        job.state = JobState.PENDING
+        job.trigger_time = perf_counter()
+        job.sequence = next(self._sequence)
+        job.metrics.last_trigger = datetime.now().isoformat()
+        return True
+
+    def _enqueue_missing_dependencies(self):
+        # Dependencies of pending jobs never executed are run first
+        enqueued = True
+        while enqueued:
+            enqueued = False
+            for job in list(self._jobs.values()):
+                if job.state != JobState.PENDING:
+                    continue
+                for dep_name in job.depends_on:
+                    dependency = self._jobs[dep_name]
+                    if dependency.state == JobState.IDLE and not dependency.completed:
+                        logger.debug("Job %s waiting for job %s: triggering it", job.name, dep_name)
+                        self._enqueue(dependency)
+                        enqueued = True
+
+    def _is_ready(self, job: Job):
+        for dep_name in job.depends_on:
+            dependency = self._jobs[dep_name]
+            if dependency.state != JobState.IDLE or not dependency.completed:
+                return False
+        if job.group is not None:
+            limit = self._group_limits.get(job.group, DEFAULT_GROUP_LIMIT)
+            if self._group_running.get(job.group, 0) >= limit:
+                return False
+        return True
+
+    def _dispatch(self):
+        """
+        Start the ready jobs, while workers are available. Must be called holding the lock
+        """
+        self._enqueue_missing_dependencies()
+        while True:
+            running = sum(1 for job in self._jobs.values() if job.state == JobState.RUNNING)
+            if running >= self._max_workers:
+                return
+            pending = sorted((job for job in self._jobs.values() if job.state == JobState.PENDING),
+                             key=lambda job: (job.priority, job.sequence))
+            ready_job = next((job for job in pending if self._is_ready(job)), None)
+            if ready_job is None:
+                return
+            ready_job.state = JobState.RUNNING
+            if ready_job.group is not None:
+                self._group_running[ready_job.group] = self._group_running.get(ready_job.group, 0) + 1
+            self._executor.submit(self._run, ready_job)
+
+    def _run(self, job: Job):
+        start_time = perf_counter()
+        lag = start_time - job.trigger_time
+        job.metrics.last_start = datetime.now().isoformat()
+        job.metrics.last_lag = lag
+        logger.info("[BEG] Job %s - lag: %0.3f", job.name, lag)
+        error = None
+        try:
+            if self._job_wrapper is not None:
+                self._job_wrapper(job.func)
+            else:
+                job.func()
+        except Exception as ex:
+            error = ex
+            logger.error("[ERR] Job %s - Error running job: %s", job.name, ex)
+            logger.error("[ERR] Job %s - Traceback of error ", job.name, exc_info=1)
+        duration = perf_counter() - start_time
+        logger.info(f"[END] Job {job.name} - Execution Time : {duration:0.6f}")
+        with self._condition:
+            metrics = job.metrics
+            metrics.runs += 1
+            metrics.last_end = datetime.now().isoformat()
+            metrics.last_duration = duration
+            metrics.max_duration = duration if metrics.max_duration is None else max(metrics.max_duration, duration)
+            if error is not None:
+                metrics.failures += 1
+                metrics.last_error = str(error)
+            # A failed execution does not block dependent jobs forever
+            job.completed = True
+            job.state = JobState.IDLE
+            if job.group is not None:
+                self._group_running[job.group] -= 1
+            self._dispatch()
+            self._condition.notify_all()
+
+    def warm_up(self):
+        """
+        Trigger all the jobs to be executed at startup: they are executed in order of priority,
+        as soon as dependencies allow
+        """
+        with self._condition:
+            for job in sorted(self._jobs.values(), key=lambda job: job.priority):
+                if job.warm_up:
+                    self._enqueue(job)
+            self._dispatch()
+
+    def wait_idle(self, timeout=None):
+        """
+        Wait until no job is pending or running
+        Returns: True if all jobs are idle
+        """
+        deadline = None if timeout is None else perf_counter() + timeout
+        with self._condition:
+            while any(job.state != JobState.IDLE for job in self._jobs.values()):
+                remaining = None if deadline is None else deadline - perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def start(self, time_triggers=None, warm_up=True):
+        """
+        Start the workers and the loop checking the time based triggers
+        Args:
+            time_triggers (): optional "schedule" Scheduler, whose jobs trigger scheduler jobs
+            warm_up (bool): if True, all the jobs are executed at startup
+        """
+        with self._condition:
+            if self._started:
+                return
+            self._check_dependencies()
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='job')
+            self._started = True
+        if warm_up:
+            self.warm_up()
+        if time_triggers is not None:
+            threading.Thread(target=self._poll_time_triggers, args=(time_triggers,),
+                             name='job-triggers', daemon=True).start()
+
+    def _poll_time_triggers(self, time_triggers):
+        while True:
+            try:
+                time_triggers.run_pending()
+            except Exception as ex:
+                logger.error("[ERR] Job Scheduler - Error checking time based triggers: %s", ex)
+                logger.error("[ERR] Job Scheduler - Traceback of error ", exc_info=1)
+            time.sleep(self._poll_interval)
+
+    def get_status(self):
+        """
+        Returns: a dictionary job name -> job state, dependencies and metrics
+        """
+        with self._condition:
+            return {job.name: {
+                'state': job.state,
+                'depends_on': list(job.depends_on),
+                'priority': job.priority,
+                'group': job.group,
+                'metrics': asdict(job.metrics)
+            } for job in self._jobs.values()}
@@ -2,8 +2,11 @@
 """
 Copyright (c) 2019 - present AppSeed.us
 """
+import os
+
 bind = '0.0.0.0:5005'
-workers = 1
+# Cache loaders run only on the elected leader worker: more workers require the shared (Redis) cache
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
 timeout = 640
 logconfig = 'log.conf'
 certfile = '/crt/cert.pem'
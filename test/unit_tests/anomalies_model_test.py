@@ -0,0 +1,81 @@
+import unittest
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import event, inspect
+
+from apps import db
+from apps.models import anomalies as anomalies_model
+
+
+def _anomaly(key, title='Title', environment='S1A-123;S1A-124'):
+    return {'key': key, 'publicationDate': datetime(2023, 10, 1, 12), 'title': title, 'text': 'Text',
+            'category': 'Production', 'impactedItem': 'Item', 'impactedSatellite': 'S1A',
+            'start': datetime(2023, 10, 1, 10), 'end': datetime(2023, 10, 2, 10), 'environment': environment}
+
+
+class AnomaliesUpsertTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._count_statement)
+
+    def tearDown(self) -> None:
+        event.remove(db.engine, 'before_cursor_execute', self._count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement.split()[0].upper())
+
+    def test_key_index(self):
+        indexes = inspect(db.engine).get_indexes('anomalies')
+        self.assertIn(['key'], [index['column_names'] for index in indexes])
+        # Already existing indexes are skipped
+        anomalies_model.create_missing_indexes()
+
+    def test_upsert_counts(self):
+        result = anomalies_model.upsert_anomalies([_anomaly(f"CAMS-{i}") for i in range(1200)])
+        self.assertEqual(anomalies_model.AnomaliesUpsertResult(inserted=1200), result)
+        # Existing keys are loaded in chunks, rows are inserted with a single statement
+        self.assertEqual(['SELECT', 'SELECT', 'SELECT', 'INSERT'], self.statements)
+        saved = db.session.query(anomalies_model.Anomalies).filter_by(key='CAMS-7').one()
+        self.assertEqual("[{'datatakeID': 'S1A-123', 'L0_': 0, 'L1_': 0, 'L2_': 0}, "
+                         "{'datatakeID': 'S1A-124', 'L0_': 0, 'L1_': 0, 'L2_': 0}]", saved.datatakes_completeness)
+        self.assertEqual('Production', saved.category)
+
+        modify_date = datetime(2023, 10, 5)
+        result = anomalies_model.upsert_anomalies([_anomaly('CAMS-1', title='New title'),
+                                                   dict(_anomaly('CAMS-2'), category='Archive'),
+                                                   _anomaly('CAMS-NEW')], modify_date)
+        self.assertEqual(anomalies_model.AnomaliesUpsertResult(inserted=1, updated=1, unchanged=1), result)
+        db.session.expire_all()
+        updated = db.session.query(anomalies_model.Anomalies).filter_by(key='CAMS-1').one()
+        self.assertEqual('New title', updated.title)
+        self.assertEqual(modify_date, updated.modifyDate)
+        # Categorization of existing anomalies is not updated
+        self.assertEqual('Production', db.session.query(anomalies_model.Anomalies).filter_by(key='CAMS-2').one().category)
+
+    def test_update_datatakes_completeness_many(self):
+        anomalies_model.upsert_anomalies([_anomaly('CAMS-1'), _anomaly('CAMS-2')])
+        completeness = [{'datatakeID': 'S1A-123', 'L0_': 100.0}]
+        result = anomalies_model.update_datatakes_completeness_many({'CAMS-1': completeness,
+                                                                     'CAMS-3': completeness})
+        self.assertEqual(anomalies_model.AnomaliesUpsertResult(updated=1), result)
+        result = anomalies_model.update_datatakes_completeness_many({'CAMS-1': completeness})
+        self.assertEqual(anomalies_model.AnomaliesUpsertResult(unchanged=1), result)
+        db.session.expire_all()
+        self.assertEqual(str(completeness), db.session.query(anomalies_model.Anomalies)
+                         .filter_by(key='CAMS-1').one().datatakes_completeness)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from flask import Flask
+
+from apps import flask_cache
+from apps.cache import revalidating_cache
+from apps.cache.loader.cache_loader import RestCacheLoader
+from apps.utils.date_utils import PeriodID
+
+API_KEY_FORMAT = '/api/statistics/test-statistics/{}-{}'
+
+
+def _mission_statistics(start_date, end_date, mission):
+    return [{'mission': mission, 'count': 1}]
+
+
+class RestCacheLoaderTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        flask_cache.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.loader = RestCacheLoader('Test Statistics', API_KEY_FORMAT, _mission_statistics)
+
+    def tearDown(self) -> None:
+        flask_cache.clear()
+        self.app_context.pop()
+
+    def _assert_policy(self, cache_key, policy):
+        cached_response = flask_cache.get(cache_key)
+        self.assertIsNotNone(cached_response)
+        self.assertEqual(policy.soft_ttl, cached_response.stale_time - cached_response.stored_time)
+
+    def test_last_period_policy(self):
+        self.loader.load_cache(PeriodID.DAY)
+        self._assert_policy(API_KEY_FORMAT.format('last', PeriodID.DAY),
+                            revalidating_cache.HOURLY_REFRESH_POLICY)
+
+    def test_previous_quarter_policy(self):
+        self.loader.load_cache_previous_quarter()
+        self._assert_policy(API_KEY_FORMAT.format('previous', 'quarter'),
+                            revalidating_cache.DAILY_REFRESH_POLICY)
+
+
+if __name__ == '__main__':
+    unittest.main()
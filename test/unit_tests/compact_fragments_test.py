@@ -0,0 +1,79 @@
+import os
+import pickle
+import unittest
+
+from lxml import etree
+
+from apps.ingestion.acquisition_plans.acq_plan_fragments import AcqPlanDayFragment, AcqDatatake
+from apps.ingestion.acquisition_plans.acq_plan_kml_loader import S1MissionAcqPlanLoader, S2MissionAcqPlanLoader
+from apps.ingestion.acquisition_plans.compact_fragments import CompactDayFragment
+
+
+class _DayFragmentsCollector:
+    def __init__(self):
+        self.fragments = []
+
+    def process_kml_folder(self, kml_folder):
+        fragment = AcqPlanDayFragment(str(kml_folder.name), kml_folder)
+        fragment.set_placemark_intervals_utc()
+        self.fragments.append(fragment)
+
+
+class CompactDayFragmentTestCase(unittest.TestCase):
+    kml_path = "./test_acqplan_kml"
+
+    def _load_fragments(self, kml_loader, kml_filename):
+        with open(os.path.join(self.kml_path, kml_filename), 'rb') as kml_file:
+            kml_string = kml_file.read()
+        collector = _DayFragmentsCollector()
+        kml_loader.load_acqplan_kml(kml_string, collector)
+        return collector.fragments
+
+    def _check_round_trip(self, day_fragment, id_key):
+        compact_fragment = CompactDayFragment.from_day_fragment(day_fragment)
+        self.assertEqual(len(day_fragment.placemark_list), compact_fragment.num_placemarks)
+        self.assertLess(len(pickle.dumps(compact_fragment)), len(etree.tostring(day_fragment.folder_kml)))
+
+        rebuilt_fragment = compact_fragment.to_day_fragment()
+        self.assertEqual(day_fragment.day, rebuilt_fragment.day)
+        self.assertEqual(str(day_fragment.placemarks_folder.name), str(rebuilt_fragment.placemarks_folder.name))
+        self.assertEqual(day_fragment.placemark_names, rebuilt_fragment.placemark_names)
+        for pm, rebuilt_pm in zip(day_fragment.placemark_list, rebuilt_fragment.placemark_list):
+            self.assertEqual((str(pm.TimeSpan.begin), str(pm.TimeSpan.end)),
+                             (str(rebuilt_pm.TimeSpan.begin), str(rebuilt_pm.TimeSpan.end)))
+            self.assertEqual(AcqDatatake(pm, id_key).datatake_id, AcqDatatake(rebuilt_pm, id_key).datatake_id)
+            self.assertEqual(repr(AcqDatatake(pm, id_key)), repr(AcqDatatake(rebuilt_pm, id_key)))
+            coordinates = [[float(value) for value in point.split(',')]
+                           for point in str(pm.Polygon.outerBoundaryIs.LinearRing.coordinates).split()]
+            rebuilt_coordinates = [[float(value) for value in point.split(',')]
+                                   for point in str(rebuilt_pm.Polygon.outerBoundaryIs.LinearRing.coordinates).split()]
+            self.assertEqual(coordinates, rebuilt_coordinates)
+        # Conversion is stable
+        self.assertEqual(etree.tostring(rebuilt_fragment.folder_kml),
+                         etree.tostring(CompactDayFragment.from_day_fragment(rebuilt_fragment)
+                                        .to_day_fragment().folder_kml))
+        return compact_fragment
+
+    def test_s1_round_trip(self):
+        fragments = self._load_fragments(S1MissionAcqPlanLoader(),
+                                         "S1A_MP_USER_20230908T174000_20230928T194000.kml")
+        for day_fragment in fragments[:3]:
+            compact_fragment = self._check_round_trip(day_fragment, 'DatatakeId')
+            self.assertEqual(1, len(compact_fragment.shapes))
+        self.assertEqual('60C28', compact_fragment_data(fragments[0], 0, 'DatatakeId'))
+
+    def test_s2_round_trip(self):
+        fragments = self._load_fragments(S2MissionAcqPlanLoader(),
+                                         "S2A_MP_ACQ__KML_20230601T120000_20230619T150000.kml")
+        for day_fragment in fragments[:3]:
+            compact_fragment = self._check_round_trip(day_fragment, 'ID')
+            self.assertEqual(['0'], list(set(compact_fragment.visibility)))
+            self.assertTrue((compact_fragment.begin_epochs <= compact_fragment.end_epochs).all())
+
+
+def compact_fragment_data(day_fragment, placemark_index, data_name):
+    return CompactDayFragment.from_day_fragment(day_fragment).get_data_record(placemark_index, data_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
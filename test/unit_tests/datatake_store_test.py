@@ -0,0 +1,200 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from apps.elastic.modules import datatakes
+from apps.elastic.modules.datatakes import DatatakeStore
+
+
+def _s1s2_record(dt_id, start, l0_percentage):
+    return {'_id': dt_id, '_source': {'satellite_unit': dt_id[0:3],
+                                      'observation_time_start': start,
+                                      'observation_time_stop': start[:11] + '23:59:00.000Z',
+                                      'IW_RAW__0S_local_percentage': l0_percentage}}
+
+
+def _product(prod_id, datatake_id, start, stop, percentage, product_level='L0_', product_type='SR_0_SRA___'):
+    return {'_id': prod_id, '_source': {'datatake_id': datatake_id,
+                                        'product_level': product_level,
+                                        'product_type': product_type,
+                                        'observation_time_start': start,
+                                        'observation_time_stop': stop,
+                                        'percentage': percentage}}
+
+
+class FakeDatatakeRecords:
+    """
+    Replaces the Elastic queries of the store: each call returns the next prepared
+    tuple (S1/S2 records, S3 products, S5 products)
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, start_date, end_date, updated_since=None, strict=False):
+        self.calls.append({'start_date': start_date, 'end_date': end_date,
+                           'updated_since': updated_since, 'strict': strict})
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakeCountElastic:
+    """
+    Replaces the Elastic client in the check of the update time field: counts documents
+    of the indices, and documents of the indices with the field
+    """
+
+    def __init__(self, index_counts, field_counts):
+        self.index_counts = index_counts
+        self.field_counts = field_counts
+
+    def count(self, index, body=None, request_timeout=None):
+        if 'exists' in body['query']:
+            return {'count': self.field_counts.get(index, 0)}
+        return {'count': self.index_counts.get(index, 0)}
+
+
+class DatatakeStoreTestCase(unittest.TestCase):
+    start_date = datetime(2023, 9, 1)
+    end_date = datetime(2023, 10, 2)
+
+    def setUp(self) -> None:
+        self.field_check = mock.patch.object(datatakes, '_update_time_field_available', return_value=True)
+        self.field_check.start()
+
+    def tearDown(self) -> None:
+        self.field_check.stop()
+
+    def _initial_records(self):
+        return ([_s1s2_record('S1A-1', '2023-09-01T10:00:00.000Z', 100),
+                 _s1s2_record('S1A-2', '2023-09-20T10:00:00.000Z', 50)],
+                [_product('p1', 'S3A-1', '2023-09-01T10:00:00.000Z', '2023-09-01T10:30:00.000Z', 100),
+                 _product('p2', 'S3A-1', '2023-09-02T10:00:00.000Z', '2023-09-02T10:30:00.000Z', 50),
+                 _product('p3', 'S3B-1', '2023-09-10T10:00:00.000Z', '2023-09-10T10:30:00.000Z', 40)],
+                [_product('p4', 'S5P-1', '2023-09-01T10:00:00.000Z', '2023-09-01T11:00:00.000Z', 60,
+                          product_level='L1B', product_type='L1B_RA_BD1')])
+
+    @staticmethod
+    def _by_id(store):
+        return {dt['_source']['datatake_id']: dt['_source'] for dt in store.datatakes()}
+
+    def test_rebuild(self):
+        store = DatatakeStore()
+        self.assertFalse(store.is_loaded())
+        fake_records = FakeDatatakeRecords(self._initial_records(),
+                                           ([_s1s2_record('S1A-2', '2023-09-20T10:00:00.000Z', 75)], [], []))
+        with mock.patch.object(datatakes, '_get_cds_datatake_records', fake_records):
+            store.rebuild(self.start_date, self.end_date)
+            self.assertTrue(store.is_loaded())
+            self.assertIsNone(fake_records.calls[0]['updated_since'])
+            self.assertTrue(fake_records.calls[0]['strict'])
+            stored = self._by_id(store)
+            self.assertEqual({'S1A-1', 'S1A-2', 'S3A-1', 'S3B-1', 'S5P-1'}, set(stored))
+            self.assertEqual(100.0, stored['S1A-1']['L0_'])
+            self.assertEqual(75.0, stored['S3A-1']['L0_'])
+            self.assertEqual('2023-09-01T10:00:00.000Z', stored['S3A-1']['observation_time_start'])
+            self.assertEqual(60.0, stored['S5P-1']['L1_'])
+
+            # A rebuild discards the previous content
+            datatakes_list = store.rebuild(self.start_date, self.end_date)
+            self.assertEqual(['S1A-2'], [dt['_source']['datatake_id'] for dt in datatakes_list])
+            self.assertEqual(75.0, datatakes_list[0]['_source']['L0_'])
+
+    def test_incremental_refresh(self):
+        store = DatatakeStore()
+        updated_records = ([_s1s2_record('S1A-2', '2023-09-20T10:00:00.000Z', 100),
+                            _s1s2_record('S1A-3', '2023-09-25T10:00:00.000Z', 20)],
+                           [_product('p2', 'S3A-1', '2023-09-02T10:00:00.000Z', '2023-09-02T10:30:00.000Z', 100)],
+                           [])
+        fake_records = FakeDatatakeRecords(self._initial_records(), updated_records)
+        with mock.patch.object(datatakes, '_get_cds_datatake_records', fake_records):
+            store.rebuild(self.start_date, self.end_date)
+            high_water_mark = store.high_water_mark
+            store.refresh(self.start_date, self.end_date)
+        # Only the documents updated since the previous retrieval are queried
+        self.assertEqual(high_water_mark - timedelta(minutes=datatakes.DEFAULT_UPDATE_TIME_OVERLAP_MINUTES),
+                         fake_records.calls[1]['updated_since'])
+        self.assertGreaterEqual(store.high_water_mark, high_water_mark)
+        stored = self._by_id(store)
+        self.assertEqual({'S1A-1', 'S1A-2', 'S1A-3', 'S3A-1', 'S3B-1', 'S5P-1'}, set(stored))
+        self.assertEqual(100.0, stored['S1A-1']['L0_'])
+        self.assertEqual(100.0, stored['S1A-2']['L0_'])
+        self.assertEqual(20.0, stored['S1A-3']['L0_'])
+        # The completeness of the S3 datatake is computed from stored and updated products
+        self.assertEqual(100.0, stored['S3A-1']['L0_'])
+        self.assertEqual(40.0, stored['S3B-1']['L0_'])
+        for dt_source in stored.values():
+            self.assertIn('completeness_status', dt_source)
+
+    def test_eviction(self):
+        store = DatatakeStore()
+        fake_records = FakeDatatakeRecords(self._initial_records(), ([], [], []))
+        with mock.patch.object(datatakes, '_get_cds_datatake_records', fake_records):
+            store.rebuild(self.start_date, self.end_date)
+            datatakes_list = store.refresh(datetime(2023, 9, 2), self.end_date + timedelta(days=1))
+        stored = self._by_id(store)
+        self.assertEqual(len(datatakes_list), len(stored))
+        # Datatakes started before the interval are evicted, with all their products
+        self.assertEqual({'S1A-2', 'S3A-1', 'S3B-1'}, set(stored))
+        self.assertNotIn('S5P-1', store._products)
+        # Datatakes with some products in the interval are rebuilt from the remaining products
+        self.assertEqual(['p2'], list(store._products['S3A-1']))
+        self.assertEqual(50.0, stored['S3A-1']['L0_'])
+        self.assertEqual('2023-09-02T10:00:00.000Z', stored['S3A-1']['observation_time_start'])
+
+    def test_refresh_failure(self):
+        store = DatatakeStore()
+        fake_records = FakeDatatakeRecords(self._initial_records(), ConnectionError('Elastic unavailable'))
+        with mock.patch.object(datatakes, '_get_cds_datatake_records', fake_records):
+            store.rebuild(self.start_date, self.end_date)
+            high_water_mark = store.high_water_mark
+            with self.assertRaises(ConnectionError):
+                store.refresh(self.start_date, self.end_date)
+        # The store is left untouched: the next refresh retrieves the same updates
+        self.assertEqual(high_water_mark, store.high_water_mark)
+        self.assertEqual({'S1A-1', 'S1A-2', 'S3A-1', 'S3B-1', 'S5P-1'}, set(self._by_id(store)))
+
+    def test_refresh_without_update_time_field(self):
+        store = DatatakeStore()
+        fake_records = FakeDatatakeRecords(self._initial_records(),
+                                           ([_s1s2_record('S1A-2', '2023-09-20T10:00:00.000Z', 75)], [], []))
+        with mock.patch.object(datatakes, '_get_cds_datatake_records', fake_records):
+            store.rebuild(self.start_date, self.end_date)
+            with mock.patch.object(datatakes, '_update_time_field_available', return_value=False):
+                datatakes_list = store.refresh(self.start_date, self.end_date)
+        # The refresh is replaced by a full rebuild
+        self.assertIsNone(fake_records.calls[1]['updated_since'])
+        self.assertEqual(['S1A-2'], [dt['_source']['datatake_id'] for dt in datatakes_list])
+
+    def test_datatakes_are_copies(self):
+        store = DatatakeStore()
+        fake_records = FakeDatatakeRecords(self._initial_records(),
+                                           ([_s1s2_record('S1A-1', '2023-09-01T10:00:00.000Z', 20)], [], []))
+        with mock.patch.object(datatakes, '_get_cds_datatake_records', fake_records):
+            datatakes_list = store.rebuild(self.start_date, self.end_date)
+            store.refresh(self.start_date, self.end_date)
+        returned = {dt['_source']['datatake_id']: dt['_source'] for dt in datatakes_list}
+        # Datatakes already returned are not changed by the next refreshes
+        self.assertEqual(100.0, returned['S1A-1']['L0_'])
+        self.assertEqual(20.0, self._by_id(store)['S1A-1']['L0_'])
+
+
+class UpdateTimeFieldTestCase(unittest.TestCase):
+
+    def test_update_time_field_available(self):
+        index_counts = {'cds-datatake': 10, 'cds-s3-completeness': 20}
+        with mock.patch.object(datatakes.elastic_client, 'get_elastic_client',
+                               return_value=FakeCountElastic(index_counts, {'cds-datatake': 10,
+                                                                            'cds-s3-completeness': 5})):
+            # Empty indices are not checked
+            self.assertTrue(datatakes._update_time_field_available('@timestamp'))
+        with mock.patch.object(datatakes.elastic_client, 'get_elastic_client',
+                               return_value=FakeCountElastic(index_counts, {'cds-datatake': 10})):
+            self.assertFalse(datatakes._update_time_field_available('@timestamp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
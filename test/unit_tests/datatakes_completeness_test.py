@@ -0,0 +1,97 @@
+import unittest
+from datetime import datetime
+
+from apps.elastic.modules.datatakes_completeness import build_products_datatakes, build_s1s2_datatakes, \
+    set_completeness_status
+
+
+def _product(prod_id, datatake_id, product_level, product_type, start, stop, percentage=None):
+    prod_info = {'datatake_id': datatake_id,
+                 'product_level': product_level,
+                 'product_type': product_type,
+                 'observation_time_start': start,
+                 'observation_time_stop': stop}
+    if percentage is not None:
+        prod_info['percentage'] = percentage
+    return {'_id': prod_id, '_source': prod_info}
+
+
+class DatatakesCompletenessTest(unittest.TestCase):
+    now = datetime(2023, 10, 1, 12, 0, 0)
+
+    def test_s3_products_datatakes(self):
+        products = [
+            _product('p1', 'S3A-1', 'L0_', 'SR_0_SRA___', '2023-09-01T10:00:00.000Z', '2023-09-01T10:30:00.000Z', 100),
+            _product('p2', 'S3B-2', 'L1_', 'OL_1_EFR___', '2023-09-01T11:00:00.000Z', '2023-09-01T11:10:00.000Z', 40),
+            _product('p3', 'S3A-1', 'L0_', 'SR_0_SRA___', '2023-09-01T09:50:00.000Z', '2023-09-01T12:00:00.000Z', 50),
+            _product('p4', 'S3A-1', 'L1_', 'DO_0_DOP___', '2023-09-01T08:00:00.000Z', '2023-09-01T13:00:00.000Z', 80),
+            _product('p5', 'S3A-1', 'L2_', 'SR_2_LAN___', '2023-09-01T10:00:00.000Z', '2023-09-01T10:30:00.000Z')
+        ]
+        datatakes = build_products_datatakes(products, 'S3')
+        self.assertEqual(['S3A-1', 'S3B-2'], [dt['_source']['datatake_id'] for dt in datatakes])
+        dt_source = datatakes[0]['_source']
+        self.assertEqual('SRA', dt_source['instrument_mode'])
+        self.assertEqual(75.0, dt_source['L0_'])
+        self.assertEqual(80.0, dt_source['L1_'])
+        self.assertNotIn('L2_', dt_source)
+        # Window extended by the relevant products, and bounded to 97 minutes
+        self.assertEqual('2023-09-01T09:50:00.000Z', dt_source['observation_time_start'])
+        self.assertEqual('2023-09-01T11:27:00.000Z', dt_source['observation_time_stop'])
+
+    def test_s5_level_ids(self):
+        products = [
+            _product('p1', 'S5P-1', 'L1B', 'L1B_RA_BD1', '2023-09-01T10:00:00.123456Z', '2023-09-01T10:30:00.000Z', 30),
+            _product('p2', 'S5P-1', 'L2_', 'L2__O3____', '2023-09-01T10:00:00.000Z', '2023-09-01T10:30:00.000Z', 60)
+        ]
+        dt_source = build_products_datatakes(products, 'S5')[0]['_source']
+        self.assertEqual(30.0, dt_source['L1_'])
+        self.assertEqual(60.0, dt_source['L2_'])
+        self.assertEqual('2023-09-01T10:00:00.000Z', dt_source['observation_time_start'])
+
+    def test_s1s2_datatakes(self):
+        records = [{'_id': 'S1A-1', '_source': {'satellite_unit': 'S1A',
+                                                'observation_time_start': '2023-09-30T10:00:00.000Z',
+                                                'observation_time_stop': '2023-09-30T10:10:00.000Z',
+                                                'IW_RAW__0S_local_percentage': 100,
+                                                'IW_GRDH_1S_local_percentage': 50,
+                                                'IW_SLC__1S_local_percentage': 100}},
+                   {'_id': 'S2B-1', '_source': {'satellite_unit': 'S2B',
+                                                'observation_time_start': '2023-09-30T10:00:00.000Z',
+                                                'observation_time_stop': '2023-09-30T10:10:00.000Z',
+                                                'L1C_local_percentage': 20}}]
+        build_s1s2_datatakes(records)
+        self.assertEqual({'satellite_unit': 'S1A',
+                          'observation_time_start': '2023-09-30T10:00:00.000Z',
+                          'observation_time_stop': '2023-09-30T10:10:00.000Z',
+                          'datatake_id': 'S1A-1',
+                          'L0_': 100.0, 'L1_': 75.0},
+                         {k: v for k, v in records[0]['_source'].items() if k != 'completeness_status'})
+        self.assertEqual(20.0, records[1]['_source']['L1_'])
+
+    def test_completeness_status(self):
+        sources = [
+            # Future datatake
+            {'satellite_unit': 'S1A', 'observation_time_stop': '2023-10-01T13:00:00.000Z', 'L0_': 100.0},
+            # Within S1 time threshold
+            {'satellite_unit': 'S1A', 'observation_time_stop': '2023-10-01T06:00:00.000Z', 'L0_': 95.0},
+            # Within increased time threshold, incomplete
+            {'satellite_unit': 'S1A', 'observation_time_stop': '2023-10-01T03:00:00.000Z', 'L0_': 95.0, 'L1_': 50.0},
+            # Consolidated
+            {'satellite_unit': 'S2A', 'observation_time_stop': '2023-09-01T00:00:00.000Z', 'L0_': 50.0, 'L1_': 5.0},
+            {'satellite_unit': 'S5P', 'observation_time_stop': '2023-09-01T00:00:00.000Z'}
+        ]
+        set_completeness_status(sources, self.now)
+        self.assertEqual({'ACQ': {'status': 'PLANNED', 'percentage': 0},
+                          'PUB': {'status': 'PLANNED', 'percentage': 0}}, sources[0]['completeness_status'])
+        self.assertEqual({'ACQ': {'status': 'ACQUIRED', 'percentage': 95.0},
+                          'PUB': {'status': 'PUBLISHED', 'percentage': 95.0}}, sources[1]['completeness_status'])
+        self.assertEqual({'ACQ': {'status': 'ACQUIRED', 'percentage': 95.0},
+                          'PUB': {'status': 'DELAYED', 'percentage': 72.5}}, sources[2]['completeness_status'])
+        self.assertEqual({'ACQ': {'status': 'PARTIAL', 'percentage': 50.0},
+                          'PUB': {'status': 'PARTIAL', 'percentage': 27.5}}, sources[3]['completeness_status'])
+        self.assertEqual({'ACQ': {'status': 'LOST', 'percentage': 0},
+                          'PUB': {'status': 'LOST', 'percentage': 0.0}}, sources[4]['completeness_status'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import datetime
+import unittest
+
+from pykml.factory import KML_ElementMaker as KML
+
+from apps.ingestion.acquisition_plans.acq_plan_fragments import AcqPlanDayFragment, FragmentInterval
+
+
+def _placemark(begin, end):
+    return KML.Placemark(KML.name(begin),
+                         KML.TimeSpan(KML.begin(begin), KML.end(end)))
+
+
+def _day_fragment(day, intervals):
+    return AcqPlanDayFragment(day, KML.Folder(KML.name(day),
+                                              KML.Folder(KML.name('S1A'),
+                                                         *[_placemark(begin, end) for begin, end in intervals])))
+
+
+def _names(day_fragment):
+    return [str(pm.name) for pm in day_fragment.placemark_list]
+
+
+class AcqPlanDayFragmentMergeTestCase(unittest.TestCase):
+    day = '2023-09-07'
+
+    def _time(self, hour_minute):
+        return f"{self.day}T{hour_minute}:00Z"
+
+    def _fragment(self, *hour_minutes):
+        return _day_fragment(self.day, [(self._time(start), self._time(end)) for start, end in hour_minutes])
+
+    def test_sort_on_index_build(self):
+        fragment = self._fragment(('10:00', '10:30'), ('08:00', '08:10'), ('09:00', '09:20'))
+        fragment.sort_placemarks()
+        self.assertEqual([self._time('08:00'), self._time('09:00'), self._time('10:00')], _names(fragment))
+
+    def test_merge_sorted_without_duplicates(self):
+        fragment = self._fragment(('08:00', '08:10'), ('10:00', '10:30'))
+        fragment.sort_placemarks()
+        other_fragment = self._fragment(('07:00', '07:10'), ('08:00', '08:10'), ('09:00', '09:20'),
+                                        ('11:00', '11:05'))
+        fragment.merge(other_fragment)
+        expected_names = [self._time(hour_minute) for hour_minute in ('07:00', '08:00', '09:00', '10:00', '11:00')]
+        self.assertEqual(expected_names, _names(fragment))
+        self.assertEqual(set(expected_names), fragment.placemark_name_set)
+        # The already existing Placemark is left in the other fragment
+        self.assertEqual([self._time('08:00')], _names(other_fragment))
+
+    def test_remove_placemarks(self):
+        fragment = self._fragment(('08:00', '08:10'), ('09:00', '09:20'), ('10:00', '10:30'))
+        fragment.remove_placemarks([fragment.placemark_list[1]])
+        self.assertEqual([self._time('08:00'), self._time('10:00')], _names(fragment))
+        self.assertNotIn(self._time('09:00'), fragment.placemark_name_set)
+        fragment.merge(self._fragment(('09:30', '09:40')))
+        self.assertEqual([self._time('08:00'), self._time('09:30'), self._time('10:00')], _names(fragment))
+
+    def test_replace_interval_placemarks(self):
+        fragment = self._fragment(('08:00', '08:10'), ('09:00', '09:20'), ('10:00', '10:30'))
+        fragment._replace_interval_placemarks(self._fragment(('09:00', '09:25'), ('11:00', '11:05')))
+        self.assertEqual([self._time('08:00'), self._time('09:00'), self._time('11:00')], _names(fragment))
+        self.assertEqual('09:25', str(fragment.placemark_list[1].TimeSpan.end)[11:16])
+        self.assertEqual(FragmentInterval(datetime.datetime(2023, 9, 7, 8), datetime.datetime(2023, 9, 7, 11, 5)),
+                         fragment.interval)
+
+
+if __name__ == '__main__':
+    unittest.main()
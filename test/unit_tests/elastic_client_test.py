@@ -0,0 +1,36 @@
+import unittest
+
+from apps.cache.cache import ConfigCache
+from apps.elastic import client as elastic_client
+
+ELASTIC_CONFIG = {'elastic_scheme': 'https', 'elastic_host': 'elastic.example.com', 'elastic_port': 9200,
+                  'elastic_user': 'user', 'elastic_password': 'password',
+                  'verify_certs': 'false', 'ssl_show_warn': 'false'}
+
+
+class ElasticClientTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._elastic_config = ConfigCache.load_object("elastic_config")
+        ConfigCache.store_object("elastic_config", dict(ELASTIC_CONFIG))
+        elastic_client._clients.clear()
+
+    def tearDown(self) -> None:
+        elastic_client._clients.clear()
+        ConfigCache.store_object("elastic_config", self._elastic_config)
+
+    def test_shared_client(self):
+        client = elastic_client.get_elastic_client()
+        self.assertIsInstance(client, elastic_client.ElasticClient)
+        self.assertIs(client, elastic_client.get_elastic_client())
+
+    def test_new_client_on_config_change(self):
+        client = elastic_client.get_elastic_client()
+        ConfigCache.store_object("elastic_config", dict(ELASTIC_CONFIG, elastic_host='other.example.com'))
+        new_client = elastic_client.get_elastic_client()
+        self.assertIsNot(client, new_client)
+        self.assertIs(new_client, elastic_client.get_elastic_client())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import threading
+import time
+import unittest
+
+from apps.utils.job_scheduler import JobScheduler
+
+
+class JobSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.executions = []
+        self.lock = threading.Lock()
+        self.schedulers = []
+
+    def tearDown(self) -> None:
+        for scheduler in self.schedulers:
+            scheduler._executor.shutdown(wait=True)
+
+    def _scheduler(self, **kwargs):
+        scheduler = JobScheduler(**kwargs)
+        self.schedulers.append(scheduler)
+        return scheduler
+
+    def _job(self, name, duration=0.0, error=None):
+        def _execute():
+            with self.lock:
+                self.executions.append(name)
+            if duration:
+                time.sleep(duration)
+            if error is not None:
+                raise error
+        return _execute
+
+    def test_dependency_order(self):
+        scheduler = self._scheduler(max_workers=4)
+        scheduler.add_job('datatakes', self._job('datatakes'), depends_on=['products', 'anomalies'])
+        scheduler.add_job('products', self._job('products', 0.05))
+        scheduler.add_job('anomalies', self._job('anomalies', 0.02), depends_on=['products'])
+        scheduler.start()
+        self.assertTrue(scheduler.wait_idle(5))
+        self.assertEqual(['products', 'anomalies', 'datatakes'], self.executions)
+
+    def test_trigger_runs_missing_dependencies(self):
+        scheduler = self._scheduler()
+        scheduler.add_job('products', self._job('products'))
+        scheduler.add_job('datatakes', self._job('datatakes'), depends_on=['products'])
+        scheduler.start(warm_up=False)
+        scheduler.trigger('datatakes')
+        self.assertTrue(scheduler.wait_idle(5))
+        self.assertEqual(['products', 'datatakes'], self.executions)
+        # Completed dependencies are not executed again
+        scheduler.trigger('datatakes')
+        self.assertTrue(scheduler.wait_idle(5))
+        self.assertEqual(['products', 'datatakes', 'datatakes'], self.executions)
+
+    def test_group_limit(self):
+        running = []
+        max_running = []
+
+        def _elastic_job():
+            with self.lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with self.lock:
+                running.pop()
+
+        scheduler = self._scheduler(max_workers=4, group_limits={'elastic': 2})
+        for index in range(6):
+            scheduler.add_job(f"elastic-{index}", _elastic_job, group='elastic')
+        scheduler.add_job('config', self._job('config', 0.05))
+        scheduler.start()
+        self.assertTrue(scheduler.wait_idle(5))
+        self.assertEqual(6, len(max_running))
+        self.assertEqual(2, max(max_running))
+        self.assertEqual(['config'], self.executions)
+
+    def test_dependency_cycle(self):
+        scheduler = JobScheduler()
+        scheduler.add_job('products', self._job('products'), depends_on=['datatakes'])
+        scheduler.add_job('anomalies', self._job('anomalies'), depends_on=['products'])
+        scheduler.add_job('datatakes', self._job('datatakes'), depends_on=['anomalies'])
+        with self.assertRaisesRegex(ValueError, 'cycle'):
+            scheduler.start()
+        self.assertEqual([], self.executions)
+
+    def test_undefined_dependency(self):
+        scheduler = JobScheduler()
+        scheduler.add_job('datatakes', self._job('datatakes'), depends_on=['products'])
+        with self.assertRaisesRegex(ValueError, 'undefined job products'):
+            scheduler.start()
+        with self.assertRaises(ValueError):
+            scheduler.add_job('datatakes', self._job('datatakes'))
+
+    def test_warm_up_priority(self):
+        scheduler = self._scheduler(max_workers=1)
+        scheduler.add_job('news', self._job('news'), priority=30)
+        scheduler.add_job('config', self._job('config'), priority=10)
+        scheduler.add_job('events', self._job('events'), priority=20)
+        scheduler.add_job('orbits', self._job('orbits'), priority=5, warm_up=False)
+        scheduler.start()
+        self.assertTrue(scheduler.wait_idle(5))
+        self.assertEqual(['config', 'events', 'news'], self.executions)
+        self.assertEqual('idle', scheduler.get_status()['orbits']['state'])
+        self.assertEqual(0, scheduler.get_status()['orbits']['metrics']['runs'])
+
+    def test_failed_dependency(self):
+        scheduler = self._scheduler(max_workers=2)
+        scheduler.add_job('products', self._job('products', error=RuntimeError('Elastic unavailable')))
+        scheduler.add_job('datatakes', self._job('datatakes'), depends_on=['products'])
+        scheduler.add_job('anomalies', self._job('anomalies'), depends_on=['datatakes'])
+        scheduler.start()
+        self.assertTrue(scheduler.wait_idle(5))
+        # Dependent jobs are not blocked by a failed execution
+        self.assertEqual(['products', 'datatakes', 'anomalies'], self.executions)
+        status = scheduler.get_status()
+        self.assertEqual(1, status['products']['metrics']['failures'])
+        self.assertEqual('Elastic unavailable', status['products']['metrics']['last_error'])
+        self.assertEqual(0, status['datatakes']['metrics']['failures'])
+        self.assertEqual(1, status['anomalies']['metrics']['runs'])
+
+    def test_no_overlapping_executions(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def _blocking_job():
+            started.set()
+            release.wait(5)
+
+        scheduler = self._scheduler()
+        scheduler.add_job('products', _blocking_job)
+        scheduler.start(warm_up=False)
+        self.assertTrue(scheduler.trigger('products'))
+        self.assertTrue(started.wait(5))
+        self.assertFalse(scheduler.trigger('products'))
+        release.set()
+        self.assertTrue(scheduler.wait_idle(5))
+        metrics = scheduler.get_status()['products']['metrics']
+        self.assertEqual(1, metrics['runs'])
+        self.assertEqual(1, metrics['skipped'])
+
+
+if __name__ == '__main__':
+    unittest.main()
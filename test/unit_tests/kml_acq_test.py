@@ -7,6 +7,7 @@ import unittest
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta
 
+import numpy as np
 import time_machine
 from lxml import etree
 from pykml import parser as KMLparser
@@ -27,7 +28,7 @@ from apps.ingestion.acquisition_plans.orbit_acquisitions_kml import OrbitAcquisi
     _build_datatake_placemark, _points_to_coordinates, build_acquisition_line_placemark
 from apps.ingestion.acquisition_plans.orbit_datatake_acquisitions import DatatakeAcquisition, GeographicGeoPoint, \
     OrbitPropagator, AcquisitionLineProfileFromOrbit, OrbitAcquisitionsBuilder, AcquisitionPolygonProfileFromOrbit, \
-    OrbitPropagatorSkyfield, GeoPointOperations, swaths, OBSERVATION_END_KEY, OBSERVATION_START_KEY
+    OrbitPropagatorSkyfield, GeoPointOperations, swaths, OBSERVATION_END_KEY, OBSERVATION_START_KEY, build_swath_ring
 from apps.ingestion.kml_processor import AcqPlanKmlBuilder
 from apps.ingestion.orbit_acquisitions import AcquisitionPlanOrbitDatatakeBuilder, ORBIT_PROPAGATION_STEP
 
@@ -1139,6 +1140,22 @@ class OrbitAcqPlanTestCase(AcqPlanFragmentsTestCaseBase):
         # Check result
         ref_str = "85.73000,43.50000,0 145.14300,-13.87000,20.1 -121.98000,76.43000,760.86"
         self.assertEqual(ref_str, coord_str, "Generated coordinates string not matching")
+        # Same points, as array of longitude, latitude, altitude
+        points_array = np.array([[pnt.lon, pnt.lat, pnt.altitude] for pnt in points])
+        self.assertEqual(ref_str, _points_to_coordinates(points_array))
+
+    def test_swath_ring_antimeridian(self):
+        # Ground track crossing the antimeridian, going north
+        track_lats = np.radians(np.array([-1.0, 0.0, 1.0, 2.0]))
+        track_lons = np.radians(np.array([179.0, 179.8, -179.4, -178.6]))
+        ring = build_swath_ring(track_lats, track_lons, 100000.0, 3)
+        self.assertEqual((7, 3), ring.shape)
+        self.assertListEqual(list(ring[0]), list(ring[-1]))
+        self.assertTrue(((ring[:, 0] >= -180) & (ring[:, 0] < 180)).all())
+        # East points are after the antimeridian, west points before it
+        # (the middle east point is the one crossing it)
+        self.assertTrue((ring[1:3, 0] < 0).all())
+        self.assertTrue((ring[3:6, 0] > 0).all())
 
     def test_build_line_placemark(self):
         mission = 'S1'
@@ -1300,9 +1317,36 @@ class OrbitAcqPlanTestCase(AcqPlanFragmentsTestCaseBase):
         date2 = date1 + timedelta(seconds=70)
         # Request the Acquisition  for the interval as a Line
         image_p = acquisition_builder.build_image_profile(date1, date2)
-        self.assertEqual(18, len(image_p))
+        # East and west points, plus the first point closing the ring
+        self.assertEqual(19, len(image_p))
+        self.assertListEqual(list(image_p[0]), list(image_p[-1]))
         # Request the Acquisition  for the interval as a Polygon
 
+    def test_orbit_intervals_batch_propagation(self):
+        step = 10
+        test_tle_1 = "S3A_20231012.tle"
+        tle_data = self.tle_retriever.get_tle_data(test_tle_1)
+        orbit_propagator = OrbitPropagatorSkyfield(tle_data, step,
+                                                   extra_point=True)
+        acquisition_builder = AcquisitionPolygonProfileFromOrbit(orbit_propagator, swaths['S3A'])
+        date1 = datetime.strptime("2023-10-10T11:23:45.000Z", ELASTIC_TIME_FORMAT)
+        intervals = [(date1, date1 + timedelta(seconds=70)),
+                     (date1 + timedelta(hours=5), date1 + timedelta(hours=5, seconds=30)),
+                     (date1 + timedelta(hours=2), date1 + timedelta(hours=2, minutes=3))]
+        # Intervals propagated together give the same profiles as propagated one by one
+        batch_profiles = acquisition_builder.build_image_profiles(intervals)
+        self.assertEqual(len(intervals), len(batch_profiles))
+        for (start_time, end_time), batch_profile in zip(intervals, batch_profiles):
+            profile = acquisition_builder.build_image_profile(start_time, end_time)
+            self.assertEqual(len(profile), len(batch_profile))
+            for point, batch_point in zip(profile, batch_profile):
+                self.assertAlmostEqual(point[0], batch_point[0], 6)
+                self.assertAlmostEqual(point[1], batch_point[1], 6)
+        # Samples: start, every step, end, extra point
+        samples = orbit_propagator.get_orbit_samples(intervals[1:2])[0]
+        self.assertEqual(5, samples.num_samples)
+        self.assertEqual(6, len(samples.latitudes))
+
     from unittest.mock import Mock, patch
 
     # TODO: MOVE TO PYTEST eeds also porting setup datatakes table
@@ -0,0 +1,103 @@
+import functools
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from apps.ingestion.acquisition_plans.acq_link_page import SatelliteAcqPlanLink
+from apps.ingestion.acquisition_plans.kml_fetcher import AcqPlanKmlFetcher, KmlFileStore, KmlFetchStatus, \
+    select_uncovered_links
+
+
+class _KmlRequestHandler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requested_paths = []
+
+    def do_GET(self):
+        self.requested_paths.append(self.path)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AcqPlanKmlFetcherTestCase(unittest.TestCase):
+    kml_path = "./test_acqplan_kml"
+    # Links from the newest
+    s1_kml_filenames = ["S1A_MP_USER_20230912T174000_20231002T194000.kml",
+                        "S1A_MP_USER_20230908T174000_20230928T194000.kml",
+                        "S1A_MP_USER_20230907T174000_20230927T194000.kml"]
+
+    @classmethod
+    def setUpClass(cls):
+        handler = functools.partial(_KmlRequestHandler, directory=os.path.abspath(cls.kml_path))
+        cls.http_server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=cls.http_server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.http_server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.http_server.shutdown()
+        cls.http_server.server_close()
+
+    def setUp(self) -> None:
+        self.store_dir = tempfile.TemporaryDirectory()
+        _KmlRequestHandler.requested_paths.clear()
+
+    def tearDown(self) -> None:
+        self.store_dir.cleanup()
+
+    def _links(self, filenames):
+        return [SatelliteAcqPlanLink(filename, self.base_url) for filename in filenames]
+
+    def _fetcher(self):
+        return AcqPlanKmlFetcher(KmlFileStore(self.store_dir.name), max_workers=3, timeout=10)
+
+    def _file_content(self, filename):
+        with open(os.path.join(self.kml_path, filename), 'rb') as kml_file:
+            return kml_file.read()
+
+    def test_select_uncovered_links(self):
+        links = self._links(self.s1_kml_filenames)
+        self.assertEqual(links, select_uncovered_links(links))
+        # Older links are needed only for days before the newest link
+        self.assertEqual(links[:2], select_uncovered_links(links, datetime(2023, 9, 9)))
+        self.assertEqual(links[:1], select_uncovered_links(links, datetime(2023, 9, 13)))
+        # Links ending before the start date are not needed
+        self.assertEqual([], select_uncovered_links(links, datetime(2023, 10, 5)))
+
+    def test_fetch_covered_links_skipped(self):
+        links = self._links(self.s1_kml_filenames)
+        results = self._fetcher().fetch(links, datetime(2023, 9, 13))
+        self.assertEqual([KmlFetchStatus.DOWNLOADED, KmlFetchStatus.SKIPPED, KmlFetchStatus.SKIPPED],
+                         [result.status for result in results])
+        self.assertEqual(self._file_content(self.s1_kml_filenames[0]), results[0].content)
+        self.assertEqual(len(results[0].content), results[0].size)
+        self.assertEqual([f"/{self.s1_kml_filenames[0]}"], _KmlRequestHandler.requested_paths)
+
+    def test_fetch_not_modified(self):
+        links = self._links(self.s1_kml_filenames)
+        fetcher = self._fetcher()
+        first_results = fetcher.fetch(links)
+        self.assertEqual([KmlFetchStatus.DOWNLOADED] * 3, [result.status for result in first_results])
+        second_results = fetcher.fetch(links)
+        self.assertEqual([KmlFetchStatus.NOT_MODIFIED] * 3, [result.status for result in second_results])
+        for filename, result in zip(self.s1_kml_filenames, second_results):
+            self.assertEqual(self._file_content(filename), result.content)
+            self.assertGreaterEqual(result.duration, 0)
+
+    def test_fetch_failed_link_replaced(self):
+        # The newest link is missing: the older links covering its interval are downloaded
+        links = self._links(["S1A_MP_USER_20230913T174000_20231003T194000.kml"] + self.s1_kml_filenames)
+        results = self._fetcher().fetch(links, datetime(2023, 9, 14))
+        self.assertEqual([KmlFetchStatus.FAILED, KmlFetchStatus.DOWNLOADED,
+                          KmlFetchStatus.SKIPPED, KmlFetchStatus.SKIPPED],
+                         [result.status for result in results])
+        self.assertIsNone(results[0].content)
+        self.assertIn('404', results[0].error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import gzip
+import os
+import unittest
+
+from lxml import etree
+from pykml import parser as KMLparser
+
+from apps.ingestion.acquisition_plans.acq_plan_kml_loader import S1MissionAcqPlanLoader, S2MissionAcqPlanLoader
+
+
+class _DayFoldersCollector:
+    def __init__(self):
+        self.folders = []
+
+    def process_kml_folder(self, kml_folder):
+        self.folders.append(etree.tostring(kml_folder))
+
+
+class _S1TreeAcqPlanLoader(S1MissionAcqPlanLoader):
+    """
+    Reference S1 loader, building the whole KML tree before extracting the day folders
+    """
+
+    def load_acqplan_kml(self, kml_string, fragments_table):
+        parsed_kml = KMLparser.fromstring(kml_string)
+        for folder in parsed_kml.Document.Folder:
+            self._convert_placemark_line_style(folder)
+            fragments_table.process_kml_folder(folder)
+
+
+class _S2TreeAcqPlanLoader(S2MissionAcqPlanLoader):
+    """
+    Reference S2 loader, building the whole KML tree before extracting the day folders
+    """
+
+    def load_acqplan_kml(self, kml_string, fragments_table):
+        parsed_kml = KMLparser.fromstring(kml_string)
+        for folder in parsed_kml.Document.Folder:
+            for mode_folder in folder.Folder:
+                for pm in mode_folder.Folder[0].Placemark:
+                    start_day_str = str(pm.TimeSpan[0]['begin']).split("T")[0]
+                    end_day_str = str(pm.TimeSpan[0]['end']).split("T")[0]
+                    self._add_to_daily_folder(start_day_str, str(folder.name), pm)
+                    if self._allocate_every_day and start_day_str != end_day_str:
+                        self._add_to_daily_folder(end_day_str, str(folder.name), pm)
+        for day_folder in self._day_folders.values():
+            fragments_table.process_kml_folder(day_folder)
+
+
+def _open_kml(kml_fullpath):
+    if kml_fullpath.endswith('.gz'):
+        return gzip.open(kml_fullpath, 'rb')
+    return open(kml_fullpath, 'rb')
+
+
+def _load_kml(loader_class, kml_fullpath, streamed):
+    collector = _DayFoldersCollector()
+    with _open_kml(kml_fullpath) as kml_file:
+        loader_class().load_acqplan_kml(kml_file if streamed else kml_file.read(), collector)
+    return collector.folders
+
+
+class AcqPlanKmlLoaderTestCase(unittest.TestCase):
+    kml_path = "./test_acqplan_kml"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.kml_filenames = sorted(filename for filename in os.listdir(cls.kml_path)
+                                   if filename.startswith(('S1', 'S2')))
+
+    def _loaders(self, kml_filename):
+        if kml_filename.startswith('S1'):
+            return _S1TreeAcqPlanLoader, S1MissionAcqPlanLoader
+        return _S2TreeAcqPlanLoader, S2MissionAcqPlanLoader
+
+    def test_streaming_loader_same_folders(self):
+        for kml_filename in self.kml_filenames:
+            with self.subTest(kml_filename=kml_filename):
+                kml_fullpath = os.path.join(self.kml_path, kml_filename)
+                tree_loader, streaming_loader = self._loaders(kml_filename)
+                expected_folders = _load_kml(tree_loader, kml_fullpath, False)
+                self.assertGreater(len(expected_folders), 0)
+                self.assertEqual(expected_folders, _load_kml(streaming_loader, kml_fullpath, False))
+                # KML read from file while parsed
+                self.assertEqual(expected_folders, _load_kml(streaming_loader, kml_fullpath, True))
+
+    def test_s1_invalid_folder_skipped(self):
+        kml_string = b'<kml xmlns="http://www.opengis.net/kml/2.2"><Document>' \
+                     b'<Folder><name>2023-09-07</name></Folder>' \
+                     b'<Folder><name>2023-09-08</name><Folder><name>S1A</name><Placemark>' \
+                     b'<name>2023-09-08T17:51:26</name><LinearRing><coordinates>0,0,0 1,1,0</coordinates>' \
+                     b'</LinearRing></Placemark></Folder></Folder>' \
+                     b'</Document></kml>'
+        collector = _DayFoldersCollector()
+        S1MissionAcqPlanLoader().load_acqplan_kml(kml_string, collector)
+        self.assertEqual(1, len(collector.folders))
+        self.assertIn(b'<name>2023-09-08</name>', collector.folders[0])
+        self.assertIn(b'<outerBoundaryIs><LinearRing>', collector.folders[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Compare time and memory of the whole tree KML loaders (KML text read in memory)
+and of the streaming loaders (KML read from file while parsed), on the KML files
+of the unit tests or of the specified folder. Each load is executed in a new process.
+
+Usage, from this folder:
+    PYTHONPATH=<repository root> python kml_loaders_benchmark.py [KML folder]
+"""
+import multiprocessing
+import os
+import resource
+import sys
+from time import perf_counter
+
+from kml_loader_test import AcqPlanKmlLoaderTestCase, _S1TreeAcqPlanLoader, _S2TreeAcqPlanLoader, _load_kml
+
+from apps.ingestion.acquisition_plans.acq_plan_kml_loader import S1MissionAcqPlanLoader, S2MissionAcqPlanLoader
+
+
+def _measure_load(loader_class, kml_fullpath, streamed):
+    # Executed in a new process: the maximum RSS increase is due to the load
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = perf_counter()
+    num_folders = len(_load_kml(loader_class, kml_fullpath, streamed))
+    return (num_folders, perf_counter() - start_time,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss)
+
+
+def _loaders(kml_filename):
+    if kml_filename.startswith('S1'):
+        return _S1TreeAcqPlanLoader, S1MissionAcqPlanLoader
+    return _S2TreeAcqPlanLoader, S2MissionAcqPlanLoader
+
+
+def benchmark_loaders(kml_path):
+    context = multiprocessing.get_context('fork')
+    print("%-55s %-10s %8s %8s %10s" % ("KML file", "loader", "folders", "time (s)", "RSS (KiB)"))
+    for kml_filename in sorted(filename for filename in os.listdir(kml_path) if filename.startswith(('S1', 'S2'))):
+        kml_fullpath = os.path.join(kml_path, kml_filename)
+        tree_loader, streaming_loader = _loaders(kml_filename)
+        for loader_name, loader_class, streamed in (('tree', tree_loader, False),
+                                                    ('streaming', streaming_loader, True)):
+            with context.Pool(1) as pool:
+                num_folders, elapsed, rss_increase = pool.apply(_measure_load,
+                                                                (loader_class, kml_fullpath, streamed))
+            print("%-55s %-10s %8d %8.3f %10d" % (kml_filename, loader_name, num_folders, elapsed, rss_increase))
+
+
+if __name__ == '__main__':
+    benchmark_loaders(sys.argv[1] if len(sys.argv) > 1 else AcqPlanKmlLoaderTestCase.kml_path)
@@ -0,0 +1,88 @@
+import dataclasses
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sgp4.earth_gravity import wgs72
+from sgp4.io import twoline2rv
+
+from apps.cache.orbit_artifacts import OrbitArtifactBuilder, SatelliteAsset, EXTRA_SAMPLES
+from apps.ingestion.acquisition_plans.tle_repository import load_tle_files, norad_id_map
+
+
+class OrbitArtifactBuilderTestCase(unittest.TestCase):
+    tle_path = "./test_tles"
+    sat_ids = ['S3A', 'S3B', 'S5P']
+    now = datetime(2023, 10, 18, 10, 7, 12)
+    step = 300
+
+    @classmethod
+    def setUpClass(cls):
+        tle_files = load_tle_files(cls.tle_path)
+        cls.tle_records = {sat_id: tle_files[norad_id_map[sat_id]][-1] for sat_id in cls.sat_ids}
+        cls.assets = {sat_id: SatelliteAsset([255, 173, 70, 255], 'static/assets/img/sentinel-3.png')
+                      for sat_id in cls.sat_ids}
+
+    def _builder(self):
+        return OrbitArtifactBuilder(self.sat_ids, step=self.step,
+                                    past_window=timedelta(days=2), future_window=timedelta(days=2),
+                                    tle_provider=self.tle_records.get)
+
+    def test_positions_as_satellite_czml(self):
+        builder = self._builder()
+        builder.refresh(self.now)
+        samples = builder.samples['S3A']
+        tle_obj = twoline2rv(self.tle_records['S3A'].line1, self.tle_records['S3A'].line2, wgs72)
+        for index in (0, 100, len(samples.times) - 1):
+            sample_time = datetime.utcfromtimestamp(int(samples.times[index]))
+            position, _ = tle_obj.propagate(sample_time.year, sample_time.month, sample_time.day,
+                                            sample_time.hour, sample_time.minute, sample_time.second)
+            np.testing.assert_allclose(np.array(position) * 1000.0, samples.positions[index], atol=1.0)
+
+    def test_incremental_refresh(self):
+        builder = self._builder()
+        # Window from 10:05 to 10:10, four days later
+        num_samples = (4 * 86400 + self.step) // self.step + 1 + EXTRA_SAMPLES
+        self.assertEqual(num_samples * len(self.sat_ids), builder.refresh(self.now))
+        # Only the new tail is computed
+        later = self.now + timedelta(hours=4)
+        self.assertEqual(4 * 3600 // self.step * len(self.sat_ids), builder.refresh(later))
+        full_builder = self._builder()
+        full_builder.refresh(later)
+        for sat_id in self.sat_ids:
+            self.assertEqual(num_samples, len(builder.samples[sat_id].times))
+            np.testing.assert_array_equal(full_builder.samples[sat_id].times, builder.samples[sat_id].times)
+            np.testing.assert_array_equal(full_builder.samples[sat_id].positions, builder.samples[sat_id].positions)
+        self.assertEqual(full_builder.build_czml_body(self.assets), builder.build_czml_body(self.assets))
+
+    def test_new_tle_epoch(self):
+        builder = self._builder()
+        builder.refresh(self.now)
+        old_samples = builder.samples['S3A']
+        # Same elements, with a later epoch: only the samples after the epoch are computed
+        new_epoch = datetime(2023, 10, 19, 7, 0, 30)
+        tle_records = dict(self.tle_records, S3A=dataclasses.replace(self.tle_records['S3A'], epoch=new_epoch))
+        builder._tle_provider = tle_records.get
+        new_tle_samples = builder.refresh(self.now)
+        kept = old_samples.times < new_epoch.replace(tzinfo=timezone.utc).timestamp()
+        self.assertGreater(kept.sum(), 0)
+        self.assertEqual(len(old_samples.times) - kept.sum(), new_tle_samples)
+        np.testing.assert_array_equal(old_samples.positions[kept], builder.samples['S3A'].positions[:kept.sum()])
+
+    def test_czml_document(self):
+        builder = self._builder()
+        builder.refresh(self.now)
+        packets = json.loads(builder.build_czml_body(self.assets))
+        self.assertEqual(['document', 41335, 43437, 42969], [packet['id'] for packet in packets])
+        self.assertEqual('2023-10-16T10:05:00+00:00/2023-10-20T10:10:00+00:00', packets[0]['clock']['interval'])
+        position = packets[1]['position']
+        self.assertEqual('2023-10-16T10:05:00+00:00', position['epoch'])
+        self.assertEqual(len(builder.samples['S3A'].times) * 4, len(position['cartesian']))
+        self.assertEqual([0, self.step], position['cartesian'][0:5:4])
+        self.assertEqual('SENTINEL-3A', packets[1]['label']['text'])
+        self.assertGreater(len(packets[1]['path']['leadTime']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
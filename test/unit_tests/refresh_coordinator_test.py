@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from apps import flask_cache
+from apps.cache.refresh_coordinator import CacheRefreshCoordinator, FileLeaderLock, check_shared_cache
+
+# Checks of leadership are driven by the tests: the loop thread never wakes up
+RENEW_INTERVAL = 3600
+
+HOLD_LOCK_SCRIPT = """
+import fcntl, os, sys, time
+lock_fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT, 0o644)
+fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+print('locked', flush=True)
+time.sleep(60)
+"""
+
+
+class CacheRefreshCoordinatorTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lock_dir = tempfile.TemporaryDirectory()
+        self.lock_file = os.path.join(self.lock_dir.name, 'cache-refresh.lock')
+        self.elections = []
+        self.locks = []
+
+    def tearDown(self) -> None:
+        for lock in self.locks:
+            lock.release()
+        self.lock_dir.cleanup()
+
+    def _coordinator(self, name):
+        lock = FileLeaderLock(self.lock_file)
+        self.locks.append(lock)
+        coordinator = CacheRefreshCoordinator(lock, renew_interval=RENEW_INTERVAL)
+        coordinator.start(lambda: self.elections.append(name))
+        return coordinator, lock
+
+    def test_single_leader(self):
+        first, _ = self._coordinator('first')
+        second, _ = self._coordinator('second')
+        self.assertTrue(first.is_leader())
+        self.assertFalse(second.is_leader())
+        with open(self.lock_file) as lock_file:
+            self.assertEqual(str(os.getpid()), lock_file.read())
+        # Further checks keep the same leader
+        first._check_leadership()
+        second._check_leadership()
+        self.assertTrue(first.is_leader())
+        self.assertFalse(second.is_leader())
+        self.assertEqual(['first'], self.elections)
+
+    def test_reelection_after_lock_expired(self):
+        first, first_lock = self._coordinator('first')
+        second, _ = self._coordinator('second')
+        first_lock.release()
+        # The former leader detects the loss at the next renewal, and competes again
+        first._check_leadership()
+        self.assertFalse(first.is_leader())
+        second._check_leadership()
+        self.assertTrue(second.is_leader())
+        first._check_leadership()
+        self.assertFalse(first.is_leader())
+        self.assertEqual(['first', 'second'], self.elections)
+
+    def test_reelection_after_leader_process_died(self):
+        leader_process = subprocess.Popen([sys.executable, '-c', HOLD_LOCK_SCRIPT, self.lock_file],
+                                          stdout=subprocess.PIPE, text=True)
+        try:
+            self.assertEqual('locked', leader_process.stdout.readline().strip())
+            follower, _ = self._coordinator('follower')
+            self.assertFalse(follower.is_leader())
+        finally:
+            leader_process.kill()
+            leader_process.wait()
+            leader_process.stdout.close()
+        follower._check_leadership()
+        self.assertTrue(follower.is_leader())
+        self.assertEqual(['follower'], self.elections)
+
+    def test_election_callback_error(self):
+        lock = FileLeaderLock(self.lock_file)
+        self.locks.append(lock)
+        coordinator = CacheRefreshCoordinator(lock, renew_interval=RENEW_INTERVAL)
+
+        def _failing_start():
+            raise RuntimeError('Scheduler not started')
+
+        coordinator.start(_failing_start)
+        # Leadership is kept: the callback is not executed again at the next check
+        self.assertTrue(coordinator.is_leader())
+        coordinator._check_leadership()
+        self.assertTrue(coordinator.is_leader())
+
+    def test_lock_backend_unreachable(self):
+        lock = FileLeaderLock(self.lock_file)
+        self.locks.append(lock)
+        coordinator = CacheRefreshCoordinator(lock, renew_interval=RENEW_INTERVAL)
+        # The startup does not fail: leadership is requested again at the next check
+        with mock.patch.object(lock, 'acquire', side_effect=ConnectionError('Lock backend not reachable')):
+            coordinator.start(lambda: self.elections.append('leader'))
+        self.assertFalse(coordinator.is_leader())
+        coordinator._check_leadership()
+        self.assertTrue(coordinator.is_leader())
+        self.assertEqual(['leader'], self.elections)
+
+
+class CheckSharedCacheTestCase(unittest.TestCase):
+
+    def test_check_shared_cache(self):
+        with mock.patch.dict(flask_cache.config, {'CACHE_TYPE': 'SimpleCache'}):
+            check_shared_cache(1)
+            with self.assertRaises(RuntimeError):
+                check_shared_cache(4)
+        with mock.patch.dict(flask_cache.config, {'CACHE_TYPE': 'RedisCache'}):
+            check_shared_cache(4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask, Response, g
+
+from apps import flask_cache
+from apps.cache import revalidating_cache
+
+TEST_POLICY = revalidating_cache.CachePolicy(soft_ttl=100, hard_ttl=1000)
+
+
+class FakeClock:
+    """
+    Replaces the time module in revalidating_cache, and the time function of the cache backend
+    """
+
+    def __init__(self, now=1700000000.0):
+        self.now = now
+        self.on_sleep = None
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep()
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class CountingLoader:
+    """
+    Loader saving on cache the number of its executions; optionally waits for a release event
+    """
+
+    def __init__(self, cache_key, blocking=False):
+        self.cache_key = cache_key
+        self.count = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.done = threading.Event()
+        if not blocking:
+            self.release.set()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.count += 1
+            count = self.count
+        self.started.set()
+        self.release.wait(5)
+        revalidating_cache.set_value(self.cache_key, f"value-{count}", TEST_POLICY)
+        self.done.set()
+
+
+class FakeCoordinator:
+
+    def __init__(self, leader):
+        self.leader = leader
+
+    def is_leader(self):
+        return self.leader
+
+
+class RevalidatingCacheTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        flask_cache.init_app(self.app)
+        self.clock = FakeClock()
+        self.patches = [mock.patch.object(revalidating_cache, 'time', self.clock),
+                        mock.patch('cachelib.simple.time', self.clock.time)]
+        for patch in self.patches:
+            patch.start()
+        self.request_context = self.app.test_request_context('/')
+        self.request_context.push()
+
+    def tearDown(self) -> None:
+        self.app.extensions.pop('cache_refresh_coordinator', None)
+        flask_cache.clear()
+        self.request_context.pop()
+        for patch in self.patches:
+            patch.stop()
+
+    @staticmethod
+    def _wait_for_waiting_loads(log_info, count):
+        # Waiting calls log that the load is in progress, before waiting for it
+        for _ in range(500):
+            if sum(1 for call in log_info.call_args_list if 'already in progress' in call.args[0]) >= count:
+                return True
+            threading.Event().wait(0.01)
+        return False
+
+    def _wait_background_refresh(self, cache_key):
+        for _ in range(500):
+            if cache_key not in revalidating_cache._background_refreshes:
+                return
+            threading.Event().wait(0.01)
+        self.fail(f"Background refresh of {cache_key} not completed")
+
+    def test_single_flight(self):
+        loader = CountingLoader('single-flight-key', blocking=True)
+        single_flight_loader = revalidating_cache.single_flight('test-load')(loader)
+
+        def _load():
+            with self.app.app_context():
+                single_flight_loader()
+
+        threads = [threading.Thread(target=_load) for _ in range(5)]
+        with mock.patch.object(revalidating_cache.logger, 'info') as log_info:
+            threads[0].start()
+            self.assertTrue(loader.started.wait(5))
+            for thread in threads[1:]:
+                thread.start()
+            self.assertTrue(self._wait_for_waiting_loads(log_info, 4))
+            loader.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(1, loader.count)
+        self.assertEqual('value-1', flask_cache.get('single-flight-key'))
+        # Completed loads are executed again
+        single_flight_loader()
+        self.assertEqual(2, loader.count)
+
+    def test_single_flight_other_process(self):
+        loader = CountingLoader('other-process-key')
+        single_flight_loader = revalidating_cache.single_flight('test-load', wait_timeout=30)(loader)
+        loading_key = revalidating_cache.loading_key_prefix + 'test-load'
+        flask_cache.set(loading_key, 12345)
+        # The marker is never removed: the wait ends at the timeout, on the fake clock
+        single_flight_loader()
+        self.assertEqual(0, loader.count)
+        flask_cache.delete(loading_key)
+        single_flight_loader()
+        self.assertEqual(1, loader.count)
+        self.assertFalse(flask_cache.has(loading_key))
+
+    def test_concurrent_misses(self):
+        loader = CountingLoader('missing-key', blocking=True)
+        single_flight_loader = revalidating_cache.single_flight('missing-load')(loader)
+        values = []
+
+        def _get():
+            with self.app.app_context():
+                values.append(revalidating_cache.get_value('missing-key', single_flight_loader, TEST_POLICY))
+
+        threads = [threading.Thread(target=_get) for _ in range(4)]
+        with mock.patch.object(revalidating_cache.logger, 'info') as log_info:
+            threads[0].start()
+            self.assertTrue(loader.started.wait(5))
+            for thread in threads[1:]:
+                thread.start()
+            self.assertTrue(self._wait_for_waiting_loads(log_info, 3))
+            loader.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(1, loader.count)
+        self.assertEqual(['value-1'] * 4, values)
+
+    def test_stale_value_served_while_refreshing(self):
+        cache_key = 'stale-key'
+        revalidating_cache.set_value(cache_key, 'value-0', TEST_POLICY)
+        loader = CountingLoader(cache_key, blocking=True)
+        self.clock.advance(50)
+        self.assertEqual('value-0', revalidating_cache.get_value(cache_key, loader, TEST_POLICY))
+        self.assertEqual(0, loader.count)
+        self.assertIsNone(g.get('cache_stale_age'))
+
+        self.clock.advance(100)
+        self.assertEqual('value-0', revalidating_cache.get_value(cache_key, loader, TEST_POLICY))
+        self.assertTrue(loader.started.wait(5))
+        # While the refresh is running, the stale value is served and no other refresh is started
+        self.assertEqual('value-0', revalidating_cache.get_value(cache_key, loader, TEST_POLICY))
+        self.assertEqual(1, loader.count)
+        self.assertEqual(150, g.cache_stale_age)
+
+        response = revalidating_cache.add_staleness_headers(Response('{}'))
+        self.assertEqual('150', response.headers['Age'])
+        self.assertEqual(revalidating_cache.STALE_WARNING, response.headers['Warning'])
+
+        loader.release.set()
+        self.assertTrue(loader.done.wait(5))
+        self._wait_background_refresh(cache_key)
+        self.assertEqual('value-1', revalidating_cache.get_value(cache_key, loader, TEST_POLICY))
+        self.assertEqual(1, loader.count)
+
+    def test_fresh_response_headers(self):
+        response = revalidating_cache.add_staleness_headers(Response('{}'))
+        self.assertNotIn('Age', response.headers)
+        self.assertNotIn('Warning', response.headers)
+
+    def test_reload_after_hard_ttl(self):
+        cache_key = 'expired-key'
+        revalidating_cache.set_value(cache_key, 'value-0', TEST_POLICY)
+        loader = CountingLoader(cache_key)
+        self.clock.advance(TEST_POLICY.hard_ttl + 1)
+        # The expired value is not served: the request waits for the load
+        self.assertEqual('value-1', revalidating_cache.get_value(cache_key, loader, TEST_POLICY))
+        self.assertEqual(1, loader.count)
+        self.assertIsNone(g.get('cache_stale_age'))
+
+    def test_follower_waits_for_leader(self):
+        self.app.extensions['cache_refresh_coordinator'] = FakeCoordinator(leader=False)
+        cache_key = 'follower-missing-key'
+        loader = CountingLoader(cache_key)
+        sleeps = []
+
+        def _leader_load():
+            sleeps.append(self.clock.now)
+            if len(sleeps) == 3:
+                revalidating_cache.set_value(cache_key, 'leader-value', TEST_POLICY)
+
+        self.clock.on_sleep = _leader_load
+        self.assertEqual('leader-value', revalidating_cache.get_value(cache_key, loader, TEST_POLICY))
+        self.assertEqual(0, loader.count)
+        self.assertEqual(3, len(sleeps))
+        # The wait ends at the timeout, if the leader does not save the value
+        self.clock.on_sleep = None
+        self.assertIsNone(revalidating_cache.get_value('never-loaded-key', loader, TEST_POLICY))
+        self.assertEqual(0, loader.count)
+
+    def test_follower_serves_stale_value(self):
+        cache_key = 'follower-stale-key'
+        revalidating_cache.set_value(cache_key, 'value-0', TEST_POLICY)
+        loader = CountingLoader(cache_key)
+        self.app.extensions['cache_refresh_coordinator'] = FakeCoordinator(leader=False)
+        self.clock.advance(150)
+        self.assertEqual('value-0', revalidating_cache.get_value(cache_key, loader, TEST_POLICY))
+        self.assertNotIn(cache_key, revalidating_cache._background_refreshes)
+        self.assertEqual(0, loader.count)
+        self.assertEqual(150, g.cache_stale_age)
+        # The leader refreshes stale values
+        self.app.extensions['cache_refresh_coordinator'].leader = True
+        self.assertEqual('value-0', revalidating_cache.get_value(cache_key, loader, TEST_POLICY))
+        self.assertTrue(loader.done.wait(5))
+        self._wait_background_refresh(cache_key)
+        self.assertEqual(1, loader.count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import copy
+import json
+import math
+import unittest
+
+import numpy as np
+
+from apps.cache.station_assets import StationAssetRegistry, DEFAULT_STATIONS_CONFIG, EARTH_RADIUS, horizon_circle
+
+
+class StationAssetRegistryTestCase(unittest.TestCase):
+
+    def test_default_stations_czml(self):
+        packets = json.loads(StationAssetRegistry().load(DEFAULT_STATIONS_CONFIG).body)
+        self.assertEqual(['document', 'Svalbard', 'Inuvik', 'Maspalomas', 'Matera', 'Neustrelitz'],
+                         [packet['id'] for packet in packets])
+        self.assertEqual({'id': 'Matera',
+                          'billboard': {'show': True, 'image': 'static/assets/img/antenna.png',
+                                        'color': {'rgba': [215, 222, 252, 255]}, 'scale': 0.5},
+                          'position': {'cartographicDegrees': [16.7046, 40.6486, 536.9]}},
+                         packets[4])
+
+    def test_payload_built_once_per_version(self):
+        registry = StationAssetRegistry()
+        cached_response = registry.load(DEFAULT_STATIONS_CONFIG)
+        self.assertIs(cached_response, registry.load(copy.deepcopy(DEFAULT_STATIONS_CONFIG)))
+        self.assertIsNotNone(cached_response.gzip_body)
+        new_config = copy.deepcopy(DEFAULT_STATIONS_CONFIG)
+        new_config['stations'][0]['color'] = [255, 0, 0, 255]
+        new_response = registry.load(new_config)
+        self.assertNotEqual(cached_response.etag, new_response.etag)
+        self.assertEqual([255, 0, 0, 255], registry.stations[0].color)
+        self.assertEqual([215, 222, 252, 255], registry.stations[1].color)
+
+    def test_visibility_mask(self):
+        config = copy.deepcopy(DEFAULT_STATIONS_CONFIG)
+        config['stations'][3]['visibility_mask'] = {'satellite_altitude': 700, 'min_elevation': 5}
+        registry = StationAssetRegistry()
+        packets = json.loads(registry.load(config).body)
+        self.assertEqual('Matera-visibility-mask', packets[5]['id'])
+        positions = packets[5]['polyline']['positions']['cartographicDegrees']
+        self.assertEqual((72 + 1) * 3, len(positions))
+        self.assertEqual(positions[:3], positions[-3:])
+        circle = registry.stations[3].horizon_circle
+        station_lon, station_lat = math.radians(16.7046), math.radians(40.6486)
+        lons, lats = np.radians(circle[:, 0]), np.radians(circle[:, 1])
+        distances = np.arccos(np.sin(station_lat) * np.sin(lats) +
+                              np.cos(station_lat) * np.cos(lats) * np.cos(lons - station_lon))
+        elevation = math.radians(5)
+        expected_angle = math.acos(EARTH_RADIUS / (EARTH_RADIUS + 700) * math.cos(elevation)) - elevation
+        np.testing.assert_allclose(distances, expected_angle, atol=1e-9)
+
+    def test_horizon_circle_longitudes(self):
+        circle = horizon_circle(-133.72181, 68.34986, 800, 0)
+        self.assertTrue(np.all(circle[:, 0] >= -180) and np.all(circle[:, 0] < 180))
+        self.assertTrue(np.any(circle[:, 0] > 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import random
+import unittest
+
+from flask import Flask
+
+from apps import db
+from apps.ingestion.synonym_matcher import CategorizationEngine, SynonymIndex
+from apps.models import categories as categories_model
+from apps.models import impacted_item as impacted_item_model
+from apps.models import impacted_satellite as impacted_satellite_model
+
+CATEGORIES = [('Platform', 'platform;satellite;AOCS;manoeuvre'),
+              ('Acquisition', 'acquisition;downlink;station;X-band'),
+              ('Production', 'production;processing;L0;L1;L2;product'),
+              ('Archive', None)]
+
+IMPACTED_SATELLITES = [('S1A', 'S1A;Sentinel-1A;S1'), ('S2B', 'S2B;Sentinel-2B'),
+                       ('S2A', 'S2A;Sentinel-2A;S2'), ('S5P', 'S5P;Sentinel-5P;SNP')]
+
+IMPACTED_ITEMS = [('Svalbard', 'Acquisition', 'SGS;Svalbard'), ('Matera', 'Acquisition', 'MTI;Matera'),
+                  ('PDGS', 'Production;Archive', 'PDGS;processor'), ('SAR', 'Platform', 'SAR;instrument'),
+                  ('Downlink', 'Acquisition', 'downlink'), ('Ground', None, 'ground;failure')]
+
+WORDS = ['platform', 'Satellite', 'aocs', 'station', 'band', 'L1', 'product', 'S1', 'sentinel-2', '2A', 'SNP',
+         'svalbard', 'MTI', 'processor', 'instrument', 'down', 'link', 'failure', 'anomaly', 'delay', 'data']
+
+
+def _reference_categorization(title_tokens, text_tokens, default_category):
+    """
+    Categorization with the original per-token queries
+    """
+    def first_match(query, tokens):
+        for token in tokens:
+            row = query(token)
+            if row is not None:
+                return row.name
+        return None
+
+    impacted_satellite = first_match(impacted_satellite_model.get_impacted_satellite_by_synonymous, title_tokens) or \
+        first_match(impacted_satellite_model.get_impacted_satellite_by_synonymous, text_tokens) or ''
+    category = first_match(categories_model.get_category_by_synonymous, title_tokens) or \
+        first_match(categories_model.get_category_by_synonymous, text_tokens) or \
+        (default_category if text_tokens else '')
+
+    def item_query(token):
+        return impacted_item_model.get_impacted_item_by_category_and_synonymous(category, token)
+
+    impacted_item = first_match(item_query, title_tokens) or first_match(item_query, text_tokens) or ''
+    return category, impacted_satellite, impacted_item
+
+
+class CategorizationEngineTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add_all([categories_model.Categories(name=name, synonymous=synonymous)
+                            for name, synonymous in CATEGORIES])
+        db.session.add_all([impacted_satellite_model.ImpactedSatellite(name=name, synonymous=synonymous)
+                            for name, synonymous in IMPACTED_SATELLITES])
+        db.session.add_all([impacted_item_model.ImpactedItem(name=name, category=category, synonymous=synonymous)
+                            for name, category, synonymous in IMPACTED_ITEMS])
+        db.session.commit()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_synonym_index_first_row(self):
+        index = SynonymIndex([('A', 'abc;def'), ('B', None), ('C', 'xyz;DEF')])
+        self.assertEqual('A', index.match('def'))
+        self.assertEqual('C', index.match('DEF'))
+        self.assertEqual('C', index.match('yz'))
+        self.assertIsNone(index.match('cd'))
+        # Matches do not span two rows
+        self.assertIsNone(index.match('fxyz'))
+        self.assertEqual('A', SynonymIndex([('A', 'abc;def'), ('C', 'xyz;DEF')], case_sensitive=False).match('DEF'))
+
+    def test_same_as_queries(self):
+        engine = CategorizationEngine.from_db()
+        randomizer = random.Random(7)
+        documents = [([randomizer.choice(WORDS) for _ in range(randomizer.randint(0, 4))],
+                      [randomizer.choice(WORDS) for _ in range(randomizer.randint(0, 12))])
+                     for _ in range(300)]
+        for (title_tokens, text_tokens), categorization in zip(documents,
+                                                               engine.classify_many(documents, 'Acquisition')):
+            self.assertEqual(_reference_categorization(title_tokens, text_tokens, 'Acquisition'),
+                             (categorization.category, categorization.impacted_satellite,
+                              categorization.impacted_item))
+
+    def test_news_without_impacted_item(self):
+        engine = CategorizationEngine.from_db()
+        categorization = engine.classify(['S2B', 'manoeuvre'], ['svalbard'], 'Production', with_impacted_item=False)
+        self.assertEqual(('Platform', 'S2B', ''), (categorization.category, categorization.impacted_satellite,
+                                                   categorization.impacted_item))
+
+    def test_item_without_category(self):
+        engine = CategorizationEngine.from_db()
+        # Without text, the category is empty: as the query, items without category are not matched
+        categorization = engine.classify(['failure', 'svalbard'], [], 'Acquisition')
+        self.assertEqual(('', '', 'Svalbard'), (categorization.category, categorization.impacted_satellite,
+                                                 categorization.impacted_item))
+        self.assertEqual(_reference_categorization(['failure', 'svalbard'], [], 'Acquisition'),
+                         (categorization.category, categorization.impacted_satellite,
+                          categorization.impacted_item))
+
+
+if __name__ == '__main__':
+    unittest.main()
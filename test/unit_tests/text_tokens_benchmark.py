@@ -0,0 +1,31 @@
+"""
+Compare the tokenization of anomalies and news text before the text_tokens module
+(chain of replace calls, excluded words in a list) with text_tokens.document_tokens,
+on a synthetic corpus of tickets.
+
+Usage, from this folder:
+    PYTHONPATH=<repository root> python text_tokens_benchmark.py [number of tickets]
+"""
+import sys
+from timeit import repeat
+
+from text_tokens_test import _legacy_document_tokens, _synthetic_tickets
+
+from apps.ingestion import text_tokens
+
+DEFAULT_NUM_TICKETS = 10000
+
+
+def benchmark_tokenization(num_tickets):
+    tickets = _synthetic_tickets(num_tickets)
+    if [_legacy_document_tokens(title, text) for title, text in tickets] != \
+            [text_tokens.document_tokens(title, text) for title, text in tickets]:
+        raise AssertionError("Different tokens from the two tokenizers")
+    for name, tokenizer in (('replace chain', _legacy_document_tokens),
+                            ('text_tokens', text_tokens.document_tokens)):
+        elapsed = min(repeat(lambda: [tokenizer(title, text) for title, text in tickets], number=1, repeat=5))
+        print("%-15s %d tickets: %0.3f s" % (name, num_tickets, elapsed))
+
+
+if __name__ == '__main__':
+    benchmark_tokenization(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUM_TICKETS)
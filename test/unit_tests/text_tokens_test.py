@@ -0,0 +1,63 @@
+import random
+import unittest
+
+from apps.ingestion import text_tokens
+
+VOCABULARY = ['S1A', 'S2B', 'S5P', 'Sentinel-1A', 'L0', 'L1C', 'product', 'products', 'generation', 'delay',
+              'processing', 'failure', 'station', 'Svalbard', 'MTI', 'downlink', 'X-band', 'the', 'of', 'and',
+              'is', 'due', 'to', 'i.e.', '-', 'a', '42', '2023', 'anomaly', 'datatake', 'unavailability']
+
+DECORATIONS = ['[{}]', '({})', '{}:', '{}/', '*{}*', '{}_{}', '{}', '{}', '{}']
+
+
+def _legacy_tokenize(text):
+    return text.replace('[', ' ').replace(']', ' ').replace('(', ' ').replace(')', ' ') \
+        .replace('_', ' ').replace(':', ' ').replace('/', ' ').replace('*', ' ').split()
+
+
+def _legacy_not_consistent(token):
+    excluded_tokens = ['-', 'in', 'and', 'or', 'the', 'of', 'to', 'due', 'ok', 'i.e', 'i.e.', 'is']
+    return token.isdigit() or len(token) == 1 or token in excluded_tokens
+
+
+def _legacy_document_tokens(title, text):
+    """
+    Tokenization of the ingestors before the text_tokens module
+    """
+    title_tokenized = _legacy_tokenize(title)
+    text_tokenized = _legacy_tokenize(text)
+    return ([token for token in title_tokenized if not _legacy_not_consistent(token)],
+            [token for token in text_tokenized if not _legacy_not_consistent(token)])
+
+
+def _synthetic_text(randomizer, num_words):
+    words = []
+    for _ in range(num_words):
+        decoration = randomizer.choice(DECORATIONS)
+        words.append(decoration.format(randomizer.choice(VOCABULARY), randomizer.choice(VOCABULARY)))
+    return ' '.join(words)
+
+
+def _synthetic_tickets(num_tickets, seed=11):
+    randomizer = random.Random(seed)
+    return [(_synthetic_text(randomizer, randomizer.randint(4, 15)),
+             _synthetic_text(randomizer, randomizer.randint(20, 120)))
+            for _ in range(num_tickets)]
+
+
+class TextTokensTestCase(unittest.TestCase):
+
+    def test_tokenize(self):
+        self.assertEqual(['S1A', 'L0', 'delay', 'due', 'to', 'X-band', 'failure', 'i.e.', '2023'],
+                         text_tokens.tokenize("[S1A]/L0 delay (due to X-band_failure): i.e. *2023*"))
+        self.assertEqual(['S1A', 'L0', 'delay', 'X-band', 'failure'],
+                         text_tokens.consistent_tokens("[S1A]/L0 delay (due to X-band_failure): i.e. *2023*"))
+        self.assertEqual([], text_tokens.tokenize(None))
+
+    def test_same_tokens_as_ingestors(self):
+        for title, text in _synthetic_tickets(500):
+            self.assertEqual(_legacy_document_tokens(title, text), text_tokens.document_tokens(title, text))
+
+
+if __name__ == '__main__':
+    unittest.main()
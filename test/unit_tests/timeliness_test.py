@@ -0,0 +1,110 @@
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from apps.cache.cache import MissionTimelinessCache, PublicationProductTreeCache
+from apps.elastic.modules import timeliness
+
+TIMELINESS_CONFIG = {
+    'timeliness_types': ['NRT', 'NTC'],
+    'S1': {
+        'NRT': {'timeliness': 'NRT', 'thresholds': [{'threshold': 3, 'product_level': 'L1_'},
+                                                    {'threshold': 3, 'product_level': 'L2_'}]},
+        'NTC': {'timeliness': 'NTC', 'thresholds': {'threshold': 24, 'product_level': 'L1_'}}
+    }
+}
+
+
+class FakeElastic:
+    """
+    Record the requests, and answer with counts depending on the number of clauses
+    """
+
+    def __init__(self, search_error=None, failing_timeliness=None):
+        self.search_error = search_error
+        self.failing_timeliness = failing_timeliness
+        self.searches = []
+        self.counts = []
+
+    def search(self, index, query=None, aggs=None, size=0):
+        self.searches.append({'index': index, 'query': query, 'aggs': aggs})
+        if self.search_error is not None:
+            raise self.search_error
+        filters = aggs['timeliness']['filters']['filters']
+        return {'aggregations': {'timeliness': {'buckets': {
+            filter_id: {'doc_count': len(filter_query['bool']['must'])}
+            for filter_id, filter_query in filters.items()}}}}
+
+    def count(self, index, body=None):
+        self.counts.append(body)
+        if self.failing_timeliness is not None and \
+                {'prefix': {'timeliness': self.failing_timeliness}} in body['query']['bool']['must']:
+            raise ConnectionError('Elastic unavailable')
+        return {'count': len(body['query']['bool']['must'])}
+
+
+class TimelinessTestCase(unittest.TestCase):
+    start_date = datetime(2023, 7, 1)
+    end_date = datetime(2023, 10, 1)
+
+    def setUp(self) -> None:
+        self._timeliness_config = dict(MissionTimelinessCache.load_all())
+        self._publication_config = dict(PublicationProductTreeCache.load_all())
+        MissionTimelinessCache.store_objects(TIMELINESS_CONFIG)
+        PublicationProductTreeCache.store_objects(dict(self._publication_config,
+                                                       current_publication_service='DHUS'))
+        self.compiled_filters = timeliness._compile_timeliness_filters(self.start_date, self.end_date, 'S1',
+                                                                       ['NRT', 'NTC'])
+
+    def tearDown(self) -> None:
+        MissionTimelinessCache.store_objects(self._timeliness_config)
+        PublicationProductTreeCache.store_objects(self._publication_config)
+
+    @staticmethod
+    def _clauses(clause_list):
+        return sorted(json.dumps(clause, sort_keys=True, default=str) for clause in clause_list)
+
+    def test_shared_query(self):
+        shared_query, residual_filters = timeliness._split_shared_clauses(self.compiled_filters)
+        shared_must = shared_query['bool']['must']
+        self.assertIn({'term': {'mission': 'S1'}}, shared_must)
+        self.assertIn({'term': {'service_id': 'DHUS'}}, shared_must)
+        self.assertIn({'range': {'publication_date': {'gte': self.start_date, 'lt': self.end_date}}}, shared_must)
+        self.assertEqual([{'term': {'product_level': '___'}}], shared_query['bool']['must_not'])
+        for (_, total_query, ontime_query), (_, total_filter, ontime_filter) in zip(self.compiled_filters,
+                                                                                  residual_filters):
+            # Type and threshold clauses only: the search evaluates the same conditions of the count queries
+            self.assertNotIn({'term': {'mission': 'S1'}}, total_filter['bool']['must'])
+            self.assertEqual(2, len(total_filter['bool']['must']))
+            self.assertEqual([], total_filter['bool']['must_not'])
+            for query, residual in ((total_query, total_filter), (ontime_query, ontime_filter)):
+                for bool_key in ('must', 'must_not'):
+                    self.assertEqual(self._clauses(query['bool'][bool_key]),
+                                     self._clauses(shared_query['bool'][bool_key] + residual['bool'][bool_key]))
+
+    def test_single_search(self):
+        elastic = FakeElastic()
+        results = timeliness._evaluate_timeliness_filters(elastic, ['cds-publication'], self.compiled_filters)
+        self.assertEqual(1, len(elastic.searches))
+        self.assertIn({'term': {'mission': 'S1'}}, elastic.searches[0]['query']['bool']['must'])
+        self.assertEqual([('NRT', 'L1'), ('NRT', 'L2'), ('NTC', 'L1')],
+                         [(result['timeliness'], result['level']) for result in results])
+        # Timeliness prefix and level for the total; on time adds the threshold clause
+        self.assertEqual([(2, 3)] * 3, [(result['total_count'], result['on_time']) for result in results])
+
+    def test_fallback_to_count_queries(self):
+        elastic = FakeElastic(search_error=ConnectionError('Search timeout'), failing_timeliness='NTC')
+        with mock.patch.object(timeliness.elastic_client, 'get_elastic_client', return_value=elastic):
+            results = timeliness._get_cds_timeliness_types(self.start_date, self.end_date, 'S1', ['NRT', 'NTC'])
+        # Count queries are limited to mission and publication date range, as the search
+        for body in elastic.counts:
+            self.assertIn({'term': {'mission': 'S1'}}, body['query']['bool']['must'])
+        # Only the results of the failed timeliness type are discarded
+        self.assertEqual([('NRT', 'L1'), ('NRT', 'L2')], [(result['timeliness'], result['level'])
+                                                          for result in results])
+        self.assertEqual([7, 7], [result['total_count'] for result in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from apps.cache.cache import ConfigCache
+from apps.ingestion.acquisition_plans.orbit_datatake_acquisitions import OrbitPropagatorSkyfield
+from apps.ingestion.acquisition_plans.tle_repository import TleFileStore, TleRepository, \
+    SatellitePropagatorCache, load_tle_files, parse_tle_epoch
+
+
+class _TleFetcher:
+    """
+    Replace the CelesTrak download: return the TLE files of a folder
+    """
+
+    def __init__(self, tle_dir):
+        self.records = {norad_id: records[-1] for norad_id, records in load_tle_files(tle_dir).items()}
+        self.requested_ids = []
+        self.available = True
+
+    def __call__(self, norad_id):
+        self.requested_ids.append(norad_id)
+        if not self.available:
+            raise ConnectionError("CelesTrak not reachable")
+        return self.records[norad_id].lines
+
+
+class TleRepositoryTestCase(unittest.TestCase):
+    tle_path = "./test_tles"
+
+    def setUp(self) -> None:
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.fetcher = _TleFetcher(self.tle_path)
+
+    def tearDown(self) -> None:
+        self.store_dir.cleanup()
+
+    def _repository(self, max_age=3600, fallback_dir=''):
+        return TleRepository(TleFileStore(self.store_dir.name), max_age=max_age,
+                             fallback_dir=fallback_dir, fetch_function=self.fetcher)
+
+    def test_parse_epoch(self):
+        with open(os.path.join(self.tle_path, 'S3A_20231012.tle'), 'r') as tle_file:
+            line1 = tle_file.read().splitlines()[1]
+        epoch = parse_tle_epoch(line1)
+        self.assertEqual(datetime(2023, 10, 12, 4, 52), epoch.replace(second=0, microsecond=0))
+
+    def test_fresh_tle_not_fetched_again(self):
+        repository = self._repository()
+        tle_record = repository.get_latest('S3A')
+        self.assertEqual('SENTINEL-3A', tle_record.name)
+        self.assertEqual(tle_record, repository.get_latest('S3A'))
+        self.assertEqual([41335], self.fetcher.requested_ids)
+        # A new repository finds the TLE on the store
+        self.assertEqual(tle_record.lines, self._repository().get_latest('S3A').lines)
+        self.assertEqual([41335], self.fetcher.requested_ids)
+        # Expired TLE are downloaded again, and the history is not duplicated
+        repository = self._repository(max_age=0)
+        repository.get_latest('S3A')
+        self.assertEqual([41335, 41335], self.fetcher.requested_ids)
+        self.assertEqual(1, len(repository.get_history('S3A')))
+
+    def test_offline_fallback(self):
+        self.fetcher.available = False
+        repository = self._repository(max_age=0, fallback_dir=self.tle_path)
+        self.assertEqual('SENTINEL-5P', repository.get_latest('S5P').name)
+        with self.assertRaises(ConnectionError):
+            repository.get_latest('S1A')
+        # The stored TLE is preferred to the fallback files
+        self.fetcher.available = True
+        stored_record = self._repository().get_latest('S3B')
+        self.fetcher.available = False
+        self.assertEqual(stored_record.lines, repository.get_latest('S3B').lines)
+
+    def test_fallback_dir_configuration(self):
+        tle_config = ConfigCache.load_object("tle_config")
+        try:
+            ConfigCache.store_object("tle_config", {'store_dir': self.store_dir.name,
+                                                    'fallback_dir': os.path.join(self.store_dir.name, 'missing')})
+            with self.assertRaisesRegex(ValueError, 'fallback_dir'):
+                TleRepository(fetch_function=self.fetcher)
+            # Without a configured fallback folder, only CelesTrak and the store are used
+            ConfigCache.store_object("tle_config", {'store_dir': self.store_dir.name})
+            self.fetcher.available = False
+            repository = TleRepository(fetch_function=self.fetcher)
+            with self.assertRaises(ConnectionError):
+                repository.get_latest('S5P')
+            self.assertEqual([], repository.get_history('S5P'))
+        finally:
+            ConfigCache.store_object("tle_config", tle_config)
+
+    def test_tle_at_epoch(self):
+        repository = self._repository(fallback_dir=self.tle_path)
+        s3a_record = repository.get_latest('S3A')
+        self.assertEqual(s3a_record.lines, repository.get_tle_at('S3A', datetime(2023, 10, 20)).lines)
+        self.assertEqual(s3a_record.lines, repository.get_tle_at('S3A', datetime(2023, 9, 1)).lines)
+        self.assertIsNone(repository.get_tle_at('S1A', datetime(2023, 10, 20)))
+
+    def test_propagators_shared(self):
+        tle_lines = self.fetcher.records[41335].lines
+        propagators = SatellitePropagatorCache(max_size=1)
+        satellite = propagators.get_satellite(tle_lines)
+        self.assertIs(satellite, propagators.get_satellite([line + '\n' for line in tle_lines]))
+        propagators.get_satellite(self.fetcher.records[43437].lines)
+        self.assertIsNot(satellite, propagators.get_satellite(tle_lines))
+        # Orbit propagators on the same TLE use the same satellite
+        self.assertIs(OrbitPropagatorSkyfield(tle_lines, 60)._satellite,
+                      OrbitPropagatorSkyfield(tle_lines, 90, True)._satellite)
+
+
+if __name__ == '__main__':
+    unittest.main()